@@ -1,6 +1,6 @@
 # app_gui5_llm.py
-import os, re, sys, json, traceback
-from typing import List, Union # [수정] Union 임포트
+import os, re, sys, json, time, atexit, tempfile, threading, traceback, importlib.util
+from typing import Callable, List, Optional, Union # [수정] Union 임포트
 
 # Qt 플랫폼 플러그인 경로를 PyQt5 import 이전에 설정해야 합니다.
 _candidates = [
@@ -17,26 +17,41 @@ os.environ.setdefault("QTWEBENGINE_CHROMIUM_FLAGS", "--disable-gpu")  # 일부 
 
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QListWidget, QListWidgetItem, QTextEdit, QPushButton, QLineEdit, QLabel, QSplitter
+    QListWidget, QListWidgetItem, QTextEdit, QPushButton, QLineEdit, QLabel, QSplitter, QMessageBox, QTabWidget
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QCoreApplication
 from PyQt5.QtGui import QFont, QPalette, QColor, QTextCursor, QIcon # QTextCursor 임포트
 
-# ── WebEngine 임포트 시도 + 가용 플래그 ───────────────────────────
-try:
-    from PyQt5.QtWebEngineWidgets import QWebEngineView  # type: ignore
-    WEB_ENGINE_OK = True
-except Exception:
-    QWebEngineView = None  # type: ignore
-    WEB_ENGINE_OK = False
+# ── WebEngine 가용 플래그 (import와 뷰 생성은 첫 그래프 때 — App._ensure_plot_view) ───
+# QApplication을 만든 뒤에 QtWebEngineWidgets를 import하려면 그 전에 AA_ShareOpenGLContexts를 켜 두어야 한다.
+WEB_ENGINE_OK = importlib.util.find_spec("PyQt5.QtWebEngineWidgets") is not None
+if WEB_ENGINE_OK and QCoreApplication.instance() is None: QCoreApplication.setAttribute(Qt.AA_ShareOpenGLContexts)
 # ────────────────────────────────────────────────────────────
 
 import pandas as pd
-import plotly.express as px
 from dotenv import load_dotenv
-from openai import OpenAI
 
-from db.connector import run_query  # 반드시 pandas.DataFrame 반환
+from db.connector import engine, run_query, run_query_stream, register_prepared, run_prepared, explain_plan, dry_run, sql_error, result_cache, table_versions, local_backend  # run_query는 반드시 pandas.DataFrame 반환, run_query_stream은 청크 이터레이터
+from db.streaming import ResultDigest  # 스트리밍 결과를 메모리 한도 안에서 요약
+from db.cost_guard import CostGuard  # 실행 전 EXPLAIN 비용 가드
+from db.rollups import RollupManager, ROLLUP_CONTEXT  # raw_data 레이어 롤업 + 재작성기
+from db.time_column import TimeColumn, TIME_CONTEXT  # raw_data.time → time_ts(timestamp) + 인덱스
+from db.fanout import FanOut  # 프로젝트별 병렬 분할 실행
+from db.prefetch import Prefetcher, DUCKDB_OK  # 프로젝트 선택 시 미리 읽기 + meta_data 로컬(DuckDB) 실행
+from db.tracing import tracer  # 단계별 span (request → classify / generate / execute / answer / chart)
+from gui.engine import RequestEngine  # _on_send 파이프라인을 워커 스레드에서 실행
+from gui.plotting import PlotView  # 다운샘플 + WebGL + 영속 plotly 페이지
+from gui.charts import infer_roles, choose_chart, aggregate_sql, build_figure  # 컬럼 역할 → 차트 종류 추론
+from gui.trace_panel import TracePanel  # 단계별 p50/p95 + 최근 오류 도킹 패널
+from gui.result_table import ResultTableView  # 가상화된 결과 표 (점진 로드 / 정렬 / CSV·Parquet 내보내기)
+from gui.startup import ProjectListLoader, preload  # 프로젝트 목록 비동기 로드(+ 마지막 목록 캐시), 창이 뜬 뒤 미리 import
+from nlq.sql_cache import SqlCache, prompt_fingerprint  # NL→SQL 영구 캐시
+from nlq import sql_rewrite  # SQL 구문 트리 기반 정제 / 필터 주입 / 읽기 전용 검사
+from nlq.prompt_builder import PromptBuilder, PromptMeter, parse_examples  # 토큰 예산 + 캐시 친화 순서 프롬프트 조립
+from nlq.query_library import QueryLibrary  # 검증된 질문 → SQL 라이브러리 (few-shot 예시)
+from nlq.answer_renderer import AnswerRenderer, KINDS as ANSWER_KINDS, table_html  # 결과 모양별 로컬 답변 (LLM 답변 단계 생략)
+from nlq.rate_limit import RateLimiter, retry_call  # LLM 호출 속도 제한 + 429/5xx 재시도
+from nlq.conversation import ConversationStore, format_turns  # 프로젝트 집합별 대화 기록 (SQLite + FTS5)
 
 # ─────────────────────────────────────────────────────────────────
 # 환경 & LLM
@@ -44,7 +59,61 @@ from db.connector import run_query  # 반드시 pandas.DataFrame 반환
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY") or os.getenv("openai_api_key")
 OPENAI_MODEL   = os.getenv("OPENAI_MODEL", "gpt-4o")
-client = OpenAI(api_key=OPENAI_API_KEY)
+LLM_STREAM     = os.getenv("LLM_STREAM", "1") != "0"  # 답변/채팅 응답을 토큰 단위로 스트리밍 (0이면 끔)
+LLM_RETRIES    = int(os.getenv("LLM_RETRIES", "3"))  # 429/5xx/타임아웃 재시도 횟수 (지수 백오프, Retry-After 우선)
+LLM_LIMITER    = RateLimiter(float(os.getenv("LLM_RPM", "0")))  # 분당 요청 수 제한 (0이면 없음, 429 Retry-After 시 전체 일시 정지)
+_client, _client_lock = None, threading.Lock()
+
+def llm_client():
+    """OpenAI 클라이언트. openai 패키지 import(시작 시간의 큰 몫)는 첫 LLM 호출(또는 STARTUP_PRELOAD) 때 한 번만 한다."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                _client = OpenAI(api_key=OPENAI_API_KEY, max_retries=0)  # 재시도는 retry_call이 맡는다. OPENAI_BASE_URL로 로컬 가짜 서버(tools/fake_openai.py)를 지정할 수 있다
+    return _client
+
+def _on_llm_retry(n: int, e: Exception, delay: float):
+    print(f"⏳ LLM 호출 재시도 {n}/{LLM_RETRIES} ({delay:.1f}s 후): {e}")
+    tracer.add("retries", 1)
+
+def _create(**kwargs):
+    return retry_call(lambda: llm_client().chat.completions.create(model=OPENAI_MODEL, **kwargs), retries=LLM_RETRIES, limiter=LLM_LIMITER,
+                      on_retry=_on_llm_retry)
+
+def llm_complete(messages: List[dict], temperature: float, on_delta: Optional[Callable[[str], None]] = None,
+                 stats: Optional[dict] = None, **kwargs) -> str:
+    """
+    chat.completions 호출 공통 함수.
+    on_delta가 주어지고 LLM_STREAM이 켜져 있으면 스트리밍 API를 사용하고, 지금까지 받은 누적 텍스트를 on_delta에 전달한다.
+    stats(PromptBuilder가 돌려준 토큰 정보)가 있으면 호출 시간/응답 usage(캐시된 토큰 포함)와 함께 PROMPT_METER에 기록한다.
+    kwargs는 create()에 그대로 넘긴다 (예: response_format). 요청 시작(스트림 연결)까지는 LLM_LIMITER 속도 제한과 재시도를 거친다.
+    """
+    if stats and PROMPT_CACHE_KEY: kwargs.setdefault("prompt_cache_key", f"{PROMPT_CACHE_KEY}-{stats['stage']}")
+    started, usage = time.perf_counter(), None
+    with tracer.span(f"llm.{stats['stage'] if stats else 'call'}", model=OPENAI_MODEL, tokens_in=stats["tokens"] if stats else None) as span:
+        if on_delta is None or not LLM_STREAM:
+            resp = _create(temperature=temperature, messages=messages, **kwargs)
+            out, usage = resp.choices[0].message.content or "", resp.usage
+        else:
+            parts = []
+            stream = _create(temperature=temperature, messages=messages, stream=True, stream_options={"include_usage": True}, **kwargs)
+            for chunk in stream:
+                if getattr(chunk, "usage", None) is not None: usage = chunk.usage  # 마지막 청크 (choices 비어 있음)
+                if not chunk.choices: continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if not parts: span.set(ttft_ms=(time.perf_counter() - started) * 1000)  # 첫 토큰까지
+                    parts.append(delta)
+                    on_delta("".join(parts))
+            out = "".join(parts)
+        if usage is not None:
+            details = getattr(usage, "prompt_tokens_details", None)
+            span.set(tokens_in=usage.prompt_tokens or span.attrs["tokens_in"], tokens_out=usage.completion_tokens,
+                     cached_tokens=getattr(details, "cached_tokens", None))
+    if stats and PROMPT_METER: PROMPT_METER.record(stats, time.perf_counter() - started, usage)
+    return out
 
 # ─────────────────────────────────────────────────────────────────
 # 스키마 및 용어 정의 (LLM에게 제공)
@@ -106,7 +175,7 @@ def apply_dark70_theme(app: QApplication):
     # QTextEdit의 line-height 및 hr/table 스타일 추가
     app.setStyleSheet("""
         QWidget { background-color:#24272E; color:#EAEAEA; }
-        QTextEdit, QPlainTextEdit, QLineEdit, QListWidget {
+        QTextEdit, QPlainTextEdit, QLineEdit, QListWidget, QTableView {
             background-color:#1C1F24; color:#EAEAEA;
             border:1px solid #3C4048; border-radius:6px;
         }
@@ -123,70 +192,130 @@ def apply_dark70_theme(app: QApplication):
     """)
 
 # ─────────────────────────────────────────────────────────────────
-# SQL 정제 & 보정 (변경 없음)
+# SQL 정제 & 보정 (nlq/sql_rewrite.py: sqlglot 구문 트리 기반)
 # ─────────────────────────────────────────────────────────────────
-SQL_START = re.compile(r'(?is)\b(SELECT|WITH|INSERT|UPDATE|DELETE|CREATE|DROP|ALTER|EXPLAIN)\b')
+SQL_START = sql_rewrite.SQL_START
 
 def sanitize_sql(raw: str) -> str:   # LLM의 출력물 정리 (청소부) -> 이 함수는 LLM이 생성한 SQL 쿼리에서 불필요한 주석, 설명, 백틱 등을 제거하고, SQL 문장만 남기는 역할을 합니다.
-    if not raw: return ""
-    blocks = re.findall(r"```(?:sql)?\s*(.*?)```", raw, flags=re.S)
-    if blocks: raw = blocks[0]
-    m = SQL_START.search(raw)
-    if m: raw = raw[m.start():]
-    raw = re.sub(r'\bname\b', 'project_name', raw, flags=re.I)
-    raw = raw.strip()
-    if not raw.endswith(";"): raw += ";"
-    return raw
+    return sql_rewrite.sanitize_sql(raw)  # 구문 트리 기준으로 project6의 name 컬럼만 project_name으로 바꿈 (별칭/문자열은 그대로)
 
 def enforce_project_filter(sql: str, ids: List[int]) -> str:  # 프로젝트 필터 강제 적용 (안전장치) -> 이 함수는 GUI에서 사용자가 체크박스로 선택한 프로젝트 ID를 SQL 쿼리에 강제로 주입하는 매우 중요한 "안전장치"입니다.
-    if not ids: return sql
-    ids_csv = ",".join(str(int(i)) for i in sorted(set(ids)))
-    if re.search(r'\bproject_id\b\s+IN\s*\(\s*\d+(?:\s*,\s*\d+)*\s*\)', sql, flags=re.I): return sql
-    if re.search(r'\bWHERE\b', sql, flags=re.I):
-        sql = re.sub(r'\bWHERE\b', f"WHERE project_id IN ({ids_csv}) AND ", sql, count=1, flags=re.I)
-    else:
-        m = re.search(r'\b(ORDER\s+BY|GROUP\s+BY|LIMIT)\b', sql, flags=re.I)
-        if m: sql = sql[:m.start()] + f" WHERE project_id IN ({ids_csv}) " + sql[m.start():]
-        else: sql = sql.rstrip(';') + f" WHERE project_id IN ({ids_csv});"
-    return sql
+    return sql_rewrite.enforce_project_filter(sql, ids)  # CTE/하위 쿼리/JOIN의 모든 raw_data·meta_data·project6 스캔에 project_id 필터 (파싱 실패 시 기존 정규식 방식)
 
 # 이 두 함수는 LLM이 실수를 하거나(예: name 사용, ``` 붙임) 중요한 요구사항을 빠뜨려도(예: project_id 필터 누락), 시스템이 이를 자동으로 수정하여 정확하고 안전한 쿼리만 데이터베이스에 전달되도록 보장합니다.
 
+if result_cache is not None: result_cache.normalizer = sql_rewrite.normalize_sql  # 표기만 다른 같은 쿼리는 결과 캐시 키도 같게
+
+# 로컬 분석 모드 (DB_BACKEND=duckdb, db/local_backend.py): 내려받은 Parquet을 DuckDB로 조회한다.
+# 롤업 / time_ts / 병렬 분할 / COPY 조회 / 미리 읽기는 PostgreSQL 전용이므로 끈다 (비용 가드는 DuckDB 예상 행 수로 동작).
+LOCAL_MODE = local_backend is not None
+
+# ─────────────────────────────────────────────────────────────────
+# raw_data 레이어 롤업 (python -m db.rollups --init으로 만든 경우에만 사용, ROLLUPS=0이면 끔)
+# 롤업 테이블이 있으면 SQL 생성 프롬프트에 스키마를 알려주고, 롤업으로 답할 수 있는 raw_data 집계는 자동으로 재작성한다.
+# ─────────────────────────────────────────────────────────────────
+ROLLUPS = None
+if os.getenv("ROLLUPS", "1") != "0" and not LOCAL_MODE:
+    ROLLUPS = RollupManager(engine, bucket_sec=int(os.getenv("ROLLUP_BUCKET_SEC", "1")),
+                            refresh_interval=float(os.getenv("ROLLUP_REFRESH_SEC", "5")))
+
+def rollup_context() -> str:
+    return f"{ROLLUP_CONTEXT}\n" if ROLLUPS and ROLLUPS.available() else ""
+
+# ─────────────────────────────────────────────────────────────────
+# raw_data.time_ts (python -m db.time_column --migrate로 만든 경우에만 사용, TIME_TS=0이면 끔)
+# 있으면 SQL 생성 프롬프트에 알려주고, LLM SQL의 time 문자열 비교 / MIN·MAX(time) / ORDER BY time을 time_ts 인덱스 조회로 바꾼다.
+# ─────────────────────────────────────────────────────────────────
+TIME_TS = TimeColumn(engine) if os.getenv("TIME_TS", "1") != "0" and not LOCAL_MODE else None
+
+def time_context() -> str:
+    return f"{TIME_CONTEXT}\n" if TIME_TS and TIME_TS.available() else ""
+
+# ─────────────────────────────────────────────────────────────────
+# 검증된 질문 → SQL 라이브러리 (nlq/query_library.py, QUERY_LIBRARY=0이면 고정 EXAMPLE_QUERIES만 예시로 사용)
+# 실행에 성공하고 결과가 있었던 (질문, SQL)을 모아 SQL 생성 프롬프트의 few-shot 예시로 쓴다 (EXAMPLE_QUERIES는 초기값).
+# 같은 SQL이 나중에 실행에 실패하면 라이브러리에서 지운다.
+# ─────────────────────────────────────────────────────────────────
+SEED_EXAMPLES = parse_examples(EXAMPLE_QUERIES)
+QUERY_LIBRARY = None
+if os.getenv("QUERY_LIBRARY", "1") != "0":
+    try:
+        QUERY_LIBRARY = QueryLibrary(os.getenv("QUERY_LIBRARY_PATH", "query_library.sqlite3"), seeds=SEED_EXAMPLES,
+                                     max_entries=int(os.getenv("QUERY_LIBRARY_MAX", "500")))
+    except Exception as e:
+        print(f"⚠️ 쿼리 라이브러리 비활성화: {e}")
+
+def example_queries(user_text: str) -> str:
+    """기존 전체 프롬프트(PROMPT_BUILDER=0)용 예시 블록: 라이브러리에서 질문과 비슷한 것을 EXAMPLE_QUERIES와 같은 개수만큼."""
+    if QUERY_LIBRARY is None: return EXAMPLE_QUERIES
+    return "\n" + PromptBuilder.format_examples(QUERY_LIBRARY.examples(user_text, (), len(SEED_EXAMPLES))) + "\n"
+
+# ─────────────────────────────────────────────────────────────────
+# 프롬프트 조립 (nlq/prompt_builder.py, PROMPT_BUILDER=0이면 기존처럼 전체 정의/예시/HTML 미리보기를 매번 보낸다)
+# 고정 내용(역할·규칙·용어 정의)을 앞에 두어 제공자의 프롬프트 캐시를 타게 하고, 질문에 맞는 스키마 조각/예시만 토큰 예산 안에서 붙인다.
+# PROMPT_LOG=1이면 요청마다 보낸 토큰 / 기존 방식 대비 절약 토큰 / 캐시된 토큰 / 추정 절약 지연을 출력한다.
+# ─────────────────────────────────────────────────────────────────
+PROMPT_CACHE_KEY = os.getenv("PROMPT_CACHE_KEY", "")  # 지정하면 prompt_cache_key="<값>-<단계>"를 함께 보냄 (OpenAI 전용 파라미터)
+PROMPT_METER = PromptMeter(log=os.getenv("PROMPT_LOG", "1") != "0")
+PROMPTS = None
+if os.getenv("PROMPT_BUILDER", "1") != "0":
+    PROMPTS = PromptBuilder(CONTEXT_DEFINITIONS, EXAMPLE_QUERIES, model=OPENAI_MODEL,
+                            budget_tokens=int(os.getenv("PROMPT_TOKEN_BUDGET", "6000")),
+                            example_k=int(os.getenv("PROMPT_EXAMPLES", "3")),
+                            preview_rows=int(os.getenv("PROMPT_PREVIEW_ROWS", "60")),
+                            preview_tokens=int(os.getenv("PROMPT_PREVIEW_TOKENS", "1500")),
+                            meter=PROMPT_METER, library=QUERY_LIBRARY)
+
 # ─────────────────────────────────────────────────────────────────
 # LLM 단계 1: SQL 생성
 # ─────────────────────────────────────────────────────────────────
 # system 프롬프트에 CONTEXT_DEFINITIONS 포함
-def llm_generate_sql(user_text: str, selected_ids: List[int]) -> str:
+SQL_RULES = (
+    "--- [쿼리 생성 규칙] ---\n"
+    "* 주석/설명/자연어/백틱 없이 오직 SQL 문장 하나만 출력한다.\n"
+    "* 쿼리 끝에는 항상 세미콜론(;)을 붙인다.\n"
+    "* 가능하면 `data.meta_data`(요약 정보), `public.project6`(프로젝트 정보) 테이블을 우선 사용한다.\n"
+    "* `data.raw_data`(원본 데이터)는 필요한 경우에만 사용한다 (예: 특정 시간 조회).\n"
+    "* **선택된 프로젝트 ID(`ids`)가 있다면, `WHERE project_id IN (...)` 조건을 반드시 포함해야 한다.**\n"
+    "* 사용자가 '공정'이라고 하면 '프로젝트'로 해석하여 쿼리를 생성한다.\n"
+    "* '공정 시작 시각', '공정 준비 시작 시각' 등의 용어를 이해하고 정의에 맞는 쿼리를 생성한다."
+)
+
+def _ids_rule(selected_ids: List[int]) -> str:
     ids_csv = ",".join(str(int(i)) for i in sorted(set(selected_ids))) or "/*none*/"
-    system = (
-        "너는 PostgreSQL 데이터 분석 SQL 생성기다. 다음 정보를 바탕으로 사용자의 질문에 가장 적합한 SQL 쿼리 **하나만** 생성한다.\n"
-        f"{CONTEXT_DEFINITIONS}\n" # 스키마 및 용어 정의 포함
-        "--- [쿼리 생성 규칙] ---\n"
-        "* 주석/설명/자연어/백틱 없이 오직 SQL 문장 하나만 출력한다.\n"
-        "* 쿼리 끝에는 항상 세미콜론(;)을 붙인다.\n"
-        "* 가능하면 `data.meta_data`(요약 정보), `public.project6`(프로젝트 정보) 테이블을 우선 사용한다.\n"
-        "* `data.raw_data`(원본 데이터)는 필요한 경우에만 사용한다 (예: 특정 시간 조회).\n"
-        "* **선택된 프로젝트 ID(`ids`)가 있다면, `WHERE project_id IN (...)` 조건을 반드시 포함해야 한다.**\n"
-        "* 사용자가 '공정'이라고 하면 '프로젝트'로 해석하여 쿼리를 생성한다.\n"
-        "* '공정 시작 시각', '공정 준비 시작 시각' 등의 용어를 이해하고 정의에 맞는 쿼리를 생성한다."
-    )
-    ids_rule = f"[선택된 프로젝트] ids = ({ids_csv})"
-    prompt = f"""{EXAMPLE_QUERIES}
+    return f"[선택된 프로젝트] ids = ({ids_csv})"
 
-{ids_rule}
+def _sql_user_prompt(user_text: str, selected_ids: List[int], history: str = "", feedback: str = "") -> str:
+    if history: history = f"\n{history}\n"
+    if feedback: feedback = f"\n{feedback}\n"
+    return f"""{example_queries(user_text)}
+{history}{feedback}
+{_ids_rule(selected_ids)}
 
 [사용자 질문]
 {user_text}
 
 [생성할 SQL]
 """
+
+def _sql_messages(stage: str, head: str, rules: str, user_text: str, selected_ids: List[int], feedback: str = ""):
+    """SQL 생성/라우터/자가 수정 메시지와 계측 정보. PROMPTS가 없으면 기존 전체 프롬프트 (stats=None). feedback: 실패한 SQL + 오류"""
+    history = sql_history(user_text, selected_ids)  # 같은 프로젝트 세션의 관련 이전 질문 → SQL
+    def legacy() -> List[dict]:
+        system = f"{head}\n{CONTEXT_DEFINITIONS}\n{rollup_context()}{time_context()}{rules}"
+        return [ {"role": "system", "content": system}, {"role": "user", "content": _sql_user_prompt(user_text, selected_ids, history, feedback)} ]
+    if PROMPTS is None: return legacy(), None
+    return PROMPTS.sql_messages(stage, head, rules, user_text, _ids_rule(selected_ids),
+                                table_context={"data.raw_data": rollup_context() + time_context()}, legacy=legacy, history=history, feedback=feedback)
+
+SQL_HEAD = "너는 PostgreSQL 데이터 분석 SQL 생성기다. 다음 정보를 바탕으로 사용자의 질문에 가장 적합한 SQL 쿼리 **하나만** 생성한다."
+
+def llm_generate_sql(user_text: str, selected_ids: List[int]) -> str:
+    messages, stats = _sql_messages("sql", SQL_HEAD, SQL_RULES, user_text, selected_ids)  # 스키마 및 용어 정의 포함
     try:                ## 1. try: SQL 생성 및 API 호출
-        resp = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            temperature=0.1, # 정확성 위해 온도 낮춤 -> LLM(AI)에서 temperature 매개변수는 답변의 창의성(무작위성)을 조절하는 스위치이다. 낮을수록 더 결정적이고 일관된 답변을 생성한다.
-            messages=[ {"role": "system", "content": system}, {"role": "user", "content": prompt} ],   # messages는 역할극 대본 같은 것이라고 생각하면 됨. -> AI가 어떤 역할을 맡고 어떤 맥락에서 답변해야 하는지 알려줌.
-        ) # resp는 LLM의 응답 전체를 담고 있는 객체. 이때, 이때 두 가지 핵심 설정을 전달합니다. 첫째, temperature=0.1로 설정하여 답변의 정확성을 높이고, 둘째, messages 배열을 통해 시스템과 사용자 역할을 명확히 구분하여 LLM이 SQL 생성에 집중하도록 유도합니다.
-        raw = resp.choices[0].message.content or ""  ## 2. 후처리 (SQL 정제 및 보정)
+        # temperature=0.1: 정확성 위해 온도 낮춤 -> LLM(AI)에서 temperature 매개변수는 답변의 창의성(무작위성)을 조절하는 스위치이다. 낮을수록 더 결정적이고 일관된 답변을 생성한다.
+        # messages는 역할극 대본 같은 것이라고 생각하면 됨. -> AI가 어떤 역할을 맡고 어떤 맥락에서 답변해야 하는지 알려줌.
+        raw = llm_complete(messages, temperature=0.1, stats=stats)  ## 2. 후처리 (SQL 정제 및 보정)
         sql = sanitize_sql(raw)  # 1단계 정제, AI가 텍스트 앞뒤에 붙인 불필요한 마크다운이나 설명을 제거함.
         sql = enforce_project_filter(sql, selected_ids) # 2단계 보정, 사용자가 선택한 프로젝트 ID 필터를 SQL에 강제로 주입함.
         return sql # 모든 정제와 보정이 끝난, 실행 가능한 최종 SQL 문장을 반환합니다.
@@ -194,11 +323,37 @@ def llm_generate_sql(user_text: str, selected_ids: List[int]) -> str:
         print(f"🔥 LLM SQL 생성 오류: {e}") # 오류 내용을 터미널에 기록합니다.
         return "-- LLM 오류 --" # 앱(GUI)에는 실제 오류 대신 "--LLM 오류 --"라는 간단한 메시지를 반환하여 사용자에게 알립니다. 그래서 사용자가 오류 상황을 인지할 수 있게 합니다.
 
+# ─────────────────────────────────────────────────────────────────
+# LLM 단계 1.5: SQL 자가 수정 (SQL_REPAIR_RETRIES=0이면 끔)
+# 실행(또는 비용 가드의 EXPLAIN)이 SQL 오류(없는 컬럼, time 문자열 비교 형식 등)로 실패하면 실패한 SQL + 오류 메시지 +
+# 관련 스키마 조각을 생성기에 돌려주어 고친 SQL을 받는다. 고친 SQL은 실행 전에 EXPLAIN(로컬 모드는 LIMIT 0)으로 먼저 확인하고,
+# 최대 SQL_REPAIR_RETRIES번까지 반복한다. 연결 끊김 / 시간 초과 / 취소는 고치지 않는다 (db/connector.sql_error).
+# ─────────────────────────────────────────────────────────────────
+SQL_REPAIR_RETRIES = int(os.getenv("SQL_REPAIR_RETRIES", "2"))
+REPAIR_RULES = SQL_RULES + (
+    "\n* [실패한 SQL]은 [오류] 때문에 실행되지 않았다. 오류 메시지와 스키마를 보고 원인을 고친 SQL 하나만 출력한다.\n"
+    "* 스키마에 없는 컬럼/테이블은 쓰지 않는다. 같은 SQL을 그대로 다시 출력하지 않는다."
+)
+
+def llm_repair_sql(user_text: str, selected_ids: List[int], failed_sql: str, error: str) -> Optional[str]:
+    """실패한 SQL과 오류를 보고 고친 SQL을 만든다. 생성 실패 / 같은 SQL / 읽기 전용이 아니면 None."""
+    feedback = f"[실패한 SQL]\n{failed_sql}\n\n[오류]\n{error}"
+    messages, stats = _sql_messages("repair", SQL_HEAD, REPAIR_RULES, user_text, selected_ids, feedback=feedback)
+    try:
+        sql = enforce_project_filter(sanitize_sql(llm_complete(messages, temperature=0.0, stats=stats)), selected_ids)
+    except Exception as e:
+        print(f"🔥 LLM SQL 수정 오류: {e}")
+        return None
+    if not SQL_START.match(sql) or sql_rewrite.normalize_sql(sql) == sql_rewrite.normalize_sql(failed_sql): return None
+    if not sql_rewrite.check_read_only(sql)[0]: return None
+    return sql
+
 # ─────────────────────────────────────────────────────────────────
 # LLM 단계 2: 자연어 답변 생성 (데이터 분석용)
 # ─────────────────────────────────────────────────────────────────
 # 100행 이하면 df.to_html()을 반환 (변경 없음)
-def df_preview_text(df: pd.DataFrame, max_rows: int = 100) -> str:
+def df_preview_text(df: Union[pd.DataFrame, ResultDigest], max_rows: int = 100) -> str:
+    if isinstance(df, ResultDigest): return df.preview_text(max_rows)  # 스트리밍 결과: 상·하위 일부 + 전체 요약 통계
     if df is None or df.empty: return "(결과 없음)"
     if len(df) > max_rows:
         return (f"--- (총 {len(df)}개 행 중 상위 25개) ---\n"
@@ -207,8 +362,23 @@ def df_preview_text(df: pd.DataFrame, max_rows: int = 100) -> str:
                 f"{df.tail(25).to_string(index=False)}")
     return df.to_html(index=False, border=1)
 
-# system 프롬프트에 CONTEXT_DEFINITIONS 포함 및 dwell time 주의사항 수정
-def llm_answer(user_text: str, sql: str, df: pd.DataFrame) -> str:
+# 압축 미리보기(PROMPTS)용 규칙: 표는 앱이 직접 붙이므로 LLM은 해석만 쓴다 (표를 다시 출력하느라 쓰던 출력 토큰도 줄어든다)
+ANSWER_HEAD = "너는 친절하고 전문적인 DED 공정 데이터 분석가다. 다음 정보를 바탕으로 답변한다."
+ANSWER_RULES = (
+    "--- [답변 생성 규칙] ---\n"
+    "* 아래 [결과 미리보기](CSV + 숫자 컬럼 요약)를 **[주요 용어 정의]에 따라 정확하게 해석**하여, 사용자의 [사용자 질문]에 대해 자연스러운 한국어 문장으로 답변한다.\n"
+    "* 사용자가 '공정'이라고 하면 '프로젝트'로 해석한다.\n"
+    "* '공정 시작 시각', '공정 준비 시작 시각' 같은 용어를 이해하고 답변에 활용한다.\n"
+    "* 딱딱한 보고서 형식([요약])은 사용하지 않는다.\n"
+    "* **[중요] `dwell_time_seconds` 값은 '공정 시작 시각' 이후의 레이저 OFF 시간만을 의미하도록 DB에서 재계산되었음을 인지하고 해석한다.** (즉, 첫 레이어 값이 비정상적으로 높지 않아야 정상이다).\n"
+    "* 결과 표는 앱이 답변 앞에 따로 표시하므로 표/CSV를 다시 쓰지 않는다. 미리보기에 '표 표시 안 함'이라고 되어 있으면 '데이터가 너무 많아 모두 표시하기 어렵습니다.'라고 말하고, 상·하위 행과 요약 통계로 핵심 추세나 주요 값을 설명한다.\n"
+    "* `<strong>[데이터 해석]</strong>` 또는 `<strong>[의미]</strong>` 섹션을 만들어 수치의 의미를 분석한다.\n"
+    "* 문단 구분 시에는 `<br><br>` 태그를 사용한다.\n"
+    "* SQL 쿼리 내용은 답변에 포함하지 않는다."
+)
+ANSWER_TABLE_ROWS = 100  # 이 행 수 이하(전체 보관된 결과)면 앱이 HTML 표를 답변 앞에 붙인다
+
+def _legacy_answer_messages(user_text: str, df: Union[pd.DataFrame, ResultDigest]) -> List[dict]:
     df_snip = df_preview_text(df)
     system = (
         "너는 친절하고 전문적인 DED 공정 데이터 분석가다. 다음 정보를 바탕으로 답변한다.\n"
@@ -233,38 +403,284 @@ def llm_answer(user_text: str, sql: str, df: pd.DataFrame) -> str:
 
 [답변]
 """
+    return [ {"role": "system", "content": system}, {"role": "user", "content": prompt} ]
+
+# system 프롬프트에 CONTEXT_DEFINITIONS 포함 및 dwell time 주의사항 수정
+def llm_answer(user_text: str, sql: str, df: Union[pd.DataFrame, ResultDigest], on_delta: Optional[Callable[[str], None]] = None) -> str:
+    table, stats = "", None
+    if PROMPTS is None: messages = _legacy_answer_messages(user_text, df)
+    else:
+        rows = df.rows if isinstance(df, ResultDigest) else (0 if df is None else len(df))
+        complete = df.complete if isinstance(df, ResultDigest) else df is not None
+        if 0 < rows <= ANSWER_TABLE_ROWS and complete:
+            frame = df.frame() if isinstance(df, ResultDigest) else df
+            table = table_html(frame)
+            note = f"(결과 {rows}행 전체를 앱이 표로 표시함)"
+        else: note = f"(결과 {rows}행: 표 표시 안 함)" if rows else ""
+        messages, stats = PROMPTS.answer_messages(f"{ANSWER_HEAD}\n{ANSWER_RULES}", user_text, df, note=note,
+                                                  legacy=lambda: _legacy_answer_messages(user_text, df))
+        if table and on_delta is not None:
+            emit = on_delta
+            on_delta = lambda partial: emit(table + partial)  # 스트리밍 중에도 표를 먼저 보여준다
     try:
-        resp = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            temperature=0.4,
-            messages=[ {"role": "system", "content": system}, {"role": "user", "content": prompt} ],
-        )
-        return (resp.choices[0].message.content or "").strip()
+        return table + llm_complete(messages, temperature=0.4, on_delta=on_delta, stats=stats).strip()  # on_delta: 스트리밍 중간 결과 콜백
     except Exception as e:
         print(f"🔥 LLM 답변 생성 오류: {e}")
-        return "답변 생성 중 오류가 발생했습니다."
+        return table + "답변 생성 중 오류가 발생했습니다."
 
 # ─────────────────────────────────────────────────────────────────
 # LLM 단계 0: 의도 분류 (SCHEMA_INFO 포함)
 # ─────────────────────────────────────────────────────────────────
+INTENT_RULES = (
+    "1. DED 공정 데이터(레이어, MPT, dwell time, 프로젝트 정보, 공정 시작 시각 등) 값에 대한 **분석/요청/질문**이면 'SQL'을 반환한다.\n" # 용어 추가
+    "2. 데이터베이스 테이블의 **컬럼(column) 이름, 스키마(schema) 구조, 필드 정보**에 대한 질문이면 'SCHEMA_INFO'를 반환한다.\n"
+    "3. 단순 인사, 안부, 잡담, 봇의 기능에 대한 질문 등 위 1, 2에 해당하지 않으면 'CHAT'을 반환한다.\n"
+)
+
 def llm_classify_intent(user_text: str) -> str:
     """사용자 의도를 'SQL', 'CHAT', 또는 'SCHEMA_INFO'로 분류합니다."""
     system = (
         "너는 사용자 의도 분류기다. 다음 규칙에 따라 사용자 질문의 의도를 분류한다:\n"
-        "1. DED 공정 데이터(레이어, MPT, dwell time, 프로젝트 정보, 공정 시작 시각 등) 값에 대한 **분석/요청/질문**이면 'SQL'을 반환한다.\n" # 용어 추가
-        "2. 데이터베이스 테이블의 **컬럼(column) 이름, 스키마(schema) 구조, 필드 정보**에 대한 질문이면 'SCHEMA_INFO'를 반환한다.\n"
-        "3. 단순 인사, 안부, 잡담, 봇의 기능에 대한 질문 등 위 1, 2에 해당하지 않으면 'CHAT'을 반환한다.\n"
+        f"{INTENT_RULES}"
         "오직 'SQL', 'CHAT', 'SCHEMA_INFO' 중 하나만 응답한다."
     )
     prompt = f"사용자 질문: {user_text}"
+    messages = [ {"role": "system", "content": system}, {"role": "user", "content": prompt} ]
     try:
-        resp = client.chat.completions.create( model=OPENAI_MODEL, temperature=0.0, messages=[ {"role": "system", "content": system}, {"role": "user", "content": prompt} ], )
         # temperature=0.0: AI의 창의성을 0으로 설정하여, 제시된 보기 중에서 가장 확률이 높은 정답 하나만을 무조건 선택하도록 강제하는, 분류 작업에 필수적인 설정임.
-        intent = (resp.choices[0].message.content or "").strip().upper()
+        intent = llm_complete(messages, temperature=0.0, stats=PROMPTS.measure("classify", messages) if PROMPTS else None).strip().upper()
         if intent in ["SQL", "SCHEMA_INFO"]: return intent
         return "CHAT"
     except Exception: return "CHAT"
 
+# ─────────────────────────────────────────────────────────────────
+# LLM 단계 0.5: 로컬 빠른 분류 + 단일 호출 라우터 (의도 분류 + SQL 생성)
+"""
+기존 흐름은 데이터 질문마다 llm_classify_intent → llm_generate_sql 두 번의 LLM 왕복을 거친다.
+    - fast_classify_intent: CONTEXT_DEFINITIONS의 도메인 어휘 + 키워드 규칙으로 명확한 질문은 LLM 없이 분류한다. 애매하면 None.
+    - llm_route: 하나의 JSON 응답으로 {"intent", "sql"}을 받아 의도 분류와 SQL 생성을 한 번에 끝낸다.
+설정: LLM_ROUTER_MODE=combined(기본, 단일 호출) | legacy(분류 → 생성 2회 호출), FAST_INTENT=1(기본) | 0
+"""
+# ─────────────────────────────────────────────────────────────────
+LLM_ROUTER_MODE = os.getenv("LLM_ROUTER_MODE", "combined").lower()
+FAST_INTENT     = os.getenv("FAST_INTENT", "1") != "0"
+
+_VOCAB_STOPWORDS = {"select", "from", "where", "and", "min", "max", "data", "public", "time", "load", "contact", "active"}
+def _domain_vocabulary() -> List[str]:
+    """CONTEXT_DEFINITIONS의 `...` 안에 있는 식별자(컬럼/테이블명)를 도메인 어휘로 추출한다. (예: mpt_..., dwell_... → mpt, dwell)"""
+    words = set()
+    for chunk in re.findall(r"`([^`]+)`", CONTEXT_DEFINITIONS):
+        for w in re.findall(r"[a-z][a-z0-9_]{2,}", chunk.lower()):
+            w = w.strip("_")
+            if len(w) >= 3 and w not in _VOCAB_STOPWORDS: words.add(w)
+    return sorted(words, key=len, reverse=True)
+
+_DOMAIN_RE   = re.compile(r"(?<![a-z0-9])(?:" + "|".join(map(re.escape, _domain_vocabulary())) + r")"
+                          r"|공정|프로젝트|레이어|층|온도|용융풀|레이저|비드|샘플|좌표|드웰", re.I)
+_ANALYSIS_RE = re.compile(r"평균|최대|최소|최댓값|최솟값|중앙값|통계|합계|총합|개수|몇|상위|하위|비율|추이|비교|분포|조회|"
+                          r"보여|알려|구해|계산|언제|얼마|목록|리스트|이름|시각|그래프|시각화|top|avg|count|list", re.I)
+_AGGREGATE_RE = re.compile(r"평균|최대|최소|최댓값|최솟값|중앙값|통계|합계|개수|상위|하위|추이|분포|avg|count|top", re.I)
+_SCHEMA_RE   = re.compile(r"컬럼|칼럼|column|스키마|schema|필드|field|테이블 구조|열 이름|어떤 항목", re.I)
+_CHAT_RE     = re.compile(r"^\W*(안녕|하이|헬로|hello|hi|hey|고마워|감사|ㅎㅇ|반가워|잘 ?있어|수고|너는 누구|넌 누구|뭐 할 수 있|도움말|help)", re.I)
+_GRAPH_ONLY_RE = re.compile(r"^\W*(그래프|차트|chart|plot|시각화)?\s*(로|으로)?\s*(그려|보여|시각화)", re.I)
+
+def fast_classify_intent(user_text: str) -> Optional[str]:
+    """명확한 입력만 로컬에서 'SQL' / 'SCHEMA_INFO' / 'CHAT'으로 분류한다. 판단이 애매하면 None (LLM에 맡김)."""
+    text_ = user_text.strip()
+    if not text_: return "CHAT"
+    domain = bool(_DOMAIN_RE.search(text_))
+    if _SCHEMA_RE.search(text_):
+        return "SCHEMA_INFO" if not _AGGREGATE_RE.search(text_) else None
+    if domain:
+        return "SQL" if _ANALYSIS_RE.search(text_) else None
+    if len(text_) <= 30 and (_CHAT_RE.search(text_) or _GRAPH_ONLY_RE.search(text_)):
+        return "CHAT"
+    return None
+
+ROUTER_HEAD = (
+    "너는 DED 공정 데이터 챗봇의 의도 분류 + SQL 생성 라우터다. 사용자 질문의 의도를 분류하고, 의도가 SQL이면 PostgreSQL 쿼리 하나를 함께 생성한다.\n"
+    "--- [의도 분류 규칙] ---\n"
+    f"{INTENT_RULES.rstrip()}"
+)
+ROUTER_RULES = (
+    f"{SQL_RULES}\n"
+    "--- [출력 형식] (위 규칙의 'SQL 문장만 출력'보다 우선한다) ---\n"
+    '* 반드시 JSON 객체 하나만 출력한다: {"intent": "SQL" | "SCHEMA_INFO" | "CHAT", "sql": "<SQL 문장>" 또는 null}\n'
+    "* intent가 SQL이 아니면 sql은 null이다."
+)
+
+def llm_route(user_text: str, selected_ids: List[int]) -> dict:
+    """
+    의도 분류(+ 가능하면 SQL 생성)를 수행하고 {"intent", "sql", "source"}를 반환한다.
+      - source="fast": 로컬 분류 (sql=None → SQL이면 llm_generate_sql 필요)
+      - source="router": 단일 LLM 호출로 의도와 SQL을 함께 받음
+      - source="legacy": llm_classify_intent만 수행 (sql=None)
+    """
+    if FAST_INTENT:
+        intent = fast_classify_intent(user_text)
+        if intent is not None: return {"intent": intent, "sql": None, "source": "fast"}
+    if LLM_ROUTER_MODE != "combined":
+        return {"intent": llm_classify_intent(user_text), "sql": None, "source": "legacy"}
+
+    messages, stats = _sql_messages("router", ROUTER_HEAD, ROUTER_RULES, user_text, selected_ids)
+    try:
+        content = llm_complete(messages, temperature=0.0, stats=stats, response_format={"type": "json_object"})
+        data = json.loads(content or "{}")
+        intent = str(data.get("intent") or "").strip().upper()
+        if intent not in ("SQL", "SCHEMA_INFO", "CHAT"): raise ValueError(f"알 수 없는 intent: {intent!r}")
+        sql = None
+        if intent == "SQL" and data.get("sql"):
+            sql = enforce_project_filter(sanitize_sql(str(data["sql"])), selected_ids)
+        return {"intent": intent, "sql": sql, "source": "router"}
+    except Exception as e:
+        print(f"🔥 LLM 라우터 오류 (기존 분류로 대체): {e}")
+        return {"intent": llm_classify_intent(user_text), "sql": None, "source": "legacy"}
+
+# ─────────────────────────────────────────────────────────────────
+# 쿼리 실행 방식: 대량 raw_data 조회는 서버 측 커서로 청크 스트리밍 (QUERY_STREAM=auto | always | never)
+# LARGE_FETCH=copy이면 스트리밍 대신 COPY → Arrow 일괄 조회(db/copy_fetch.py)로 전체 결과를 빠르게 가져온다.
+# ─────────────────────────────────────────────────────────────────
+QUERY_STREAM = os.getenv("QUERY_STREAM", "auto").lower()
+LARGE_FETCH  = os.getenv("LARGE_FETCH", "stream").lower()
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "50000"))
+_AGGREGATE_SQL_RE = re.compile(r"\b(GROUP\s+BY|COUNT|SUM|AVG|MIN|MAX|PERCENTILE_CONT|PERCENTILE_DISC|STDDEV|VARIANCE)\b", re.I)
+_SMALL_LIMIT_RE = re.compile(r"\bLIMIT\s+(\d+)", re.I)
+
+def should_stream(sql: str) -> bool:
+    """auto: raw_data를 집계 없이 읽는 쿼리(작은 LIMIT 제외)만 스트리밍한다."""
+    if QUERY_STREAM == "always": return True
+    if QUERY_STREAM == "never": return False
+    if not re.search(r"\braw_data\b", sql, re.I) or _AGGREGATE_SQL_RE.search(sql): return False
+    m = _SMALL_LIMIT_RE.search(sql)
+    return not (m and int(m.group(1)) <= 10_000)
+
+# 병렬 분할 실행 (FANOUT=1이면 켬): 부분 쿼리는 각각 run_query로 실행되므로 결과 캐시도 프로젝트 단위로 재사용된다.
+FANOUT = None
+if os.getenv("FANOUT", "0") == "1" and not LOCAL_MODE:
+    register_prepared("layer_bounds", "SELECT min(layer) AS lo, max(layer) AS hi FROM data.raw_data WHERE project_id = $1", argtypes=("int",))
+    FANOUT = FanOut(
+        runner=run_query,
+        layer_bounds=lambda pid: tuple(run_prepared("layer_bounds", pid).iloc[0]),
+        max_workers=int(os.getenv("FANOUT_WORKERS", "4")),
+        min_parts=int(os.getenv("FANOUT_MIN_PARTS", "2")),
+        layer_parts=int(os.getenv("FANOUT_LAYER_PARTS", "4")),
+    )
+
+# 결과 표: GUI 요청의 스트리밍 결과는 Arrow IPC 파일로 흘려 써서 전체를 표에서 스크롤/정렬/내보내기 (RESULT_SPILL=0이면 표본만)
+RESULT_SPILL     = os.getenv("RESULT_SPILL", "1") != "0"
+RESULT_SPILL_DIR = os.getenv("RESULT_SPILL_DIR") or None  # 기본: 시스템 임시 폴더
+_SPILL_FILES: List[str] = []  # 표가 닫지 못한 파일(취소된 요청 등)은 종료 시 지운다
+
+def _spill_path() -> str:
+    fd, path = tempfile.mkstemp(prefix="ded_result_", suffix=".arrow", dir=RESULT_SPILL_DIR)
+    os.close(fd)
+    _SPILL_FILES.append(path)
+    return path
+
+@atexit.register
+def _remove_spill_files():
+    for path in _SPILL_FILES:
+        try: os.remove(path)
+        except OSError: pass
+
+def _run_part(sql: str, cancel_token, timeout_ms: Optional[int]) -> pd.DataFrame:
+    if cancel_token is not None: cancel_token.raise_if_cancelled()  # 취소 후에는 대기 중인 부분을 시작하지 않는다
+    return run_query(sql, cancel_token=cancel_token, timeout_ms=timeout_ms)
+
+def execute_sql(sql: str, cancel_token=None, stream: Optional[bool] = None, timeout_ms: Optional[int] = None,
+                spill: bool = False) -> Union[pd.DataFrame, ResultDigest]:
+    """
+    스트리밍 대상이면(stream이 None이면 should_stream으로 판단) 청크를 ResultDigest로 요약(또는 LARGE_FETCH=copy면 Arrow 일괄 조회)해 반환하고,
+    아니면 run_query의 DataFrame을 그대로 반환한다. timeout_ms는 이 쿼리의 statement_timeout.
+    spill: 스트리밍 청크 전체를 Arrow IPC 파일(digest.spill_path)로도 흘려 쓴다 (결과 표용, RESULT_SPILL=0이면 무시).
+    """
+    if stream is None: stream = should_stream(sql)
+    if not stream:
+        if FANOUT:  # 프로젝트(또는 레이어 구간)별로 나눠 동시에 실행할 수 있으면 병합 결과를 반환
+            df = FANOUT.run(sql, lambda part: _run_part(part, cancel_token, timeout_ms))
+            if df is not None: return df
+        return run_query(sql, cancel_token=cancel_token, timeout_ms=timeout_ms)
+    if LARGE_FETCH == "copy" and not LOCAL_MODE:
+        from db.copy_fetch import run_query_arrow  # pyarrow 필요 — 사용할 때만 import
+        return run_query_arrow(sql, cancel_token=cancel_token, timeout_ms=timeout_ms)
+    digest = ResultDigest(spill_path=_spill_path() if spill and RESULT_SPILL else None)
+    try:
+        for chunk in run_query_stream(sql, chunk_rows=STREAM_CHUNK_ROWS, cancel_token=cancel_token, timeout_ms=timeout_ms):
+            digest.add(chunk)
+    except BaseException:
+        digest.discard_spill()
+        raise
+    return digest.finish()
+
+# ─────────────────────────────────────────────────────────────────
+# 실행 전 비용 가드: EXPLAIN 예상 행 수/비용에 따라 그대로 실행 / 스트리밍 / LIMIT 주입 / 사용자 확인 (COST_GUARD=0이면 끔)
+# 모든 LLM 생성 SQL에는 statement_timeout(ms)을 건다.
+# ─────────────────────────────────────────────────────────────────
+COST_GUARD = None
+if os.getenv("COST_GUARD", "1") != "0":
+    COST_GUARD = CostGuard(
+        explain_plan,
+        stream_rows=int(os.getenv("GUARD_STREAM_ROWS", "100000")),
+        max_rows=int(os.getenv("GUARD_MAX_ROWS", "2000000")),
+        confirm_cost=float(os.getenv("GUARD_CONFIRM_COST", "1000000")),
+        timeout_ms=int(os.getenv("GUARD_TIMEOUT_MS", "60000")),
+        confirmed_timeout_ms=int(os.getenv("GUARD_CONFIRMED_TIMEOUT_MS", "300000")),
+    )
+
+# ─────────────────────────────────────────────────────────────────
+# NL→SQL 캐시: 정규화된 질문 + 선택 프로젝트 → 실행에 성공한 SQL (SQL_CACHE=0이면 끔)
+# 프롬프트(CONTEXT_DEFINITIONS, EXAMPLE_QUERIES, SQL_RULES)가 바뀌면 지문이 달라져 캐시가 자동으로 비워진다.
+# ─────────────────────────────────────────────────────────────────
+SQL_CACHE = None
+if os.getenv("SQL_CACHE", "1") != "0":
+    try:
+        SQL_CACHE = SqlCache(
+            os.getenv("SQL_CACHE_PATH", "sql_cache.sqlite3"),
+            fingerprint=prompt_fingerprint(CONTEXT_DEFINITIONS, ROLLUP_CONTEXT, TIME_CONTEXT, EXAMPLE_QUERIES, SQL_RULES, OPENAI_MODEL,
+                                            f"prompts:{PROMPTS.example_k}" if PROMPTS else ""),
+            max_entries=int(os.getenv("SQL_CACHE_MAX", "2000")),
+            ttl_seconds=float(os.getenv("SQL_CACHE_TTL_HOURS", "168")) * 3600,
+            fuzzy_threshold=float(os.getenv("SQL_CACHE_FUZZY", "0.9")),
+        )
+    except Exception as e:
+        print(f"⚠️ SQL 캐시 비활성화: {e}")
+
+# ─────────────────────────────────────────────────────────────────
+# 그래프: 컬럼 역할로 차트 종류를 고르고(gui/charts.py), 큰 시리즈는 LTTB/min-max로 줄이거나 DB에서 집계해 WebGL로 렌더링
+# plotly.js는 로컬 번들(plotly 패키지 내장본 또는 PLOTLY_JS)을 영속 페이지에 한 번만 읽고 이후 Plotly.react로 갱신
+# ─────────────────────────────────────────────────────────────────
+PLOT_MAX_POINTS = int(os.getenv("PLOT_MAX_POINTS", "4000"))
+PLOT_GL_THRESHOLD = int(os.getenv("PLOT_GL_THRESHOLD", "5000"))
+PLOT_DOWNSAMPLE = os.getenv("PLOT_DOWNSAMPLE", "lttb").lower()  # lttb | minmax
+CHART_SERVER_AGG_ROWS = int(os.getenv("CHART_SERVER_AGG_ROWS", "50000"))  # 결과가 이보다 크면(또는 스트리밍 표본뿐이면) DB에서 집계해 그림
+
+# ─────────────────────────────────────────────────────────────────
+# 반복 조회 템플릿: 프로젝트 목록 / 선택 프로젝트 요약은 연결마다 한 번 PREPARE하고 EXECUTE로 재사용
+# ─────────────────────────────────────────────────────────────────
+register_prepared("project_list", "SELECT project_id, project_name FROM public.project6 ORDER BY project_id")
+register_prepared("project_summary", """
+SELECT m.project_id, p.project_name, COUNT(m.*) AS "rows(meta)", COUNT(DISTINCT m.layer_number) AS layers, SUM(m.dwell_time_seconds) AS total_dwell, AVG(m.mpt_avg) AS avg_mpt, SUM(m.dwell_time_seconds) / NULLIF(SUM(m.duration_seconds), 0) AS dwell_ratio FROM data.meta_data AS m LEFT JOIN public.project6 AS p ON m.project_id = p.project_id WHERE m.project_id = ANY($1) GROUP BY m.project_id, p.project_name ORDER BY m.project_id""", argtypes=("int[]",))
+
+# ─────────────────────────────────────────────────────────────────
+# 미리 읽기 (PREFETCH=0이면 끔, duckdb 필요): 프로젝트 선택이 바뀌면 백그라운드에서 연결 풀 예열,
+# 선택 프로젝트의 meta_data / project6를 메모리 DuckDB에 적재, 예시 쿼리 결과를 미리 계산한다.
+# 적재된 테이블만 읽는 SQL은 PostgreSQL 왕복 없이 로컬에서 실행한다 (PREFETCH_PROBE_SEC마다 테이블 버전 확인).
+# ─────────────────────────────────────────────────────────────────
+def _prefetch_fetch(sql: str):
+    from db.copy_fetch import fetch_arrow  # pyarrow 필요 — 사용할 때만 import
+    return fetch_arrow(sql)
+
+PREFETCH = None
+if os.getenv("PREFETCH", "1") != "0" and DUCKDB_OK and not LOCAL_MODE:
+    PREFETCH = Prefetcher(
+        engine, fetch=_prefetch_fetch, run_query=run_query,
+        templates=re.findall(r"^\s*((?:SELECT|WITH)\b.+?;)\s*$", EXAMPLE_QUERIES, re.M),
+        prepare=lambda sql, ids: enforce_project_filter(sanitize_sql(sql), ids),  # LLM이 만든 SQL과 같은 정제 → 같은 키
+        probe=table_versions, probe_interval=float(os.getenv("PREFETCH_PROBE_SEC", "30")),
+        warm_connections=int(os.getenv("PREFETCH_WARM_CONNECTIONS", "2")),
+        max_rows=int(os.getenv("PREFETCH_MAX_ROWS", "1000000")),
+    )
+
 # ─────────────────────────────────────────────────────────────────
 # LLM 단계 2.6: 스키마 정보 답변 생성 (변경 없음)
 """
@@ -284,16 +700,28 @@ def llm_schema_response(user_text: str) -> str:
     prompt = f"{system}\n{definitions_prompt}\n\n[사용자 질문]\n{user_text}\n\n[답변]"
     if requested_table:
         try:
-            resp = client.chat.completions.create( model=OPENAI_MODEL, temperature=0.2, messages=[ {"role": "system", "content": system}, {"role": "user", "content": prompt} ], )
-            return (resp.choices[0].message.content or "").strip()
+            return llm_complete([ {"role": "system", "content": system}, {"role": "user", "content": prompt} ], temperature=0.2).strip()
         except Exception as e: return f"스키마 정보 조회 중 오류 발생: {str(e)}"
     else: return "어떤 테이블의 컬럼 정보가 필요하신가요? `raw_data` 또는 `meta_data` 중에서 선택해주세요."
 
+# ─────────────────────────────────────────────────────────────────
+# LLM 단계 2 생략: 로컬 답변 렌더러 (nlq/answer_renderer.py)
+# 결과가 값 하나 / 작은 표 / 레이어별 수치 / 대용량 요약이고 질문에 서술(이유, 평가, 비교 설명 등)이 필요 없으면
+# llm_answer 대신 pandas/NumPy로 표 + [데이터 해석](추세, 최소·최대 레이어, 이상치)을 바로 만든다.
+# ANSWER_RENDERER=auto(기본) | local(가능하면 항상) | llm(항상 LLM), ANSWER_LOCAL_KINDS로 로컬 처리할 결과 종류 제한
+# ─────────────────────────────────────────────────────────────────
+ANSWER_RENDERER = None
+if os.getenv("ANSWER_RENDERER", "auto").lower() != "llm":
+    ANSWER_RENDERER = AnswerRenderer(mode=os.getenv("ANSWER_RENDERER", "auto").lower(),
+                                     kinds=os.getenv("ANSWER_LOCAL_KINDS", ",".join(ANSWER_KINDS)).replace(" ", "").split(","),
+                                     labels={**COLUMN_DEFINITIONS["raw_data"], **COLUMN_DEFINITIONS["meta_data"]},
+                                     max_table_rows=ANSWER_TABLE_ROWS)
+
 # ─────────────────────────────────────────────────────────────────
 # LLM 단계 2.5: 일상 대화 답변 생성
 # ─────────────────────────────────────────────────────────────────
 # system 프롬프트에 '공정'='프로젝트' 정의 추가
-def llm_chat_response(user_text: str, context: str) -> str:
+def llm_chat_response(user_text: str, context: str, on_delta: Optional[Callable[[str], None]] = None) -> str:
     """일상 대화 및 안내용 LLM 응답을 생성합니다."""
     system = (
         "너는 LW-DED 공정 데이터 분석을 돕는 친절한 AI 어시턴트다. 사용자와 한국어로 대화한다.\n"
@@ -302,31 +730,197 @@ def llm_chat_response(user_text: str, context: str) -> str:
         "**기억할 점:** 사용자가 '공정'이라고 하면 '프로젝트'를 의미한다.\n" # 용어 정의 추가
         "예시: '안녕하세요! LW-DED 공정 데이터에 대해 궁금한 점이 있으신가요? 편하게 물어보세요.'"
     )
-    prompt = f"--- 최근 대화 ---\n{context}\n\n--- 사용자 질문 ---\n{user_text}\n\n[답변]"
+    prompt = f"--- 최근/관련 대화 ---\n{context}\n\n--- 사용자 질문 ---\n{user_text}\n\n[답변]"
     try:
-        resp = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            temperature=0.7,
-            messages=[ {"role": "system", "content": system}, {"role": "user", "content": prompt} ],
-        )
-        return (resp.choices[0].message.content or "").strip()
+        messages = [ {"role": "system", "content": system}, {"role": "user", "content": prompt} ]
+        return llm_complete(messages, temperature=0.7, on_delta=on_delta, stats=PROMPTS.measure("chat", messages) if PROMPTS else None).strip()
     except Exception as e:
         return f"채팅 응답 중 오류가 발생했습니다: {str(e)}"
 
 # ─────────────────────────────────────────────────────────────────
-# 메모리(간단 JSON) (변경 없음)
+# 요청 처리 단계 (GUI의 _run_request와 배치 실행기 nlq/batch.py가 함께 사용)
+#   plan_request  [LLM]   NL→SQL 캐시 → 의도 분류(+SQL 생성) → 읽기 전용 검사
+#   execute_plan  [DB]    롤업 / time_ts 재작성 → 비용 가드 → 실행 (SQL 오류면 [LLM] 자가 수정 후 다시)
+#   answer_result [LLM]   로컬 렌더러 또는 llm_answer
+# 각 단계는 plan dict에 결과를 더해 돌려준다. 더 진행할 수 없으면 done=True와 answer / sql_preview를 채운다.
+# ─────────────────────────────────────────────────────────────────
+def plan_request(user_text: str, ids: List[int], confirmed_sql: Optional[str] = None,
+                 stage: Optional[Callable[[str], None]] = None) -> dict:
+    """
+    의도와 실행할 SQL을 정한다. {"user_text", "ids", "intent", "source", "sql", "cached", "confirmed"}
+    confirmed_sql: 비용 가드 확인을 거친 SQL (분류/생성을 건너뛰고 바로 실행). stage: 진행 단계 콜백 ("generate")
+    """
+    cached = None
+    with tracer.span("classify") as span:
+        if confirmed_sql is not None: route = {"intent": "SQL", "sql": confirmed_sql, "source": "confirmed"}
+        else:
+            cached = SQL_CACHE.get(user_text, ids) if SQL_CACHE else None  # 캐시 적중 시 LLM 호출 없이 바로 실행
+            if cached: route = {"intent": "SQL", "sql": cached["sql"], "source": f"cache:{cached['kind']}"}
+            else: route = llm_route(user_text, ids)
+        span.set(intent=route["intent"], source=route["source"], sql_cache=cached["kind"] if cached else "miss" if SQL_CACHE else None)
+    plan = {"user_text": user_text, "ids": ids, **route, "cached": cached, "confirmed": confirmed_sql is not None}
+    if route["intent"] != "SQL": return plan
+
+    sql = route["sql"]
+    if sql is None:
+        if stage: stage("generate")
+        with tracer.span("generate"): sql = plan["sql"] = llm_generate_sql(user_text, ids)
+    if not SQL_START.match(sql):
+        tracer.error("SQL 생성 실패", sql)
+        plan.update(done=True, answer="SQL 생성 실패.", sql_preview="(생성 실패)")
+        return plan
+    read_only, reason = sql_rewrite.check_read_only(sql)  # DML/DDL, 여러 문장, 부작용 함수는 실행하지 않음
+    if not read_only:
+        if cached: SQL_CACHE.invalidate(cached["key"])
+        plan.update(done=True, answer="읽기 전용(SELECT) 쿼리만 실행할 수 있습니다.", sql_preview=f"-- SQL (실행 안 함) --\n{sql}\n\n[거부]\n{reason}")
+    return plan
+
+def execute_plan(plan: dict, cancel_token=None, stage: Optional[Callable[[str], None]] = None) -> dict:
+    """
+    plan의 SQL을 실행하고 res(DataFrame 또는 ResultDigest), 실제 실행한 sql, rows, SQL 미리보기 머리말 sql_header를 더한다.
+    SQL 오류로 실패하면 자가 수정(llm_repair_sql)을 거쳐 다시 실행하고, 고친 횟수를 repairs에 담는다. stage: 진행 단계 콜백 ("repair")
+    비용 가드가 확인을 요청하면 confirm, 끝내 실행에 실패하면 error를 채우고 done=True.
+    """
+    with tracer.span("execute") as span:
+        plan = _execute_plan(plan, cancel_token, stage)
+        span.set(rows=plan.get("rows"), guard=plan.get("guard"), rewrite=plan.get("rewrite"), repairs=plan.get("repairs"))
+        if plan.get("error"): tracer.error(f"쿼리 실행 오류: {plan['error']}", plan["sql"])
+    return plan
+
+def _execute_plan(plan: dict, cancel_token=None, stage: Optional[Callable[[str], None]] = None) -> dict:
+    user_text, ids, cached = plan["user_text"], plan["ids"], plan["cached"]
+    sql, repairs = plan["sql"], []  # repairs: [(실패한 SQL, 오류)]
+    while True:
+        try:
+            out = _run_candidate(plan, sql, cancel_token, validate=bool(repairs))  # 고친 SQL은 실행 전에 EXPLAIN / LIMIT 0 확인
+            break
+        except Exception as e:
+            if cancel_token is not None: cancel_token.raise_if_cancelled()
+            error = e
+        message, fixed = sql_error(error), None
+        if message:  # SQL 자체의 오류(SQLSTATE 42/22)만 — 시간 초과·연결 끊김은 캐시/라이브러리 항목을 지우지 않는다
+            if cached and not repairs: SQL_CACHE.invalidate(cached["key"])
+            if QUERY_LIBRARY: QUERY_LIBRARY.forget(sql, ids)
+        if message and len(repairs) < SQL_REPAIR_RETRIES and not plan["confirmed"]:  # 사용자가 확인한 SQL은 다른 SQL로 바꾸지 않는다
+            if stage: stage("repair")
+            with tracer.span("repair", attempt=len(repairs) + 1) as span:
+                fixed = llm_repair_sql(user_text, ids, sql, message)
+                span.set(fixed=fixed is not None)
+        repairs.append((sql, message or str(error)))
+        if fixed is None:
+            history = "".join(f"\n{i}) {s}\n   → {_first_line(m)}" for i, (s, m) in enumerate(repairs[:-1], 1))
+            header = f"-- SQL (자동 수정 {len(repairs) - 1}회 후에도 실패) --" if len(repairs) > 1 else "-- SQL --"
+            plan.update(done=True, sql=sql, error=str(error), repairs=len(repairs) - 1,
+                        answer="쿼리 실행 오류." if len(repairs) == 1 else f"쿼리 실행 오류 (자동 수정 {len(repairs) - 1}회 실패).",
+                        sql_preview=f"{header}\n{sql}\n\n[오류]\n{error}" + (f"\n\n[이전 시도]{history}" if history else ""))
+            return plan
+        sql = fixed
+    if out.get("done"):  # 비용 가드 확인 대기
+        plan.update(out)
+        return plan
+
+    if SQL_CACHE and (not cached or repairs): SQL_CACHE.put(user_text, ids, sql)  # 고친 SQL로 캐시 갱신
+    if QUERY_LIBRARY and out["rows"]: QUERY_LIBRARY.record(user_text, ids, sql, source="repair" if repairs else "llm")
+    sql_header = f"-- SQL (캐시 적중: {cached['kind']}) --" if cached else "-- SQL --"
+    if repairs: sql_header += f"\n-- 자동 수정: 실행 오류 {len(repairs)}회를 고쳐 실행 (처음 오류: {_first_line(repairs[0][1])}) --"
+    plan.update(out, sql_header=sql_header + out["sql_header"], repairs=len(repairs))
+    return plan
+
+def _first_line(text: str) -> str:
+    return text.strip().split("\n", 1)[0]
+
+def _run_candidate(plan: dict, sql: str, cancel_token=None, validate: bool = False) -> dict:
+    """
+    SQL 하나를 미리 읽기(로컬) → 롤업 / time_ts 재작성 → 비용 가드 → 실행 순서로 처리해 plan에 더할 값을 돌려준다.
+    실행이 실패하거나 비용 가드의 EXPLAIN이 SQL 오류로 실패하면 예외 (실행 왕복 없이 바로 수정 단계로).
+    validate: 비용 가드가 없을 때 실행 전에 dry_run(EXPLAIN / LIMIT 0)으로 먼저 확인한다.
+    """
+    ids = plan["ids"]
+    local = PREFETCH.run(sql, ids) if PREFETCH else None  # 미리 읽은 meta_data / project6 또는 미리 계산한 예시 결과
+    if local is not None:
+        return dict(res=local, sql=sql, sql_header="\n-- 미리 읽은 데이터로 로컬 실행 (DuckDB) --", guard=None,
+                    rewrite="local", rows=len(local))
+    rollup_sql = ROLLUPS.rewrite(sql) if ROLLUPS else None  # 롤업으로 답할 수 있으면 raw_data 대신 롤업 조회
+    if rollup_sql: sql = rollup_sql
+    time_sql = sql_rewrite.rewrite_time_column(sql) if not rollup_sql and TIME_TS and TIME_TS.available() else sql
+    time_rewritten = time_sql != sql  # time 문자열 조건 → time_ts 인덱스 조회
+    sql = time_sql
+    with tracer.span("guard"): guard = COST_GUARD.check(sql, confirmed=plan["confirmed"]) if COST_GUARD else None  # EXPLAIN 왕복
+    if guard and guard["error"] is not None and sql_error(guard["error"]): raise guard["error"]
+    if validate and not guard:
+        with tracer.span("validate"): dry_run(sql)
+    if guard and guard["action"] == "confirm":
+        return dict(done=True, sql=sql, answer=f"예상 비용이 커서 실행 전에 확인이 필요합니다. ({guard['reason']})",
+                    sql_preview=f"-- SQL (실행 대기: 확인 필요) --\n{sql}",
+                    confirm={"user_text": plan["user_text"], "ids": ids, "sql": sql, "reason": guard["reason"]})
+    run_sql = guard["sql"] if guard else sql  # limit 결정이면 LIMIT이 주입된 SQL
+    stream = True if guard and guard["action"] in ("stream", "limit") else None
+    res = execute_sql(run_sql, cancel_token=cancel_token, stream=stream, timeout_ms=guard["timeout_ms"] if guard else None,
+                      spill=plan.get("spill", False))  # DataFrame 또는 ResultDigest(대량 스트리밍)
+    sql_header = ""
+    if rollup_sql: sql_header += "\n-- raw_data 집계를 레이어 롤업(data.layer_rollup) 조회로 재작성 --"
+    if time_rewritten: sql_header += "\n-- time 문자열 조건을 time_ts(timestamp 인덱스) 조건으로 재작성 --"
+    if guard and guard["action"] != "run": sql_header += f"\n-- 비용 가드: {guard['reason']} --"
+    return dict(res=res, sql=run_sql, sql_header=sql_header, guard=guard["action"] if guard else None,
+                rewrite="rollup" if rollup_sql else "time_ts" if time_rewritten else None,
+                rows=res.rows if isinstance(res, ResultDigest) else len(res))
+
+def answer_result(plan: dict, on_delta: Optional[Callable[[str], None]] = None) -> dict:
+    """execute_plan 결과로 답변을 만든다. answer와 answer_kind(로컬 렌더러 결과 종류 또는 "llm")를 더한다."""
+    with tracer.span("answer") as span:
+        local = ANSWER_RENDERER.render(plan["user_text"], plan["res"]) if ANSWER_RENDERER else None  # (답변, 결과 종류) 또는 None
+        if local:
+            plan["sql_header"] += f"\n-- 답변: 로컬 렌더러({local[1]}), LLM 호출 생략 --"
+            plan.update(answer=local[0], answer_kind=local[1])
+        else:
+            plan.update(answer=llm_answer(plan["user_text"], plan["sql"], plan["res"], on_delta=on_delta), answer_kind="llm")
+        span.set(kind=plan["answer_kind"])
+    return plan
+
+# ─────────────────────────────────────────────────────────────────
+# 추적 (db/tracing.py): 단계별 span은 항상 기록하고 TRACE_STORE(SQLite)에 누적, TRACE_OTEL=1이면 OpenTelemetry로도 보냄
+# TRACE_PANEL=0이면 창 아래의 단계별 지연 패널을 띄우지 않는다.
+# ─────────────────────────────────────────────────────────────────
+TRACE_PANEL = os.getenv("TRACE_PANEL", "1") != "0"
+
+# ─────────────────────────────────────────────────────────────────
+# 대화 기록 (nlq/conversation.py)
 """
-    이 블록은 llm_chat_response가 최근 대화를 기억할 수 있도록 대화 기록을 로컬 파일(memory.json)에 저장하고 불러오는 기능입니다.
+    llm_chat_response와 SQL 생성이 이전 대화를 참고할 수 있도록 대화 턴(질문 → SQL → 답변)을 SQLite에 추가 전용으로 기록한다.
+    선택한 프로젝트 집합마다 세션이 따로 있고, 최근 CHAT_RECENT_TURNS턴 + 현재 질문과 관련된 이전 턴(FTS5 검색)을 프롬프트에 넣는다.
+    기록은 백그라운드 스레드가 모아서 쓴다 (이전: 메시지마다 memory.json 전체를 다시 쓰고 최근 12개만 유지).
+    CONV_STORE=""이면 파일 없이 메모리에만 보관한다. SQL_HISTORY_TURNS=0이면 SQL 생성 프롬프트에는 넣지 않는다.
 """
 # ─────────────────────────────────────────────────────────────────
-MEM_FILE = "memory.json"; MAX_MEMORY = 12
-def load_memory() -> List[dict]:
-    if not os.path.exists(MEM_FILE): return []
-    try: return json.loads(open(MEM_FILE, "r", encoding="utf-8").read()).get("memory", [])
-    except Exception: return []
-def save_memory(history: List[dict]):
-    history = history[-MAX_MEMORY:]
-    with open(MEM_FILE, "w", encoding="utf-8") as f: json.dump({"memory": history}, f, ensure_ascii=False, indent=2)
+CONVERSATIONS = ConversationStore(os.getenv("CONV_STORE", "conversations.sqlite3") or ":memory:")
+CHAT_RECENT_TURNS = int(os.getenv("CHAT_RECENT_TURNS", "2"))
+CHAT_RELATED_TURNS = int(os.getenv("CHAT_RELATED_TURNS", "3"))
+SQL_HISTORY_TURNS = int(os.getenv("SQL_HISTORY_TURNS", "2"))
+
+def chat_context(user_text: str, ids: List[int]) -> str:
+    return format_turns(CONVERSATIONS.context(ids, user_text, CHAT_RECENT_TURNS, CHAT_RELATED_TURNS), with_sql=False)
+
+def sql_history(user_text: str, ids: List[int]) -> str:
+    """SQL 생성 프롬프트용: 같은 세션에서 실행에 성공한 비슷한 질문과 그 SQL (후속 질문 "그럼 5번 레이어는?" 등에 도움)."""
+    if SQL_HISTORY_TURNS <= 0: return ""
+    turns = CONVERSATIONS.related(ids, user_text, SQL_HISTORY_TURNS, sql_only=True)
+    if not turns: return ""
+    return "[이전 대화의 관련 질문과 SQL (참고)]\n" + "\n".join(f"- {t['user']}\n    {t['sql']}" for t in sorted(turns, key=lambda t: t["id"]))
+
+# ─────────────────────────────────────────────────────────────────
+# 빠른 시작 (gui/startup.py): 창을 먼저 띄우고 무거운 준비는 뒤로 미룬다
+#   - 프로젝트 목록: 마지막으로 받은 목록(PROJECT_CACHE)을 바로 보여 주고, DB 조회는 백그라운드 스레드에서 한 뒤 교체
+#   - openai: 첫 LLM 호출 때 import (STARTUP_PRELOAD=1이면 첫 화면을 그린 뒤 백그라운드에서 미리)
+#   - QtWebEngine / plotly: 첫 그래프 때 (그 전까지 그래프 영역은 안내 문구)
+# 측정: python bench/bench_suite.py --only startup
+# ─────────────────────────────────────────────────────────────────
+PROJECT_CACHE   = os.getenv("PROJECT_CACHE", "projects_cache.json")  # ""이면 캐시 안 함 (매번 "불러오는 중..."부터)
+STARTUP_PRELOAD = os.getenv("STARTUP_PRELOAD", "1") != "0"
+
+def fetch_projects() -> List[tuple]:
+    """[(project_id, project_name), ...] — ProjectListLoader가 백그라운드 스레드에서 부른다."""
+    df = run_prepared("project_list")
+    return [] if df is None else [(int(pid), str(name)) for pid, name in zip(df["project_id"], df["project_name"])]
 
 # ─────────────────────────────────────────────────────────────────
 # 메인 윈도우 (이하 코드 변경 없음 - 원본 구조 유지)
@@ -340,14 +934,15 @@ QMainWindow를 상속받아 메인 윈도우 그 자체를 구성하며, 모든
     2. _build_ui 메서드 - 역할: 앱의 시각적인 레이아웃(뼈대)을 만든다.
     : 좌측 프로젝트 리스트, 중앙 채팅 영역, 우측 그래프 및 SQL 미리보기 영역 등 주요 UI 컴포넌트를 생성하고 배치한다.
  
-    3. _on_send 메서드 - 역할: 이 앱의 '두뇌'입니다. 사용자가 "전송"을 눌렀을 때의 모든 워크플로우를 지휘합니다.
+    3. _on_send / _run_request 메서드 - 역할: 이 앱의 '두뇌'입니다. 사용자가 "전송"을 눌렀을 때의 모든 워크플로우를 지휘합니다.
+       (_on_send는 질문을 RequestEngine 큐에 넣고, _run_request가 워커 스레드에서 아래 흐름을 실행합니다. 결과는 _on_request_finished에서 GUI에 반영됩니다.)
         1. 1차 LLM 호출: 사용자의 질문을 분석하여 'SQL', 'CHAT', 'SCHEMA_INFO' 중 하나로 분류합니다.
         2. _checked_ids(): 현재 선택된 프로젝트 ID를 가져오고/ llm_generate_sql(...): (2차 LLM 호출) 자연어를 SQL로 변환합니다.
            run_query(sql): db.connector를 통해 DB에서 df (데이터)를 가져옵니다.
            llm_answer(...): (3차 LLM 호출) df 데이터를 AI에게 보여주고 "데이터 해석" 답변을 생성하게 합니다.
         3. llm_schema_response(...): (LLM 호출) 스키마 정보를 묻는 질문에 답변합니다.
         4. llm_chat_response(...): (LLM 호출) 일상 대화에 답변합니다.
-        5. self.last_df에 데이터가 있다면 _maybe_plot(self.last_df)를 호출하여 그래프를 그립니다.
+        5. 그래프 요청이면 _build_chart(워커)가 컬럼 역할로 차트를 고르고(대용량이면 DB 집계) _show_chart가 그립니다.
         6. _replace_last_bot_message(answer): "생각 중..." 메시지를 최종 답변으로 교체합니다.
         
     4. _on_project_check_changed (프로젝트 선택 처리) - 역할: 사용자가 프로젝트 체크박스를 변경할 때마다 SQL 미리보기를 업데이트합니다.
@@ -362,7 +957,7 @@ QMainWindow를 상속받아 메인 윈도우 그 자체를 구성하며, 모든
 class App(QMainWindow):
     def __init__(self): #1. 앱이 처음 실행될 때 모든 것을 준비하고 설정하는 생성자.
         super().__init__()
-        self.setWindowTitle("Laser Wire DED Monitoring – LLM SQL Assistant v1.0")
+        self.setWindowTitle("Laser Wire DED Monitoring – LLM SQL Assistant v1.0" + (f" (로컬 데이터: {local_backend.root})" if LOCAL_MODE else ""))
 
         # --- 윈도우 아이콘 설정 로직 추가 ---
         try:
@@ -383,16 +978,31 @@ class App(QMainWindow):
         # ---  로직 추가 완료  ---
 
         self.resize(1700, 950)
-        self.history = load_memory()
         self.last_df = None
+        self.last_sql, self.last_rows = None, None  # last_df를 만든 SQL과 전체 행 수 (그래프용 DB 집계에 사용)
+        self._running_id = None  # 채팅에 "생각 중..." 자리표시자를 띄운 요청
+        self._bot_anchor = None  # 자리표시자(진행 중 답변) 블록의 시작 위치 — 스트리밍 갱신 시 이 위치부터 끝까지 교체
+
+        self.engine = RequestEngine(self)
+        self.engine.started.connect(self._on_request_started)
+        self.engine.stage.connect(self._on_request_stage)
+        self.engine.partial.connect(self._on_request_partial)
+        self.engine.finished.connect(self._on_request_finished)
+        self.engine.failed.connect(self._on_request_failed)
+        self.engine.cancelled.connect(self._on_request_cancelled)
+        self.engine.queue_changed.connect(self._on_queue_changed)
 
         self._build_ui()
+        self._projects_ready = False  # DB에서 받은 목록이 반영되었는지 (그 전에는 캐시된 목록)
+        self.project_loader = ProjectListLoader(fetch_projects, PROJECT_CACHE, self)
+        self.project_loader.loaded.connect(self._on_projects_loaded)
+        self.project_loader.failed.connect(self._on_projects_failed)
         self._load_projects()
         self._append_bot("초기화 완료! 좌측에서 프로젝트를 선택하고 중앙에 질문을 입력하세요.<br>"
                          "예) '선택한 프로젝트의 레이어별 dwell 비율 보여줘'")
 
     def _build_ui(self): #2. 앱의 시각적인 레이아웃(뼈대)을 만든다.
-        left_title = QLabel("Projects")
+        self.project_title = left_title = QLabel("Projects")
         left_title.setFont(QFont("Segoe UI", 10, QFont.Bold))
         self.project_list = QListWidget()
         self.project_list.itemChanged.connect(self._on_project_check_changed)
@@ -411,29 +1021,37 @@ class App(QMainWindow):
         self.input.returnPressed.connect(self._on_send)
         self.btn = QPushButton("전송")
         self.btn.clicked.connect(self._on_send)
+        self.cancel_btn = QPushButton("취소")
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(self._on_cancel)
+        self.status_label = QLabel("")
+        self.status_label.setStyleSheet("color:#AAAAAA;")
         center_box = QVBoxLayout()
         center_box.addWidget(center_title)
         center_box.addWidget(self.chat, 1)
         send_row = QHBoxLayout()
         send_row.addWidget(self.input, 1)
         send_row.addWidget(self.btn)
+        send_row.addWidget(self.cancel_btn)
+        center_box.addWidget(self.status_label)
         center_box.addLayout(send_row)
         center = QWidget()
         center.setLayout(center_box)
 
-        if WEB_ENGINE_OK:
-            self.webview = QWebEngineView()
-            self.webview.setHtml("<html><body style='margin:0;background:#24272E;color:#EAEAEA;font-family:Segoe UI,Malgun Gothic,Arial'>그래프 요청 시 이 영역에 표시됩니다.</body></html>")
-        else:
-            self.webview = QTextEdit("그래프 요청 시 이 영역에 표시됩니다.")
-            self.webview.setReadOnly(True)
+        self.plot_view = None  # QWebEngineView + 영속 plotly 페이지는 첫 그래프 때 만들어 이 자리표시자와 바꾼다 (_ensure_plot_view)
+        self.webview = QTextEdit("그래프 요청 시 이 영역에 표시됩니다.")
+        self.webview.setReadOnly(True)
 
         self.sql_preview = QTextEdit()
         self.sql_preview.setReadOnly(True)
         self.sql_preview.setFont(QFont("Consolas", 10))
-        right = QSplitter(Qt.Vertical)
+        self.result_view = ResultTableView()  # 결과 전체를 보이는 행만 읽어 표시
+        self.result_tabs = QTabWidget()
+        self.result_tabs.addTab(self.result_view, "결과 표")
+        self.result_tabs.addTab(self.sql_preview, "SQL")
+        self.right_split = right = QSplitter(Qt.Vertical)
         right.addWidget(self.webview)
-        right.addWidget(self.sql_preview)
+        right.addWidget(self.result_tabs)
         right.setSizes([520, 380])
 
         main = QSplitter(Qt.Horizontal)
@@ -447,24 +1065,59 @@ class App(QMainWindow):
         root_box.addWidget(main)
         self.setCentralWidget(root)
 
+        if TRACE_PANEL:  # 단계별 p50/p95 + 최근 오류 (닫아도 기록은 계속됨)
+            self.trace_panel = TracePanel(tracer, self)
+            self.addDockWidget(Qt.BottomDockWidgetArea, self.trace_panel)
+
     def _load_projects(self):
+        """마지막으로 받은 목록(캐시)을 바로 표시하고 DB 조회는 백그라운드에서 한다 (끝나면 _on_projects_loaded가 교체)."""
+        self._projects_ready = False
+        cached = self.project_loader.cached()
+        if cached: self._fill_projects(cached, "Projects (저장된 목록 — 갱신 중...)")
+        else: self._fill_projects(None, "Projects", "(프로젝트 목록 불러오는 중...)")
+        self.project_loader.start()
+
+    def _fill_projects(self, projects: Optional[List[tuple]], title: str, message: str = "(데이터 없음)"):
+        """목록을 projects로 바꾼다. 이미 체크한 프로젝트는 체크를 유지하고, 목록에서 사라져 선택이 바뀌면 요약을 다시 읽는다."""
+        checked = set(self._checked_ids())
         self.project_list.blockSignals(True)
         self.project_list.clear()
         try:
-            df = run_query('SELECT project_id, project_name FROM public.project6 ORDER BY project_id;')
-            if df is not None and not df.empty:
-                for _, r in df.iterrows():
-                    txt = f"{int(r['project_id'])}: {r['project_name']}"
-                    it = QListWidgetItem(txt)
-                    it.setFlags(it.flags() | Qt.ItemIsUserCheckable)
-                    it.setCheckState(Qt.Unchecked)
-                    self.project_list.addItem(it)
-            else:
-                self.project_list.addItem("(데이터 없음)")
-        except Exception as e:
-            self.project_list.addItem(f"(로드 오류) {e}")
+            for pid, name in projects or []:
+                it = QListWidgetItem(f"{pid}: {name}")
+                it.setFlags(it.flags() | Qt.ItemIsUserCheckable)
+                it.setCheckState(Qt.Checked if pid in checked else Qt.Unchecked)
+                self.project_list.addItem(it)
+            if not projects: self.project_list.addItem(message)
         finally:
             self.project_list.blockSignals(False)
+        self.project_title.setText(title)
+        if checked and set(self._checked_ids()) != checked: self._on_project_check_changed(None)
+
+    def _on_projects_loaded(self, projects: list):
+        self._fill_projects(projects, "Projects")
+        self._on_startup_done()
+
+    def _on_startup_done(self):
+        if not self._projects_ready and STARTUP_PRELOAD and _client is None:
+            preload(llm_client)  # 창이 뜨고 목록 조회가 끝난 뒤: 첫 질문 전에 openai import를 끝내 둔다
+        self._projects_ready = True
+
+    def _on_projects_failed(self, error: str):
+        if self.project_loader.cached():  # 저장된 목록으로 계속 (질문 시 DB 오류는 그때 표시됨)
+            self.project_title.setText("Projects (저장된 목록 — DB 연결 실패)")
+            self.project_title.setToolTip(error)
+        else:
+            self._fill_projects(None, "Projects", f"(로드 오류) {error}")
+        self._on_startup_done()
+
+    def wait_for_projects(self, timeout: float = 30.0) -> bool:
+        """DB에서 받은 프로젝트 목록이 반영될 때까지 이벤트를 처리하며 기다린다 (스크립트 / 벤치마크용)."""
+        deadline = time.perf_counter() + timeout
+        while not self._projects_ready and time.perf_counter() < deadline:
+            QApplication.processEvents()
+            time.sleep(0.005)
+        return self._projects_ready
 
     def _checked_ids(self) -> List[int]:
         ids = []
@@ -480,26 +1133,27 @@ class App(QMainWindow):
     def _on_project_check_changed(self, _): #4. 좌측 QListWidget의 체크박스 상태가 변경될 때마다 호출됩니다. 사용자가 프로젝트를 선택하거나 선택 해제할 때마다 이 메서드가 실행되어 SQL 미리보기 영역을 업데이트합니다.
         ids = self._checked_ids()
         ids_csv = ",".join(map(str, ids))
+        self.engine.cancel_all()  # 이전 선택 기준으로 실행 중/대기 중인 질문은 폐기
+        self._running_id = self._bot_anchor = None
+        if PREFETCH and ids: PREFETCH.prefetch(ids)  # 백그라운드: 연결 예열 + meta_data 적재 + 예시 쿼리 결과
         if not ids:
             self.sql_preview.setText("-- 미리보기(선택 프로젝트 없음) --")
-            self.history.clear()
-            self.last_df = None
-            save_memory(self.history)
+            self.result_view.clear()
+            self.last_df = self.last_sql = self.last_rows = None
             self.chat.clear()
             self._append_bot("프로젝트 선택 해제됨.")
             return
 
-        sql = f"""-- 선택 프로젝트 요약 --
-SELECT m.project_id, p.project_name, COUNT(m.*) AS "rows(meta)", COUNT(DISTINCT m.layer_number) AS layers, SUM(m.dwell_time_seconds) AS total_dwell, AVG(m.mpt_avg) AS avg_mpt, SUM(m.dwell_time_seconds) / NULLIF(SUM(m.duration_seconds), 0) AS dwell_ratio FROM data.meta_data AS m LEFT JOIN public.project6 AS p ON m.project_id = p.project_id WHERE m.project_id IN ({ids_csv}) GROUP BY m.project_id, p.project_name ORDER BY m.project_id;""".strip()
         try:
-            df = run_query(sql)
-            self.sql_preview.setText(df_preview_text(df)) # SQL 숨김
+            df = run_prepared("project_summary", ids)
+            self.result_view.set_frame(df, "(선택 프로젝트 요약)")  # SQL 숨김
+            self.sql_preview.setText("-- 선택 프로젝트 요약 (결과 표) --")
+            self.result_tabs.setCurrentWidget(self.result_view)
         except Exception as e:
             self.sql_preview.setText(f"[요약 로드 오류]\n{e}")
+            self.result_tabs.setCurrentWidget(self.sql_preview)
 
-        self.history.clear()
-        self.last_df = None
-        save_memory(self.history)
+        self.last_df = self.last_sql = self.last_rows = None  # 대화 기록은 프로젝트 집합별 세션으로 남아 있음 (CONVERSATIONS)
         self.chat.clear()
         self._append_bot(f"프로젝트 선택 변경됨 (ID: {ids_csv}).<br>새 질문 시작.")
 
@@ -511,9 +1165,23 @@ SELECT m.project_id, p.project_name, COUNT(m.*) AS "rows(meta)", COUNT(DISTINCT
 
     def _append_bot_placeholder(self):
         self.chat.append(f'<b style="color:#00FF00;">LLM:</b> <i style="color:#AAAAAA;">생각 중...</i>')
+        self._bot_anchor = self.chat.document().lastBlock().position()
+        self.chat.moveCursor(QTextCursor.End)
+
+    def _set_bot_block(self, html: str):
+        """_bot_anchor부터 문서 끝까지(진행 중인 봇 메시지)를 html로 교체한다."""
+        cursor = self.chat.textCursor()
+        cursor.setPosition(self._bot_anchor)
+        cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+        cursor.removeSelectedText()
+        cursor.insertHtml(html)
         self.chat.moveCursor(QTextCursor.End)
 
     def _replace_last_bot_message(self, final_answer: str):
+        if self._bot_anchor is not None:
+            self._set_bot_block(f'<b style="color:#00FF00;">LLM:</b> {final_answer}<br><hr>')
+            self._bot_anchor = None
+            return
         cursor = self.chat.textCursor()
         cursor.movePosition(QTextCursor.End)
         cursor.movePosition(QTextCursor.StartOfBlock)
@@ -525,122 +1193,231 @@ SELECT m.project_id, p.project_name, COUNT(m.*) AS "rows(meta)", COUNT(DISTINCT
         self.chat.insertHtml(f'<b style="color:#00FF00;">LLM:</b> {final_answer}<br><hr>')
         self.chat.moveCursor(QTextCursor.End)
 
-    def _on_send(self): #3. 이 앱의 '두뇌'입니다. 사용자가 "전송"을 눌렀을 때의 모든 워크플로우를 지휘합니다.
+    def _update_bot_placeholder(self, stage_label: str):
+        if self._bot_anchor is None: return
+        self._set_bot_block(f'<b style="color:#00FF00;">LLM:</b> <i style="color:#AAAAAA;">생각 중... ({stage_label})</i>')
+
+    def _on_send(self): #3. 사용자가 "전송"을 눌렀을 때 질문을 요청 엔진 큐에 넣는다. 실제 워크플로우는 _run_request가 워커 스레드에서 수행한다.
         user_text = self.input.text().strip()
         if not user_text: return
 
         self.input.clear()
-        self._append_user(user_text)
-        self._append_bot_placeholder()
-        QApplication.processEvents()
-
-        try:
-            intent_type = llm_classify_intent(user_text)
-            answer = ""
-
-            if intent_type == "SQL":
-                ids = self._checked_ids()
-                sql = llm_generate_sql(user_text, ids)
-                if not SQL_START.match(sql):
-                    answer = "SQL 생성 실패."
-                    self.sql_preview.setText("(생성 실패)")
-                    self._replace_last_bot_message(answer)
-                    return
-
-                df = None
+        ids = self._checked_ids()
+        self.engine.submit(self._run_request, user_text, ids, None, self._last_result(), meta=user_text)
+
+    def _last_result(self) -> tuple:
+        """[GUI 스레드] 워커에 넘길 직전 결과 (last_df, last_sql, last_rows). 워커는 self.last_*를 직접 읽지 않는다
+        (실행 중에 프로젝트 선택이 바뀌면 GUI 스레드가 비우므로)."""
+        return self.last_df, self.last_sql, self.last_rows
+
+    def _on_cancel(self):
+        self.engine.cancel_all()
+
+    def _run_request(self, ctx, user_text: str, ids: List[int], confirmed_sql: Optional[str] = None,
+                     last: tuple = (None, None, None)) -> dict:
+        """[워커 스레드] 요청 하나를 request span으로 감싸 실행한다. span은 결과의 trace로 GUI 스레드에 넘긴다 (chart.render)."""
+        with tracer.span("request", question=user_text[:120], projects=len(ids), confirmed=confirmed_sql is not None) as span:
+            result = self._handle_request(ctx, user_text, ids, confirmed_sql, last)
+            span.set(intent=result.get("intent"), rows=result.get("rows"))
+        result["trace"] = span
+        return result
+
+    def _handle_request(self, ctx, user_text: str, ids: List[int], confirmed_sql: Optional[str] = None,
+                        last: tuple = (None, None, None)) -> dict:
+        """
+        [워커 스레드] 의도 분류 → SQL 생성 → 비용 가드 → 쿼리 실행 → 답변 생성.
+        위젯에는 접근하지 않고, GUI에 반영할 내용을 dict로 반환한다 (_on_request_finished에서 적용).
+        confirmed_sql: 비용 가드가 확인을 요청했고 사용자가 승인한 SQL (분류/생성을 건너뛰고 바로 실행)
+        last: 요청을 넣을 때 GUI 스레드가 찍어 둔 직전 결과 (last_df, last_sql, last_rows) — "방금 결과로 그래프" 요청용
+        """
+        last_df, last_sql, last_rows = last
+        result = {"answer": "", "sql_preview": None, "df": None, "update_df": False, "history": None, "graph": False, "confirm": None}
+        ctx.stage("classify")
+        plan = plan_request(user_text, ids, confirmed_sql, stage=ctx.stage)  # 캐시 / 로컬 빠른 분류 / 단일 호출 라우터 (SQL까지 함께 생성될 수 있음)
+        plan["spill"] = True  # 스트리밍 결과 전체를 결과 표에서 볼 수 있게 파일로도 흘려 씀
+        intent_type = result["intent"] = plan["intent"]
+        wants_graph_chat = False
+
+        if intent_type == "SQL":
+            if not plan.get("done"):
+                ctx.stage("execute")
+                plan = execute_plan(plan, cancel_token=ctx.token, stage=ctx.stage)
+            if plan.get("done"):  # 생성 실패 / 읽기 전용 거부 / 확인 대기 / 실행 오류
+                result.update(answer=plan["answer"], sql_preview=plan["sql_preview"], confirm=plan.get("confirm"))
+                if plan.get("error"): result.update(df=None, update_df=True)
+                return result
+
+            res = plan["res"]
+            # 스트리밍 결과는 그래프용으로 전체(작을 때) 또는 등간격 표본만 last_df에 남긴다.
+            df = res.frame() if isinstance(res, ResultDigest) else res
+            ctx.stage("answer")
+            answer = answer_result(plan, on_delta=ctx.partial)["answer"]
+            if isinstance(res, ResultDigest) and res.spill_path: table, note = res.spill_path, ""
+            elif isinstance(res, ResultDigest) and not res.complete: table, note = df, f"(표본 — 전체 {res.rows:,}행)"
+            else: table, note = df, ""
+            result.update(sql_preview=f"{plan['sql_header']}\n{plan['sql']}\n\n-- 결과: {plan['rows']:,}행 (결과 표 탭) --",
+                          df=df, update_df=True, sql=plan["sql"], rows=plan["rows"], table=table, table_note=note)
+            result["history"] = {"ids": ids, "user": user_text, "answer": answer, "intent": "SQL", "sql": plan["sql"], "rows": plan["rows"]}
+
+        elif intent_type == "SCHEMA_INFO":
+            ctx.stage("answer")
+            answer = llm_schema_response(user_text)
+            result.update(sql_preview="-- 스키마 정보 조회 --", history={"ids": ids, "user": user_text, "answer": answer, "intent": "SCHEMA_INFO"})
+
+        else: # CHAT
+            ctx.stage("answer")
+            wants_graph_chat = bool(re.search(r"(그래프|시각화|plot|chart|그려줘|보여줘)", user_text, re.I))
+            if wants_graph_chat and last_df is not None:
+                answer = "네, 방금 조회 데이터로 그래프 렌더링."
+            else:
+                answer = llm_chat_response(user_text, chat_context(user_text, ids), on_delta=ctx.partial)  # 최근 턴 + 관련 이전 턴
+            result["history"] = {"ids": ids, "user": user_text, "answer": answer, "intent": "CHAT"}
+
+        result["graph"] = bool(re.search(r"(그래프|시각화|plot|chart|그려줘|보여줘)", user_text, re.I))
+        result["graph_chat"] = wants_graph_chat and last_df is not None  # "방금 결과로 그래프" 대화 (직전 결과가 있을 때)
+        result["answer"] = answer
+        if result["graph"]:
+            if result["update_df"]: chart_df, chart_sql, chart_rows = result["df"], result.get("sql"), result.get("rows")
+            else: chart_df, chart_sql, chart_rows = last_df, last_sql, last_rows
+            result["chart_data"] = chart_df is not None and not chart_df.empty
+            if result["chart_data"]:
+                ctx.stage("chart")
+                with tracer.span("chart", rows=chart_rows or len(chart_df)):
+                    result["figure"], result["chart_note"] = self._build_chart(ctx, user_text, chart_df, chart_sql, chart_rows or len(chart_df))
+        return result
+
+    def _build_chart(self, ctx, user_text: str, df: pd.DataFrame, sql: Optional[str], total_rows: int):
+        """
+        [워커 스레드] 컬럼 역할 → 차트 종류 → 그림 JSON. (fig_json 또는 None, 안내 문구)
+        결과가 크거나 df가 스트리밍 표본뿐이면 원래 SQL을 감싼 집계 쿼리를 DB에서 실행해 그 결과로 그린다.
+        """
+        spec = choose_chart(infer_roles(df), user_text)
+        if spec is None: return None, "시각화 가능한 컬럼 조합(시간/레이어 축, x·y 좌표, 수치 컬럼) 없음."
+        if sql and (total_rows > CHART_SERVER_AGG_ROWS or total_rows > len(df)):  # 큰 결과 또는 표본만 받은 결과
+            agg_sql = aggregate_sql(sql, spec, PLOT_MAX_POINTS)
+            if agg_sql:
                 try:
-                    df = run_query(sql)
-                    self.last_df = df
+                    df = execute_sql(agg_sql, cancel_token=ctx.token, stream=False, timeout_ms=COST_GUARD.timeout_ms if COST_GUARD else None)
+                    spec = {**spec, "aggregated": True}
                 except Exception as e:
-                    answer = "쿼리 실행 오류."
-                    self.sql_preview.setText(f"-- SQL --\n{sql}\n\n[오류]\n{e}")
-                    self.last_df = None
-                    self._replace_last_bot_message(answer)
-                    return
-
-                self.sql_preview.setText(f"-- SQL --\n{sql}\n\n{df_preview_text(df)}")
-                answer = llm_answer(user_text, sql, df)
-                self.history.append({"user": user_text, "llM": answer}); save_memory(self.history)
-
-            elif intent_type == "SCHEMA_INFO":
-                answer = llm_schema_response(user_text)
-                self.sql_preview.setText("-- 스키마 정보 조회 --")
-                self.history.append({"user": user_text, "llm": answer}); save_memory(self.history)
-
-            else: # CHAT
-                wants_graph_chat = bool(re.search(r"(그래프|시각화|plot|chart|그려줘|보여줘)", user_text, re.I))
-                if wants_graph_chat and self.last_df is not None:
-                    answer = "네, 방금 조회 데이터로 그래프 렌더링."
-                else:
-                    context = "\n".join([f"User: {m['user']}\nLLM: {m['llm']}" for m in self.history[-5:]])
-                    answer = llm_chat_response(user_text, context)
-                self.history.append({"user": user_text, "llm": answer}); save_memory(self.history)
-
-            wants_graph_global = bool(re.search(r"(그래프|시각화|plot|chart|그려줘|보여줘)", user_text, re.I))
-            if wants_graph_global:
-                if self.last_df is not None and not self.last_df.empty:
-                    self._maybe_plot(self.last_df)
-                else:
-                    if not (wants_graph_chat and self.last_df is not None):
-                        answer += "<br><br><i>(그래프 그릴 데이터 없음.)</i>"
+                    ctx.token.raise_if_cancelled()
+                    print(f"⚠️ 그래프용 DB 집계 실패 (받은 데이터로 그림): {e}")
+                    tracer.error(f"그래프용 DB 집계 실패: {e}", agg_sql)
+        fig_json, info = build_figure(df, spec, max_points=PLOT_MAX_POINTS, gl_threshold=PLOT_GL_THRESHOLD,
+                                      method=PLOT_DOWNSAMPLE, total_rows=total_rows)
+        return fig_json, f"{info['kind']}: {info['shown']:,}/{info['rows']:,}"
+
+    # ── 요청 엔진 시그널 핸들러 (GUI 스레드) ──────────────────────────
+    STAGE_LABELS = {"classify": "의도 분류", "generate": "SQL 생성", "execute": "쿼리 실행", "repair": "SQL 자동 수정", "answer": "답변 생성", "chart": "그래프 준비"}
+
+    def _on_request_started(self, request_id: int, user_text: object):
+        self._running_id = request_id
+        self._append_user(str(user_text))
+        self._append_bot_placeholder()
+        self.cancel_btn.setEnabled(True)
 
-            self._replace_last_bot_message(answer)
+    def _on_request_stage(self, request_id: int, stage: str):
+        if request_id != self._running_id: return
+        self._update_bot_placeholder(self.STAGE_LABELS.get(stage, stage))
+
+    def _on_request_partial(self, request_id: int, text: str):
+        if request_id != self._running_id or self._bot_anchor is None: return
+        self._set_bot_block(f'<b style="color:#00FF00;">LLM:</b> {text} <i style="color:#AAAAAA;">▌</i>')
+
+    def _on_request_finished(self, request_id: int, result: dict):
+        self._running_id = None
+        try:
+            answer = result["answer"]
+            if result["sql_preview"] is not None: self.sql_preview.setText(result["sql_preview"])
+            if result["update_df"]:
+                self.last_df, self.last_sql, self.last_rows = result["df"], result.get("sql"), result.get("rows")
+                self._show_table(result.get("table"), result.get("table_note", ""))
+            elif result["sql_preview"] is not None and result.get("intent") == "SQL":  # 생성 실패 / 거부 / 확인 대기
+                self.result_tabs.setCurrentWidget(self.sql_preview)
+            if result["history"]: CONVERSATIONS.append(**result["history"])  # 큐에 넣기만 함 (기록은 백그라운드 스레드)
+
+            if result["graph"]:
+                if result.get("chart_data"):  # 워커가 그래프를 만든 데이터 기준 (그사이 바뀐 last_df가 아니라)
+                    with tracer.span("chart.render", parent=result.get("trace")):  # Plotly.react 호출까지 (GUI 스레드)
+                        self._show_chart(result.get("figure"), result.get("chart_note", ""))
+                elif not result.get("graph_chat"):
+                    answer += "<br><br><i>(그래프 그릴 데이터 없음.)</i>"
 
-        except Exception as e:
-            answer = f"오류 발생."
             self._replace_last_bot_message(answer)
+            if result.get("confirm"): self._confirm_expensive_query(result["confirm"])
+        except Exception:
+            self._replace_last_bot_message("오류 발생.")
             self.sql_preview.setText(traceback.format_exc())
+        self._refresh_engine_status()
 
-    # [수정] 타입 힌트 변경 -> Union[str, None]
-    def _find_col(self, cols: List[str], candidates: List[str]) -> Union[str, None]:
-        cols_lower_map = {c.lower(): c for c in cols}
-        for cand in candidates:
-            cand_lower = cand.lower()
-            if cand_lower in cols_lower_map:
-                return cols_lower_map[cand_lower]
-        return None
+    def _show_table(self, table, note: str = ""):
+        """결과 표 갱신: table은 DataFrame 또는 스트리밍 결과를 흘려 쓴 Arrow 파일 경로 (None이면 비움 — 실행 오류)."""
+        if table is None:
+            self.result_view.clear()
+            self.result_tabs.setCurrentWidget(self.sql_preview)
+            return
+        if isinstance(table, str): self.result_view.set_file(table, note)
+        else: self.result_view.set_frame(table, note)
+        self.result_tabs.setCurrentWidget(self.result_view)
+
+    def _confirm_expensive_query(self, pending: dict):
+        reply = QMessageBox.question(self, "쿼리 실행 확인", f"{pending['reason']}\n\n{pending['sql']}\n\n그래도 실행할까요?",
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply == QMessageBox.Yes:
+            self.engine.submit(self._run_request, pending["user_text"], pending["ids"], pending["sql"], self._last_result(),
+                               meta=pending["user_text"])
+
+    def _on_request_failed(self, request_id: int, tb: str):
+        self._running_id = None
+        self._replace_last_bot_message("오류 발생.")
+        self.sql_preview.setText(tb)
+        self.result_tabs.setCurrentWidget(self.sql_preview)
+        self._refresh_engine_status()
+
+    def _on_request_cancelled(self, request_id: int):
+        # 실행 중이던 요청만 채팅에 자리표시자가 있다. 대기 중이던 요청은 조용히 폐기한다.
+        if request_id == self._running_id:
+            self._running_id = None
+            self._replace_last_bot_message("<i>(요청 취소됨)</i>")
+        self._refresh_engine_status()
+
+    def _on_queue_changed(self, _count: int):
+        self._refresh_engine_status()
+
+    def _refresh_engine_status(self):
+        pending = self.engine.pending_count()
+        self.cancel_btn.setEnabled(self.engine.is_busy() or pending > 0)
+        self.status_label.setText(f"대기 중인 질문: {pending}건" if pending else "")
+
+    def _show_chart(self, fig_json: Optional[str], note: str = ""):
+        if fig_json is None:
+            self._webview_text(note or "시각화 가능 컬럼 없음.")
+        elif self._ensure_plot_view():
+            self.plot_view.show_figure(fig_json)  # 페이지 재로딩 없이 Plotly.react
+        else:
+            self._webview_text("WebEngine 모듈 필요.")
 
-    def _maybe_plot(self, df: pd.DataFrame): #
+    def _webview_text(self, txt: str):
+        if self.plot_view is not None: self.plot_view.show_text(txt)
+        else: self.webview.setPlainText(txt)  # 그래프를 아직 그린 적 없음 (또는 WebEngine 없음): 자리표시자에 표시
+
+    def _ensure_plot_view(self) -> bool:
+        """첫 그래프 때 QWebEngineView + 영속 plotly 페이지를 만들어 자리표시자와 바꾼다. WebEngine을 쓸 수 없으면 False."""
+        global WEB_ENGINE_OK
+        if self.plot_view is not None: return True
+        if not WEB_ENGINE_OK: return False
         try:
-            fig = None
-            cols = list(df.columns)
-            x_col = self._find_col(cols, ["layer_number"])
-            if not x_col:
-                self._webview_text("'layer_number' 컬럼 없음.")
-                return
-
-            y_col = None
-            y_title = ""
-            mpt_candidates = ["mpt_avg", "average_mpt", "avg_mpt", "mpt 평균"]
-            y_col = self._find_col(cols, mpt_candidates)
-            if y_col: y_title = "Layer vs MPT 평균"
-
-            if not y_col:
-                dwell_candidates = ["dwell_ratio_by_time", "dwell_time_ratio", "avg_dwell_ratio", "dwell 비율"]
-                y_col = self._find_col(cols, dwell_candidates)
-                if y_col: y_title = "Layer vs Dwell Ratio"
-
-            if not y_col:
-                self._webview_text("시각화 가능 컬럼(mpt_avg 등) 없음.")
-                return
-
-            fig = px.line(df.sort_values(x_col), x=x_col, y=y_col, title=y_title, markers=True, color_discrete_sequence=["#669df6"])
-            fig.update_layout(template="plotly_dark", plot_bgcolor="#24272E", paper_bgcolor="#24272E", font_color="#EAEAEA", title_font_size=16, xaxis_title="Layer Number", yaxis_title=y_title.split(" vs ")[-1].strip())
-            html = fig.to_html(include_plotlyjs="cdn", full_html=False)
-
-            if WEB_ENGINE_OK:
-                self.webview.setHtml(html)
-            else:
-                self._webview_text("WebEngine 모듈 필요.")
+            from PyQt5.QtWebEngineWidgets import QWebEngineView  # type: ignore
         except Exception as e:
-            self._webview_text(f"그래프 오류: {e}")
-
-    def _webview_text(self, txt: str):
-        if WEB_ENGINE_OK:
-            html = f"<html><body style='margin:0;background:#24272E;color:#EAEAEA;white-space:pre-wrap;font-family:Segoe UI,Malgun Gothic,Arial'>{txt}</body></html>"
-            self.webview.setHtml(html)
-        else:
-            self.sql_preview.append(f"\n[그래프 영역]\n{txt}")
+            print(f"⚠️ WebEngine을 불러오지 못했습니다 (그래프 대신 안내 문구): {e}")
+            WEB_ENGINE_OK = False
+            return False
+        view = QWebEngineView()
+        self.plot_view = PlotView(view)  # 셸 페이지는 여기서 한 번만 로드 (로딩 중 요청은 끝난 뒤 실행)
+        self.right_split.replaceWidget(0, view)
+        self.webview.deleteLater()
+        self.webview = view
+        return True
 
 # ─────────────────────────────────────────────────────────────────
 def main():
@@ -0,0 +1,106 @@
+# bench/bench_answer_renderer.py
+"""
+답변 단계 벤치마크: llm_answer vs 로컬 답변 렌더러 (nlq/answer_renderer.py)
+
+질문 + SQL 모음의 결과에 대해 로컬 렌더러가 어떤 종류(scalar / trend / table / stats / empty)로 처리하는지,
+LLM으로 넘기는지 확인하고, 질문당 답변 단계 지연(중앙값/p95)과 LLM 호출 수를 비교합니다.
+기본값은 tools/fake_openai.py 가짜 서버(--latency, --token-delay)와 합성 결과를 씁니다.
+    python bench/bench_answer_renderer.py --latency 0.8 --repeat 3
+    python bench/bench_answer_renderer.py --with-db --ids 1,2      # DATABASE_URL의 DB에서 실제 결과로
+    python bench/bench_answer_renderer.py --real                   # .env의 실제 OpenAI 설정 사용
+app.py를 import하므로 .env의 DATABASE_URL이 설정되어 있어야 합니다.
+"""
+import argparse, json, os, re, statistics, sys, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import pandas as pd
+
+# (질문, SQL 템플릿({ids}), 합성 결과 생성기)
+CASES = [
+    ("공정 준비 시작 시각 알려줘", "SELECT MIN(time) FROM data.raw_data WHERE project_id IN ({ids});",
+     lambda: pd.DataFrame({"min": ["03_01_08_16_50_000"]})),
+    ("선택한 프로젝트의 레이어 수", "SELECT project_id, COUNT(DISTINCT layer_number) AS layer_count FROM data.meta_data WHERE project_id IN ({ids}) GROUP BY project_id ORDER BY project_id;",
+     lambda: pd.DataFrame({"project_id": [1, 2], "layer_count": [40, 38]})),
+    ("레이어별 MPT 평균 보여줘", "SELECT project_id, layer_number, mpt_avg FROM data.meta_data WHERE project_id IN ({ids}) ORDER BY project_id, layer_number;",
+     lambda: pd.DataFrame({"project_id": np.repeat([1, 2], 40), "layer_number": np.tile(np.arange(1, 41), 2),
+                           "mpt_avg": 1750 + 2 * np.tile(np.arange(40), 2) + np.random.default_rng(0).normal(0, 3, 80)})),
+    ("dwell ratio 상위 10개", "SELECT project_id, layer_number, dwell_ratio_by_time FROM data.meta_data WHERE project_id IN ({ids}) ORDER BY dwell_ratio_by_time DESC LIMIT 10;",
+     lambda: pd.DataFrame({"project_id": 1, "layer_number": np.arange(1, 11), "dwell_ratio_by_time": np.linspace(0.5, 0.3, 10)})),
+    ("선택한 프로젝트 이름", "SELECT project_name FROM public.project6 WHERE project_id IN ({ids});",
+     lambda: pd.DataFrame({"project_name": ["P1", "P2"]})),
+    ("1~10 레이어까지의 mpt 통계량 조사해줘", "SELECT AVG(mpt) AS avg_mpt, MIN(mpt) AS min_mpt, MAX(mpt) AS max_mpt, STDDEV(mpt) AS std_mpt FROM data.raw_data WHERE project_id IN ({ids}) AND layer BETWEEN 1 AND 10;",
+     lambda: pd.DataFrame({"avg_mpt": [1790.2], "min_mpt": [1702.3], "max_mpt": [1879.9], "std_mpt": [40.1]})),
+    ("3번 레이어 원본 데이터 보여줘", "SELECT * FROM data.raw_data WHERE project_id IN ({ids}) AND layer = 3 LIMIT 5000;",
+     lambda: pd.DataFrame({"layer": 3, "mpt": np.random.default_rng(1).normal(1790, 40, 1000), "x": np.random.rand(1000)})),
+    ("레이어별 MPT 추이가 정상인지 평가해줘", "SELECT layer_number, mpt_avg FROM data.meta_data WHERE project_id IN ({ids}) ORDER BY layer_number;",
+     lambda: pd.DataFrame({"layer_number": np.arange(1, 41), "mpt_avg": 1750 + 2 * np.arange(40)})),
+]
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    if not values: return 0.0
+    k = (len(values) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="llm_answer vs 로컬 답변 렌더러 지연/호출 수 비교")
+    ap.add_argument("--latency", type=float, default=0.8, help="가짜 서버 응답 전 지연(초)")
+    ap.add_argument("--token-delay", type=float, default=0.01, help="가짜 서버 스트리밍 청크 간격(초)")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--real", action="store_true", help="가짜 서버 대신 .env의 OpenAI 설정 사용")
+    ap.add_argument("--with-db", action="store_true", help="합성 결과 대신 DB에서 SQL 실행")
+    ap.add_argument("--ids", default="1", help="--with-db일 때 프로젝트 ID (쉼표 구분)")
+    ap.add_argument("--verbose", action="store_true", help="로컬 답변 출력")
+    ap.add_argument("--json", help="결과를 JSON 파일로 저장")
+    args = ap.parse_args()
+
+    server = None
+    if not args.real:
+        from tools.fake_openai import start_server
+        server, base_url = start_server(port=0, latency=args.latency, token_delay=args.token_delay)
+        os.environ["OPENAI_BASE_URL"], os.environ["OPENAI_API_KEY"] = base_url, os.environ.get("OPENAI_API_KEY") or "sk-fake"
+    os.environ.setdefault("PROMPT_LOG", "0")
+    import app
+
+    renderer = app.AnswerRenderer(mode="auto", labels=app.ANSWER_RENDERER.labels if app.ANSWER_RENDERER else None,
+                                  max_table_rows=app.ANSWER_TABLE_ROWS)
+    rows, llm_times, mixed_times = [], [], []
+    print(f"{'question':<34}{'rows':>6}  {'local kind':<10}{'local ms':>10}{'llm ms':>10}")
+    for question, template, synth in CASES:
+        sql = template.format(ids=args.ids)
+        df = app.run_query(sql) if args.with_db else synth()
+        local_runs, llm_runs, out = [], [], None
+        for _ in range(args.repeat):
+            t0 = time.perf_counter(); out = renderer.render(question, df); local_runs.append(time.perf_counter() - t0)
+            t0 = time.perf_counter(); app.llm_answer(question, sql, df, on_delta=lambda _t: None); llm_runs.append(time.perf_counter() - t0)
+        kind = out[1] if out else "LLM"
+        local_ms, llm_ms = statistics.median(local_runs) * 1000, statistics.median(llm_runs) * 1000
+        llm_times.extend(llm_runs)
+        mixed_times.extend(local_runs if out else llm_runs)
+        rows.append({"question": question, "rows": len(df), "kind": kind, "local_ms": local_ms, "llm_ms": llm_ms})
+        print(f"{question[:32]:<34}{len(df):>6}  {kind:<10}{local_ms if out else float('nan'):>10.2f}{llm_ms:>10.0f}")
+        if args.verbose and out: print("    " + re.sub(r"<table.*?</table>", "[표]", out[0], flags=re.S).replace("<br>", "\n    "))
+
+    local_share = sum(r["kind"] != "LLM" for r in rows) / len(rows)
+    report = {
+        "cases": rows, "local_share": local_share,
+        "llm_only": {"p50_ms": _percentile(llm_times, 0.5) * 1000, "p95_ms": _percentile(llm_times, 0.95) * 1000, "llm_calls": len(rows)},
+        "with_renderer": {"p50_ms": _percentile(mixed_times, 0.5) * 1000, "p95_ms": _percentile(mixed_times, 0.95) * 1000,
+                          "llm_calls": sum(r["kind"] == "LLM" for r in rows)},
+    }
+    print(f"로컬 처리 비율 {local_share:.0%} | 답변 단계 p50: LLM만 {report['llm_only']['p50_ms']:.0f}ms → 렌더러 사용 {report['with_renderer']['p50_ms']:.1f}ms"
+          f" | p95: {report['llm_only']['p95_ms']:.0f}ms → {report['with_renderer']['p95_ms']:.0f}ms"
+          f" | 질문당 LLM 호출 {len(rows)} → {report['with_renderer']['llm_calls']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump(report, f, ensure_ascii=False, indent=2)
+    if server: server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
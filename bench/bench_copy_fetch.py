@@ -0,0 +1,94 @@
+# bench/bench_copy_fetch.py
+"""
+대량 조회 경로 벤치마크: read_sql_query(run_query) vs 서버 측 커서 스트리밍 vs COPY → Arrow
+
+DATABASE_URL의 DB에 합성 raw_data 테이블(bench.raw_data_synth, 컬럼 구성은 data.raw_data와 동일)을 만들어 측정합니다.
+    python bench/bench_copy_fetch.py --rows 2000000 --repeat 3
+    python bench/bench_copy_fetch.py --rows 5000000 --keep      # 테이블을 지우지 않고 남김 (재실행 시 재사용)
+    python bench/bench_copy_fetch.py --memory                   # Python 힙 최대 사용량도 측정
+테이블 생성 권한(CREATE SCHEMA)이 필요합니다.
+"""
+import argparse, json, os, statistics, sys, time, tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import text
+from db.connector import engine, run_query, run_query_stream
+from db.copy_fetch import run_query_arrow
+
+CREATE_SQL = """
+CREATE SCHEMA IF NOT EXISTS bench;
+CREATE UNLOGGED TABLE bench.raw_data_synth AS
+SELECT g AS id, 1 + g % 10 AS project_id, 1 + (g / 2000) % 500 AS layer,
+       to_char(timestamp '2024-03-01 08:00' + g * interval '10 millisecond', 'MM_DD_HH24_MI_SS_MS') AS time,
+       (g % 10 < 7)::int AS laser_on, 1700 + random() * 200 AS mpt,
+       random() * 100 AS x, random() * 100 AS y, (g / 2000) * 1.2 AS z, random() AS e1, random() AS e2,
+       2000.0 AS s_lp, 10.0 AS s_rs, 5.0 AS s_ws, 1990 + random() * 20 AS r_lp, 10.0 AS r_rs, 5.0 AS r_ws,
+       3 + random() AS mpa, 2 + random() AS mpw, random() AS load, 1 AS contact, (g / 200) % 10 AS bead_number
+FROM generate_series(1, :rows) AS g;
+"""
+
+
+def ensure_table(rows: int):
+    with engine.begin() as conn:
+        exists = conn.execute(text("SELECT to_regclass('bench.raw_data_synth') IS NOT NULL")).scalar()
+        if exists and conn.execute(text("SELECT count(*) FROM bench.raw_data_synth")).scalar() == rows: return
+        conn.execute(text("DROP TABLE IF EXISTS bench.raw_data_synth"))
+        for stmt in CREATE_SQL.strip().split(";"):
+            if stmt.strip(): conn.execute(text(stmt), {"rows": rows})
+
+
+def measure(fn, repeat: int, memory: bool) -> dict:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        n = fn()
+        times.append(time.perf_counter() - t0)
+    peak = None
+    if memory:  # tracemalloc은 실행을 크게 느리게 하므로 시간 측정과 분리된 별도 1회 실행으로 잰다
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1] / (1 << 20)
+        tracemalloc.stop()
+    return {"rows": n, "median_s": statistics.median(times), "min_s": min(times), "peak_mb": peak}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="read_sql_query vs 스트리밍 vs COPY→Arrow 대량 조회 벤치마크")
+    ap.add_argument("--rows", type=int, default=2_000_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--chunk-rows", type=int, default=50_000)
+    ap.add_argument("--keep", action="store_true", help="합성 테이블을 삭제하지 않음")
+    ap.add_argument("--memory", action="store_true", help="tracemalloc으로 Python 힙 최대 사용량도 측정 (별도 실행)")
+    ap.add_argument("--json", help="결과를 JSON 파일로 저장")
+    args = ap.parse_args()
+
+    print(f"합성 테이블 준비 중 ({args.rows:,}행)...")
+    ensure_table(args.rows)
+    sql = "SELECT * FROM bench.raw_data_synth;"
+
+    def stream_count():
+        return sum(len(chunk) for chunk in run_query_stream(sql, chunk_rows=args.chunk_rows))
+
+    cases = {
+        "read_sql_query": lambda: len(run_query(sql, use_cache=False)),
+        "stream_chunks": stream_count,
+        "copy_arrow": lambda: len(run_query_arrow(sql)),
+    }
+    report = {name: measure(fn, args.repeat, args.memory) for name, fn in cases.items()}
+    base = report["read_sql_query"]["median_s"]
+
+    print(f"{'path':<16}{'rows':>12}{'median(s)':>12}{'min(s)':>10}{'peak(MB)':>10}{'speedup':>9}")
+    for name, r in report.items():
+        r["speedup"] = base / r["median_s"] if r["median_s"] else None
+        peak = f"{r['peak_mb']:.0f}" if r["peak_mb"] is not None else "-"
+        print(f"{name:<16}{r['rows']:>12,}{r['median_s']:>12.2f}{r['min_s']:>10.2f}{peak:>10}{r['speedup']:>8.1f}x")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump(report, f, ensure_ascii=False, indent=2)
+    if not args.keep:
+        with engine.begin() as conn: conn.execute(text("DROP TABLE IF EXISTS bench.raw_data_synth"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# bench/bench_intent_routing.py
+"""
+의도 분류 + SQL 생성 라우팅 벤치마크
+
+기존 3회 호출 흐름(llm_classify_intent → llm_generate_sql → llm_answer)과
+새 흐름(로컬 빠른 분류 / 단일 호출 라우터 llm_route → llm_answer)의 종단 간 지연을 비교합니다.
+
+기본값은 tools/fake_openai.py 가짜 서버를 띄워 호출당 지연(--latency)을 흉내 냅니다.
+    python bench/bench_intent_routing.py --latency 0.8 --repeat 3
+    python bench/bench_intent_routing.py --real              # .env의 실제 OpenAI 설정 사용
+    python bench/bench_intent_routing.py --with-db           # run_query까지 포함 (DATABASE_URL, --ids 필요)
+app.py를 import하므로 .env의 DATABASE_URL이 설정되어 있어야 합니다 (--with-db가 아니면 DB에 접속하지 않음).
+"""
+import argparse, json, os, statistics, sys, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+QUESTIONS = [
+    "1~10 레이어까지의 mpt 통계량 조사해줘",
+    "dwell ratio 상위 10개",
+    "선택한 프로젝트의 레이어 수 알려줘",
+    "레이어별 MPT 평균 보여줘",
+    "공정 시작 시각 알려줘",
+    "이 공정의 이름은?",
+    "raw_data 컬럼 뭐 있어?",
+    "안녕",
+    "전체적으로 품질이 괜찮았던 것 같아?",
+]
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    if not values: return 0.0
+    k = (len(values) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def run_flow(app, mode: str, question: str, ids, with_db: bool):
+    """mode: legacy(3회 호출) | combined(라우터) | fast(빠른 분류 + 라우터)"""
+    import pandas as pd
+    if mode == "legacy":
+        intent, sql = app.llm_classify_intent(question), None
+    else:
+        app.FAST_INTENT = (mode == "fast")
+        app.LLM_ROUTER_MODE = "combined"
+        route = app.llm_route(question, ids)
+        intent, sql = route["intent"], route["sql"]
+
+    if intent == "SQL":
+        if sql is None: sql = app.llm_generate_sql(question, ids)
+        if with_db: df = app.run_query(sql)
+        else: df = pd.DataFrame({"project_id": [1] * 10, "layer_number": range(1, 11), "mpt_avg": [1800.0 + i for i in range(10)]})
+        app.llm_answer(question, sql, df)
+    elif intent == "SCHEMA_INFO":
+        app.llm_schema_response(question)
+    else:
+        app.llm_chat_response(question, "")
+    return intent
+
+
+def main():
+    ap = argparse.ArgumentParser(description="의도 분류/SQL 생성 라우팅 지연 벤치마크")
+    ap.add_argument("--latency", type=float, default=0.8, help="가짜 서버의 호출당 지연(초)")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--ids", default="1", help="선택 프로젝트 ID (쉼표 구분)")
+    ap.add_argument("--real", action="store_true", help="가짜 서버 대신 실제 OpenAI API 사용")
+    ap.add_argument("--with-db", action="store_true", help="run_query까지 실행")
+    ap.add_argument("--json", help="결과를 JSON 파일로 저장")
+    args = ap.parse_args()
+
+    server = None
+    if not args.real:
+        from fake_openai import start_server
+        server, base_url = start_server(latency=args.latency)
+        os.environ["OPENAI_BASE_URL"] = base_url
+        os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+    os.environ["LLM_STREAM"] = "0"
+
+    import app
+    ids = [int(x) for x in args.ids.split(",") if x.strip()]
+
+    report = {}
+    for mode in ("legacy", "combined", "fast"):
+        timings, calls_before = [], server.request_count if server else 0
+        for _ in range(args.repeat):
+            for q in QUESTIONS:
+                t0 = time.perf_counter()
+                run_flow(app, mode, q, ids, args.with_db)
+                timings.append(time.perf_counter() - t0)
+        calls = (server.request_count - calls_before) / (args.repeat * len(QUESTIONS)) if server else None
+        report[mode] = {"mean_s": statistics.mean(timings), "p50_s": _percentile(timings, 0.5),
+                        "p95_s": _percentile(timings, 0.95), "llm_calls_per_question": calls}
+
+    print(f"{'mode':<10}{'mean(s)':>10}{'p50(s)':>10}{'p95(s)':>10}{'calls/q':>10}")
+    for mode, r in report.items():
+        calls = f"{r['llm_calls_per_question']:.2f}" if r["llm_calls_per_question"] is not None else "-"
+        print(f"{mode:<10}{r['mean_s']:>10.3f}{r['p50_s']:>10.3f}{r['p95_s']:>10.3f}{calls:>10}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump(report, f, ensure_ascii=False, indent=2)
+    if server: server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
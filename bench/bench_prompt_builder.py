@@ -0,0 +1,94 @@
+# bench/bench_prompt_builder.py
+"""
+프롬프트 토큰 벤치마크: 기존 전체 프롬프트 vs nlq/prompt_builder.py 조립 (LLM 호출 없음)
+
+질문 모음에 대해 SQL 생성 / 라우터 프롬프트의 입력 토큰을, 합성 결과(10 / 100 / 5,000행)에 대해 답변 프롬프트의
+입력 토큰과 미리보기 생성 시간(HTML vs CSV + 요약 통계)을 비교합니다. 고정 접두사(system) 토큰은 프롬프트 캐시 대상입니다.
+    python bench/bench_prompt_builder.py
+    python bench/bench_prompt_builder.py --examples 2 --budget 4000 --json prompt_tokens.json
+app.py를 import하므로 .env의 DATABASE_URL이 설정되어 있어야 합니다 (롤업/time_ts 존재 여부 확인에만 접속).
+tiktoken 인코딩 파일을 받을 수 없는 환경에서는 근사 토큰 수로 계산됩니다.
+"""
+import argparse, json, os, statistics, sys, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import pandas as pd
+
+QUESTIONS = [
+    "1~10 레이어까지의 mpt 통계량 조사해줘",
+    "dwell ratio 상위 10개",
+    "선택한 프로젝트의 레이어 수 알려줘",
+    "레이어별 MPT 평균 보여줘",
+    "공정 시작 시각 알려줘",
+    "이 공정의 이름은?",
+    "3번 레이어 x, y 좌표 경로 그려줘",
+    "전체적으로 품질이 괜찮았던 것 같아?",
+]
+IDS = [1, 2]
+
+
+def synthetic_result(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(rows)
+    return pd.DataFrame({"project_id": 1, "layer_number": np.arange(rows) % 40 + 1,
+                         "mpt_avg": 1800 + rng.normal(0, 25, rows), "dwell_ratio_by_time": rng.random(rows),
+                         "process_date": "2024-03-01"})
+
+
+def timed(fn, repeat: int):
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter(); out = fn(); runs.append(time.perf_counter() - t0)
+    return out, statistics.median(runs) * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser(description="기존 프롬프트 vs 토큰 예산 프롬프트 조립기 입력 토큰 비교")
+    ap.add_argument("--examples", type=int, default=None, help="PROMPT_EXAMPLES 대신 쓸 예시 개수")
+    ap.add_argument("--budget", type=int, default=None, help="PROMPT_TOKEN_BUDGET 대신 쓸 토큰 예산")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--json", help="결과를 JSON 파일로 저장")
+    args = ap.parse_args()
+    os.environ["PROMPT_BUILDER"], os.environ["PROMPT_LOG"] = "1", "1"
+
+    import app
+    from nlq.prompt_builder import count_message_tokens
+    P = app.PROMPTS
+    if args.examples is not None: P.example_k = args.examples
+    if args.budget is not None: P.budget_tokens = args.budget
+    count = lambda msgs: count_message_tokens(msgs, P.model)
+
+    report = {"sql": [], "router": [], "answer": []}
+    print(f"{'stage':<8}{'question / rows':<36}{'legacy':>8}{'builder':>9}{'saved':>8}{'system(캐시)':>13}{'build ms':>10}")
+    for stage, head, rules in (("sql", app.SQL_HEAD, app.SQL_RULES), ("router", app.ROUTER_HEAD, app.ROUTER_RULES)):
+        for q in QUESTIONS:
+            (msgs, stats), build_ms = timed(lambda: app._sql_messages(stage, head, rules, q, IDS), args.repeat)
+            row = {"question": q, "legacy": stats["tokens_full"], "builder": stats["tokens"],
+                   "system": count([msgs[0]]), "tables": P.relevant_tables(q), "build_ms": build_ms}
+            report[stage].append(row)
+            print(f"{stage:<8}{q[:34]:<36}{row['legacy']:>8,}{row['builder']:>9,}{row['legacy'] - row['builder']:>8,}{row['system']:>13,}{build_ms:>10.2f}")
+
+    system = f"{app.ANSWER_HEAD}\n{app.ANSWER_RULES}"
+    for rows in (10, 100, 5_000):
+        df = synthetic_result(rows)
+        _, html_ms = timed(lambda: app.df_preview_text(df), args.repeat)
+        (msgs, stats), build_ms = timed(lambda: P.answer_messages(system, "레이어별 MPT 평균 추이", df,
+                                                                  legacy=lambda: app._legacy_answer_messages("레이어별 MPT 평균 추이", df)), args.repeat)
+        row = {"rows": rows, "legacy": stats["tokens_full"], "builder": stats["tokens"], "system": count([msgs[0]]),
+               "legacy_preview_ms": html_ms, "build_ms": build_ms}
+        report["answer"].append(row)
+        print(f"{'answer':<8}{f'{rows:,}행':<36}{row['legacy']:>8,}{row['builder']:>9,}{row['legacy'] - row['builder']:>8,}{row['system']:>13,}{build_ms:>10.2f}"
+              f"  (HTML 미리보기 {html_ms:.2f}ms)")
+
+    totals = {stage: (sum(r["legacy"] for r in rows), sum(r["builder"] for r in rows)) for stage, rows in report.items()}
+    for stage, (legacy, builder) in totals.items():
+        print(f"합계 {stage:<7} {legacy:>8,} → {builder:>8,} 토큰 ({1 - builder / legacy:.0%} 절약)")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"report": report, "totals": totals, "example_k": P.example_k, "budget": P.budget_tokens}, f, ensure_ascii=False, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+# bench/bench_sql_rewrite.py
+"""
+SQL 재작성 검증 + 오버헤드 벤치마크: 기존 정규식 방식 vs sqlglot 구문 트리 방식 (nlq/sql_rewrite.py)
+
+LLM이 만들 법한 까다로운 SQL(CTE, 하위 쿼리, JOIN, UNION, 별칭/문자열 속 name, DML, 여러 문장 등)에 대해
+    - 필터 주입: 프로젝트 테이블(롤업 포함)을 읽는 모든 스캔에 `project_id IN (...)`이 들어갔는지 (LEFT JOIN은 ON 절, FULL JOIN은 양쪽 IS NULL 허용)
+    - 읽기 전용 검사: 실행하면 안 되는 문장이 거부되는지
+를 확인하고, 두 방식의 질의당 처리 시간(µs)을 비교합니다. 하나라도 틀리면 종료 코드 1.
+    python bench/bench_sql_rewrite.py
+    python bench/bench_sql_rewrite.py --repeat 2000 --verbose
+    python bench/bench_sql_rewrite.py --with-db     # 재작성된 SQL을 DATABASE_URL의 DB에서 EXPLAIN으로 문법 확인
+같은 코퍼스를 tests/test_sql_rewrite.py가 테스트로 실행한다 (python -m pytest tests 또는 python -m unittest discover tests).
+"""
+import argparse, json, os, re, statistics, sys, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from nlq.sql_rewrite import sanitize_sql, enforce_project_filter, check_read_only, normalize_sql, _splice_filter
+
+IDS = [1, 2]
+FILTER = "project_id IN (1, 2)"
+
+# (이름, SQL, 읽기 전용이어야 하는지, 필터 주입 개수, 결과에 있어야 하는 문자열, 없어야 하는 문자열)
+CORPUS = [
+    ("simple", "SELECT layer, COUNT(*) FROM raw_data WHERE laser_on = 1 GROUP BY layer;", True, 1,
+     ["WHERE project_id IN (1, 2) AND laser_on = 1"], []),
+    ("no_where", "SELECT MAX(layer) FROM data.raw_data ORDER BY 1 LIMIT 5;", True, 1, ["WHERE project_id IN (1, 2)"], []),
+    ("or_where", "SELECT * FROM raw_data WHERE layer = 1 OR layer = 2;", True, 1,
+     ["project_id IN (1, 2) AND (layer = 1 OR layer = 2)"], []),
+    ("cte", "WITH l AS (SELECT layer, AVG(mpt) AS m FROM raw_data GROUP BY layer) SELECT * FROM l WHERE m > 1700;", True, 1,
+     ["FROM raw_data WHERE project_id IN (1, 2) GROUP BY layer"], []),
+    ("subquery", "SELECT * FROM raw_data WHERE layer = (SELECT MAX(layer) FROM raw_data);", True, 2, [], []),
+    ("in_subquery_meta", "SELECT project_name FROM project6 WHERE project_id IN (SELECT project_id FROM meta_data WHERE layer_number > 3);",
+     True, 2, [], []),
+    ("join", "SELECT r.layer, m.mpt_avg FROM raw_data r JOIN meta_data m ON m.project_id = r.project_id AND m.layer_number = r.layer;",
+     True, 2, ["r.project_id IN (1, 2)", "m.project_id IN (1, 2)"], []),
+    ("left_join", "SELECT p.project_name, COUNT(r.id) FROM project6 p LEFT JOIN raw_data r ON r.project_id = p.project_id GROUP BY 1;",
+     True, 2, ["ON r.project_id IN (1, 2) AND r.project_id = p.project_id", "WHERE p.project_id IN (1, 2)"], []),
+    ("full_join", "SELECT m.layer_number, r.mpt FROM meta_data m FULL JOIN raw_data r ON r.project_id = m.project_id AND r.layer = m.layer_number;",
+     True, 2, ["WHERE (r.project_id IN (1, 2) OR r.project_id IS NULL) AND (m.project_id IN (1, 2) OR m.project_id IS NULL)"], []),
+    ("layer_rollup", "SELECT layer, mpt_avg FROM data.layer_rollup ORDER BY layer;", True, 1,
+     ["FROM data.layer_rollup WHERE project_id IN (1, 2) ORDER BY layer"], []),
+    ("layer_bucket_rollup", "SELECT bucket_start, mpt_avg FROM data.layer_bucket_rollup WHERE layer = 3;", True, 1,
+     ["FROM data.layer_bucket_rollup WHERE project_id IN (1, 2) AND layer = 3"], []),
+    ("union", "SELECT layer FROM raw_data WHERE laser_on = 1 UNION ALL SELECT layer_number FROM meta_data;", True, 2, [], []),
+    ("already_filtered", "SELECT * FROM raw_data WHERE project_id IN (1) AND layer = 2;", True, 0, [], []),
+    ("foreign_filter", "SELECT * FROM raw_data WHERE project_id IN (7) AND layer = 2;", True, 1, ["project_id IN (1, 2)"], []),
+    ("name_column", "SELECT name, project_id FROM project6;", True, 1, ["SELECT project_name"], []),
+    ("name_alias", "SELECT layer AS name, 'name' AS label FROM raw_data;", True, 1, ["AS name", "'name'"], ["project_name"]),
+    ("string_where", "SELECT * FROM raw_data WHERE time LIKE '03_01%' AND 'where' <> 'x';", True, 1,
+     ["'where' <> 'x'"], []),
+    ("markdown", "쿼리입니다:\n```sql\nSELECT COUNT(*) FROM raw_data\n```\n설명 끝", True, 1, ["FROM raw_data WHERE project_id IN (1, 2)"], ["```"]),
+    ("delete", "DELETE FROM raw_data WHERE layer = 1;", False, None, [], []),
+    ("multi_statement", "SELECT 1; DROP TABLE raw_data;", False, None, [], []),
+    ("pg_sleep", "SELECT pg_sleep(10), layer FROM raw_data;", False, None, [], []),
+    ("for_update", "SELECT * FROM raw_data FOR UPDATE;", False, None, [], []),
+    ("select_into", "SELECT * INTO tmp_copy FROM raw_data;", False, None, [], []),
+    ("dml_cte", "WITH d AS (DELETE FROM raw_data RETURNING *) SELECT COUNT(*) FROM d;", False, None, [], []),
+    ("explain", "EXPLAIN ANALYZE SELECT * FROM raw_data;", False, None, [], []),
+]
+
+
+def legacy_rewrite(raw: str, ids) -> str:
+    """기존 app.py의 정규식 정제 + 필터 주입 (비교용)."""
+    blocks = re.findall(r"```(?:sql)?\s*(.*?)```", raw, flags=re.S)
+    if blocks: raw = blocks[0]
+    m = re.search(r'(?is)\b(SELECT|WITH|INSERT|UPDATE|DELETE|CREATE|DROP|ALTER|EXPLAIN)\b', raw)
+    if m: raw = raw[m.start():]
+    raw = re.sub(r'\bname\b', 'project_name', raw, flags=re.I).strip()
+    if not raw.endswith(";"): raw += ";"
+    return _splice_filter(raw, sorted(set(ids)))
+
+
+def new_rewrite(raw: str, ids) -> str:
+    return enforce_project_filter(sanitize_sql(raw), ids)
+
+
+def check_case(case, verbose: bool) -> list:
+    name, raw, read_only, n_filters, must, must_not = case
+    errors = []
+    sql = sanitize_sql(raw)
+    ok, reason = check_read_only(sql)
+    if ok != read_only: errors.append(f"read_only={ok} (기대 {read_only}) {reason}")
+    if read_only and ok:
+        out = enforce_project_filter(sql, IDS)
+        added = out.count(FILTER) - sql.count(FILTER)
+        if n_filters is not None and added != n_filters: errors.append(f"필터 {added}개 주입 (기대 {n_filters})")
+        errors += [f"'{s}' 없음" for s in must if s not in out]
+        errors += [f"'{s}' 있음" for s in must_not if s in out]
+        if verbose: print(f"    {out}")
+    elif verbose: print(f"    거부: {reason}")
+    return errors
+
+
+def check_db(sqls):
+    from sqlalchemy import text
+    from db.connector import engine
+    failed = 0
+    with engine.connect() as conn:
+        for name, sql in sqls:
+            try:
+                conn.execute(text("EXPLAIN " + sql.replace(":", r"\:")))
+            except Exception as e:
+                failed += 1
+                print(f"  [DB 실패] {name}: {str(e).splitlines()[0]}")
+                conn.rollback()
+    return failed
+
+
+def time_per_query(fn, sqls, repeat: int) -> float:
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for s in sqls: fn(s, IDS)
+        runs.append((time.perf_counter() - t0) / len(sqls))
+    return statistics.median(runs) * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser(description="SQL 재작성(정규식 vs sqlglot) 검증 및 오버헤드 벤치마크")
+    ap.add_argument("--repeat", type=int, default=500)
+    ap.add_argument("--verbose", action="store_true", help="재작성 결과 SQL 출력")
+    ap.add_argument("--with-db", action="store_true", help="재작성된 SQL을 EXPLAIN으로 DB에서 확인")
+    ap.add_argument("--json", help="결과를 JSON 파일로 저장")
+    args = ap.parse_args()
+
+    failed = 0
+    for case in CORPUS:
+        errors = check_case(case, args.verbose)
+        failed += bool(errors)
+        print(f"  {'OK ' if not errors else 'FAIL'} {case[0]:<20} {'; '.join(errors)}")
+        if args.verbose and case[2]: print(f"    (정규식) {legacy_rewrite(case[1], IDS)}")
+    print(f"검증: {len(CORPUS) - failed}/{len(CORPUS)} 통과")
+
+    readable = [(c[0], new_rewrite(c[1], IDS)) for c in CORPUS if c[2]]
+    if args.with_db: failed += check_db(readable)
+
+    sqls = [c[1] for c in CORPUS if c[2]]
+    report = {"legacy_regex_us": time_per_query(legacy_rewrite, sqls, args.repeat),
+              "sqlglot_us": time_per_query(new_rewrite, sqls, args.repeat),
+              "read_only_check_us": time_per_query(lambda s, _: check_read_only(s), sqls, args.repeat)}
+    normalize_sql.cache_clear()
+    report["normalize_us"] = time_per_query(lambda s, _: normalize_sql(s), sqls, 1)
+    print(f"{'path':<20}{'µs/query':>10}")
+    for name, us in report.items(): print(f"{name:<20}{us:>10.0f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump({**report, "failed": failed}, f, ensure_ascii=False, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+# bench/bench_suite.py
+"""
+재현 가능한 벤치마크 모음 (합성 데이터 + 재생 LLM + 기계가 읽을 수 있는 결과)
+
+같은 데이터 규모와 같은 LLM 응답으로 주요 경로의 지연을 재고, 실행마다 JSON으로 남겨 시간에 따라 비교합니다.
+    python bench/synth_dataset.py --projects 5 --layers 40 --samples 1000          # 벤치마크 전용 DB에 한 번 생성
+    python bench/bench_suite.py --ids 1,2 --repeat 5 --json result.json
+    python bench/bench_suite.py --ids 1,2 --generate 5x40x1000 --replace             # 생성부터 함께 (기존 세 테이블을 비움)
+    python bench/bench_suite.py --ids 1,2 --history bench_history.jsonl --compare last.json
+    python bench/bench_suite.py --compare old.json new.json                          # 측정 없이 두 결과만 비교
+측정 항목 (--only로 고를 수 있음):
+    run_query               EXAMPLE_QUERIES의 SQL(선택 ids 대입)과 raw_data 조회를 결과 캐시 없이 실행
+    df_preview_text         raw_data 10 / 1,000 / 100,000행 결과의 미리보기 문자열
+    enforce_project_filter  예시 SQL + 까다로운 SQL(CTE, JOIN, OR 조건, 서브쿼리)에 프로젝트 필터 주입 (질의 1회당)
+    chart                   결과 → 컬럼 역할 추론 → 차트 선택 → 그림 JSON (이전 _maybe_plot HTML 생성에 해당)
+    request                 GUI(App, offscreen)에서 _on_send부터 답변 반영까지의 종단 간 지연과 질문당 LLM 호출 수
+    startup                 새 프로세스에서 import app / App 생성 / 첫 화면 / 프로젝트 목록 반영까지 (첫 화면 시점에 import된 무거운 모듈도 기록)
+LLM은 tools/fake_openai.py를 재생 모드로 띄워 EXAMPLE_QUERIES의 (제목 → SQL)을 그대로 돌려줍니다 (--latency로 호출당 지연).
+--replay로 nlq/batch.py 결과 파일(실제 API로 한 번 실행해 녹화한 것)을 주면 그 응답을 재생합니다.
+SQL 캐시 / 결과 캐시 / 대화 기록 / 추적 저장은 기본으로 끄고 측정합니다 (--warm이면 캐시를 켠 상태).
+결과 JSON: {"meta": {시각, git 커밋, 버전, 데이터 규모, 옵션}, "results": {"<항목>/<케이스>": {"n", "p50_ms", "p95_ms", "mean_ms", "min_ms", ...}}}
+"""
+import argparse, json, os, platform, re, statistics, subprocess, sys, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+GROUPS = ("run_query", "df_preview_text", "enforce_project_filter", "chart", "request", "startup")
+
+# 필터 주입이 까다로운 SQL (예시 SQL과 함께 측정)
+TRICKY_SQL = [
+    "WITH l AS (SELECT project_id, layer, AVG(mpt) AS m FROM data.raw_data GROUP BY project_id, layer) SELECT * FROM l ORDER BY m DESC LIMIT 5;",
+    "SELECT p.project_name, m.layer_number, m.mpt_avg FROM data.meta_data m JOIN public.project6 p ON p.project_id = m.project_id WHERE m.layer_number < 5;",
+    "SELECT layer_number, dwell_time_ratio FROM data.meta_data WHERE dwell_time_ratio > 0.3 OR mpt_avg > 1800 ORDER BY layer_number;",
+    "SELECT layer, COUNT(*) FROM data.raw_data WHERE layer IN (SELECT layer_number FROM data.meta_data WHERE mpt_max > 1750) GROUP BY layer;",
+]
+# 재생 LLM에 더하는 질문 (차트 / 채팅 / 스키마 경로)
+EXTRA_CASES = [
+    {"question": "레이어별 MPT 평균 그래프로 보여줘", "intent": "SQL",
+     "sql": "SELECT project_id, layer_number, mpt_avg FROM data.meta_data WHERE project_id IN ({ids}) ORDER BY layer_number;"},
+    {"question": "1~10 레이어까지의 mpt 통계량 조사해줘", "intent": "SQL",
+     "sql": "SELECT AVG(mpt) AS avg_mpt, MIN(mpt) AS min_mpt, MAX(mpt) AS max_mpt, STDDEV(mpt) AS std_mpt FROM data.raw_data "
+            "WHERE project_id IN ({ids}) AND layer BETWEEN 1 AND 10;"},
+    {"question": "안녕", "intent": "CHAT", "answer": "안녕하세요! LW-DED 공정 데이터에 대해 궁금한 점이 있으신가요?"},
+    {"question": "raw_data 컬럼 뭐 있어?", "intent": "SCHEMA_INFO"},
+]
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    if not values: return 0.0
+    k = (len(values) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def summarize(times_s, **extra) -> dict:
+    ms = [t * 1000 for t in times_s]
+    return {"n": len(ms), "p50_ms": round(_percentile(ms, 0.5), 3), "p95_ms": round(_percentile(ms, 0.95), 3),
+            "mean_ms": round(statistics.mean(ms), 3), "min_ms": round(min(ms), 3), **extra}
+
+
+def measure(fn, repeat: int, warmup: int = 1, inner: int = 1):
+    """fn을 warmup번 버리고 repeat번 잰다. inner > 1이면 한 번 잴 때 inner회 돌려 1회당 시간으로 나눈다 (아주 짧은 함수)."""
+    for _ in range(warmup): fn()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(inner): fn()
+        times.append((time.perf_counter() - t0) / inner)
+    return times
+
+
+def example_cases(example_queries: str, ids_csv: str) -> list:
+    """EXAMPLE_QUERIES → [{"question": 제목, "intent": "SQL", "sql": ids를 넣은 SQL}]"""
+    pairs = re.findall(r"^\s*\d+\)\s*(.+?):\s*\n\s*(SELECT.+?;)\s*$", example_queries, re.M | re.S)
+    return [{"question": q.strip(), "intent": "SQL", "sql": sql.replace("{{ids}}", ids_csv).replace("{ids}", ids_csv)} for q, sql in pairs]
+
+
+def _git(*args) -> str:
+    try: return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, timeout=5).stdout.strip()
+    except Exception: return ""
+
+
+def run_meta(args, app) -> dict:
+    import pandas as pd, sqlalchemy
+    from sqlalchemy import text
+    dataset = {}
+    try:
+        with app.engine.connect() as conn:
+            dataset["projects"] = int(conn.execute(text("SELECT count(*) FROM public.project6")).scalar())
+            dataset["meta_rows"] = int(conn.execute(text("SELECT count(*) FROM data.meta_data")).scalar())
+            dataset["raw_rows_est"] = int(conn.execute(text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'data.raw_data'::regclass")).scalar())
+    except Exception as e:
+        dataset["error"] = str(e)
+    return {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": _git("rev-parse", "--short", "HEAD"),
+            "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")), "python": platform.python_version(),
+            "platform": platform.platform(), "pandas": pd.__version__, "sqlalchemy": sqlalchemy.__version__,
+            "cpus": os.cpu_count(), "dataset": dataset, "ids": args.ids, "repeat": args.repeat, "warm": args.warm,
+            "llm": "real" if args.real else f"replay(latency={args.latency})"}
+
+
+# ── 항목별 측정 ──────────────────────────────────────────────────
+def bench_run_query(app, cases, ids_csv, args) -> dict:
+    out = {}
+    sqls = {f"ex{i}": c["sql"] for i, c in enumerate(cases, 1)}
+    sqls["raw_layer"] = f"SELECT * FROM data.raw_data WHERE project_id IN ({ids_csv}) AND layer = 3;"
+    sqls["raw_agg"] = f"SELECT layer, AVG(mpt) AS mpt_avg FROM data.raw_data WHERE project_id IN ({ids_csv}) GROUP BY layer ORDER BY layer;"
+    for name, sql in sqls.items():
+        rows = len(app.run_query(sql, use_cache=args.warm))
+        out[f"run_query/{name}"] = summarize(measure(lambda: app.run_query(sql, use_cache=args.warm), args.repeat, args.warmup), rows=rows, sql=sql)
+    return out
+
+
+def bench_preview(app, ids_csv, args) -> dict:
+    out = {}
+    raw = app.run_query(f"SELECT * FROM data.raw_data WHERE project_id IN ({ids_csv}) ORDER BY id LIMIT 100000;", use_cache=False)
+    for n in (10, 1_000, 100_000):
+        df = raw.head(n)
+        out[f"df_preview_text/{len(df)}rows"] = summarize(measure(lambda: app.df_preview_text(df), args.repeat, args.warmup), rows=len(df))
+    return out
+
+
+def bench_filter(app, cases, ids, args) -> dict:
+    out = {}
+    for i, sql in enumerate([c["sql"] for c in cases] + TRICKY_SQL, 1):
+        name = f"q{i}" if i <= len(cases) else f"tricky{i - len(cases)}"
+        out[f"enforce_project_filter/{name}"] = summarize(measure(lambda: app.enforce_project_filter(sql, ids), args.repeat, args.warmup, inner=20))
+    return out
+
+
+def bench_chart(app, ids_csv, args) -> dict:
+    from gui.charts import infer_roles, choose_chart, build_figure
+    frames = {
+        "meta_layers": ("레이어별 MPT 평균 그래프", f"SELECT project_id, layer_number, mpt_avg FROM data.meta_data WHERE project_id IN ({ids_csv}) ORDER BY layer_number;"),
+        "raw_time_mpt": ("시간에 따른 mpt 그래프", f"SELECT time, layer, mpt FROM data.raw_data WHERE project_id IN ({ids_csv}) ORDER BY id LIMIT 100000;"),
+        "raw_toolpath": ("x y z 툴패스 그래프", f"SELECT x, y, z, mpt FROM data.raw_data WHERE project_id IN ({ids_csv}) ORDER BY id LIMIT 50000;"),
+    }
+    out = {}
+    for name, (question, sql) in frames.items():
+        df = app.run_query(sql, use_cache=False)
+
+        def render():
+            spec = choose_chart(infer_roles(df), question)
+            if spec is None: return None
+            return build_figure(df, spec, max_points=app.PLOT_MAX_POINTS, gl_threshold=app.PLOT_GL_THRESHOLD,
+                                method=app.PLOT_DOWNSAMPLE, total_rows=len(df))
+        info = render()
+        out[f"chart/{name}"] = summarize(measure(render, args.repeat, args.warmup), rows=len(df), kind=info[1]["kind"] if info else None)
+    return out
+
+
+def bench_request(app, cases, ids, args, server) -> dict:
+    """GUI 요청 흐름: _on_send → (워커) 분류 / SQL / 실행 / 답변 → _on_request_finished 반영까지."""
+    from PyQt5.QtCore import QEventLoop, QTimer, Qt
+    from PyQt5.QtWidgets import QApplication
+    qt = QApplication.instance() or QApplication(sys.argv)
+    w = app.App()
+    w.wait_for_projects()
+    for i in range(w.project_list.count()):
+        it = w.project_list.item(i)
+        if it.text().split(":", 1)[0] in {str(x) for x in ids}: it.setCheckState(Qt.Checked)
+    loop, state = QEventLoop(), {}
+
+    def done(_rid, *_):
+        state["end"] = time.perf_counter()
+        loop.quit()
+    for sig in (w.engine.finished, w.engine.failed, w.engine.cancelled): sig.connect(done)  # 앱의 처리기 다음에 호출됨
+
+    def ask(question: str) -> float:
+        state.clear()
+        w.input.setText(question)
+        t0 = time.perf_counter()
+        w._on_send()
+        QTimer.singleShot(120_000, loop.quit)
+        loop.exec_()
+        qt.processEvents()
+        if "end" not in state: raise TimeoutError(f"요청이 끝나지 않음: {question}")
+        return state["end"] - t0
+
+    out = {}
+    for case in cases:
+        q = case["question"]
+        for _ in range(args.warmup): ask(q)
+        calls_before = server.request_count if server else 0
+        times = [ask(q) for _ in range(args.repeat)]
+        calls = (server.request_count - calls_before) / args.repeat if server else None
+        out[f"request/{q}"] = summarize(times, llm_calls=calls, intent=case.get("intent"))
+    w.close()
+    return out
+
+
+# 새 인터프리터에서 실행: 시각은 스크립트 첫 줄 기준(초), "spawned_wall"은 부모가 프로세스를 띄운 벽시계 시각
+STARTUP_SCRIPT = r"""
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import app
+t_import = time.perf_counter()
+from PyQt5.QtCore import QEvent, QObject
+from PyQt5.QtWidgets import QApplication
+qt = QApplication(sys.argv[:1])
+app.apply_dark70_theme(qt)
+w = app.App()
+t_init = time.perf_counter()
+state = {}
+class Paint(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and "paint" not in state:
+            state.update(paint=time.perf_counter(), wall=time.time(), items=w.project_list.count(),
+                         loaded=[m for m in ("openai", "plotly", "duckdb", "PyQt5.QtWebEngineWidgets") if m in sys.modules],
+                         modules=len(sys.modules))
+        return False
+probe = Paint()
+w.installEventFilter(probe)
+w.show()
+deadline = time.perf_counter() + 30
+while "paint" not in state and time.perf_counter() < deadline:
+    qt.processEvents()
+ok = w.wait_for_projects(30) if hasattr(w, "wait_for_projects") else True  # 이전 버전: App()에서 동기 로드
+t_projects = time.perf_counter()
+print(json.dumps({"import": t_import - t0, "init": t_init - t_import, "paint": state.get("paint", t_projects) - t0,
+                  "paint_wall": state.get("wall"), "projects": t_projects - t0, "projects_ok": ok,
+                  "items_at_paint": state.get("items"), "loaded_at_paint": state.get("loaded"), "modules": state.get("modules")}))
+"""
+
+
+def bench_startup(args) -> dict:
+    """콜드 스타트: 반복마다 새 프로세스 (첫 번째 실행이 프로젝트 목록 캐시를 만들어 이후 실행은 캐시된 목록으로 시작)."""
+    import tempfile
+    env = {**os.environ, "PROJECT_CACHE": os.path.join(tempfile.mkdtemp(prefix="ded_startup_"), "projects_cache.json"),
+           "CONV_STORE": "", "TRACE_STORE": "", "SQL_CACHE": "0"}
+    runs = []
+    for i in range(args.warmup + args.repeat):
+        spawned = time.time()
+        proc = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, ROOT], env=env, capture_output=True, text=True, timeout=120)
+        line = next((l for l in reversed(proc.stdout.splitlines()) if l.startswith("{")), None)
+        if proc.returncode != 0 or line is None: raise RuntimeError(f"시작 측정 실패:\n{proc.stderr[-2000:]}")
+        r = json.loads(line)
+        r["process"] = (r["paint_wall"] - spawned) if r["paint_wall"] else None
+        if i >= args.warmup: runs.append(r)
+    last = runs[-1]
+    out = {
+        "startup/import_app": summarize([r["import"] for r in runs]),
+        "startup/app_init": summarize([r["init"] for r in runs]),
+        "startup/first_paint": summarize([r["paint"] for r in runs], items=last["items_at_paint"], loaded=last["loaded_at_paint"],
+                                         modules=last["modules"]),
+        "startup/projects_loaded": summarize([r["projects"] for r in runs], ok=all(r["projects_ok"] for r in runs)),
+    }
+    if all(r["process"] is not None for r in runs):  # 인터프리터 시작 포함
+        out["startup/process_to_first_paint"] = summarize([r["process"] for r in runs])
+    return out
+
+
+# ── 비교 ─────────────────────────────────────────────────────────
+def compare(base: dict, new: dict, threshold: float = 0.10) -> list:
+    """두 결과의 p50 비교 → [(키, 이전 ms, 현재 ms, 변화율)]. new에 있는 항목만 보고, threshold보다 변한 항목은 표시."""
+    rows = []
+    for key in new["results"]:
+        a, b = base["results"].get(key), new["results"][key]
+        if a is None: rows.append((key, None, b["p50_ms"], None)); continue
+        change = (b["p50_ms"] - a["p50_ms"]) / a["p50_ms"] if a["p50_ms"] else 0.0
+        rows.append((key, a["p50_ms"], b["p50_ms"], change))
+    print(f"{'항목':<58}{'이전 p50':>12}{'현재 p50':>12}{'변화':>10}")
+    for key, a, b, change in rows:
+        mark = "  ▲ 느려짐" if change is not None and change > threshold else "  ▼ 빨라짐" if change is not None and change < -threshold else ""
+        fmt = lambda v: f"{v:,.3f}" if v is not None else "-"
+        print(f"{key[:57]:<58}{fmt(a):>12}{fmt(b):>12}{(f'{change:+.1%}' if change is not None else '새 항목'):>10}{mark}")
+    return rows
+
+
+def print_report(report: dict):
+    print(f"{'항목':<58}{'n':>5}{'p50 ms':>12}{'p95 ms':>12}{'비고':>8}")
+    for key, r in report["results"].items():
+        note = r.get("rows", r.get("llm_calls", ""))
+        print(f"{key[:57]:<58}{r['n']:>5}{r['p50_ms']:>12,.3f}{r['p95_ms']:>12,.3f}{note!s:>8}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="재현 가능한 벤치마크 모음 (합성 데이터 + 재생 LLM + JSON 결과)")
+    ap.add_argument("--ids", default="1,2", help="선택 프로젝트 ID (쉼표 구분)")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--warmup", type=int, default=1)
+    ap.add_argument("--only", help=f"측정할 항목 (쉼표 구분): {', '.join(GROUPS)}")
+    ap.add_argument("--latency", type=float, default=0.05, help="재생 LLM 서버의 호출당 지연(초)")
+    ap.add_argument("--replay", help="재생할 녹화 파일 (nlq/batch.py 결과 JSONL 또는 JSON 목록). 없으면 EXAMPLE_QUERIES")
+    ap.add_argument("--real", action="store_true", help="재생 서버 대신 .env의 실제 OpenAI 설정 사용")
+    ap.add_argument("--warm", action="store_true", help="SQL 캐시 / 결과 캐시를 켠 상태로 측정")
+    ap.add_argument("--generate", metavar="PxLxS", help="측정 전에 합성 데이터 생성 (프로젝트 x 레이어 x 레이어당 샘플)")
+    ap.add_argument("--replace", action="store_true", help="--generate 시 기존 세 테이블을 비우고 다시 생성")
+    ap.add_argument("--json", help="결과를 JSON 파일로 저장")
+    ap.add_argument("--history", help="결과를 한 줄(JSONL)로 덧붙일 파일 (실행 간 추이 비교용)")
+    ap.add_argument("--compare", nargs="+", metavar="JSON", help="기준 결과와 비교 (파일 두 개면 측정 없이 둘만 비교)")
+    ap.add_argument("--threshold", type=float, default=0.10, help="비교 시 느려짐/빨라짐으로 표시할 p50 변화율")
+    args = ap.parse_args()
+
+    if args.compare and len(args.compare) == 2:
+        base, new = (json.load(open(p, encoding="utf-8")) for p in args.compare)
+        compare(base, new, args.threshold)
+        return
+    groups = [g.strip() for g in (args.only or ",".join(GROUPS)).split(",") if g.strip()]
+    ids = [int(x) for x in args.ids.split(",") if x.strip()]
+    ids_csv = ",".join(map(str, ids))
+
+    # app.py import 전에 환경을 고정한다 (캐시 / 대화 기록 / 추적 저장이 측정에 섞이지 않도록)
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    os.environ.update({"LLM_STREAM": "0", "CONV_STORE": "", "TRACE_STORE": "", "TRACE_PANEL": "0", "PROMPT_LOG": "0"})
+    if not args.warm: os.environ.update({"SQL_CACHE": "0", "RESULT_CACHE": "0"})
+
+    if args.generate:
+        from db.connector import engine
+        from bench.synth_dataset import generate
+        p, l, s = (int(x) for x in args.generate.lower().split("x"))
+        print(f"합성 데이터 생성: {p} × {l} × {s:,}")
+        print(generate(engine, p, l, s, replace=args.replace))
+
+    server = None
+    if not args.real:  # 재생 내용은 app.py의 EXAMPLE_QUERIES를 읽은 뒤 채운다 (서버 설정은 요청마다 읽힘)
+        from fake_openai import start_server, load_replay
+        server, base_url = start_server(latency=args.latency)
+        os.environ["OPENAI_BASE_URL"] = base_url
+        os.environ["OPENAI_API_KEY"] = "sk-fake"
+
+    import app
+    examples = example_cases(app.EXAMPLE_QUERIES, ids_csv)
+    cases = examples + [{**c, "sql": c["sql"].format(ids=ids_csv)} if c.get("sql") else c for c in EXTRA_CASES]
+    if server:
+        if args.replay:
+            server.cfg["replay"] = load_replay(args.replay)
+            cases = list(server.cfg["replay"].values())
+        else: server.cfg["replay"] = {c["question"]: c for c in cases}
+    sql_cases = [c for c in cases if (c.get("intent") or "SQL") == "SQL" and c.get("sql")]
+
+    report = {"meta": run_meta(args, app), "results": {}}
+    for group in groups:
+        print(f"[{group}] 측정 중...")
+        if group == "run_query": report["results"].update(bench_run_query(app, examples, ids_csv, args))
+        elif group == "df_preview_text": report["results"].update(bench_preview(app, ids_csv, args))
+        elif group == "enforce_project_filter": report["results"].update(bench_filter(app, sql_cases, ids, args))
+        elif group == "chart": report["results"].update(bench_chart(app, ids_csv, args))
+        elif group == "request": report["results"].update(bench_request(app, cases, ids, args, server))
+        elif group == "startup": report["results"].update(bench_startup(args))
+        else: print(f"⚠️ 알 수 없는 항목: {group}")
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.history:
+        with open(args.history, "a", encoding="utf-8") as f: f.write(json.dumps(report, ensure_ascii=False) + "\n")
+    if args.compare:
+        print()
+        compare(json.load(open(args.compare[0], encoding="utf-8")), report, args.threshold)
+    if server: server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
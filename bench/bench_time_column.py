@@ -0,0 +1,115 @@
+# bench/bench_time_column.py
+"""
+raw_data.time(TEXT) 시간 조회 벤치마크: 문자열 비교 vs time_ts(timestamp + (project_id, time_ts) 인덱스)
+
+    python bench/bench_time_column.py                  # 마이그레이션 전: 원본 SQL만 측정 (기준선)
+    python -m db.time_column --migrate                 # time_ts 컬럼/인덱스 생성
+    python bench/bench_time_column.py --repeat 5       # 마이그레이션 후: 원본 vs time_ts로 재작성한 SQL (결과 일치 확인 포함)
+    python bench/bench_time_column.py --parse-only     # 클라이언트 파서만: NumPy 벡터 파서 vs pd.to_datetime vs strptime
+DB 측정은 EXPLAIN (ANALYZE)의 실행 시간(서버 내부)이며, 쿼리별로 인덱스를 쓰는지(Index/Bitmap 노드)도 함께 표시합니다.
+"""
+import argparse, json, os, statistics, sys, time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import pandas as pd
+
+from db.time_column import parse_time
+
+# {pid}: 데이터가 가장 많은 프로젝트, {t0}/{t1}: 그 프로젝트의 시간 범위 안쪽 5% 구간
+QUERIES = {
+    "공정 준비 시작 시각": "SELECT MIN(time) FROM data.raw_data WHERE project_id IN ({pid});",
+    "공정 시작 시각": "SELECT MIN(time) FROM data.raw_data WHERE project_id IN ({pid}) AND layer = 1 AND laser_on = 1;",
+    "마지막 시각": "SELECT MAX(time) FROM data.raw_data WHERE project_id IN ({pid});",
+    "시간 구간 평균": "SELECT COUNT(*), AVG(mpt) FROM data.raw_data WHERE project_id IN ({pid}) AND time >= '{t0}' AND time < '{t1}';",
+    "최근 10개": "SELECT time, mpt FROM data.raw_data WHERE project_id IN ({pid}) ORDER BY time DESC LIMIT 10;",
+}
+
+
+def bench_parser(rows: int, repeat: int) -> dict:
+    rng = np.random.default_rng(0)
+    base = pd.Timestamp("2000-03-01 08:00") + pd.to_timedelta(np.sort(rng.integers(0, 30 * 86400 * 1000, rows)), unit="ms")
+    values = pd.Series(base.strftime("%m_%d_%H_%M_%S_").to_numpy(dtype=object) + (base.microsecond // 1000).map("{:03d}".format).to_numpy(dtype=object))
+
+    def timed(fn):
+        runs = []
+        for _ in range(repeat):
+            t0 = time.perf_counter(); out = fn(); runs.append(time.perf_counter() - t0)
+        return out, statistics.median(runs)
+
+    vec, t_vec = timed(lambda: parse_time(values))
+    pdt, t_pd = timed(lambda: pd.to_datetime("2000_" + values, format="%Y_%m_%d_%H_%M_%S_%f"))
+    subset = values.iloc[: min(rows, 100_000)]
+    _, t_loop = timed(lambda: [datetime.strptime("2000_" + v, "%Y_%m_%d_%H_%M_%S_%f") for v in subset])
+    t_loop *= rows / len(subset)
+    assert (vec.to_numpy() == pdt.to_numpy()).all(), "벡터 파서 결과가 pd.to_datetime과 다릅니다"
+    report = {"rows": rows, "numpy_vectorized_s": t_vec, "pd_to_datetime_s": t_pd, "strptime_loop_s(추정)": t_loop}
+    print(f"파서 ({rows:,}행): NumPy {t_vec:.3f}s | pd.to_datetime {t_pd:.3f}s ({t_pd / t_vec:.1f}x) | strptime 루프 ~{t_loop:.2f}s ({t_loop / t_vec:.0f}x)")
+    return report
+
+
+def explain_ms(conn, sql: str, repeat: int):
+    from sqlalchemy import text
+    runs, plan = [], None
+    for _ in range(repeat):
+        plan = conn.execute(text("EXPLAIN (ANALYZE, FORMAT JSON) " + sql.replace(":", r"\:"))).scalar()[0]
+        runs.append(plan["Execution Time"])
+    nodes, stack = [], [plan["Plan"]]
+    while stack:
+        node = stack.pop()
+        nodes.append(node["Node Type"])
+        stack.extend(node.get("Plans", []))
+    index = any("Index" in n or "Bitmap" in n for n in nodes)
+    return statistics.median(runs), index
+
+
+def bench_db(repeat: int) -> dict:
+    from sqlalchemy import text
+    from db.connector import engine
+    from db.time_column import TimeColumn
+    from nlq.sql_rewrite import rewrite_time_column
+
+    available = TimeColumn(engine).available()
+    with engine.connect() as conn:
+        pid, n = conn.execute(text("SELECT project_id, count(*) FROM data.raw_data GROUP BY 1 ORDER BY 2 DESC LIMIT 1")).one()
+        times = conn.execute(text("SELECT time FROM data.raw_data WHERE project_id = :p ORDER BY time"), {"p": pid}).scalars().all()
+        t0, t1 = times[int(len(times) * 0.50)], times[int(len(times) * 0.55)]
+        print(f"프로젝트 {pid} ({n:,}행), time_ts {'사용 가능' if available else '없음 (기준선만 측정)'}")
+        print(f"{'query':<14}{'text(ms)':>10}{'idx':>5}{'time_ts(ms)':>13}{'idx':>5}{'speedup':>9}  결과")
+        report = {}
+        for name, template in QUERIES.items():
+            sql = template.format(pid=pid, t0=t0, t1=t1)
+            before, before_idx = explain_ms(conn, sql, repeat)
+            row = {"sql": sql, "text_ms": before, "text_index": before_idx}
+            line = f"{name:<14}{before:>10.2f}{'Y' if before_idx else '-':>5}"
+            if available:
+                rewritten = rewrite_time_column(sql)
+                after, after_idx = explain_ms(conn, rewritten, repeat)
+                same = conn.execute(text(sql)).all() == conn.execute(text(rewritten)).all()
+                row.update(rewritten=rewritten, time_ts_ms=after, time_ts_index=after_idx, same_result=same)
+                line += f"{after:>13.2f}{'Y' if after_idx else '-':>5}{before / after:>8.1f}x  {'일치' if same else '불일치!'}"
+            print(line)
+            report[name] = row
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser(description="raw_data.time 문자열 vs time_ts 인덱스 조회 / 시간 파서 벤치마크")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--parse-rows", type=int, default=1_000_000)
+    ap.add_argument("--parse-only", action="store_true")
+    ap.add_argument("--json", help="결과를 JSON 파일로 저장")
+    args = ap.parse_args()
+
+    report = {"parser": bench_parser(args.parse_rows, args.repeat)}
+    if not args.parse_only: report["db"] = bench_db(args.repeat)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+    if any(not r.get("same_result", True) for r in report.get("db", {}).values()): sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
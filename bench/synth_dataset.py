@@ -0,0 +1,182 @@
+# bench/synth_dataset.py
+"""
+합성 LW-DED 데이터셋 생성기 (public.project6 / data.meta_data / data.raw_data)
+
+DATABASE_URL의 DB에 앱이 쓰는 세 테이블(CONTEXT_DEFINITIONS의 스키마)을 만들고, 프로젝트 × 레이어 × 레이어당 샘플 수만큼
+실제 공정과 비슷한 모양의 데이터를 채웁니다. 벤치마크(bench/bench_suite.py)를 같은 데이터 규모로 반복 실행하기 위한 것입니다.
+    - raw_data: 10ms 간격 샘플. 레이어 앞부분은 준비 구간(레이저 OFF), 이후 bead마다 레이저 ON 75% / dwell 25%.
+      MPT는 레이어가 올라갈수록(열 누적) 조금씩 오르고 bead 안에서 진동 + 잡음, 레이저 OFF 구간은 냉각 값.
+      x/y는 bead마다 방향이 바뀌는 래스터 경로, z는 레이어 높이, 설정값(s_*) / 실측값(r_*)은 레이저 상태를 따른다.
+      time은 'MM_DD_HH24_MI_SS_MS' 문자열이고 레이어 사이에 --layer-gap초 쉬는 시간이 있다.
+    - meta_data: raw_data에서 (프로젝트, 레이어)별로 계산 (공정 시작 = 레이어의 첫 laser_on 이후 구간만).
+모든 값은 PostgreSQL generate_series로 서버에서 만들고 setseed(--seed)로 재현됩니다.
+    python bench/synth_dataset.py --projects 10 --layers 100 --samples 2000              # 2백만 행
+    python bench/synth_dataset.py --projects 10 --layers 100 --samples 2000 --replace    # 기존 세 테이블을 비우고 다시 생성
+기존 데이터가 있는 DB에서는 --replace 없이 실행하면 아무것도 바꾸지 않고 끝납니다. 벤치마크 전용 DB를 쓰세요.
+"""
+import argparse, datetime, json, os, sys, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import text
+
+SCHEMA_SQL = """
+CREATE SCHEMA IF NOT EXISTS data;
+CREATE TABLE IF NOT EXISTS public.project6 (project_id int PRIMARY KEY, project_name text UNIQUE);
+CREATE TABLE IF NOT EXISTS data.meta_data (
+    summary_id serial PRIMARY KEY, project_id int REFERENCES public.project6, layer_number int, process_date date,
+    duration_seconds double precision, dwell_time_seconds double precision, active_time_seconds double precision,
+    dwell_time_ratio double precision, dwell_ratio_by_time double precision, dwell_ratio_by_count double precision,
+    dwell_count int, active_count int, total_sample_count int,
+    mpt_min double precision, mpt_max double precision, mpt_avg double precision, mpt_median double precision);
+CREATE TABLE IF NOT EXISTS data.raw_data (
+    id bigserial PRIMARY KEY, project_id int REFERENCES public.project6, layer int, time text, laser_on int, mpt double precision,
+    x double precision, y double precision, z double precision, e1 double precision, e2 double precision,
+    s_lp double precision, s_rs double precision, s_ws double precision, r_lp double precision, r_rs double precision, r_ws double precision,
+    mpa double precision, mpw double precision, load double precision, contact int, bead_number int);
+"""
+
+# 한 프로젝트 분량. g: 레이어 안의 샘플 번호, on: 레이저 상태, b: bead 번호(준비 구간은 0), u: bead 안 위치(0~1)
+RAW_SQL = """
+INSERT INTO data.raw_data (project_id, layer, time, laser_on, mpt, x, y, z, e1, e2, s_lp, s_rs, s_ws, r_lp, r_rs, r_ws,
+                           mpa, mpw, load, contact, bead_number)
+SELECT :p, l,
+       to_char(:t0 + ((l - 1) * (:samples * :sample_ms + :gap_ms) + g * :sample_ms) * interval '1 millisecond', 'MM_DD_HH24_MI_SS_MS'),
+       on_, mpt,
+       CASE WHEN b % 2 = 1 THEN u ELSE 1 - u END * 40, b * 1.5, (l - 1) * 0.8, random(), random(),
+       on_ * 2000.0, on_ * 10.0, on_ * 5.0, on_ * (1990 + random() * 20), on_ * (9.8 + random() * 0.4), on_ * (4.9 + random() * 0.2),
+       CASE WHEN on_ = 1 THEN 2.5 + (mpt - 1700) / 200 + random() * 0.3 ELSE 0 END,
+       CASE WHEN on_ = 1 THEN 1.8 + (mpt - 1700) / 300 + random() * 0.2 ELSE 0 END,
+       random() * 5 + on_ * 20, on_, b
+FROM (
+    SELECT l, g, b, u, on_,
+           CASE WHEN on_ = 1 THEN 1700 + :p_offset + l * 1.5 + 25 * sin(g / 37.0) + random() * 30
+                ELSE 400 + random() * 80 END AS mpt
+    FROM (
+        SELECT l, g,
+               CASE WHEN g < :prep THEN 0 ELSE 1 + (g - :prep) / :bead END AS b,
+               CASE WHEN g < :prep THEN 0 ELSE ((g - :prep) % :bead)::float / :bead END AS u,
+               CASE WHEN g >= :prep AND (g - :prep) % :bead < :bead_on THEN 1 ELSE 0 END AS on_
+        FROM generate_series(1, :layers) AS l, generate_series(0, :samples - 1) AS g
+    ) s
+) s
+ORDER BY l, g
+"""
+
+# 레이어별 요약. 공정 시작(첫 laser_on) 이전 샘플은 시간/비율 계산에서 뺀다.
+META_SQL = """
+INSERT INTO data.meta_data (project_id, layer_number, process_date, duration_seconds, dwell_time_seconds, active_time_seconds,
+                            dwell_time_ratio, dwell_ratio_by_time, dwell_ratio_by_count, dwell_count, active_count,
+                            total_sample_count, mpt_min, mpt_max, mpt_avg, mpt_median)
+SELECT project_id, layer, :day, n * :dt, dwell * :dt, active * :dt, dwell::float / nullif(n, 0), dwell::float / nullif(n, 0),
+       dwell_n::float / nullif(dwell_n + active_n, 0), dwell_n, active_n, total, mpt_min, mpt_max, mpt_avg, mpt_median
+FROM (
+    SELECT project_id, layer,
+           count(*) FILTER (WHERE started) AS n,
+           count(*) FILTER (WHERE started AND laser_on = 0) AS dwell,
+           count(*) FILTER (WHERE started AND laser_on = 1) AS active,
+           count(*) FILTER (WHERE started AND laser_on = 0 AND prev = 1) AS dwell_n,
+           count(*) FILTER (WHERE laser_on = 1 AND prev = 0) AS active_n,
+           count(*) AS total,
+           min(mpt) FILTER (WHERE laser_on = 1) AS mpt_min, max(mpt) FILTER (WHERE laser_on = 1) AS mpt_max,
+           avg(mpt) FILTER (WHERE laser_on = 1) AS mpt_avg,
+           percentile_cont(0.5) WITHIN GROUP (ORDER BY mpt) FILTER (WHERE laser_on = 1) AS mpt_median
+    FROM (
+        SELECT project_id, layer, laser_on, mpt,
+               id >= min(id) FILTER (WHERE laser_on = 1) OVER (PARTITION BY layer) AS started,
+               coalesce(lag(laser_on) OVER (PARTITION BY layer ORDER BY id), 0) AS prev
+        FROM data.raw_data WHERE project_id = :p
+    ) r
+    GROUP BY project_id, layer
+) m
+ORDER BY layer
+"""
+
+
+def _existing_rows(conn) -> int:
+    if not conn.execute(text("SELECT to_regclass('data.raw_data') IS NOT NULL")).scalar(): return 0
+    return int(conn.execute(text("SELECT count(*) FROM (SELECT 1 FROM data.raw_data LIMIT 1) s")).scalar())
+
+
+def generate(engine, projects: int = 5, layers: int = 40, samples: int = 1000, sample_ms: int = 10, layer_gap: float = 30.0,
+             seed: float = 0.42, replace: bool = False, progress=print) -> dict:
+    """
+    세 테이블을 만들고 채운다. 기존 raw_data가 있으면 replace=True일 때만 비우고 다시 만든다.
+    반환: {"projects", "layers", "samples", "raw_rows", "meta_rows", "seconds"}
+    """
+    started = time.perf_counter()
+    prep, bead = max(samples // 20, 1), max(samples // 10, 20)
+    with engine.begin() as conn:
+        for stmt in SCHEMA_SQL.split(";"):
+            if stmt.strip(): conn.execute(text(stmt))
+        if _existing_rows(conn):
+            if not replace: raise RuntimeError("data.raw_data에 이미 데이터가 있습니다. 벤치마크 전용 DB를 쓰거나 --replace를 주세요.")
+            progress("기존 project6 / meta_data / raw_data 비우는 중...")
+            conn.execute(text("TRUNCATE data.raw_data, data.meta_data, public.project6 RESTART IDENTITY CASCADE"))
+        conn.execute(text("INSERT INTO public.project6 SELECT g, 'synth_' || lpad(g::text, 3, '0') FROM generate_series(1, :n) AS g"),
+                     {"n": projects})
+
+    for p in range(1, projects + 1):
+        t0 = time.perf_counter()
+        with engine.begin() as conn:  # 프로젝트마다 한 트랜잭션 (setseed는 세션 단위라 같은 연결에서)
+            conn.execute(text("SELECT setseed(:s)"), {"s": (seed * 1000 + p) % 1000 / 1000})
+            conn.execute(text(RAW_SQL), {
+                "p": p, "p_offset": (p * 7) % 40, "layers": layers, "samples": samples, "sample_ms": sample_ms,
+                "gap_ms": int(layer_gap * 1000), "prep": prep, "bead": bead, "bead_on": max(int(bead * 0.75), 1),
+                "t0": _start_time(p)})
+            conn.execute(text(META_SQL), {"p": p, "dt": sample_ms / 1000, "day": _start_time(p).date()})
+        progress(f"  프로젝트 {p}/{projects}: {layers * samples:,}행 ({time.perf_counter() - t0:.1f}초)")
+
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX IF NOT EXISTS raw_data_project_layer_idx ON data.raw_data (project_id, layer)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS meta_data_project_layer_idx ON data.meta_data (project_id, layer_number)"))
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE public.project6, data.meta_data, data.raw_data"))
+        raw_rows = int(conn.execute(text("SELECT count(*) FROM data.raw_data")).scalar())
+        meta_rows = int(conn.execute(text("SELECT count(*) FROM data.meta_data")).scalar())
+    _refresh_derived(engine, progress)
+    return {"projects": projects, "layers": layers, "samples": samples, "raw_rows": raw_rows, "meta_rows": meta_rows,
+            "seconds": round(time.perf_counter() - started, 2)}
+
+
+def _start_time(p: int) -> datetime.datetime:
+    return datetime.datetime(2024, 3, 1, 8, 0) + datetime.timedelta(days=p - 1)
+
+
+def _refresh_derived(engine, progress):
+    """이미 만들어 둔 롤업 / time_ts가 있으면 새 데이터에 맞춘다 (트리거가 time_ts를 채우므로 롤업만 다시 계산)."""
+    from db.rollups import RollupManager
+    rollups = RollupManager(engine)
+    if rollups.available():
+        progress("레이어 롤업 전체 재계산 중...")
+        rollups.refresh(full=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="합성 LW-DED 데이터셋 생성 (project6 / meta_data / raw_data)")
+    ap.add_argument("--projects", type=int, default=5)
+    ap.add_argument("--layers", type=int, default=40)
+    ap.add_argument("--samples", type=int, default=1000, help="레이어당 raw_data 샘플 수")
+    ap.add_argument("--sample-ms", type=int, default=10, help="샘플 간격(ms)")
+    ap.add_argument("--layer-gap", type=float, default=30.0, help="레이어 사이 쉬는 시간(초)")
+    ap.add_argument("--seed", type=float, default=0.42)
+    ap.add_argument("--replace", action="store_true", help="기존 세 테이블의 데이터를 지우고 다시 생성")
+    ap.add_argument("--json", help="생성 결과(행 수, 소요 시간)를 JSON 파일로 저장")
+    args = ap.parse_args()
+
+    from db.connector import engine
+    total = args.projects * args.layers * args.samples
+    print(f"합성 데이터 생성: {args.projects} 프로젝트 × {args.layers} 레이어 × {args.samples:,} 샘플 = {total:,}행")
+    try:
+        info = generate(engine, args.projects, args.layers, args.samples, args.sample_ms, args.layer_gap, args.seed, args.replace)
+    except RuntimeError as e:
+        print(f"⚠️ {e}")
+        sys.exit(1)
+    print(f"완료: raw_data {info['raw_rows']:,}행, meta_data {info['meta_rows']:,}행 ({info['seconds']:.1f}초)")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump(info, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
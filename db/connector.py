@@ -1,26 +1,349 @@
 # db/connector.py
-import os
+import os, threading, time
+from contextlib import contextmanager
+from typing import Iterator, Sequence
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import DBAPIError
 from dotenv import load_dotenv
 
+from db.metrics import LatencyRecorder, sql_label
+from db.tracing import tracer  # db.query / db.stream span (행 수, 바이트, 캐시 적중, driver 시간)
+from db.result_cache import ResultCache
+
 dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
 load_dotenv(dotenv_path=dotenv_path)
 
 DB_URL = os.getenv("DATABASE_URL")
-if not DB_URL:
+LOCAL_DATA_DIR = os.getenv("LOCAL_DATA_DIR")
+
+# DB_BACKEND=duckdb(또는 DATABASE_URL 없이 LOCAL_DATA_DIR만 있을 때): 중앙 PostgreSQL 대신 db/local_export.py로 내려받은
+# Parquet 파일을 DuckDB로 조회한다 (db/local_backend.py). engine은 None — PostgreSQL 전용 기능(롤업, 비용 가드 등)은 꺼진다.
+DB_BACKEND = os.getenv("DB_BACKEND", "duckdb" if not DB_URL and LOCAL_DATA_DIR else "postgres").lower()
+local_backend = None
+if DB_BACKEND == "duckdb":
+    if not LOCAL_DATA_DIR:
+        raise ValueError("DB_BACKEND=duckdb이지만 환경변수 LOCAL_DATA_DIR이 비어 있습니다. .env를 확인하세요.")
+    from db.local_backend import LocalBackend
+    local_backend = LocalBackend(LOCAL_DATA_DIR, threads=int(os.getenv("LOCAL_THREADS", "0")) or None,
+                                 memory_limit=os.getenv("LOCAL_MEMORY_LIMIT") or None)
+elif not DB_URL:
     raise ValueError("환경변수 DATABASE_URL이 비어 있습니다. .env를 확인하세요.")
 
-# echo=False, pool_pre_ping=True 권장
-engine = create_engine(DB_URL, pool_pre_ping=True, future=True)
+SEARCH_PATH = os.getenv("DB_SEARCH_PATH", "public, data")
+
+# 연결 풀: 크기/초과 허용/대기 시간/재활용 주기는 .env로 조정.
+# pool_pre_ping은 체크아웃마다 왕복이 하나 늘어나므로 기본 끔 — 대신 pool_recycle로 오래된 연결을 교체하고,
+# 끊어진 연결로 실패한 쿼리는 한 번 재시도한다 (_retry_on_disconnect).
+engine = None if local_backend else create_engine(
+    DB_URL,
+    future=True,
+    pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+    max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "5")),
+    pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    pool_pre_ping=os.getenv("DB_PRE_PING", "0") == "1",
+)
+
+def _on_connect(dbapi_conn, _record):
+    """새 DB 연결마다 한 번 search_path를 설정한다 (세션 단위로 유지되므로 쿼리마다 SET할 필요가 없다)."""
+    cur = dbapi_conn.cursor()
+    try:
+        cur.execute(f"SET search_path TO {SEARCH_PATH}")
+    finally:
+        cur.close()
+    dbapi_conn.commit()  # 트랜잭션 안의 SET은 롤백되면 되돌아가므로 바로 커밋
+
+if engine is not None: event.listen(engine, "connect", _on_connect)
+
+# 쿼리 지연 계측: run_query/run_prepared는 라벨(템플릿 이름 또는 SQL 형태)별 전체 시간,
+# "driver" 라벨은 커서 execute 자체(서버 실행 + 전송) 시간 — 두 값의 차이가 DataFrame 변환 비용이다.
+query_latency = LatencyRecorder(window=int(os.getenv("DB_LATENCY_WINDOW", "500")))
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("_query_start")
+    if starts:
+        seconds = time.perf_counter() - starts.pop()
+        query_latency.record("driver", seconds)
+        tracer.add("driver_ms", seconds * 1000)  # 현재 db.query span에 누적 → 전체 시간과의 차이가 DataFrame 변환
+
+if engine is not None:
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+def latency_stats() -> dict:
+    """{label: {"count", "p50_ms", "p95_ms", "max_ms", "last_ms", "rows_last"}}"""
+    return query_latency.summary()
+
+# 테이블 버전 probe: 통계 뷰의 삽입/수정/삭제 누적 건수 + PK 최댓값 (인덱스로 즉시 조회) — 한 번의 왕복
+TABLE_VERSION_SQL = """
+SELECT s.schemaname || '.' || s.relname AS tbl,
+       concat_ws('/', s.n_tup_ins, s.n_tup_upd, s.n_tup_del,
+                 CASE s.relname WHEN 'raw_data'  THEN (SELECT max(id) FROM data.raw_data)::text
+                                WHEN 'meta_data' THEN (SELECT max(summary_id) FROM data.meta_data)::text END) AS version
+FROM pg_stat_user_tables AS s
+WHERE (s.schemaname, s.relname) IN (('data', 'raw_data'), ('data', 'meta_data'), ('public', 'project6'));
+"""
+
+def table_versions() -> dict:
+    """{"data.raw_data": "ins/upd/del/max_id", ...} — 값이 바뀌면 해당 테이블을 참조하는 캐시 결과가 무효화된다."""
+    if local_backend: return local_backend.versions()  # Parquet 파일 수/크기/수정 시각
+    with engine.connect() as conn:
+        return {r.tbl: r.version for r in conn.execute(text(TABLE_VERSION_SQL))}
+
+# 결과 캐시 (RESULT_CACHE=0이면 끔)
+result_cache = None
+if os.getenv("RESULT_CACHE", "1") != "0":
+    result_cache = ResultCache(
+        probe=table_versions,
+        memory_budget=int(float(os.getenv("RESULT_CACHE_MB", "256")) * (1 << 20)),
+        spill_dir=os.getenv("RESULT_CACHE_DIR", os.path.join(os.path.dirname(__file__), '..', '.result_cache')),
+        disk_budget=int(float(os.getenv("RESULT_CACHE_DISK_MB", "2048")) * (1 << 20)),
+        probe_interval=float(os.getenv("RESULT_CACHE_PROBE_SEC", "2")),
+        max_query_stats=int(os.getenv("RESULT_CACHE_STATS_MAX", "1000")),
+    )
+
+def cancel_backend(pid: int) -> bool:
+    """
+    별도 연결에서 pg_cancel_backend(pid)를 호출해 해당 백엔드에서 실행 중인 쿼리를 중단한다.
+    """
+    with engine.connect() as conn:
+        return bool(conn.execute(text("SELECT pg_cancel_backend(:pid);"), {"pid": int(pid)}).scalar())
 
-def run_query(sql: str, params: dict | None = None) -> pd.DataFrame:
+def run_query(sql: str, params: dict | None = None, cancel_token=None, use_cache: bool = True,
+              timeout_ms: int | None = None) -> pd.DataFrame:
     """
     SQL을 실행하고 항상 pandas.DataFrame으로 반환한다.
-    - search_path는 매 호출마다 public, data로 설정
+    - search_path는 연결 생성 시 한 번 public, data로 설정된다 (_on_connect)
     - sql은 text()로 감싼다
+    - cancel_token(add_callback/remove_callback 제공)이 주어지면, 취소 시 pg_cancel_backend로 실행 중인 쿼리를 중단한다
+    - 결과 캐시가 켜져 있고 use_cache=True이면, 참조 테이블이 바뀌지 않은 동일 SQL은 캐시에서 반환한다
+    - timeout_ms가 주어지면 이 쿼리에만 statement_timeout을 건다
     """
+    with tracer.span("db.query", sql=sql_label(sql)) as span:
+        ticket = None
+        if use_cache and result_cache is not None:
+            df, ticket = result_cache.lookup(sql, params)
+            if df is not None:
+                span.set(cache="hit", rows=len(df))
+                return df
+
+        started = time.perf_counter()
+        df = _retry_on_disconnect(lambda: _execute(sql, params, cancel_token, timeout_ms))
+        _record_fetch(span, sql_label(sql), time.perf_counter() - started, df, "miss" if ticket is not None else None)
+        if ticket is not None:
+            result_cache.store(ticket, df)
+            return df.copy(deep=False)  # 호출자가 열을 추가/교체해도 캐시 원본은 그대로
+        return df
+
+def _record_fetch(span, label: str, seconds: float, df: pd.DataFrame, cache: str | None):
+    """지연 통계 + span 속성(행 수, 바이트, 캐시). driver 시간을 뺀 나머지는 db.convert(DataFrame 변환)로 따로 집계한다."""
+    query_latency.record(label, seconds, len(df))
+    span.set(rows=len(df), bytes=int(df.memory_usage(index=False).sum()), cache=cache)
+    driver_ms = span.attrs.get("driver_ms")
+    if driver_ms is not None: tracer.record("db.convert", max(seconds - driver_ms / 1000, 0.0), len(df))
+
+def _execute(sql: str, params: dict | None, cancel_token, timeout_ms: int | None = None) -> pd.DataFrame:
+    if local_backend: return local_backend.query(sql, params, cancel_token, timeout_ms)
+    with engine.connect() as conn:
+        _set_timeout(conn, timeout_ms)
+        with _cancellable(conn, cancel_token):
+            return pd.read_sql_query(text(sql), conn, params=params)
+
+def _set_timeout(conn, timeout_ms: int | None):
+    """현재 트랜잭션(= 이 쿼리)에만 statement_timeout을 건다. 연결이 풀로 돌아갈 때 롤백되며 함께 해제된다."""
+    if timeout_ms: conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+
+def explain_plan(sql: str, params: dict | None = None) -> dict:
+    """EXPLAIN (FORMAT JSON) 결과의 첫 항목 ({"Plan": {"Plan Rows", "Total Cost", ...}}). 쿼리를 실행하지는 않는다.
+    로컬 백엔드는 DuckDB EXPLAIN의 예상 행 수만 같은 모양으로 돌려준다 (비용은 0 — 확인 단계 없이 행 수 기준만 적용)."""
+    if local_backend: return local_backend.explain(sql, params)
+    with engine.connect() as conn:
+        return conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql.strip().rstrip(';')}"), params or {}).scalar()[0]
+
+def dry_run(sql: str):
+    """SQL을 실행하지 않고 검사한다 (오류면 예외). PostgreSQL은 EXPLAIN(계획만), 로컬 백엔드는 LIMIT 0으로 감싸 실행한다."""
+    body = sql.strip().rstrip(";")
+    if local_backend:
+        local_backend.query(f"SELECT * FROM ({body}) AS _dry_run LIMIT 0")
+        return
     with engine.connect() as conn:
-        conn.execute(text("SET LOCAL search_path TO public, data;"))
-        df = pd.read_sql_query(text(sql), conn, params=params)
+        conn.execute(text(f"EXPLAIN {body}"))
+
+# SQL 자체를 고치면 해결되는 오류: PostgreSQL SQLSTATE 42(문법 / 없는 컬럼·테이블 / 타입 불일치), 22(형식 변환 / 데이터 예외).
+# 권한 부족(42501), 시간 초과(57014), 연결 끊김 등은 SQL을 고쳐도 소용없다. DuckDB(로컬 백엔드)는 예외 클래스 이름으로 구분한다.
+_FIXABLE_SQLSTATE = ("42", "22")
+_UNFIXABLE_SQLSTATE = ("42501",)
+_FIXABLE_DUCKDB = ("ParserException", "BinderException", "CatalogException", "ConversionException", "InvalidInputException")
+
+def sql_error(e: BaseException, max_chars: int = 800) -> str | None:
+    """e가 SQL 자체의 오류이면 SQL 생성기에 돌려줄 오류 메시지(SQLAlchemy 꼬리말 제외), 아니면 None."""
+    orig = getattr(e, "orig", None) or e
+    code = getattr(orig, "pgcode", None)
+    if code: fixable = code[:2] in _FIXABLE_SQLSTATE and code not in _UNFIXABLE_SQLSTATE
+    else: fixable = type(orig).__name__ in _FIXABLE_DUCKDB
+    if not fixable: return None
+    message = str(orig).strip()
+    return message if len(message) <= max_chars else message[:max_chars] + " ..."
+
+def _retry_on_disconnect(fn):
+    """끊어진 풀 연결로 실패하면(서버 재시작, 유휴 연결 종료 등) 새 연결로 한 번 더 실행한다."""
+    try:
+        return fn()
+    except DBAPIError as e:
+        if not e.connection_invalidated: raise
+        return fn()
+
+# ── 준비된 문장(PREPARE / EXECUTE) ──────────────────────────────
+# 프로젝트 목록, 선택 프로젝트 요약처럼 매번 같은 모양으로 반복되는 쿼리는 연결마다 한 번 PREPARE해
+# 파싱/계획 비용을 아낀다. 준비 여부는 DB 연결 수명 동안 유지되는 connection.info에 기록한다.
+_prepared: dict = {}  # name -> (argtypes, sql)
+
+def register_prepared(name: str, sql: str, argtypes: Sequence[str] = ()):
+    """
+    반복 쿼리 템플릿을 등록한다. sql은 $1, $2 ... 위치 인자를 쓰고, argtypes는 그 PostgreSQL 타입(예: "int[]")이다.
+    """
+    if not name.isidentifier(): raise ValueError(f"준비된 문장 이름이 올바르지 않습니다: {name}")
+    _prepared[name] = (tuple(argtypes), sql.strip().rstrip(";"))
+
+def run_prepared(name: str, *args, use_cache: bool = True) -> pd.DataFrame:
+    """register_prepared로 등록한 템플릿을 EXECUTE하여 DataFrame으로 반환한다. 결과 캐시는 run_query와 같이 적용된다."""
+    argtypes, sql = _prepared[name]
+    params = {"args": list(args)}
+    with tracer.span("db.prepared", sql=name) as span:
+        ticket = None
+        if use_cache and result_cache is not None:
+            df, ticket = result_cache.lookup(sql, params)
+            if df is not None:
+                span.set(cache="hit", rows=len(df))
+                return df
+
+        started = time.perf_counter()
+        df = _retry_on_disconnect(lambda: _execute_prepared(name, argtypes, sql, args))
+        _record_fetch(span, name, time.perf_counter() - started, df, "miss" if ticket is not None else None)
+        if ticket is not None:
+            result_cache.store(ticket, df)
+            return df.copy(deep=False)
         return df
+
+def _execute_prepared(name: str, argtypes: tuple, sql: str, args: tuple) -> pd.DataFrame:
+    if local_backend: return local_backend.prepared(sql, args)
+    with engine.connect() as conn:
+        done = conn.connection.info.setdefault("prepared", set())
+        if name not in done:
+            types = f" ({', '.join(argtypes)})" if argtypes else ""
+            conn.exec_driver_sql(f"PREPARE {name}{types} AS {sql}")
+            done.add(name)
+        placeholders = f"({', '.join(['%s'] * len(args))})" if args else ""
+        result = conn.exec_driver_sql(f"EXECUTE {name}{placeholders}", tuple(args))
+        return pd.DataFrame.from_records(result.fetchall(), columns=list(result.keys()), coerce_float=True)
+
+def run_query_stream(sql: str, params: dict | None = None, chunk_rows: int = 50_000, cancel_token=None,
+                     timeout_ms: int | None = None) -> Iterator[pd.DataFrame]:
+    """
+    서버 측 커서(psycopg2 named cursor, stream_results + yield_per)로 결과를 chunk_rows행씩 DataFrame으로 내보낸다.
+    전체 결과를 한 번에 메모리에 올리지 않으므로 raw_data 대량 조회에 사용한다. 결과 캐시는 거치지 않는다.
+    결과가 비어 있으면 컬럼만 있는 빈 DataFrame 하나를 내보낸다.
+    """
+    started, rows_out, bytes_out = time.perf_counter(), 0, 0
+    span = tracer.start("db.stream", sql=sql_label(sql))  # 제너레이터라 with 대신 직접 끝낸다 (소비 시간은 호출자 몫이 섞인다)
+    chunks = (local_backend.stream(sql, params, chunk_rows, cancel_token, timeout_ms) if local_backend
+              else _stream_chunks(sql, params, chunk_rows, cancel_token, timeout_ms))
+    try:
+        for chunk in chunks:
+            rows_out += len(chunk)
+            bytes_out += int(chunk.memory_usage(index=False).sum())
+            yield chunk
+    except BaseException as e:
+        chunks.close()
+        span.set(rows=rows_out, bytes=bytes_out)
+        tracer.finish(span, None if isinstance(e, GeneratorExit) else e)  # 호출자가 중간에 그만 읽은 것은 오류가 아니다
+        raise
+    span.set(rows=rows_out, bytes=bytes_out)
+    tracer.finish(span)
+    query_latency.record(f"stream: {sql_label(sql)}", time.perf_counter() - started, rows_out)
+
+def _stream_chunks(sql: str, params: dict | None, chunk_rows: int, cancel_token, timeout_ms: int | None) -> Iterator[pd.DataFrame]:
+    with engine.connect() as conn:
+        _set_timeout(conn, timeout_ms)
+        with _cancellable(conn, cancel_token):
+            result = conn.execution_options(stream_results=True, yield_per=chunk_rows).execute(text(sql), params or {})
+            cols = list(result.keys())
+            emitted = False
+            for rows in result.partitions(chunk_rows):
+                emitted = True
+                yield pd.DataFrame.from_records(rows, columns=cols, coerce_float=True)
+            if not emitted:
+                yield pd.DataFrame(columns=cols)
+
+# ── 비동기 실행 (선택) ──────────────────────────────────────────
+# DB_ASYNC=1이고 asyncpg가 설치되어 있으면 SQLAlchemy AsyncEngine(postgresql+asyncpg)을 쓰고,
+# 아니면 동기 run_query를 스레드에서 실행한다. 어느 쪽이든 LLM 호출 등 다른 await와 겹쳐 실행할 수 있다.
+_async_engine = None
+
+def _get_async_engine():
+    global _async_engine
+    if _async_engine is None and os.getenv("DB_ASYNC", "0") == "1":
+        try:
+            import asyncpg  # noqa: F401
+            from sqlalchemy.engine import make_url
+            from sqlalchemy.ext.asyncio import create_async_engine
+        except ImportError:
+            print("⚠️ DB_ASYNC=1이지만 asyncpg가 설치되어 있지 않아 스레드 실행으로 대체합니다.")
+            os.environ["DB_ASYNC"] = "0"
+            return None
+        url = make_url(DB_URL).set(drivername="postgresql+asyncpg")
+        _async_engine = create_async_engine(
+            url,
+            pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "5")),
+            pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+            connect_args={"server_settings": {"search_path": SEARCH_PATH.replace(" ", "")}},
+        )
+    return _async_engine
+
+async def run_query_async(sql: str, params: dict | None = None, use_cache: bool = True) -> pd.DataFrame:
+    """run_query의 비동기 버전 (결과 캐시 공유)."""
+    import asyncio  # 비동기 경로에서만 (시작 시간)
+    aengine = _get_async_engine()
+    if aengine is None:
+        return await asyncio.to_thread(run_query, sql, params, None, use_cache)
+
+    ticket = None
+    if use_cache and result_cache is not None:
+        df, ticket = await asyncio.to_thread(result_cache.lookup, sql, params)
+        if df is not None: return df
+    started = time.perf_counter()
+    async with aengine.connect() as conn:
+        result = await conn.execute(text(sql), params or {})
+        df = pd.DataFrame.from_records(result.fetchall(), columns=list(result.keys()), coerce_float=True)
+    query_latency.record(sql_label(sql), time.perf_counter() - started, len(df))
+    if ticket is not None:
+        result_cache.store(ticket, df)
+        return df.copy(deep=False)
+    return df
+
+@contextmanager
+def _cancellable(conn, cancel_token):
+    """cancel_token이 취소되면 이 연결의 백엔드에서 실행 중인 쿼리를 pg_cancel_backend로 중단한다."""
+    if cancel_token is None:
+        yield
+        return
+    pid = conn.connection.info.get("backend_pid")
+    if pid is None:  # 연결마다 한 번만 조회
+        pid = conn.connection.info["backend_pid"] = conn.execute(text("SELECT pg_backend_pid();")).scalar()
+    # 취소 콜백은 별도 스레드에서 늦게 실행될 수 있다. 연결을 풀에 돌려준 뒤에는 같은 백엔드가 다른 요청의 쿼리를
+    # 실행 중일 수 있으므로, finally가 active를 내리면(진행 중인 취소가 끝날 때까지 기다림) 더는 취소하지 않는다.
+    lock, state = threading.Lock(), {"active": True}
+    def on_cancel():
+        with lock:
+            if state["active"]: cancel_backend(pid)
+    cancel_token.add_callback(on_cancel)
+    try:
+        yield
+    finally:
+        cancel_token.remove_callback(on_cancel)
+        with lock: state["active"] = False
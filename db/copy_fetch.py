@@ -0,0 +1,93 @@
+# db/copy_fetch.py
+"""
+COPY 기반 대량 조회 (Arrow)
+
+psycopg2의 행 단위 fetch + pandas object 변환 대신, SELECT를 `COPY (...) TO STDOUT WITH CSV`로 감싸
+서버가 만든 CSV 바이트를 pyarrow의 C++ CSV 파서(멀티스레드)로 곧바로 타입이 지정된 컬럼 버퍼로 읽는다.
+    - 컬럼 타입은 `LIMIT 0` 조회의 cursor.description(OID)으로 정해 추론 비용/오류를 없앤다.
+    - fetch_arrow: pyarrow.Table 반환. COPY 출력은 메모리에 모으지 않고 파이프로 흘려 pyarrow.csv.open_csv가
+      블록(8MB) 단위로 읽는다 (COPY는 보조 스레드에서 파이프에 쓴다) — CSV 바이트 사본 없이 Arrow 배치만 남는다.
+    - run_query_arrow: Arrow 버퍼를 그대로 쓰는(zero-copy) pandas.DataFrame(ArrowDtype) 반환
+params는 COPY에 바인딩할 수 없으므로 SQLAlchemy가 리터럴로 렌더링한다.
+"""
+import io, os, threading
+
+import pandas as pd
+import pyarrow as pa
+from pyarrow import csv as pa_csv
+from sqlalchemy import text
+
+from db.connector import engine, _cancellable, _set_timeout
+
+# PostgreSQL 타입 OID → Arrow 타입 (나머지는 문자열)
+_OID_TYPES = {
+    16: pa.bool_(), 20: pa.int64(), 21: pa.int16(), 23: pa.int32(), 26: pa.int64(),
+    700: pa.float32(), 701: pa.float64(), 1700: pa.float64(),
+    1082: pa.date32(), 1114: pa.timestamp("us"), 1184: pa.timestamp("us", tz="UTC"),
+}
+
+
+def _render(sql: str, params: dict | None) -> str:
+    sql = sql.strip().rstrip(";").strip()
+    if not params: return sql
+    return str(text(sql).bindparams(**params).compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+
+
+_READ_OPTIONS = dict(block_size=8 << 20)
+_CONVERT_OPTIONS = dict(
+    strings_can_be_null=True,          # COPY CSV: NULL은 따옴표 없는 빈 값, 빈 문자열은 ""로 구분된다
+    quoted_strings_can_be_null=False,
+    true_values=["t"], false_values=["f"],
+)
+
+
+def _copy_to_pipe(cur, copy_sql: str, wfd: int, error: list):
+    """[보조 스레드] COPY 출력을 파이프 쓰기 끝에 흘려 넣고 닫는다 (실패하면 error에 담는다)."""
+    try:
+        with open(wfd, "wb", buffering=1 << 20) as w:
+            cur.copy_expert(copy_sql, w)
+    except BaseException as e:
+        error.append(e)
+
+
+def fetch_arrow(sql: str, params: dict | None = None, cancel_token=None, timeout_ms: int | None = None) -> pa.Table:
+    """SELECT/WITH 쿼리 결과를 COPY → pyarrow.Table로 가져온다 (CSV는 파이프로 흘리며 배치 단위로 파싱)."""
+    query = _render(sql, params)
+    with engine.connect() as conn:
+        _set_timeout(conn, timeout_ms)
+        with _cancellable(conn, cancel_token):
+            cur = conn.connection.dbapi_connection.cursor()
+            try:
+                cur.execute(f"SELECT * FROM ({query}) AS _q LIMIT 0")
+                names = [d.name for d in cur.description]
+                types = {n: _OID_TYPES.get(d.type_code, pa.string()) for n, d in zip(names, cur.description)}
+                rfd, wfd = os.pipe()
+                error: list = []
+                writer = threading.Thread(target=_copy_to_pipe, name="copy-fetch", daemon=True,
+                                          args=(cur, f"COPY ({query}) TO STDOUT WITH (FORMAT csv)", wfd, error))
+                writer.start()
+                try:
+                    with open(rfd, "rb") as r:
+                        table = _read_csv_stream(r, names, types)
+                finally:  # 읽기 실패 시 읽기 끝이 닫혀 COPY 쪽 쓰기도 BrokenPipe로 끝난다
+                    writer.join()
+                if error: raise error[0]
+            finally:
+                cur.close()
+    return table
+
+
+def _read_csv_stream(r: io.BufferedReader, names: list, types: dict) -> pa.Table:
+    if not r.peek(1):  # 0행 — open_csv는 빈 입력을 받지 않는다
+        return pa.table({n: pa.array([], type=t) for n, t in types.items()})
+    reader = pa_csv.open_csv(
+        r,
+        read_options=pa_csv.ReadOptions(column_names=names, **_READ_OPTIONS),
+        convert_options=pa_csv.ConvertOptions(column_types=types, **_CONVERT_OPTIONS),
+    )
+    return pa.Table.from_batches(list(reader), schema=reader.schema)
+
+
+def run_query_arrow(sql: str, params: dict | None = None, cancel_token=None, timeout_ms: int | None = None) -> pd.DataFrame:
+    """fetch_arrow 결과를 Arrow 버퍼를 공유하는 pandas.DataFrame(ArrowDtype 컬럼)으로 반환한다."""
+    return fetch_arrow(sql, params, cancel_token, timeout_ms).to_pandas(types_mapper=pd.ArrowDtype)
@@ -0,0 +1,104 @@
+# db/cost_guard.py
+"""
+실행 전 비용 가드 (EXPLAIN 기반)
+
+LLM이 만든 SQL을 실행하기 전에 `EXPLAIN (FORMAT JSON)`으로 예상 행 수/비용을 읽고 다음 중 하나를 정한다.
+    - run:     그대로 실행
+    - stream:  예상 행 수 > stream_rows   → 서버 측 커서 스트리밍/표본 경로로 실행
+    - limit:   예상 행 수 > max_rows      → 최상위 LIMIT max_rows를 붙여 실행 (구문 트리에서 LIMIT/FETCH를 줄이거나 붙인다.
+               LIMIT ALL과 FETCH 없는 쿼리는 상한 없음으로 본다)
+    - confirm: 예상 비용 > confirm_cost   → 사용자 확인 후에만 실행
+모든 결정에는 쿼리별 statement_timeout(ms)이 함께 담긴다 (확인을 거친 쿼리는 confirmed_timeout_ms).
+EXPLAIN 자체가 실패하면(문법 오류 등) run으로 넘기고 예외를 error에 담는다 (호출 측이 실행 없이 바로 SQL을 고치거나,
+그대로 실행해 실제 실행에서 오류가 보고되게 한다).
+"""
+import re
+from typing import Callable, List
+
+from sqlglot import exp
+from sqlglot.errors import ParseError
+
+from nlq.sql_rewrite import parse, render
+
+_TRAILING_LIMIT_RE = re.compile(r"\bLIMIT\s+(\d+)(\s+OFFSET\s+\d+)?\s*;?\s*$", re.I)
+
+
+def seq_scans(plan: dict) -> List[str]:
+    """계획 트리에서 Seq Scan 대상 테이블 이름 목록."""
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name"):
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+def inject_limit(sql: str, limit: int) -> str:
+    """최상위 LIMIT / FETCH FIRST를 limit 이하로 맞춘다 (없거나 LIMIT ALL이면 붙이고, 더 크면 줄인다)."""
+    body = sql.strip().rstrip(";").rstrip()
+    try:
+        tree = parse(body)
+    except ParseError:
+        tree = None
+    if not isinstance(tree, exp.Query): return _inject_limit_regex(body, limit)
+    cap = tree.args.get("limit")
+    if isinstance(cap, exp.Fetch):
+        count = cap.args.get("count")
+        options = cap.args.get("limit_options")
+        if options is not None and options.args.get("percent"): count = None  # FETCH ... PERCENT는 행 수가 아니다
+    else:
+        count = cap.args.get("expression") if cap is not None else None
+    if cap is None or (isinstance(count, exp.Var) and count.name.upper() == "ALL"):
+        tree.set("limit", exp.Limit(expression=exp.Literal.number(limit)))
+    elif isinstance(count, exp.Literal) and not count.is_string and count.name.isdigit():
+        if int(count.name) <= limit: return body + ";"
+        count.replace(exp.Literal.number(limit))
+    else:  # 자리표시자 / 식 / PERCENT — 그대로 두고 바깥에서 자른다
+        tree = exp.select("*").from_(tree.subquery("_q")).limit(limit)
+    return render(tree)
+
+
+def _inject_limit_regex(body: str, limit: int) -> str:
+    """파싱할 수 없는 SQL용: 끝의 `LIMIT n`만 알아본다."""
+    m = _TRAILING_LIMIT_RE.search(body)
+    if m:
+        if int(m.group(1)) <= limit: return body + ";"
+        return f"{body[:m.start(1)]}{limit}{body[m.end(1):]};"
+    return f"{body} LIMIT {limit};"
+
+class CostGuard:
+    def __init__(self, explain: Callable[[str], dict], stream_rows: int = 100_000, max_rows: int = 2_000_000,
+                 confirm_cost: float = 1_000_000, timeout_ms: int = 60_000, confirmed_timeout_ms: int = 300_000):
+        self.explain = explain  # sql -> EXPLAIN (FORMAT JSON) 결과의 첫 항목 ({"Plan": {...}})
+        self.stream_rows = stream_rows
+        self.max_rows = max_rows
+        self.confirm_cost = confirm_cost
+        self.timeout_ms = timeout_ms
+        self.confirmed_timeout_ms = confirmed_timeout_ms
+
+    def check(self, sql: str, confirmed: bool = False) -> dict:
+        """
+        {"action": "run" | "stream" | "limit" | "confirm", "sql", "rows", "cost", "seq_scans", "reason", "timeout_ms", "error"}
+        confirmed=True(사용자가 이미 확인)이면 confirm 단계는 건너뛰고 긴 timeout을 쓴다.
+        """
+        decision = {"action": "run", "sql": sql, "rows": None, "cost": None, "seq_scans": [], "reason": "",
+                    "timeout_ms": self.confirmed_timeout_ms if confirmed else self.timeout_ms, "error": None}
+        try:
+            plan = self.explain(sql)["Plan"]
+        except Exception as e:
+            decision.update(reason=f"EXPLAIN 실패: {e}", error=e)
+            return decision
+
+        rows, cost = int(plan.get("Plan Rows", 0)), float(plan.get("Total Cost", 0.0))
+        scans = seq_scans(plan)
+        decision.update(rows=rows, cost=cost, seq_scans=scans)
+        scan_note = f", 전체 스캔: {', '.join(sorted(set(scans)))}" if scans else ""
+
+        if not confirmed and self.confirm_cost and cost > self.confirm_cost:
+            decision.update(action="confirm", reason=f"예상 비용 {cost:,.0f} > {self.confirm_cost:,.0f}{scan_note}")
+        elif self.max_rows and rows > self.max_rows:
+            decision.update(action="limit", sql=inject_limit(sql, self.max_rows),
+                            reason=f"예상 {rows:,}행 > {self.max_rows:,}행 → LIMIT {self.max_rows:,}{scan_note}")
+        elif self.stream_rows and rows > self.stream_rows:
+            decision.update(action="stream", reason=f"예상 {rows:,}행 > {self.stream_rows:,}행 → 스트리밍{scan_note}")
+        return decision
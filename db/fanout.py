@@ -0,0 +1,285 @@
+# db/fanout.py
+"""
+프로젝트별 병렬 분할 실행 (fan-out)
+
+`WHERE project_id IN (1,2,3,...)` 쿼리를 `project_id = 1`, `project_id = 2` ... 쿼리로 나눠 연결 풀 위에서
+스레드로 동시에 실행하고, 결과를 클라이언트에서 합친다. 프로젝트가 하나뿐인 raw_data 단일 테이블 쿼리는
+`layer BETWEEN a AND b` 구간으로 나눈다.
+    - concat:      분할 키(project_id / layer)로 그룹이 나뉘거나 집계가 없는 쿼리 → 부분 결과를 이어 붙임
+                   (각 부분에 LIMIT을 그대로 두고, 합친 뒤 ORDER BY → LIMIT을 다시 적용)
+    - reaggregate: 분할 키와 무관한 GROUP BY / 전체 집계 → 부분 쿼리는 SUM/COUNT/MIN/MAX(AVG는 SUM + COUNT)를
+                   반환하고 pandas로 다시 집계한 뒤 ORDER BY → LIMIT 적용
+하위 쿼리, WITH, UNION, 윈도 함수, OFFSET, (reaggregate에서) HAVING / DISTINCT 집계처럼 나눠 계산할 수 없는 쿼리는
+plan()이 None을 반환한다 (원본 그대로 실행).
+ORDER BY는 결과 컬럼(이름, 순번, SELECT 항목과 같은 식)만 지원한다. 문자열 정렬은 DB 콜레이션이 아닌 파이썬 순서를 따른다.
+"""
+import contextvars, re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+import pandas as pd
+
+_IN_RE = re.compile(r"(\b(?:\w+\.)?project_id)\s+IN\s*\(\s*(\d+(?:\s*,\s*\d+)*)\s*\)", re.I)
+_EQ_RE = re.compile(r"\b(?:\w+\.)?project_id\s*=\s*(\d+)\b", re.I)
+_REJECT_RE = re.compile(r"\b(WITH|UNION|INTERSECT|EXCEPT|OVER|OFFSET|FETCH|INTO|FOR\s+UPDATE)\b", re.I)
+_CLAUSE_RE = re.compile(r"\b(SELECT|FROM|WHERE|GROUP\s+BY|HAVING|ORDER\s+BY|LIMIT)\b", re.I)
+_AGG_RE = re.compile(r"^(sum|count|min|max|avg)\((.+)\)$", re.I | re.S)
+_ANY_AGG_RE = re.compile(r"\b(sum|count|min|max|avg|stddev\w*|variance|var_\w+|percentile_\w+|string_agg|array_agg|bool_\w+|every|mode)\s*\(", re.I)
+_RAW_SINGLE_RE = re.compile(r"^(?:data\.)?raw_data(?:\s+(?:AS\s+)?(\w+))?$", re.I)
+
+
+def _mask(sql: str) -> str:
+    """괄호/따옴표 안을 공백으로 가린 같은 길이의 문자열 — 최상위 키워드 위치만 찾기 위해 사용."""
+    out, depth, quote = [], 0, None
+    for ch in sql:
+        if quote:
+            out.append(" ")
+            if ch == quote: quote = None
+        elif ch in ("'", '"'):
+            quote = ch; out.append(" ")
+        elif ch == "(":
+            depth += 1; out.append(" ")
+        elif ch == ")":
+            depth -= 1; out.append(" ")
+        else:
+            out.append(ch if depth == 0 else " ")
+    return "".join(out)
+
+
+def _split_top(s: str, sep: str = ",") -> List[str]:
+    masked = _mask(s)
+    parts, start = [], 0
+    for i, ch in enumerate(masked):
+        if ch == sep:
+            parts.append(s[start:i].strip()); start = i + 1
+    parts.append(s[start:].strip())
+    return [p for p in parts if p]
+
+
+def _norm(expr: str) -> str:
+    return re.sub(r"\s+", "", expr).lower()
+
+
+def _bare(expr: str) -> str:
+    """m.project_id → project_id"""
+    return _norm(expr).split(".")[-1]
+
+
+def _clauses(sql: str) -> Optional[dict]:
+    body = sql.strip().rstrip(";").strip()
+    masked = _mask(body)
+    found = [(m.start(), m.end(), re.sub(r"\s+", " ", m.group(1).upper())) for m in _CLAUSE_RE.finditer(masked)]
+    names = [f[2] for f in found]
+    if not names or names[0] != "SELECT" or len(set(names)) != len(names): return None
+    order = ["SELECT", "FROM", "WHERE", "GROUP BY", "HAVING", "ORDER BY", "LIMIT"]
+    if [order.index(n) for n in names] != sorted(order.index(n) for n in names): return None
+    out = {}
+    for i, (s, e, name) in enumerate(found):
+        end = found[i + 1][0] if i + 1 < len(found) else len(body)
+        out[name] = body[e:end].strip()
+    return out
+
+
+def _item_name(expr: str, alias: Optional[str]) -> str:
+    """PostgreSQL이 붙이는 결과 컬럼 이름 (별칭 > 컬럼 이름 > 함수 이름)."""
+    if alias: return alias.strip('"') if alias.startswith('"') else alias.lower()
+    m = re.match(r"^(\w+)\s*\(", expr)
+    if m: return m.group(1).lower()
+    return _bare(expr).strip('"')
+
+
+class FanOut:
+    def __init__(self, runner: Callable[[str], pd.DataFrame], layer_bounds: Optional[Callable[[int], tuple]] = None,
+                 max_workers: int = 4, min_parts: int = 2, layer_parts: int = 4):
+        self.runner = runner              # 부분 SQL → DataFrame (호출자가 취소/타임아웃/캐시를 붙인다)
+        self.layer_bounds = layer_bounds  # project_id → (min_layer, max_layer), 없으면 레이어 구간 분할 안 함
+        self.max_workers = max_workers
+        self.min_parts = min_parts
+        self.layer_parts = layer_parts
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fanout")
+
+    # ── 계획 ───────────────────────────────────────────────────
+    def plan(self, sql: str) -> Optional[dict]:
+        """
+        {"mode": "concat" | "reaggregate", "parts": [부분 SQL...], "items", "keys", "order", "limit", "distinct"} 또는 None.
+        """
+        if len(re.findall(r"\bSELECT\b", sql, re.I)) != 1 or _REJECT_RE.search(_mask(sql)): return None
+        c = _clauses(sql)
+        if not c or "FROM" not in c or "WHERE" not in c: return None
+
+        select = c["SELECT"]
+        distinct = bool(re.match(r"DISTINCT\b", select, re.I))
+        if distinct: select = select[len("DISTINCT"):].strip()
+        if re.match(r"DISTINCT\s+ON\b", select, re.I): return None
+        items = []
+        for raw in _split_top(select):
+            m = re.match(r"^(.+?)(?:\s+AS\s+(\"[^\"]+\"|\w+))?$", raw, re.I | re.S)
+            expr, alias = m.group(1).strip(), m.group(2)
+            if expr == "*" or expr.endswith(".*"): expr, alias = expr, None
+            items.append({"expr": expr, "name": _item_name(expr, alias)})
+        keys = [_norm(g) for g in _split_top(c.get("GROUP BY", ""))]
+        keys = [_norm(items[int(k) - 1]["expr"]) if k.isdigit() and 0 < int(k) <= len(items) else k for k in keys]
+
+        # 분할 방식: 여러 프로젝트면 project_id별, 프로젝트 하나인 raw_data 단일 테이블이면 레이어 구간별
+        where = c["WHERE"]
+        in_matches = list(_IN_RE.finditer(where))
+        split_key, parts = None, None
+        if len(in_matches) == 1 and len({int(i) for i in in_matches[0].group(2).split(",")}) >= self.min_parts:
+            m = in_matches[0]
+            ids = sorted({int(i) for i in m.group(2).split(",")})
+            split_key = "project_id"
+            parts = [where[:m.start()] + f"{m.group(1)} = {pid}" + where[m.end():] for pid in ids]
+        elif self.layer_bounds and _RAW_SINGLE_RE.match(c["FROM"]):
+            pid = self._single_project(where, in_matches)
+            if pid is not None:
+                split_key = "layer"
+                parts = self._layer_ranges(where, pid, _RAW_SINGLE_RE.match(c["FROM"]).group(1))
+        if not parts or len(parts) < self.min_parts: return None
+
+        has_agg = any(_ANY_AGG_RE.search(it["expr"]) for it in items)
+        mode = "concat" if (not keys and not has_agg) or any(_bare(k) == split_key for k in keys) else "reaggregate"
+        if mode == "concat" and any(it["expr"] == "*" or it["expr"].endswith(".*") for it in items) and c.get("ORDER BY"):
+            return None  # SELECT *의 결과 컬럼을 ORDER BY와 대응시킬 수 없다
+
+        order = self._order_terms(c.get("ORDER BY", ""), items)
+        if order is None: return None
+        limit = int(c["LIMIT"]) if c.get("LIMIT", "").isdigit() else None
+        if c.get("LIMIT") and limit is None: return None
+
+        def build(select_sql: str, part_where: str, with_tail: bool) -> str:
+            q = f"SELECT {select_sql} FROM {c['FROM']} WHERE {part_where}"
+            if c.get("GROUP BY"): q += f" GROUP BY {c['GROUP BY']}"
+            if with_tail and c.get("HAVING"): q += f" HAVING {c['HAVING']}"
+            if with_tail and c.get("ORDER BY"): q += f" ORDER BY {c['ORDER BY']}"
+            if with_tail and limit is not None: q += f" LIMIT {limit}"
+            return q + ";"
+
+        if mode == "concat":
+            # DISTINCT는 부분마다 적용되고 합친 뒤 한 번 더 중복 제거한다
+            select_sql = c["SELECT"]
+            part_sqls = [build(select_sql, w, True) for w in parts]
+        else:
+            if c.get("HAVING") or distinct: return None
+            partial = self._partial_items(items, keys)
+            if partial is None: return None
+            part_sqls = [build(", ".join(partial), w, False) for w in parts]
+        return {"mode": mode, "parts": part_sqls, "items": items, "keys": keys, "order": order,
+                "limit": limit, "distinct": distinct, "split": split_key}
+
+    def _single_project(self, where: str, in_matches) -> Optional[int]:
+        if len(in_matches) == 1:
+            ids = {int(i) for i in in_matches[0].group(2).split(",")}
+            return ids.pop() if len(ids) == 1 else None
+        eq = _EQ_RE.findall(where)
+        return int(eq[0]) if len(eq) == 1 and not in_matches else None
+
+    def _layer_ranges(self, where: str, pid: int, alias: Optional[str]) -> Optional[List[str]]:
+        try:
+            lo, hi = self.layer_bounds(pid)
+        except Exception as e:
+            print(f"⚠️ 레이어 범위 조회 실패 (분할 안 함): {e}")
+            return None
+        if lo is None or hi is None or hi - lo + 1 < self.min_parts: return None
+        n = min(self.layer_parts, hi - lo + 1)
+        step = -(-(hi - lo + 1) // n)
+        col = f"{alias}.layer" if alias else "layer"
+        return [f"({where}) AND {col} BETWEEN {a} AND {min(a + step - 1, hi)}" for a in range(lo, hi + 1, step)]
+
+    @staticmethod
+    def _order_terms(order_sql: str, items: List[dict]) -> Optional[list]:
+        """ORDER BY 항목 → [(결과 컬럼 위치, 오름차순 여부, NULL 먼저 여부)]"""
+        terms = []
+        for term in _split_top(order_sql) if order_sql else []:
+            m = re.match(r"^(.+?)(?:\s+(ASC|DESC))?(?:\s+NULLS\s+(FIRST|LAST))?$", term, re.I | re.S)
+            expr = m.group(1).strip()
+            asc = (m.group(2) or "ASC").upper() == "ASC"
+            nulls_first = (m.group(3).upper() == "FIRST") if m.group(3) else not asc  # PostgreSQL 기본값
+            if expr.isdigit() and 0 < int(expr) <= len(items): pos = int(expr) - 1
+            else:
+                pos = next((i for i, it in enumerate(items) if _norm(it["expr"]) == _norm(expr)), None)
+                if pos is None: pos = next((i for i, it in enumerate(items) if it["name"] == expr.strip('"')), None)
+                if pos is None: pos = next((i for i, it in enumerate(items) if _bare(it["expr"]) == _bare(expr)), None)
+                if pos is None: return None
+            terms.append((pos, asc, nulls_first))
+        return terms
+
+    @staticmethod
+    def _partial_items(items: List[dict], keys: List[str]) -> Optional[List[str]]:
+        """reaggregate 부분 쿼리의 SELECT 목록 (__p{i}_s / __p{i}_c 열)."""
+        out = []
+        for i, it in enumerate(items):
+            e = _norm(it["expr"])
+            if e in keys or _bare(e) in {_bare(k) for k in keys}:
+                it["role"] = "key"; out.append(f"{it['expr']} AS __p{i}")
+                continue
+            m = _AGG_RE.match(it["expr"].strip())
+            if not m or re.match(r"\s*DISTINCT\b", m.group(2), re.I) or _ANY_AGG_RE.search(m.group(2)): return None
+            fn, arg = m.group(1).lower(), m.group(2)
+            it["role"] = fn
+            if fn == "avg": out += [f"SUM({arg}) AS __p{i}_s", f"COUNT({arg}) AS __p{i}_c"]
+            else: out.append(f"{fn.upper()}({arg}) AS __p{i}")
+        return out
+
+    # ── 실행 / 병합 ──────────────────────────────────────────────
+    def run(self, sql: str, runner: Optional[Callable[[str], pd.DataFrame]] = None) -> Optional[pd.DataFrame]:
+        """나눠 실행할 수 있으면 병합된 DataFrame, 아니면 None. 부분 하나라도 실패하면 남은 부분을 취소하고 예외를 올린다."""
+        plan = self.plan(sql)
+        if plan is None: return None
+        runner = runner or self.runner
+        # 부분 쿼리의 db.query span이 현재 요청 추적 아래에 붙도록 컨텍스트를 복사해 넘긴다
+        futures = [self._pool.submit(contextvars.copy_context().run, runner, part) for part in plan["parts"]]
+        try:
+            frames = [f.result() for f in futures]
+        except BaseException:
+            for f in futures: f.cancel()
+            raise
+        return self.merge(plan, frames)
+
+    def merge(self, plan: dict, frames: List[pd.DataFrame]) -> pd.DataFrame:
+        items = plan["items"]
+        if plan["mode"] == "concat":
+            df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+            if plan["distinct"]: df = df.drop_duplicates(ignore_index=True)
+        else:
+            df = self._reaggregate(items, plan["keys"], pd.concat(frames, ignore_index=True))
+        return self._order_limit(df, plan["order"], plan["limit"])
+
+    @staticmethod
+    def _reaggregate(items: List[dict], keys: List[str], parts: pd.DataFrame) -> pd.DataFrame:
+        key_cols = [f"__p{i}" for i, it in enumerate(items) if it["role"] == "key"]
+        agg = {}
+        for i, it in enumerate(items):
+            role = it["role"]
+            if role == "key": continue
+            if role == "avg":
+                agg[f"__p{i}_s"] = lambda s: s.sum(min_count=1)
+                agg[f"__p{i}_c"] = "sum"
+            elif role in ("sum",): agg[f"__p{i}"] = lambda s: s.sum(min_count=1)
+            elif role == "count": agg[f"__p{i}"] = "sum"
+            else: agg[f"__p{i}"] = role
+        if keys and key_cols:
+            g = parts.groupby(key_cols, dropna=False, sort=False).agg(agg).reset_index()
+        elif keys:  # GROUP BY 키를 SELECT하지 않은 경우는 키 없이 합칠 수 없다
+            raise ValueError("GROUP BY 키가 SELECT 목록에 없어 부분 결과를 다시 집계할 수 없습니다.")
+        else:
+            g = pd.DataFrame([{c: (f(parts[c]) if callable(f) else getattr(parts[c], f)()) for c, f in agg.items()}])
+        out = pd.DataFrame(index=g.index)
+        for i, it in enumerate(items):
+            if it["role"] == "avg":
+                s, n = g[f"__p{i}_s"].astype(float), g[f"__p{i}_c"]
+                out[i] = (s / n.where(n != 0)).astype(float)
+            else:
+                out[i] = g[f"__p{i}"]
+        out.columns = [it["name"] for it in items]
+        return out
+
+    @staticmethod
+    def _order_limit(df: pd.DataFrame, order: list, limit: Optional[int]) -> pd.DataFrame:
+        if order and not df.empty:
+            names = list(df.columns)
+            df = df.set_axis(range(len(names)), axis=1)
+            for pos, asc, nulls_first in reversed(order):  # 안정 정렬을 뒤 키부터 반복 → 다중 키 정렬
+                df = df.sort_values(pos, ascending=asc, na_position="first" if nulls_first else "last", kind="stable")
+            df = df.set_axis(names, axis=1).reset_index(drop=True)
+        if limit is not None: df = df.head(limit).reset_index(drop=True)
+        return df
@@ -0,0 +1,166 @@
+# db/local_backend.py
+"""
+로컬 분석 엔진 (DuckDB + Parquet, 오프라인 / 현장 PC용)
+
+중앙 PostgreSQL에 안정적으로 연결할 수 없는 장비에서, db/local_export.py로 내려받은 프로젝트별 Parquet 파일에
+같은 SQL을 실행한다. db/connector.py가 DB_BACKEND=duckdb(또는 DATABASE_URL 없이 LOCAL_DATA_DIR만 있을 때)이면
+run_query / run_prepared / run_query_stream / table_versions를 이 백엔드로 돌린다 (반환 형식은 같음).
+
+파일 구성 (LOCAL_DATA_DIR):
+    project6/part-0.parquet
+    meta_data/project_id=<id>/part-*.parquet      (hive 파티션 — project_id 조건이면 다른 프로젝트 파일은 열지 않음)
+    raw_data/project_id=<id>/part-*.parquet        (동기화마다 새 part 파일 추가, zstd 압축, (layer, time) 순 정렬)
+    _manifest.json                                 (테이블별 컬럼 순서, 프로젝트별 동기화 지점)
+    - 뷰: data.meta_data / data.raw_data / public.project6 (스키마 없이 쓴 이름도) → read_parquet. 새 파일은 다음 쿼리부터 보인다.
+    - 방언: nlq/sql_rewrite.to_duckdb (sqlglot). 정수 나눗셈은 PostgreSQL처럼 정수로.
+    - 취소: cancel_token → 커서 interrupt(), timeout_ms → 타이머로 interrupt (statement_timeout 대신).
+    - explain: DuckDB `EXPLAIN (FORMAT JSON)`의 예상 행 수를 PostgreSQL EXPLAIN과 같은 모양으로 (비용 모델이 없어 Total Cost는 0).
+"""
+import glob, json, os, re, threading
+from typing import Iterator, Optional
+
+import pandas as pd
+
+from nlq.sql_rewrite import to_duckdb
+
+TABLES = {"project6": "public", "meta_data": "data", "raw_data": "data"}  # 이름 → PostgreSQL 스키마
+PARTITIONED = ("meta_data", "raw_data")                                    # project_id=<id> 디렉터리로 나눔
+_SCAN_NODES = ("READ_PARQUET", "SEQ_SCAN", "TABLE_SCAN")                   # EXPLAIN에서 전체 스캔으로 볼 노드
+MANIFEST = "_manifest.json"
+_NAMED_PARAM = re.compile(r"(?<![:\w]):([A-Za-z_]\w*)")  # SQLAlchemy text()의 :name → DuckDB $name
+
+
+def table_glob(root: str, name: str) -> str:
+    return os.path.join(root, name, "project_id=*", "*.parquet") if name in PARTITIONED else os.path.join(root, name, "*.parquet")
+
+
+def read_manifest(root: str) -> dict:
+    try:
+        with open(os.path.join(root, MANIFEST), encoding="utf-8") as f: return json.load(f)
+    except (OSError, ValueError):
+        return {"tables": {}}
+
+
+def _pg_plan(node: dict) -> dict:
+    """DuckDB EXPLAIN 노드 → PostgreSQL EXPLAIN (FORMAT JSON) 모양. 예상 행 수가 없는 노드(집계 등)는 자식 값을 쓴다."""
+    children = [_pg_plan(c) for c in node.get("children", [])]
+    info = node.get("extra_info") or {}
+    rows = info.get("Estimated Cardinality")
+    name = node.get("name", "").strip()
+    return {"Node Type": "Seq Scan" if name in _SCAN_NODES else name,
+            "Plan Rows": int(rows) if str(rows or "").isdigit() else max((c["Plan Rows"] for c in children), default=0),
+            "Total Cost": 0.0, "Plans": children}
+
+
+class LocalBackend:
+    def __init__(self, root: str, threads: Optional[int] = None, memory_limit: Optional[str] = None):
+        import duckdb  # duckdb 필요 — 로컬 백엔드를 쓸 때만 import
+        if not os.path.isdir(root): raise ValueError(f"LOCAL_DATA_DIR 폴더가 없습니다: {root}")
+        self.root = os.path.abspath(root)
+        self._duckdb = duckdb
+        self._con = duckdb.connect(":memory:")
+        self._con.execute("SET GLOBAL integer_division = true")  # PostgreSQL: 정수 / 정수 = 정수
+        if threads: self._con.execute(f"SET threads = {int(threads)}")
+        if memory_limit: self._con.execute(f"SET memory_limit = '{memory_limit}'")
+        for schema in set(TABLES.values()): self._con.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+        self._views: set = set()
+        self._lock = threading.Lock()
+        self._ensure_views()
+
+    # ── 뷰 ───────────────────────────────────────────────────────
+    def _ensure_views(self):
+        """파일이 생긴 테이블의 뷰를 만든다 (처음 동기화되기 전의 테이블은 건너뜀)."""
+        if len(self._views) == len(TABLES): return
+        with self._lock:
+            columns = read_manifest(self.root).get("tables", {})
+            for name, schema in TABLES.items():
+                if name in self._views or not glob.glob(table_glob(self.root, name)): continue
+                path = table_glob(self.root, name).replace("'", "''")
+                source = (f"read_parquet('{path}', hive_partitioning = true, hive_types = {{'project_id': INTEGER}}, union_by_name = true)"
+                          if name in PARTITIONED else f"read_parquet('{path}', union_by_name = true)")
+                cols = columns.get(name, {}).get("columns")
+                select = ", ".join(f'"{c}"' for c in cols) if cols else "*"  # PostgreSQL과 같은 컬럼 순서 (파티션 컬럼이 뒤로 가지 않게)
+                self._con.execute(f"CREATE OR REPLACE VIEW {schema}.{name} AS SELECT {select} FROM {source}")
+                self._con.execute(f"CREATE OR REPLACE VIEW main.{name} AS SELECT * FROM {schema}.{name}")
+                self._views.add(name)
+
+    def tables(self) -> list:
+        self._ensure_views()
+        return sorted(self._views)
+
+    # ── 실행 ─────────────────────────────────────────────────────
+    @staticmethod
+    def translate(sql: str, params: Optional[dict] = None) -> str:
+        if params: sql = _NAMED_PARAM.sub(r"$\1", sql)
+        return to_duckdb(sql)
+
+    def _cursor(self, cancel_token=None, timeout_ms: Optional[int] = None):
+        self._ensure_views()
+        cur = self._con.cursor()  # 호출 스레드마다 별도 커서 (같은 메모리 DB / 뷰)
+        stops = []
+        if cancel_token is not None:
+            cancel_token.add_callback(cur.interrupt)
+            stops.append(lambda: cancel_token.remove_callback(cur.interrupt))
+        if timeout_ms:
+            timer = threading.Timer(timeout_ms / 1000.0, cur.interrupt)
+            timer.daemon = True
+            timer.start()
+            stops.append(timer.cancel)
+        return cur, stops
+
+    @staticmethod
+    def _release(cur, stops):
+        for stop in stops: stop()
+        cur.close()
+
+    def query(self, sql: str, params: Optional[dict] = None, cancel_token=None, timeout_ms: Optional[int] = None) -> pd.DataFrame:
+        cur, stops = self._cursor(cancel_token, timeout_ms)
+        try:
+            return cur.execute(self.translate(sql, params), params or None).df()
+        finally:
+            self._release(cur, stops)
+
+    def explain(self, sql: str, params: Optional[dict] = None) -> dict:
+        """cost_guard용 계획 요약: {"Plan": {"Node Type", "Plan Rows", "Total Cost": 0.0, "Plans"}} (쿼리는 실행하지 않음)."""
+        cur, stops = self._cursor()
+        try:
+            rows = cur.execute(f"EXPLAIN (FORMAT JSON) {self.translate(sql, params)}", params or None).fetchall()
+        finally:
+            self._release(cur, stops)
+        return {"Plan": _pg_plan(json.loads(rows[0][1])[0])}
+
+    def prepared(self, sql: str, args: tuple) -> pd.DataFrame:
+        """register_prepared 템플릿($1, $2 ... 위치 인자, 배열 인자는 리스트)."""
+        cur, stops = self._cursor()
+        try:
+            return cur.execute(to_duckdb(sql), [list(a) if isinstance(a, (list, tuple)) else a for a in args]).df()
+        finally:
+            self._release(cur, stops)
+
+    def stream(self, sql: str, params: Optional[dict] = None, chunk_rows: int = 50_000, cancel_token=None,
+               timeout_ms: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """chunk_rows행씩 DataFrame (Arrow 레코드 배치 → pandas). 결과가 비어 있으면 컬럼만 있는 빈 DataFrame 하나."""
+        cur, stops = self._cursor(cancel_token, timeout_ms)
+        try:
+            reader = cur.execute(self.translate(sql, params), params or None).fetch_record_batch(chunk_rows)
+            emitted = False
+            for batch in reader:
+                if batch.num_rows == 0: continue
+                emitted = True
+                yield batch.to_pandas()
+            if not emitted:
+                yield reader.schema.empty_table().to_pandas()
+        finally:
+            self._release(cur, stops)
+
+    def versions(self) -> dict:
+        """{"data.raw_data": "파일 수/전체 크기/최근 수정 시각", ...} — 동기화로 파일이 바뀌면 결과 캐시가 무효화된다."""
+        out = {}
+        for name, schema in TABLES.items():
+            files = glob.glob(table_glob(self.root, name))
+            stats = [os.stat(f) for f in files]
+            out[f"{schema}.{name}"] = f"{len(files)}/{sum(s.st_size for s in stats)}/{max((s.st_mtime_ns for s in stats), default=0)}"
+        return out
+
+    def close(self):
+        self._con.close()
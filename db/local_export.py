@@ -0,0 +1,137 @@
+# db/local_export.py
+"""
+로컬 분석용 Parquet 내보내기 / 동기화 (db/local_backend.py가 읽는 파일을 만든다)
+
+중앙 PostgreSQL에 연결할 수 있을 때 실행해 프로젝트별 project6 / meta_data / raw_data를 LOCAL_DATA_DIR 아래에 쓴다.
+    - 조회: COPY → Arrow (db/copy_fetch.fetch_arrow), raw_data는 id 구간(--batch-rows)씩 나눠 메모리를 일정하게 유지
+    - 파일: zstd 압축 Parquet, project_id=<id> hive 파티션 (파일 안에는 project_id 컬럼 없음),
+      raw_data는 (layer, time) 순으로 정렬해 row group 통계로 레이어/시간 조건을 건너뛸 수 있게 한다
+    - 증분: raw_data 파일 이름 part-<lo>-<hi>.parquet이 (lo, hi] id 구간이다. 다음 동기화는 가장 큰 hi 이후만 가져온다
+      (중간에 끊겨도 다 쓴 파일까지가 동기화 지점). meta_data / project6는 작으므로 매번 다시 쓴다.
+      raw_data 행의 수정/삭제는 추적하지 않으므로 그런 경우에는 --full로 다시 쓴다.
+    - 파일은 임시 이름으로 쓴 뒤 바꿔 넣으므로 동기화 중에도 로컬 앱이 반쯤 쓴 파일을 읽지 않는다.
+
+사용법:
+    python -m db.local_export --out D:/ded_local --ids 1,2      # 선택 프로젝트 동기화 (증분)
+    python -m db.local_export --out D:/ded_local --all          # 모든 프로젝트
+    python -m db.local_export --out D:/ded_local --ids 3 --full # 프로젝트 3을 처음부터 다시 씀
+"""
+import argparse, glob, json, os, re, shutil, time
+from typing import Callable, Iterable, List, Optional
+
+from db.local_backend import MANIFEST, TABLES, read_manifest
+
+_PART_RE = re.compile(r"part-(\d+)-(\d+)\.parquet$")
+
+
+def _write(table, path: str, compression: str, row_group: int):
+    import pyarrow.parquet as pq
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    pq.write_table(table, tmp, compression=compression, row_group_size=row_group)
+    os.replace(tmp, path)
+
+
+def _write_manifest(out: str, manifest: dict):
+    tmp = os.path.join(out, MANIFEST + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f: json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, os.path.join(out, MANIFEST))
+
+
+def raw_watermark(out: str, pid: int) -> int:
+    """이미 내보낸 raw_data의 마지막 id (파일 이름의 구간 끝)."""
+    his = [int(m.group(2)) for f in glob.glob(os.path.join(out, "raw_data", f"project_id={pid}", "part-*.parquet"))
+           for m in [_PART_RE.search(f)] if m]
+    return max(his, default=0)
+
+
+def export(out: str, ids: Optional[Iterable[int]] = None, full: bool = False, batch_rows: int = 1_000_000,
+           compression: str = "zstd", row_group: int = 128 * 1024, fetch: Optional[Callable] = None,
+           progress: Callable[[str], None] = print) -> dict:
+    """ids(None이면 모든 프로젝트)를 out에 동기화하고 {"projects", "tables": {name: 쓴 행 수}, "files", "seconds"}를 돌려준다."""
+    if fetch is None:
+        from db.copy_fetch import fetch_arrow as fetch  # DATABASE_URL 필요
+    started = time.perf_counter()
+    os.makedirs(out, exist_ok=True)
+    manifest = read_manifest(out)
+    tables = manifest.setdefault("tables", {})
+    projects = fetch("SELECT * FROM public.project6 ORDER BY project_id")
+    all_ids = projects.column("project_id").to_pylist()
+    ids = sorted(all_ids if ids is None else {int(i) for i in ids})
+    missing = set(ids) - set(all_ids)
+    if missing: raise ValueError(f"project6에 없는 project_id: {sorted(missing)}")
+    written = {name: 0 for name in TABLES}
+    files = 0
+
+    # project6: 이전에 내보낸 프로젝트 + 이번 프로젝트
+    keep = sorted(set(ids) | set(manifest.get("projects", [])))
+    import pyarrow as pa, pyarrow.compute as pc
+    part = projects.filter(pc.is_in(projects.column("project_id"), value_set=pa.array(keep, type=projects.schema.field("project_id").type)))
+    _write(part, os.path.join(out, "project6", "part-0.parquet"), compression, row_group)
+    tables["project6"] = {"columns": projects.column_names}
+    written["project6"], files = part.num_rows, files + 1
+
+    for pid in ids:
+        # meta_data: 작으므로 매번 다시 씀
+        meta = fetch(f"SELECT * FROM data.meta_data WHERE project_id = {pid} ORDER BY layer_number")
+        tables["meta_data"] = {"columns": meta.column_names}
+        _write(meta.drop(["project_id"]), os.path.join(out, "meta_data", f"project_id={pid}", "part-0.parquet"), compression, row_group)
+        written["meta_data"] += meta.num_rows
+        files += 1
+
+        # raw_data: (lo, hi] id 구간씩 증분
+        pdir = os.path.join(out, "raw_data", f"project_id={pid}")
+        if full and os.path.isdir(pdir): shutil.rmtree(pdir)
+        bounds = fetch(f"SELECT min(id) - 1 AS lo, max(id) AS hi FROM data.raw_data WHERE project_id = {pid}")
+        lo = max(raw_watermark(out, pid), bounds.column("lo")[0].as_py() or 0)
+        top = bounds.column("hi")[0].as_py() or 0
+        while lo < top:
+            hi = min(lo + batch_rows, top)
+            raw = fetch(f"SELECT * FROM data.raw_data WHERE project_id = {pid} AND id > {lo} AND id <= {hi}")
+            if raw.num_rows:
+                tables["raw_data"] = {"columns": raw.column_names}
+                raw = raw.sort_by([("layer", "ascending"), ("time", "ascending"), ("id", "ascending")]).drop(["project_id"])
+                _write(raw, os.path.join(pdir, f"part-{lo:012d}-{hi:012d}.parquet"), compression, row_group)
+                written["raw_data"] += raw.num_rows
+                files += 1
+            lo = hi
+        progress(f"  프로젝트 {pid}: meta_data {meta.num_rows:,}행, raw_data 동기화 지점 id {lo:,}")
+        manifest["projects"] = sorted(set(manifest.get("projects", [])) | {pid})
+        manifest["synced_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        _write_manifest(out, manifest)
+
+    _write_manifest(out, manifest)
+    return {"projects": ids, "tables": written, "files": files, "seconds": round(time.perf_counter() - started, 2)}
+
+
+def _size(out: str) -> int:
+    return sum(os.path.getsize(f) for f in glob.glob(os.path.join(out, "**", "*.parquet"), recursive=True))
+
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="PostgreSQL → 로컬 Parquet 내보내기 / 증분 동기화")
+    ap.add_argument("--out", default=os.getenv("LOCAL_DATA_DIR"), help="내보낼 폴더 (기본: LOCAL_DATA_DIR)")
+    ap.add_argument("--ids", help="프로젝트 id 목록 (예: 1,2)")
+    ap.add_argument("--all", action="store_true", help="모든 프로젝트")
+    ap.add_argument("--full", action="store_true", help="raw_data를 증분 대신 처음부터 다시 씀")
+    ap.add_argument("--batch-rows", type=int, default=1_000_000, help="raw_data를 나눠 가져올 id 구간 크기")
+    ap.add_argument("--compression", default="zstd", help="Parquet 압축 (zstd | snappy | gzip | none)")
+    ap.add_argument("--row-group", type=int, default=128 * 1024, help="Parquet row group 행 수")
+    ap.add_argument("--json", action="store_true", help="결과를 JSON으로 출력")
+    args = ap.parse_args(argv)
+    if not args.out: ap.error("--out 또는 LOCAL_DATA_DIR이 필요합니다.")
+    if not args.ids and not args.all: ap.error("--ids 또는 --all이 필요합니다.")
+    ids = None if args.all else [int(x) for x in args.ids.split(",") if x.strip()]
+    result = export(args.out, ids, full=args.full, batch_rows=args.batch_rows, compression=args.compression,
+                    row_group=args.row_group, progress=(lambda _m: None) if args.json else print)
+    result["bytes"] = _size(args.out)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False))
+    else:
+        t = result["tables"]
+        print(f"✅ {len(result['projects'])}개 프로젝트: project6 {t['project6']:,}행, meta_data {t['meta_data']:,}행, "
+              f"raw_data {t['raw_data']:,}행 (새로 쓴 행), 파일 {result['files']}개, {result['seconds']}초, 폴더 크기 {result['bytes'] / 2**20:,.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
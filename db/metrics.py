@@ -0,0 +1,52 @@
+# db/metrics.py
+"""
+쿼리 지연 계측 (LatencyRecorder)
+
+라벨(쿼리 템플릿 이름 또는 정규화된 SQL 형태)별로 최근 window개의 실행 시간/행 수를 보관하고
+count / p50 / p95 / max / 마지막 값을 요약한다. 스레드 안전.
+"""
+import re, threading, time
+from collections import defaultdict, deque
+from typing import Dict, Optional
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def sql_label(sql: str, max_len: int = 80) -> str:
+    """리터럴/숫자를 ?로 바꾸고 공백을 정리한 SQL 형태 — 같은 모양의 쿼리를 한 라벨로 묶는다."""
+    shape = _LITERAL_RE.sub("?", re.sub(r"\s+", " ", sql.strip().rstrip(";")))
+    shape = re.sub(r"\?(?:\s*,\s*\?)+", "?", shape)  # IN (1,2,3) → IN (?)
+    return shape[:max_len]
+
+
+def percentile(sorted_values, q: float) -> float:
+    if not sorted_values: return 0.0
+    k = (len(sorted_values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+class LatencyRecorder:
+    def __init__(self, window: int = 500):
+        self._samples: Dict[str, deque] = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def record(self, label: str, seconds: float, rows: Optional[int] = None):
+        with self._lock:
+            self._samples[label].append((time.time(), seconds, rows))
+
+    def summary(self) -> Dict[str, dict]:
+        """{label: {"count", "p50_ms", "p95_ms", "max_ms", "last_ms", "rows_last"}}"""
+        with self._lock:
+            snapshot = {k: list(v) for k, v in self._samples.items()}
+        out = {}
+        for label, samples in snapshot.items():
+            secs = sorted(s[1] for s in samples)
+            out[label] = {"count": len(samples), "p50_ms": percentile(secs, 0.5) * 1000,
+                          "p95_ms": percentile(secs, 0.95) * 1000, "max_ms": secs[-1] * 1000,
+                          "last_ms": samples[-1][1] * 1000, "rows_last": samples[-1][2]}
+        return out
+
+    def clear(self):
+        with self._lock: self._samples.clear()
@@ -0,0 +1,205 @@
+# db/prefetch.py
+"""
+프로젝트 선택 시 미리 읽기 + meta_data 로컬 실행 (DuckDB)
+
+프로젝트 체크가 바뀌면 요약 쿼리 하나만 돌고, 나머지는 첫 질문이 올 때까지 아무것도 준비하지 않았다.
+Prefetcher.prefetch(ids)는 백그라운드 스레드에서 다음을 한다 (새 선택이 오면 이전 작업은 단계 사이에서 멈춤).
+    1) 연결 풀 예열: warm_connections개 연결을 동시에 열어 SELECT 1 (첫 질문이 TCP/인증/search_path 설정을 기다리지 않게)
+    2) 선택 프로젝트의 data.meta_data / public.project6 행을 Arrow로 받아(db/copy_fetch.fetch_arrow) 메모리 DuckDB에 적재
+    3) 예시 쿼리(EXAMPLE_QUERIES) 결과를 미리 계산: meta_data/project6만 읽으면 DuckDB에서, raw_data를 읽으면 PostgreSQL에서
+run(sql, ids)는 선택이 적재된 프로젝트 집합 안이고 SQL이 적재된 테이블만 읽으면 PostgreSQL 왕복 없이 DuckDB에서 실행한다.
+    - 방언 변환은 nlq/sql_rewrite.to_duckdb (sqlglot). 정수 나눗셈은 PostgreSQL처럼 정수로 (SET integer_division).
+    - DuckDB에서 실패하면 None → 호출자가 PostgreSQL로 실행한다.
+    - 신선도: probe(테이블 버전, db.connector.table_versions)를 probe_interval초마다 확인해 바뀌었으면 적재본을 버리고 다시 읽는다.
+duckdb가 설치되어 있지 않으면 DUCKDB_OK=False (app.py는 미리 읽기를 끈다).
+"""
+import importlib.util, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+import pandas as pd
+from sqlalchemy import text
+
+from db.tracing import tracer
+from nlq.sql_rewrite import normalize_sql, referenced_tables, to_duckdb
+
+DUCKDB_OK = importlib.util.find_spec("duckdb") is not None  # 선택 의존성 — import는 첫 적재 때 (시작 시간)
+
+LOCAL_TABLES = {"meta_data": "data", "project6": "public"}  # 적재 대상: 이름 → PostgreSQL 스키마
+
+
+class Snapshot:
+    """한 프로젝트 집합의 적재본 (DuckDB 연결 + 미리 계산한 결과)."""
+    def __init__(self, ids: frozenset, con, tables: Dict[str, int], versions: Optional[dict]):
+        self.ids, self.con, self.tables, self.versions = ids, con, tables, versions
+        self.results: Dict[str, pd.DataFrame] = {}  # normalize_sql(sql) → 결과
+        self.loaded_at = self.checked_at = time.time()
+
+    def query(self, sql: str) -> pd.DataFrame:
+        cur = self.con.cursor()  # 워커 스레드마다 별도 커서 (같은 메모리 DB)
+        try:
+            return cur.execute(to_duckdb(sql)).df()
+        finally:
+            cur.close()
+
+    def close(self):
+        try: self.con.close()
+        except Exception: pass
+
+
+class Prefetcher:
+    def __init__(self, engine, fetch: Callable[[str], "object"], run_query: Callable[[str], pd.DataFrame],
+                 templates: Iterable[str] = (), prepare: Optional[Callable[[str, List[int]], str]] = None,
+                 probe: Optional[Callable[[], dict]] = None, probe_interval: float = 30.0,
+                 warm_connections: int = 2, max_rows: int = 1_000_000):
+        """
+        fetch: SQL → pyarrow.Table (적재용), run_query: SQL → DataFrame (raw_data 예시 쿼리 미리 계산용)
+        templates: 예시 SQL ({{ids}} 자리표시자), prepare(sql, ids): 파이프라인과 같은 정제 + 프로젝트 필터 주입
+        """
+        self.engine, self.fetch, self.run_query = engine, fetch, run_query
+        self.templates, self.prepare = list(templates), prepare
+        self.probe, self.probe_interval = probe, probe_interval
+        self.warm_connections, self.max_rows = warm_connections, max_rows
+        self._snapshot: Optional[Snapshot] = None
+        self._target: Optional[frozenset] = None
+        self._gen = 0
+        self._lock = threading.Lock()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._pool = ThreadPoolExecutor(1, thread_name_prefix="prefetch")
+        self.counters = {"loads": 0, "precomputed": 0, "local": 0, "hits": 0, "misses": 0, "errors": 0, "stale": 0}
+        self.last_load_ms: Optional[float] = None
+
+    # ── 미리 읽기 (백그라운드) ────────────────────────────────────
+    def prefetch(self, ids: Iterable[int]):
+        """ids 집합의 적재를 예약한다 (이미 적재됐거나 적재 중이면 아무것도 안 함). GUI 스레드에서 불러도 바로 돌아온다."""
+        key = frozenset(int(i) for i in ids or [])
+        with self._lock:
+            if not key or key == self._target: return
+            self._target = key
+            self._gen += 1
+            gen = self._gen
+            self._idle.clear()
+        self._pool.submit(self._load, key, gen)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """진행 중인 적재가 끝날 때까지 기다린다 (배치 / 벤치마크용)."""
+        return self._idle.wait(timeout)
+
+    def _current(self, gen: int) -> bool:
+        return gen == self._gen
+
+    def _load(self, ids: frozenset, gen: int):
+        started = time.perf_counter()
+        try:
+            with tracer.span("prefetch", projects=len(ids)) as span:
+                self._warm_pool()
+                if not self._current(gen): return
+                versions = self.probe() if self.probe else None
+                csv = ",".join(map(str, sorted(ids)))
+                import duckdb
+                con = duckdb.connect(":memory:")
+                con.execute("SET GLOBAL integer_division = true")  # PostgreSQL: 정수 / 정수 = 정수
+                tables = {}
+                for name, schema in LOCAL_TABLES.items():
+                    table = self.fetch(f"SELECT * FROM {schema}.{name} WHERE project_id IN ({csv})")
+                    if table.num_rows > self.max_rows: continue  # 너무 크면 이 테이블은 PostgreSQL에서
+                    con.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+                    con.register("_arrow", table)
+                    con.execute(f"CREATE TABLE {schema}.{name} AS SELECT * FROM _arrow")  # DuckDB 컬럼 저장소로 복사
+                    con.unregister("_arrow")
+                    con.execute(f"CREATE VIEW main.{name} AS SELECT * FROM {schema}.{name}")  # 스키마 없이 쓴 이름
+                    tables[name] = table.num_rows
+                snap = Snapshot(ids, con, tables, versions)
+                with self._lock:
+                    if not self._current(gen):
+                        snap.close(); return
+                    old, self._snapshot = self._snapshot, snap
+                if old is not None: old.close()
+                self.counters["loads"] += 1
+                self._precompute(snap, gen)
+                span.set(tables=tables, precomputed=len(snap.results))
+        except Exception as e:
+            print(f"⚠️ 미리 읽기 실패: {e}")
+            tracer.error(f"미리 읽기 실패: {e}")
+            with self._lock:
+                if self._current(gen): self._target = None  # 같은 선택으로 다시 시도할 수 있게
+        finally:
+            if self._current(gen):
+                self.last_load_ms = (time.perf_counter() - started) * 1000
+                self._idle.set()
+
+    def _warm_pool(self):
+        conns = []
+        try:
+            for _ in range(self.warm_connections): conns.append(self.engine.connect())
+            for conn in conns: conn.execute(text("SELECT 1"))
+        except Exception as e:
+            print(f"⚠️ 연결 풀 예열 실패: {e}")
+        finally:
+            for conn in conns: conn.close()  # 풀로 돌아가 첫 질문이 재사용
+
+    def _precompute(self, snap: Snapshot, gen: int):
+        ids = sorted(snap.ids)
+        for tpl in self.templates:
+            if not self._current(gen): return
+            sql = tpl.replace("{{ids}}", ",".join(map(str, ids))).replace("{ids}", ",".join(map(str, ids)))
+            if self.prepare: sql = self.prepare(sql, ids)
+            try:
+                df = snap.query(sql) if self._local_ok(snap, sql) else self.run_query(sql)
+            except Exception as e:
+                print(f"⚠️ 예시 쿼리 미리 계산 실패: {e}")
+                continue
+            snap.results[normalize_sql(sql)] = df
+            self.counters["precomputed"] += 1
+
+    # ── 로컬 실행 ────────────────────────────────────────────────
+    @staticmethod
+    def _local_ok(snap: Snapshot, sql: str) -> bool:
+        tables = referenced_tables(sql)
+        return bool(tables) and tables <= set(snap.tables)
+
+    def _fresh(self, snap: Snapshot) -> bool:
+        if self.probe is None or time.time() - snap.checked_at < self.probe_interval: return True
+        try: versions = self.probe()
+        except Exception: return False
+        if versions != snap.versions:
+            self.counters["stale"] += 1
+            with self._lock:
+                if self._snapshot is snap: self._snapshot, self._target = None, None
+            self.prefetch(snap.ids)  # 바뀐 데이터로 다시 읽기
+            return False
+        snap.checked_at = time.time()
+        return True
+
+    def run(self, sql: str, ids: Iterable[int]) -> Optional[pd.DataFrame]:
+        """적재본으로 답할 수 있으면 결과 DataFrame, 아니면 None (PostgreSQL로 실행)."""
+        snap, ids = self._snapshot, {int(i) for i in ids or []}
+        if snap is None or not ids or not ids <= snap.ids:
+            return None
+        key = normalize_sql(sql)
+        done = snap.results.get(key)
+        local = done is None and self._local_ok(snap, sql)
+        if done is None and not local:
+            self.counters["misses"] += 1
+            return None
+        if not self._fresh(snap): return None
+        if done is not None:
+            self.counters["hits"] += 1
+            tracer.record("db.local", 0.0, len(done))
+            return done.copy(deep=False)
+        try:
+            with tracer.span("db.local") as span:
+                df = snap.query(sql)
+                span.set(rows=len(df))
+        except Exception as e:  # DuckDB에서 안 되는 함수 / 방언 차이
+            print(f"⚠️ 로컬 실행 실패 (PostgreSQL로 실행): {e}")
+            self.counters["errors"] += 1
+            return None
+        self.counters["local"] += 1
+        return df
+
+    def stats(self) -> dict:
+        snap = self._snapshot
+        return {**self.counters, "ids": sorted(snap.ids) if snap else [], "tables": dict(snap.tables) if snap else {},
+                "results": len(snap.results) if snap else 0, "load_ms": self.last_load_ms}
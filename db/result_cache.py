@@ -0,0 +1,253 @@
+# db/result_cache.py
+"""
+run_query 결과 캐시
+
+같은 SQL(+params)이 다시 실행되면 PostgreSQL에 가지 않고 저장된 DataFrame을 돌려준다.
+    - 메모리 예산(memory_budget 바이트)을 넘으면 오래 사용되지 않은 결과부터 디스크(Parquet, pyarrow 없으면 pickle)로 내린다.
+    - 디스크 예산(disk_budget)을 넘으면 가장 오래된 파일부터 삭제한다. 파일은 프로세스별 하위 폴더(spill_dir/run-*)에 쓰고
+      종료 시 지운다. 시작할 때 주인 프로세스가 없는 하위 폴더(비정상 종료로 남은 것)를 지워 예산이 재시작 후에도 유지된다.
+    - 디스크에서 읽기는 잠금 밖에서 한다 (큰 Parquet 읽기가 다른 조회/저장을 막지 않도록).
+    - 테이블 단위 무효화: SQL이 참조하는 테이블(raw_data / meta_data / project6)의 버전(probe 콜백 결과)이
+      저장 당시와 다르면 해당 결과를 버린다. probe는 probe_interval초에 한 번만 실제로 실행된다.
+    - 쿼리별 조회 수 / 적중 수 / 적중률 / 절약한 바이트를 stats()로 제공한다. 쿼리별 통계는 최근 조회된 max_query_stats개까지만
+      유지한다 (캐시 항목이 없는 오래된 통계부터 제거, 전체 적중률/절약 바이트는 누적값으로 따로 유지).
+now(), random() 등 비결정적 함수를 쓰는 SQL이나 추적 테이블을 참조하지 않는 SQL은 캐시하지 않는다.
+"""
+import atexit, hashlib, json, os, re, shutil, threading, time, uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+# SQL에 나타나는 테이블 이름 → 버전 probe의 정규 이름
+# (레이어 롤업은 raw_data에서 계산되므로 raw_data 버전을 따른다)
+TRACKED_TABLES = {"raw_data": "data.raw_data", "meta_data": "data.meta_data", "project6": "public.project6",
+                  "layer_rollup": "data.raw_data", "layer_bucket_rollup": "data.raw_data"}
+_TABLE_RE = re.compile(r"\b(?:data\.|public\.)?(raw_data|meta_data|project6|layer_rollup|layer_bucket_rollup)\b", re.I)
+_VOLATILE_RE = re.compile(r"\b(now|random|clock_timestamp|current_timestamp|current_date|current_time|localtimestamp|nextval)\b", re.I)
+_READ_ONLY_RE = re.compile(r"^\s*(?:--[^\n]*\n\s*)*(SELECT|WITH)\b", re.I)
+
+
+def referenced_tables(sql: str) -> Tuple[str, ...]:
+    return tuple(sorted({TRACKED_TABLES[m.lower()] for m in _TABLE_RE.findall(sql)}))
+
+
+def _try_lock(f) -> bool:
+    """열린 파일에 프로세스 간 배타 잠금을 건다 (프로세스가 끝나면 OS가 푼다). 다른 프로세스가 잡고 있으면 False."""
+    f.seek(0)
+    try:
+        try:
+            import fcntl
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except ImportError:  # Windows
+            import msvcrt
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def _claim_spill_dir(spill_dir: str):
+    """이전 실행이 남긴 파일/폴더를 지우고 이 프로세스의 하위 폴더를 만든다. (폴더 경로, 잠금 파일) 반환."""
+    os.makedirs(spill_dir, exist_ok=True)
+    for name in os.listdir(spill_dir):
+        path = os.path.join(spill_dir, name)
+        if name.startswith("run-") and os.path.isdir(path):
+            try:
+                with open(os.path.join(path, ".lock"), "a+") as f:
+                    if not _try_lock(f): continue  # 실행 중인 다른 프로세스의 폴더
+            except OSError:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+        elif name.endswith((".parquet", ".pkl")):  # 하위 폴더를 쓰기 전 형식으로 남은 파일
+            try: os.remove(path)
+            except OSError: pass
+    path = os.path.join(spill_dir, f"run-{os.getpid()}-{uuid.uuid4().hex[:8]}")
+    os.makedirs(path)
+    lock = open(os.path.join(path, ".lock"), "a+")
+    _try_lock(lock)
+    return path, lock
+
+
+class _Entry:
+    __slots__ = ("key", "versions", "df", "path", "nbytes", "last_used")
+
+    def __init__(self, key: str, versions: dict, df: pd.DataFrame, nbytes: int):
+        self.key, self.versions, self.df, self.nbytes = key, versions, df, nbytes
+        self.path: Optional[str] = None
+        self.last_used = time.time()
+
+
+class ResultCache:
+    def __init__(self, probe: Callable[[], Dict[str, str]], memory_budget: int = 256 << 20,
+                 spill_dir: str = ".result_cache", disk_budget: int = 2 << 30, probe_interval: float = 2.0,
+                 max_query_stats: int = 1000):
+        self.probe = probe
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.disk_budget = disk_budget
+        self.probe_interval = probe_interval
+        self.max_query_stats = max_query_stats
+        self.normalizer: Optional[Callable[[str], str]] = None  # SQL → 정규화된 SQL (없으면 공백/대소문자만 정리)
+        self._lock = threading.RLock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()  # LRU 순서 (뒤가 최근)
+        self._query_stats: "OrderedDict[str, dict]" = OrderedDict()  # key → {"sql", "lookups", "hits", "bytes_saved"} (LRU 순서)
+        self._totals = {"lookups": 0, "hits": 0, "bytes_saved": 0}   # 제거된 통계까지 포함한 누적값
+        self._versions: Dict[str, str] = {}
+        self._probed_at = 0.0
+        self._memory_used = 0
+        self._disk_used = 0
+        self._spill_path: Optional[str] = None  # 첫 디스크 저장 때 만든다 (spill_dir/run-<pid>-...)
+        self._spill_lock = None
+
+    # ── 키 / 테이블 버전 ──────────────────────────────────────────
+    def make_key(self, sql: str, params: Optional[dict]) -> str:
+        norm = self.normalizer(sql) if self.normalizer else re.sub(r"\s+", " ", sql.strip().rstrip(";")).lower()
+        return hashlib.sha256(f"{norm}|{json.dumps(params or {}, sort_keys=True, default=str)}".encode("utf-8")).hexdigest()[:24]
+
+    def table_versions(self, force: bool = False) -> Dict[str, str]:
+        now = time.monotonic()
+        with self._lock:
+            if force or now - self._probed_at >= self.probe_interval:
+                self._versions = dict(self.probe())
+                self._probed_at = now
+            return self._versions
+
+    # ── 조회 / 저장 ─────────────────────────────────────────────
+    def lookup(self, sql: str, params: Optional[dict] = None) -> Tuple[Optional[pd.DataFrame], Optional[dict]]:
+        """
+        (캐시된 DataFrame 또는 None, ticket) 반환.
+        ticket이 None이 아니면 실행 후 store(ticket, df)로 저장할 수 있다 (실행 직전의 테이블 버전이 담겨 있음).
+        """
+        tables = referenced_tables(sql)
+        if not tables or _VOLATILE_RE.search(sql) or not _READ_ONLY_RE.match(sql): return None, None
+        try:
+            current = self.table_versions()
+        except Exception as e:
+            print(f"⚠️ 결과 캐시 버전 확인 실패 (캐시 건너뜀): {e}")
+            return None, None
+        versions = {t: current.get(t) for t in tables}
+        if any(v is None for v in versions.values()): return None, None
+
+        key = self.make_key(sql, params)
+        ticket = {"key": key, "versions": versions}
+        with self._lock:
+            qs = self._query_stats.setdefault(key, {"sql": sql.strip(), "lookups": 0, "hits": 0, "bytes_saved": 0})
+            self._query_stats.move_to_end(key)
+            qs["lookups"] += 1
+            self._totals["lookups"] += 1
+            self._prune_stats()
+            entry = self._entries.get(key)
+            if entry is not None and entry.versions != versions:
+                self._drop(entry)  # 참조 테이블이 바뀜 → 무효화
+                entry = None
+            if entry is None: return None, ticket
+            df, path = entry.df, entry.path
+            if df is not None:
+                self._hit(entry, qs)
+                return df.copy(deep=False), None
+        try:  # 디스크 항목: 잠금 밖에서 읽는다 (디스크 항목은 메모리로 다시 올리지 않는다 — 큰 결과가 메모리 예산을 다시 밀어내지 않도록)
+            df, error = self._read(path), None
+        except Exception as e:
+            df, error = None, e
+        with self._lock:
+            if self._entries.get(key) is not entry: return None, ticket  # 읽는 동안 무효화/교체됨
+            if df is None:
+                print(f"⚠️ 결과 캐시 파일 읽기 실패: {error}")
+                self._drop(entry)
+                return None, ticket
+            self._hit(entry, qs)
+            return df, None
+
+    def store(self, ticket: dict, df: pd.DataFrame):
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        with self._lock:
+            old = self._entries.pop(ticket["key"], None)
+            if old is not None: self._drop(old, pop=False)
+            entry = _Entry(ticket["key"], ticket["versions"], df, nbytes)
+            self._entries[entry.key] = entry
+            self._memory_used += nbytes
+            self._enforce_budgets()
+
+    def invalidate_tables(self, *tables: str):
+        """지정 테이블(예: "data.raw_data")을 참조하는 결과를 모두 버린다. 인자가 없으면 전체."""
+        with self._lock:
+            for entry in list(self._entries.values()):
+                if not tables or set(entry.versions) & set(tables): self._drop(entry)
+            self._probed_at = 0.0
+
+    # ── 통계 ───────────────────────────────────────────────────
+    def stats(self) -> dict:
+        with self._lock:
+            queries = []
+            for key, qs in self._query_stats.items():
+                entry = self._entries.get(key)
+                queries.append({**qs, "key": key, "hit_rate": qs["hits"] / qs["lookups"] if qs["lookups"] else 0.0,
+                                "cached": entry is not None, "spilled": bool(entry and entry.df is None),
+                                "nbytes": entry.nbytes if entry else 0})
+            queries.sort(key=lambda q: q["bytes_saved"], reverse=True)
+            lookups, hits = self._totals["lookups"], self._totals["hits"]
+            return {"entries": len(self._entries), "memory_bytes": self._memory_used, "disk_bytes": self._disk_used,
+                    "hit_rate": hits / lookups if lookups else 0.0,
+                    "bytes_saved": self._totals["bytes_saved"], "queries": queries}
+
+    # ── 내부: 메모리/디스크 관리 ─────────────────────────────────
+    def _prune_stats(self):
+        """쿼리별 통계가 max_query_stats개를 넘으면 오래 조회되지 않은 것부터 버린다 (캐시 항목이 남아 있는 쿼리는 유지)."""
+        excess = len(self._query_stats) - self.max_query_stats
+        if excess <= 0: return
+        for key in [k for k in self._query_stats if k not in self._entries][:excess]:
+            del self._query_stats[key]
+
+    def _hit(self, entry: _Entry, qs: dict):
+        entry.last_used = time.time()
+        self._entries.move_to_end(entry.key)
+        qs["hits"] += 1
+        qs["bytes_saved"] += entry.nbytes
+        self._totals["hits"] += 1
+        self._totals["bytes_saved"] += entry.nbytes
+
+    @staticmethod
+    def _read(path: str) -> pd.DataFrame:
+        return pd.read_parquet(path) if path.endswith(".parquet") else pd.read_pickle(path)
+
+    def _spill(self, entry: _Entry):
+        if self._spill_path is None:
+            self._spill_path, self._spill_lock = _claim_spill_dir(self.spill_dir)
+            atexit.register(self._remove_spill_dir)
+        base = os.path.join(self._spill_path, entry.key)
+        try:
+            entry.df.to_parquet(base + ".parquet", index=False)
+            entry.path = base + ".parquet"
+        except Exception:  # pyarrow 미설치 또는 Parquet로 표현할 수 없는 dtype
+            entry.df.to_pickle(base + ".pkl")
+            entry.path = base + ".pkl"
+        self._memory_used -= entry.nbytes
+        self._disk_used += os.path.getsize(entry.path)
+        entry.df = None
+
+    def _drop(self, entry: _Entry, pop: bool = True):
+        if pop: self._entries.pop(entry.key, None)
+        if entry.df is not None:
+            self._memory_used -= entry.nbytes
+        elif entry.path and os.path.exists(entry.path):
+            self._disk_used -= os.path.getsize(entry.path)
+            try: os.remove(entry.path)
+            except OSError: pass  # Windows: 다른 스레드가 아직 읽는 중 (종료 시 폴더째 지운다)
+
+    def _remove_spill_dir(self):
+        """[종료 시] 이 프로세스의 디스크 저장 폴더를 지운다."""
+        if self._spill_lock is not None: self._spill_lock.close()
+        if self._spill_path: shutil.rmtree(self._spill_path, ignore_errors=True)
+
+    def _enforce_budgets(self):
+        for entry in list(self._entries.values()):  # 오래된 것부터
+            if self._memory_used <= self.memory_budget: break
+            if entry.df is not None:
+                try: self._spill(entry)
+                except Exception as e:
+                    print(f"⚠️ 결과 캐시 디스크 저장 실패: {e}")
+                    self._drop(entry)
+        for entry in list(self._entries.values()):
+            if self._disk_used <= self.disk_budget: break
+            if entry.df is None: self._drop(entry)
@@ -0,0 +1,318 @@
+# db/rollups.py
+"""
+raw_data 레이어 롤업 (사전 집계) + 쿼리 재작성기
+
+data.meta_data가 다루지 않는 레이어 단위 통계를 (project_id, layer)마다 미리 계산해 둔다.
+    - data.layer_rollup:        샘플 수, 첫/마지막 time, 첫 laser_on time(공정 시작 시각), laser_on 샘플 수와 0→1 전환 수,
+                                bead 수, mpt/mpa/mpw의 개수·합·최소·최대·평균(+ mpt 표준편차, 5/50/95 백분위)
+    - data.layer_bucket_rollup: 레이어 안에서 bucket_sec초 구간별 샘플 수, laser_on 수, mpt/mpa/mpw 평균(mpt 최소/최대)
+증분 갱신: data.rollup_state에 마지막으로 반영한 raw_data.id(watermark)를 두고, 그보다 큰 id가 들어온
+(project_id, layer)만 raw_data에서 다시 계산한다 (raw_data_project_id_layer_idx 인덱스로 해당 레이어만 읽음).
+raw_data 행의 수정/삭제는 추적하지 않으므로 그런 경우에는 `python -m db.rollups --rebuild`로 전체를 다시 만든다.
+앱에서는 증분 갱신을 보조 스레드에서 refresh_interval초에 한 번 시작하고(0이면 앱은 갱신하지 않음 — 쓰기 권한이 있는
+별도 작업에서 `python -m db.rollups` 실행), 재작성은 watermark가 raw_data의 max(id)에 닿아 있을 때만 한다.
+
+rewrite_to_rollup(sql)은 LLM이 만든 raw_data 집계 쿼리 중 롤업만으로 같은 결과를 낼 수 있는 모양
+(project_id / layer 조건, project_id / layer 그룹, MIN/MAX/AVG/SUM/COUNT, 첫 laser_on time 등)을
+data.layer_rollup 쿼리로 바꾼다. 그 밖의 쿼리는 None을 반환한다 (원본 그대로 실행).
+
+사용법:
+    python -m db.rollups --init      # 테이블 생성 + 전체 계산
+    python -m db.rollups             # 증분 갱신
+    python -m db.rollups --rebuild   # 전체 재계산
+"""
+import argparse, re, threading, time
+from typing import List, Optional
+
+from sqlalchemy import text
+
+ROLLUP_TABLES = ("data.layer_rollup", "data.layer_bucket_rollup")
+_LOCK_KEY = 0x524F4C4C  # pg advisory lock: 동시에 한 프로세스만 갱신
+
+DDL = """
+CREATE TABLE IF NOT EXISTS data.layer_rollup (
+    project_id integer NOT NULL, layer integer NOT NULL,
+    sample_count bigint, first_time text, last_time text, first_laser_on_time text,
+    laser_on_count bigint, laser_on_transitions bigint, bead_count bigint,
+    mpt_n bigint, mpt_sum double precision, mpt_min double precision, mpt_max double precision, mpt_avg double precision,
+    mpt_stddev double precision, mpt_p05 double precision, mpt_p50 double precision, mpt_p95 double precision,
+    mpa_n bigint, mpa_sum double precision, mpa_min double precision, mpa_max double precision, mpa_avg double precision,
+    mpw_n bigint, mpw_sum double precision, mpw_min double precision, mpw_max double precision, mpw_avg double precision,
+    max_raw_id bigint, refreshed_at timestamptz DEFAULT now(),
+    PRIMARY KEY (project_id, layer)
+);
+CREATE TABLE IF NOT EXISTS data.layer_bucket_rollup (
+    project_id integer NOT NULL, layer integer NOT NULL, bucket_start text NOT NULL, bucket_sec integer NOT NULL,
+    sample_count bigint, laser_on_count bigint,
+    mpt_avg double precision, mpt_min double precision, mpt_max double precision,
+    mpa_avg double precision, mpw_avg double precision,
+    PRIMARY KEY (project_id, layer, bucket_start)
+);
+CREATE TABLE IF NOT EXISTS data.rollup_state (k text PRIMARY KEY, v text);
+"""
+
+# 롤업이 raw_data의 모든 행을 반영했는지 (watermark >= max(id), PK 인덱스로 끝 값만 읽음)
+_FRESH_SQL = """
+SELECT coalesce((SELECT v::bigint FROM data.rollup_state WHERE k = 'watermark'), -1)
+       >= (SELECT coalesce(max(id), 0) FROM data.raw_data)
+"""
+
+# 갱신 대상 레이어: _rollup_dirty 임시 테이블 (증분이면 watermark 이후 행이 들어온 레이어, 전체면 모든 레이어)
+_DIRTY_SQL = """
+CREATE TEMP TABLE _rollup_dirty ON COMMIT DROP AS
+SELECT DISTINCT project_id, layer FROM data.raw_data WHERE id > :lo AND id <= :hi
+"""
+
+_LAYER_SQL = """
+INSERT INTO data.layer_rollup
+SELECT r.project_id, r.layer, count(*), min(r.time), max(r.time),
+       min(r.time) FILTER (WHERE r.laser_on = 1), count(*) FILTER (WHERE r.laser_on = 1),
+       count(*) FILTER (WHERE r.laser_on = 1 AND r.prev_on = 0), count(DISTINCT r.bead_number),
+       count(r.mpt), sum(r.mpt), min(r.mpt), max(r.mpt), avg(r.mpt), stddev_samp(r.mpt),
+       percentile_cont(0.05) WITHIN GROUP (ORDER BY r.mpt),
+       percentile_cont(0.5)  WITHIN GROUP (ORDER BY r.mpt),
+       percentile_cont(0.95) WITHIN GROUP (ORDER BY r.mpt),
+       count(r.mpa), sum(r.mpa), min(r.mpa), max(r.mpa), avg(r.mpa),
+       count(r.mpw), sum(r.mpw), min(r.mpw), max(r.mpw), avg(r.mpw),
+       max(r.id), now()
+FROM (SELECT raw.*, lag(raw.laser_on) OVER (PARTITION BY raw.project_id, raw.layer ORDER BY raw.time, raw.id) AS prev_on
+      FROM data.raw_data AS raw JOIN _rollup_dirty AS d USING (project_id, layer)) AS r
+GROUP BY r.project_id, r.layer
+"""
+
+# time은 연도 없는 'MM_DD_HH24_MI_SS_MS' 문자열 → 윤년(2000)을 붙여 timestamp로 바꾼 뒤 bucket_sec 단위로 자른다
+_BUCKET_SQL = """
+INSERT INTO data.layer_bucket_rollup
+SELECT s.project_id, s.layer,
+       to_char(timestamp 'epoch' + s.b * :bucket_sec * interval '1 second', 'MM_DD_HH24_MI_SS_MS'), :bucket_sec,
+       count(*), count(*) FILTER (WHERE s.laser_on = 1),
+       avg(s.mpt), min(s.mpt), max(s.mpt), avg(s.mpa), avg(s.mpw)
+FROM (SELECT raw.project_id, raw.layer, raw.laser_on, raw.mpt, raw.mpa, raw.mpw,
+             floor(extract(epoch FROM to_timestamp('2000_' || raw.time, 'YYYY_MM_DD_HH24_MI_SS_MS')::timestamp) / :bucket_sec) AS b
+      FROM data.raw_data AS raw JOIN _rollup_dirty AS d USING (project_id, layer)) AS s
+GROUP BY s.project_id, s.layer, s.b
+"""
+
+# SQL 생성 프롬프트에 덧붙이는 롤업 스키마 설명
+ROLLUP_CONTEXT = """
+--- [레이어 롤업 테이블] (raw_data를 레이어 단위로 미리 집계 — raw_data 전체 스캔 대신 우선 사용) ---
+* `data.layer_rollup`: (`project_id`, `layer`)마다 한 행. `sample_count`, `first_time`, `last_time`, `first_laser_on_time`(그 레이어에서 처음 laser_on=1인 time),
+  `laser_on_count`, `laser_on_transitions`(laser_on 0→1 전환 수), `bead_count`(서로 다른 bead_number 수),
+  `mpt_n`/`mpt_sum`/`mpt_min`/`mpt_max`/`mpt_avg`/`mpt_stddev`/`mpt_p05`/`mpt_p50`/`mpt_p95`, `mpa_n`/`mpa_sum`/`mpa_min`/`mpa_max`/`mpa_avg`, `mpw_n`/`mpw_sum`/`mpw_min`/`mpw_max`/`mpw_avg`
+* `data.layer_bucket_rollup`: (`project_id`, `layer`, `bucket_start`)마다 한 행 (`bucket_sec`초 구간). `sample_count`, `laser_on_count`, `mpt_avg`, `mpt_min`, `mpt_max`, `mpa_avg`, `mpw_avg`
+* 여러 레이어를 합친 평균은 `SUM(mpt_sum) / SUM(mpt_n)`처럼 합과 개수로 계산한다 (`AVG(mpt_avg)` 금지).
+* 공정 시작 시각: `SELECT MIN(first_laser_on_time) FROM data.layer_rollup WHERE project_id IN (...) AND layer = 1`
+"""
+
+
+class RollupManager:
+    def __init__(self, engine, bucket_sec: int = 1, refresh_interval: float = 5.0, recheck_interval: float = 60.0):
+        self.engine = engine
+        self.bucket_sec = bucket_sec
+        self.refresh_interval = refresh_interval  # 0이면 앱에서 갱신하지 않는다
+        self.recheck_interval = recheck_interval  # 롤업 테이블이 없을 때 다시 확인하는 주기(초)
+        self._available: Optional[bool] = None
+        self._available_at = 0.0
+        self._checked_at = 0.0
+        self._refresher: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        """롤업 테이블이 만들어져 있는지. 있으면 계속 캐시하고, 없거나 확인에 실패하면 recheck_interval초 뒤 다시 확인한다
+        (일시적인 연결 오류나 앱 시작 뒤의 `--init`이 프로세스 끝까지 롤업을 끄지 않도록)."""
+        if self._available: return True
+        now = time.monotonic()
+        if self._available is not None and now - self._available_at < self.recheck_interval: return False
+        self._available_at = now
+        try:
+            with self.engine.connect() as conn:
+                self._available = all(conn.execute(text("SELECT to_regclass(:t) IS NOT NULL"), {"t": t}).scalar()
+                                      for t in ROLLUP_TABLES + ("data.rollup_state",))
+        except Exception as e:
+            print(f"⚠️ 롤업 테이블 확인 실패: {e}")
+            self._available = False
+        return self._available
+
+    def init(self) -> int:
+        with self.engine.begin() as conn:
+            for stmt in DDL.split(";"):
+                if stmt.strip(): conn.execute(text(stmt))
+        self._available = None
+        return self.refresh(full=True)
+
+    def refresh(self, full: bool = False) -> int:
+        """watermark 이후 행이 들어온 레이어(full이면 전체)를 다시 계산한다. 갱신한 레이어 수 반환 (다른 프로세스가 갱신 중이면 0)."""
+        with self.engine.begin() as conn:
+            if not conn.execute(text("SELECT pg_try_advisory_xact_lock(:k)"), {"k": _LOCK_KEY}).scalar(): return 0
+            state = dict(conn.execute(text("SELECT k, v FROM data.rollup_state")).all())
+            full = full or state.get("bucket_sec") != str(self.bucket_sec)
+            lo = 0 if full else int(state.get("watermark", 0))
+            hi = int(conn.execute(text("SELECT coalesce(max(id), 0) FROM data.raw_data")).scalar())
+            if hi <= lo and not full: return 0
+
+            conn.execute(text(_DIRTY_SQL), {"lo": lo, "hi": hi})
+            if full:
+                conn.execute(text("TRUNCATE data.layer_rollup, data.layer_bucket_rollup"))
+            else:
+                conn.execute(text("DELETE FROM data.layer_rollup AS t USING _rollup_dirty AS d WHERE t.project_id = d.project_id AND t.layer = d.layer"))
+                conn.execute(text("DELETE FROM data.layer_bucket_rollup AS t USING _rollup_dirty AS d WHERE t.project_id = d.project_id AND t.layer = d.layer"))
+            conn.execute(text(_LAYER_SQL))
+            conn.execute(text(_BUCKET_SQL), {"bucket_sec": self.bucket_sec})
+            for k, v in (("watermark", str(hi)), ("bucket_sec", str(self.bucket_sec))):
+                conn.execute(text("INSERT INTO data.rollup_state(k, v) VALUES (:k, :v) ON CONFLICT (k) DO UPDATE SET v = excluded.v"), {"k": k, "v": v})
+            return int(conn.execute(text("SELECT count(*) FROM _rollup_dirty")).scalar())
+
+    def ensure_fresh(self):
+        """refresh_interval초에 한 번 보조 스레드에서 증분 갱신을 시작한다 (요청 경로를 막지 않음, 갱신 중이면 건너뜀)."""
+        if not self.refresh_interval: return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked_at < self.refresh_interval: return
+            if self._refresher is not None and self._refresher.is_alive(): return
+            self._checked_at = now
+            self._refresher = threading.Thread(target=self._refresh_quietly, name="rollup-refresh", daemon=True)
+            self._refresher.start()
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"⚠️ 롤업 갱신 실패: {e}")
+
+    def is_fresh(self) -> bool:
+        """watermark가 raw_data의 max(id)에 닿아 있는지 (갱신 전이거나 다른 세션이 갱신 중이면 False)."""
+        with self.engine.connect() as conn:
+            return bool(conn.execute(text(_FRESH_SQL)).scalar())
+
+    def rewrite(self, sql: str) -> Optional[str]:
+        """롤업으로 답할 수 있는 raw_data 쿼리이고 롤업이 최신이면 재작성한 SQL, 아니면 None (원본 그대로 실행)."""
+        if not self.available(): return None
+        rewritten = rewrite_to_rollup(sql)
+        if rewritten is None: return None
+        self.ensure_fresh()
+        try:
+            if not self.is_fresh(): return None  # 아직 반영되지 않은 raw_data 행이 있음 → 원본 쿼리로 정확한 결과
+        except Exception as e:
+            print(f"⚠️ 롤업 최신 여부 확인 실패 (원본 쿼리로 실행): {e}")
+            return None
+        return rewritten
+
+# ── 재작성기 ─────────────────────────────────────────────────────
+_QUERY_RE = re.compile(r"""^\s*SELECT\s+(?P<items>.+?)
+    \s+FROM\s+(?:data\.)?raw_data(?:\s+(?:AS\s+)?(?!WHERE\b|GROUP\b|ORDER\b|LIMIT\b)(?P<alias>[a-z_]\w*))?
+    (?:\s+WHERE\s+(?P<where>.+?))?
+    (?:\s+GROUP\s+BY\s+(?P<group>.+?))?
+    (?:\s+ORDER\s+BY\s+(?P<order>.+?))?
+    (?:\s+LIMIT\s+(?P<limit>\d+))?\s*;?\s*$""", re.I | re.S | re.X)
+_COND = r"(?:project_id\s+IN\s*\(\s*\d+(?:\s*,\s*\d+)*\s*\)|project_id\s*=\s*\d+|layer\s*(?:<=|>=|=|<|>)\s*\d+|layer\s+BETWEEN\s+\d+\s+AND\s+\d+|laser_on\s*=\s*1)"
+_WHERE_RE = re.compile(rf"^{_COND}(?:\s+AND\s+{_COND})*$", re.I)
+_ITEM_RE = re.compile(r"^(?P<expr>.+?)(?:\s+AS\s+(?P<alias>\"[^\"]+\"|[a-z_]\w*))?$", re.I | re.S)
+_PERCENTILES = {"0.05": "mpt_p05", ".05": "mpt_p05", "0.5": "mpt_p50", ".5": "mpt_p50", "0.50": "mpt_p50", "0.95": "mpt_p95", ".95": "mpt_p95"}
+_MEASURES = ("mpt", "mpa", "mpw")
+
+
+def _split_top(s: str) -> List[str]:
+    """괄호 밖의 쉼표로 나눈다."""
+    parts, depth, cur = [], 0, []
+    for ch in s:
+        if ch == "(": depth += 1
+        elif ch == ")": depth -= 1
+        if ch == "," and depth == 0:
+            parts.append("".join(cur).strip()); cur = []
+        else: cur.append(ch)
+    parts.append("".join(cur).strip())
+    return parts
+
+
+def _norm(expr: str) -> str:
+    return re.sub(r"\s+", "", expr).lower()
+
+
+def _map_aggregate(expr: str, laser_on: bool, per_layer: bool):
+    """raw_data 집계식 → (롤업 집계식, PostgreSQL 기본 컬럼 이름) 또는 None."""
+    e = _norm(expr)
+    if e == "min(time)": return ("MIN(first_laser_on_time)" if laser_on else "MIN(first_time)"), "min"
+    if e == "count(*)": return ("COALESCE(SUM(laser_on_count), 0)::bigint" if laser_on else "COALESCE(SUM(sample_count), 0)::bigint"), "count"
+    if laser_on: return None  # 첫 laser_on time / laser_on 샘플 수 외에는 laser_on 조건을 롤업으로 표현할 수 없다
+    if e == "max(time)": return "MAX(last_time)", "max"
+    m = re.fullmatch(r"(min|max|avg|sum|count)\((mpt|mpa|mpw)\)", e)
+    if m:
+        fn, col = m.groups()
+        return {"min": f"MIN({col}_min)", "max": f"MAX({col}_max)", "sum": f"SUM({col}_sum)", "count": f"COALESCE(SUM({col}_n), 0)::bigint",
+                "avg": f"SUM({col}_sum) / NULLIF(SUM({col}_n), 0)"}[fn], fn
+    if not per_layer: return None  # 아래는 레이어 하나 안에서만 의미가 있는 값 (여러 레이어에 걸쳐 합칠 수 없음)
+    if e == "count(distinctbead_number)": return "MAX(bead_count)", "count"
+    m = re.fullmatch(r"(stddev|stddev_samp)\(mpt\)", e)
+    if m: return "MAX(mpt_stddev)", m.group(1)
+    m = re.fullmatch(r"percentile_cont\(([0-9.]+)\)withingroup\(orderbympt(?:asc)?\)", e)
+    if m and m.group(1) in _PERCENTILES: return f"MAX({_PERCENTILES[m.group(1)]})", "percentile_cont"
+    return None
+
+
+def rewrite_to_rollup(sql: str) -> Optional[str]:
+    m = _QUERY_RE.match(sql.strip())
+    if not m: return None
+    parts = {k: (v or "").strip() for k, v in m.groupdict().items()}
+    if parts["alias"]:
+        for k in ("items", "where", "group", "order"):
+            parts[k] = re.sub(rf"\b{re.escape(parts['alias'])}\.", "", parts[k], flags=re.I)
+
+    where = parts["where"]
+    if where and not _WHERE_RE.match(where): return None
+    conds = re.findall(_COND, where, flags=re.I) if where else []
+    laser_on = any(re.match(r"laser_on", c, re.I) for c in conds)
+    row_conds = [c for c in conds if not re.match(r"laser_on", c, re.I)]
+    single_project = any(re.match(r"project_id\s*=|project_id\s+IN\s*\(\s*\d+\s*\)", c, re.I) for c in row_conds)
+
+    keys = [_norm(g) for g in _split_top(parts["group"])] if parts["group"] else []
+    items = [_ITEM_RE.match(i) for i in _split_top(parts["items"])]
+    if any(i is None for i in items): return None
+    # GROUP BY 1, 2 같은 순번 → 해당 SELECT 항목
+    keys = [_norm(items[int(k) - 1].group("expr")) if k.isdigit() and 0 < int(k) <= len(items) else k for k in keys]
+    if any(k not in ("project_id", "layer") for k in keys): return None
+    per_layer = "layer" in keys and ("project_id" in keys or single_project)
+
+    out_items, names = [], {}
+    for item in items:
+        expr, alias = item.group("expr").strip(), item.group("alias")
+        if _norm(expr) in ("project_id", "layer"):
+            if _norm(expr) not in keys: return None
+            out_items.append(f"{_norm(expr)} AS {alias}" if alias else _norm(expr))
+            names[_norm(expr)] = alias or _norm(expr)
+            continue
+        mapped = _map_aggregate(expr, laser_on, per_layer)
+        if mapped is None: return None
+        name = alias or f'"{mapped[1]}"'
+        out_items.append(f"{mapped[0]} AS {name}")
+        names[_norm(expr)] = name
+    if not any(_norm(i.group("expr")) not in ("project_id", "layer") for i in items): return None  # 집계 없는 raw 행 조회
+
+    order_terms = []
+    for term in _split_top(parts["order"]) if parts["order"] else []:
+        t = re.match(r"^(?P<expr>.+?)(?P<dir>\s+(?:ASC|DESC))?(?P<nulls>\s+NULLS\s+(?:FIRST|LAST))?$", term, re.I | re.S)
+        expr = t.group("expr").strip()
+        if _norm(expr) in names: ref = names[_norm(expr)]
+        elif expr.isdigit() or any(_norm(expr) == _norm(n) for n in names.values()): ref = expr
+        else: return None
+        order_terms.append(f"{ref}{t.group('dir') or ''}{t.group('nulls') or ''}")
+
+    out = f"SELECT {', '.join(out_items)} FROM data.layer_rollup"
+    if row_conds: out += " WHERE " + " AND ".join(row_conds)
+    if keys: out += " GROUP BY " + ", ".join(keys)
+    if order_terms: out += " ORDER BY " + ", ".join(order_terms)
+    if parts["limit"]: out += f" LIMIT {parts['limit']}"
+    return out + ";"
+
+
+if __name__ == "__main__":
+    import os
+    from db.connector import engine
+
+    ap = argparse.ArgumentParser(description="raw_data 레이어 롤업 생성/갱신")
+    ap.add_argument("--init", action="store_true", help="롤업 테이블을 만들고 전체 계산")
+    ap.add_argument("--rebuild", action="store_true", help="전체 재계산 (raw_data 행 수정/삭제 후)")
+    args = ap.parse_args()
+    mgr = RollupManager(engine, bucket_sec=int(os.getenv("ROLLUP_BUCKET_SEC", "1")))
+    started = time.perf_counter()
+    n = mgr.init() if args.init else mgr.refresh(full=args.rebuild)
+    print(f"롤업 갱신: {n}개 레이어 ({time.perf_counter() - started:.2f}s)")
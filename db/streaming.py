@@ -0,0 +1,149 @@
+# db/streaming.py
+"""
+청크 단위 결과 요약기 (ResultDigest)
+
+run_query_stream이 내보내는 DataFrame 청크를 차례로 받아, 메모리를 일정하게 유지하면서
+미리보기/답변/그래프 단계에 필요한 것만 남긴다.
+    - 앞쪽 head_rows행, 뒤쪽 tail_rows행
+    - 전체 행 수, 숫자 컬럼별 count / min / max / mean (청크 단위 벡터 연산으로 누적)
+    - 전체 결과가 full_rows행 이하이면 원본 전체, 넘으면 sample_rows행 이하의 등간격 표본 (그래프용)
+    - spill_path를 주면 모든 청크를 Arrow IPC 파일로 흘려 써서, 결과 표(gui/result_table.py)가 전체 결과를
+      메모리 매핑으로 훑고 정렬·내보내기할 수 있게 한다 (pyarrow 필요, finish()로 파일을 닫음).
+"""
+import os
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class ResultDigest:
+    def __init__(self, head_rows: int = 25, tail_rows: int = 25, full_rows: int = 10_000, sample_rows: int = 5_000,
+                 spill_path: Optional[str] = None):
+        self.head_rows, self.tail_rows = head_rows, tail_rows
+        self.full_rows, self.sample_rows = full_rows, sample_rows
+        self.columns: Optional[List[str]] = None
+        self.rows = 0
+        self._head: Optional[pd.DataFrame] = None
+        self._tail: Optional[pd.DataFrame] = None
+        self._full: Optional[List[pd.DataFrame]] = []  # full_rows를 넘으면 None
+        self._sample: Optional[pd.DataFrame] = None
+        self._stride = 1
+        self._stats: dict = {}                          # col -> [count, sum, min, max]
+        self.spill_path = spill_path                    # 실패하면 None (표본만 남음)
+        self._spill_writer = None
+        self._spill_schema = None
+
+    @property
+    def complete(self) -> bool:
+        """원본 전체를 보관하고 있는지 (False면 frame()은 표본)."""
+        return self._full is not None
+
+    @property
+    def empty(self) -> bool:
+        return self.rows == 0
+
+    def add(self, chunk: pd.DataFrame):
+        if self.columns is None: self.columns = list(chunk.columns)
+        n = len(chunk)
+        if n == 0: return
+        if self.spill_path: self._spill(chunk)
+        offset = self.rows
+        self.rows += n
+
+        if self._head is None or len(self._head) < self.head_rows:
+            self._head = chunk.head(self.head_rows) if self._head is None else pd.concat([self._head, chunk.head(self.head_rows - len(self._head))])
+        self._tail = chunk.tail(self.tail_rows) if self._tail is None else pd.concat([self._tail, chunk.tail(self.tail_rows)]).tail(self.tail_rows)
+
+        num = chunk.select_dtypes(include="number")
+        if not num.empty:
+            cnt, tot, lo, hi = num.count(), num.sum(), num.min(), num.max()
+            for c in num.columns:
+                s = self._stats.get(c)
+                if s is None: self._stats[c] = [int(cnt[c]), float(tot[c]), lo[c], hi[c]]
+                else:
+                    s[0] += int(cnt[c]); s[1] += float(tot[c])
+                    if pd.notna(lo[c]): s[2] = lo[c] if pd.isna(s[2]) else min(s[2], lo[c])
+                    if pd.notna(hi[c]): s[3] = hi[c] if pd.isna(s[3]) else max(s[3], hi[c])
+
+        if self._full is not None:
+            self._full.append(chunk)
+            if self.rows > self.full_rows:
+                self._full = None
+
+        # 등간격 표본: 전역 행 번호가 stride의 배수인 행만 유지, 표본이 커지면 stride를 두 배로
+        pos = np.arange(offset, offset + n)
+        picked = chunk.iloc[pos % self._stride == 0].copy()
+        picked.index = pos[pos % self._stride == 0]
+        self._sample = picked if self._sample is None else pd.concat([self._sample, picked])
+        while len(self._sample) > self.sample_rows:
+            self._stride *= 2
+            self._sample = self._sample[self._sample.index % self._stride == 0]
+
+    # ── Arrow IPC 파일로 흘려 쓰기 ───────────────────────────────
+    def _spill(self, chunk: pd.DataFrame):
+        import pyarrow as pa  # pyarrow 필요 — spill_path를 쓸 때만 import
+        try:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._spill_writer is None:
+                # 첫 청크에서 전부 NULL인 컬럼(null 타입)은 뒤 청크와 맞출 수 있게 문자열로 둔다
+                self._spill_schema = pa.schema([f.with_type(pa.string()) if pa.types.is_null(f.type) else f for f in table.schema])
+                self._spill_writer = pa.ipc.new_file(self.spill_path, self._spill_schema)
+            if table.schema != self._spill_schema: table = table.cast(self._spill_schema)
+            self._spill_writer.write_table(table)
+        except Exception as e:  # 청크마다 추론한 타입이 맞지 않는 등 — 표본만으로 계속한다
+            print(f"⚠️ 결과 파일 쓰기 중단 (표본만 표시): {e}")
+            self.discard_spill()
+
+    def finish(self) -> "ResultDigest":
+        """스트림이 끝났을 때 호출한다. 흘려 쓴 파일을 닫는다 (행이 없으면 파일을 지움)."""
+        if self._spill_writer is not None:
+            self._spill_writer.close()
+            self._spill_writer = None
+        elif self.spill_path:
+            self.discard_spill()
+        return self
+
+    def discard_spill(self):
+        """흘려 쓴 파일을 닫고 지운다."""
+        if self._spill_writer is not None:
+            try: self._spill_writer.close()
+            except Exception: pass
+            self._spill_writer = None
+        if self.spill_path:
+            try: os.remove(self.spill_path)
+            except OSError: pass
+            self.spill_path = None
+
+    def frame(self) -> pd.DataFrame:
+        """전체 결과(complete) 또는 등간격 표본."""
+        if self.rows == 0: return pd.DataFrame(columns=self.columns or [])
+        if self._full is not None: return pd.concat(self._full, ignore_index=True)
+        return self._sample.reset_index(drop=True)
+
+    def head(self) -> pd.DataFrame:
+        """앞쪽 head_rows행."""
+        return self._head if self._head is not None else pd.DataFrame(columns=self.columns or [])
+
+    def tail(self) -> pd.DataFrame:
+        """뒤쪽 tail_rows행."""
+        return self._tail if self._tail is not None else pd.DataFrame(columns=self.columns or [])
+
+    def summary(self) -> pd.DataFrame:
+        """숫자 컬럼 요약 통계 (count / min / max / mean)."""
+        rows = [{"column": c, "count": s[0], "min": s[2], "max": s[3], "mean": (s[1] / s[0]) if s[0] else None}
+                for c, s in self._stats.items()]
+        return pd.DataFrame(rows, columns=["column", "count", "min", "max", "mean"])
+
+    def preview_text(self, max_rows: int = 100) -> str:
+        """df_preview_text와 같은 형식. 행이 많으면 상·하위 일부 + 전체 요약 통계."""
+        if self.rows == 0: return "(결과 없음)"
+        if self.rows <= max_rows and self._full is not None:
+            return self.frame().to_html(index=False, border=1)
+        text = (f"--- (총 {self.rows}개 행 중 상위 {len(self._head)}개) ---\n"
+                f"{self._head.to_string(index=False)}\n...\n"
+                f"--- (총 {self.rows}개 행 중 하위 {len(self._tail)}개) ---\n"
+                f"{self._tail.to_string(index=False)}")
+        if self._stats:
+            text += f"\n--- (전체 {self.rows}개 행 숫자 컬럼 요약) ---\n{self.summary().to_string(index=False)}"
+        return text
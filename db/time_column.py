@@ -0,0 +1,161 @@
+# db/time_column.py
+"""
+raw_data.time(TEXT, 'MM_DD_HH24_MI_SS_MS') → timestamp 컬럼(time_ts) + 인덱스 / 클라이언트 벡터 파서
+
+time이 문자열이라 시간 범위 조건이나 MIN(time)은 문자열 비교가 되고 시간 인덱스를 쓸 수 없다.
+    - data.raw_time_ts(text): 문자열을 timestamp로 바꾸는 IMMUTABLE SQL 함수 (연도가 없으므로 윤년 2000년 고정, 형식이 다르면 NULL)
+    - data.raw_data.time_ts: 위 함수 값을 담는 컬럼. 생성 컬럼(GENERATED ... STORED)은 추가할 때 테이블 전체를 잠그고 다시 쓰므로,
+      NULL 컬럼을 추가(메타데이터만 변경)한 뒤 id 구간 단위로 나눠 채우고(구간마다 커밋, 중단 후 재실행하면 이어서 진행),
+      새로 들어오는 행은 BEFORE INSERT/UPDATE 트리거가 채운다.
+    - raw_data_project_id_time_ts_idx: (project_id, time_ts) 인덱스 (CREATE INDEX CONCURRENTLY — 쓰기를 막지 않음)
+nlq/sql_rewrite.rewrite_time_column()이 LLM SQL의 time 문자열 비교 / MIN·MAX(time) / ORDER BY time을 time_ts로 바꿔
+인덱스 범위 조회가 되게 한다. parse_time()은 결과 DataFrame의 time 문자열을 NumPy 벡터 연산으로 datetime64로 바꾼다.
+
+사용법:
+    python -m db.time_column --migrate [--batch 50000] [--pause 0.05]   # 함수/컬럼/트리거 생성 + 채우기 + 인덱스
+    python -m db.time_column --status
+"""
+import argparse, time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+TIME_TS_INDEX = "raw_data_project_id_time_ts_idx"
+
+DDL = r"""
+CREATE OR REPLACE FUNCTION data.raw_time_ts(t text) RETURNS timestamp
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+SELECT CASE WHEN t ~ '^(0[1-9]|1[0-2])_(0[1-9]|[12][0-9]|3[01])_([01][0-9]|2[0-3])_[0-5][0-9]_[0-5][0-9]_[0-9]{3}$' THEN
+    make_timestamp(2000, substr(t, 1, 2)::int, 1, substr(t, 7, 2)::int, substr(t, 10, 2)::int,
+                   substr(t, 13, 2)::int + substr(t, 16, 3)::int / 1000.0)
+    + (substr(t, 4, 2)::int - 1) * interval '1 day'
+END
+$$;
+ALTER TABLE data.raw_data ADD COLUMN IF NOT EXISTS time_ts timestamp;
+CREATE OR REPLACE FUNCTION data.raw_data_set_time_ts() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.time_ts := data.raw_time_ts(NEW.time);
+    RETURN NEW;
+END
+$$;
+DROP TRIGGER IF EXISTS raw_data_time_ts ON data.raw_data;
+CREATE TRIGGER raw_data_time_ts BEFORE INSERT OR UPDATE OF time ON data.raw_data
+    FOR EACH ROW EXECUTE FUNCTION data.raw_data_set_time_ts();
+"""
+
+_BACKFILL_SQL = "UPDATE data.raw_data SET time_ts = data.raw_time_ts(time) WHERE id >= :lo AND id < :hi AND time_ts IS NULL AND time IS NOT NULL"
+
+# SQL 생성 프롬프트에 덧붙이는 설명 (time_ts가 있을 때만)
+TIME_CONTEXT = """
+--- [시간 컬럼] ---
+* `data.raw_data.time_ts`(timestamp): `time` 문자열을 timestamp로 바꾼 값 (연도가 없어 2000년으로 고정, 예: '03_01_09_28_55_960' → '2000-03-01 09:28:55.960').
+  (`project_id`, `time_ts`) 인덱스가 있으므로 시간 범위 조건/정렬/MIN·MAX는 `time_ts`로 쓴다. (예: `WHERE project_id IN (...) AND time_ts >= '2000-03-01 09:00' AND time_ts < '2000-03-01 10:00'`)
+"""
+
+
+class TimeColumn:
+    def __init__(self, engine, recheck_interval: float = 60.0):
+        self.engine = engine
+        self.recheck_interval = recheck_interval  # 아직 없을 때 다시 확인하는 주기(초)
+        self._available: Optional[bool] = None
+        self._checked_at = 0.0
+
+    def available(self) -> bool:
+        """time_ts 컬럼과 인덱스가 모두 만들어져 있는지. 채우기가 끝나기 전에는 False.
+        True는 계속 캐시하고, False나 확인 실패는 recheck_interval초 뒤 다시 확인한다 (앱 실행 중 --migrate가 끝나도 반영)."""
+        if self._available: return True
+        now = time.monotonic()
+        if self._available is not None and now - self._checked_at < self.recheck_interval: return False
+        self._checked_at = now
+        try:
+            with self.engine.connect() as conn:
+                self._available = bool(conn.execute(text(
+                    "SELECT to_regclass(:idx) IS NOT NULL AND EXISTS (SELECT 1 FROM pg_index WHERE indexrelid = to_regclass(:idx) AND indisvalid)"),
+                    {"idx": f"data.{TIME_TS_INDEX}"}).scalar())
+        except Exception as e:
+            print(f"⚠️ time_ts 확인 실패: {e}")
+            self._available = False
+        return self._available
+
+    def status(self) -> dict:
+        with self.engine.connect() as conn:
+            has_col = conn.execute(text("SELECT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_schema = 'data' "
+                                        "AND table_name = 'raw_data' AND column_name = 'time_ts')")).scalar()
+            missing = conn.execute(text("SELECT count(*) FROM data.raw_data WHERE time_ts IS NULL AND time IS NOT NULL")).scalar() if has_col else None
+        self._available = None
+        return {"column": bool(has_col), "missing_rows": missing, "index": self.available()}
+
+    def migrate(self, batch_rows: int = 50_000, pause: float = 0.0, progress=print) -> int:
+        """함수/컬럼/트리거 생성 → id 구간별 채우기(구간마다 커밋) → 인덱스 생성. 채운 행 수 반환."""
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql(DDL)
+            lo, hi = conn.execute(text("SELECT min(id), max(id) FROM data.raw_data WHERE time_ts IS NULL AND time IS NOT NULL")).one()
+        filled = 0
+        if lo is not None:
+            started = time.perf_counter()
+            for start in range(int(lo), int(hi) + 1, batch_rows):
+                with self.engine.begin() as conn:  # 구간마다 짧은 트랜잭션: 잠금/WAL을 잘게 나눈다
+                    filled += conn.execute(text(_BACKFILL_SQL), {"lo": start, "hi": start + batch_rows}).rowcount
+                if progress: progress(f"  time_ts 채우는 중: id {start + batch_rows - 1:,}/{hi:,} ({filled:,}행, {time.perf_counter() - started:.1f}s)")
+                if pause: time.sleep(pause)
+        with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            valid = conn.execute(text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:idx)"), {"idx": f"data.{TIME_TS_INDEX}"}).scalar()
+            if valid is False: conn.exec_driver_sql(f"DROP INDEX CONCURRENTLY data.{TIME_TS_INDEX}")  # 이전에 중단된 CONCURRENTLY 빌드
+            conn.exec_driver_sql(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {TIME_TS_INDEX} ON data.raw_data (project_id, time_ts)")
+            conn.exec_driver_sql("ANALYZE data.raw_data")
+        self._available = None
+        return filled
+
+
+# ── 클라이언트 벡터 파서 ────────────────────────────────────────
+_DIGITS = [0, 1, 3, 4, 6, 7, 9, 10, 12, 13, 15, 16, 17]
+_SEPS = [2, 5, 8, 11, 14]
+_CUM_DAYS = np.array([0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335], dtype=np.int64)  # 2000년(윤년) 월 시작일
+_EPOCH_2000 = np.datetime64("2000-01-01T00:00:00.000", "ms")
+
+
+def parse_time(values) -> pd.Series:
+    """
+    'MM_DD_HH24_MI_SS_MS' 문자열 → datetime64[ms] (2000년 고정). 형식이 다르면 NaT. data.raw_time_ts와 같은 규칙.
+    문자열을 고정 폭 바이트 배열(n x 19)로 보고 자리별 숫자를 한꺼번에 계산한다 (행마다 strptime을 돌지 않음).
+    """
+    s = values if isinstance(values, pd.Series) else pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(s): return s
+    obj = s.to_numpy(dtype=object)
+    try:
+        raw = np.asarray(obj, dtype="S19")
+        codes = raw.view(np.uint8).reshape(len(raw), 19)
+    except UnicodeEncodeError:  # ASCII가 아닌 값이 섞인 경우: UTF-32 코드 포인트로
+        raw = np.asarray(obj, dtype="U19")
+        codes = raw.view(np.uint32).reshape(len(raw), 19)
+    digits = codes[:, _DIGITS].astype(np.int64) - 48
+    ok = np.all((digits >= 0) & (digits <= 9), axis=1) & np.all(codes[:, _SEPS] == 95, axis=1) & (codes[:, 18] == 0)
+    d = np.where(ok[:, None], digits, 0)
+    mo, dd, hh = d[:, 0] * 10 + d[:, 1], d[:, 2] * 10 + d[:, 3], d[:, 4] * 10 + d[:, 5]
+    mi, ss, ms = d[:, 6] * 10 + d[:, 7], d[:, 8] * 10 + d[:, 9], d[:, 10] * 100 + d[:, 11] * 10 + d[:, 12]
+    ok &= (mo >= 1) & (mo <= 12) & (dd >= 1) & (dd <= 31) & (hh < 24) & (mi < 60) & (ss < 60)
+    days = _CUM_DAYS[np.clip(mo - 1, 0, 11)] + dd - 1
+    out = _EPOCH_2000 + ((((days * 24 + hh) * 60 + mi) * 60 + ss) * 1000 + ms).astype("timedelta64[ms]")
+    out[~ok] = np.datetime64("NaT")
+    return pd.Series(out, index=s.index, name=s.name)
+
+
+if __name__ == "__main__":
+    import os, sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from db.connector import engine
+
+    ap = argparse.ArgumentParser(description="raw_data.time → time_ts(timestamp) 컬럼/인덱스 마이그레이션")
+    ap.add_argument("--migrate", action="store_true", help="함수/컬럼/트리거 생성, 채우기, 인덱스 생성 (중단 후 재실행하면 이어서 진행)")
+    ap.add_argument("--batch", type=int, default=50_000, help="한 트랜잭션에서 채울 id 구간 크기")
+    ap.add_argument("--pause", type=float, default=0.0, help="구간 사이 대기(초) — 운영 중 부하 완화")
+    ap.add_argument("--status", action="store_true")
+    args = ap.parse_args()
+    tc = TimeColumn(engine)
+    if args.migrate:
+        started = time.perf_counter()
+        n = tc.migrate(args.batch, args.pause)
+        print(f"time_ts 마이그레이션 완료: {n:,}행 채움 ({time.perf_counter() - started:.2f}s)")
+    print(tc.status())
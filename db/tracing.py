@@ -0,0 +1,242 @@
+# db/tracing.py
+"""
+요청 추적 (단계별 span + 로컬 누적 저장 + 선택적 OpenTelemetry 내보내기)
+
+느린 답변이 의도 분류 / SQL 생성 / PostgreSQL / DataFrame 변환 / llm_answer / 그래프 중 어디서 왔는지 보기 위해
+질문 하나(request)를 트리 모양의 span으로 기록한다.
+    request ─ classify ─ llm.router            (토큰 수, 캐시된 토큰, 재시도)
+            ├ generate ─ llm.sql
+            ├ execute  ─ db.query / db.stream  (행 수, 바이트, 결과 캐시 적중, driver 시간)
+            ├ answer   ─ llm.answer            (로컬 렌더러면 LLM 호출 없음)
+            └ chart    ─ db.query(집계)        + GUI 스레드의 chart.render
+    - 현재 span은 contextvars로 전달된다. 다른 스레드로 넘길 때는 attach(span) 또는 contextvars.copy_context()를 쓴다.
+    - 끝난 span은 이름별 LatencyRecorder(p50/p95)에 들어가고, 루트 span이 끝나면 트리 전체를 SQLite(TRACE_STORE)에
+      한 번에 기록한다. 저장 행 수는 TRACE_KEEP으로 제한하고(오래된 것부터 삭제), 시작 시 최근 기록으로 통계를 채운다.
+    - 예외로 끝난 span과 error()로 남긴 오류는 최근 오류 목록(recent_errors)에 쌓인다 (이전에는 print만 했다).
+    - TRACE_OTEL=1이고 opentelemetry 패키지가 있으면 같은 span을 OpenTelemetry로도 만든다.
+      OTEL_EXPORTER_OTLP_ENDPOINT가 있고 OTLP exporter가 설치되어 있으면 여기서 내보내기를 설정하고,
+      아니면 이미 설정된 전역 TracerProvider(opentelemetry-instrument 등)를 그대로 쓴다.
+"""
+import itertools, json, os, sqlite3, threading, time, traceback
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from db.metrics import LatencyRecorder
+
+_current: ContextVar[Optional["Span"]] = ContextVar("trace_span", default=None)
+_ids = itertools.count(1)
+_run = f"{os.getpid():x}{os.urandom(2).hex()}"  # 프로세스마다 다른 접두어 (저장소에서 trace_id가 겹치지 않도록)
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "wall", "end", "attrs", "error", "otel")
+
+    def __init__(self, name: str, parent: Optional["Span"], attrs: dict):
+        self.name = name
+        self.span_id = f"{_run}-{next(_ids):x}"
+        self.trace_id = parent.trace_id if parent else self.span_id
+        self.parent_id = parent.span_id if parent else None
+        self.start, self.wall, self.end = time.perf_counter(), time.time(), None
+        self.attrs = dict(attrs)
+        self.error = None
+        self.otel = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, key: str, value: float):
+        """누적 속성 (예: 한 단계에서 여러 번 호출한 쿼리의 행 수 합)."""
+        self.attrs[key] = self.attrs.get(key, 0) + value
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+
+class TraceStore:
+    """끝난 span을 SQLite에 보관한다. keep행을 넘으면 오래된 것부터 지운다."""
+    def __init__(self, path: str, keep: int = 50_000):
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS spans (
+            trace_id TEXT, span_id TEXT, parent_id TEXT, name TEXT, started REAL, duration_ms REAL, attrs TEXT, error TEXT)""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS spans_name ON spans(name)")
+        self._conn.commit()
+
+    def write(self, spans: List[Span]):
+        rows = [(s.trace_id, s.span_id, s.parent_id, s.name, s.wall, s.duration_ms, json.dumps(s.attrs, ensure_ascii=False, default=str), s.error)
+                for s in spans]
+        with self._lock:
+            self._conn.executemany("INSERT INTO spans VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._writes += len(rows)
+            if self._writes >= max(100, self.keep // 10):  # 가끔 한 번씩만 정리
+                self._conn.execute("DELETE FROM spans WHERE rowid <= (SELECT max(rowid) FROM spans) - ?", (self.keep,))
+                self._writes = 0
+            self._conn.commit()
+
+    def recent(self, limit: int) -> List[tuple]:
+        """최근 limit개 (name, duration_ms, started), 오래된 것부터."""
+        with self._lock:
+            rows = self._conn.execute("SELECT name, duration_ms, started FROM spans ORDER BY rowid DESC LIMIT ?", (limit,)).fetchall()
+        return rows[::-1]
+
+    def trace(self, trace_id: str) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT span_id, parent_id, name, started, duration_ms, attrs, error FROM spans "
+                                      "WHERE trace_id = ? ORDER BY started", (trace_id,)).fetchall()
+        return [{"span_id": r[0], "parent_id": r[1], "name": r[2], "started": r[3], "duration_ms": r[4],
+                 "attrs": json.loads(r[5] or "{}"), "error": r[6]} for r in rows]
+
+
+def _otel_tracer():
+    """opentelemetry가 없으면 None. OTLP 엔드포인트가 지정되어 있으면 여기서 provider/exporter를 설정한다."""
+    try:
+        from opentelemetry import trace as otel_trace
+    except ImportError:
+        print("⚠️ TRACE_OTEL=1이지만 opentelemetry가 설치되어 있지 않아 로컬 기록만 합니다.")
+        return None
+    if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        try:
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            provider = TracerProvider(resource=Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", "ded-nlq")}))
+            provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+            otel_trace.set_tracer_provider(provider)
+        except ImportError:
+            print("⚠️ OTLP exporter(opentelemetry-sdk, opentelemetry-exporter-otlp)가 없어 전역 TracerProvider를 그대로 사용합니다.")
+    return otel_trace.get_tracer("ded-nlq")
+
+
+def _otel_value(v):
+    return v if isinstance(v, (bool, int, float, str)) else str(v)
+
+
+class Tracer:
+    def __init__(self, store: Optional[TraceStore] = None, window: int = 500, otel: bool = False, max_errors: int = 50):
+        self.store = store
+        self.latency = LatencyRecorder(window=window)
+        self._errors: deque = deque(maxlen=max_errors)
+        self._pending: Dict[str, List[Span]] = defaultdict(list)  # 루트가 끝나기 전의 span (trace_id별)
+        self._open = set()  # 아직 끝나지 않은 루트의 trace_id
+        self._lock = threading.Lock()
+        self._otel = _otel_tracer() if otel else None
+        if store:
+            try:
+                for name, ms, _started in store.recent(window * 20): self.latency.record(name, ms / 1000)
+            except sqlite3.Error as e:
+                print(f"⚠️ 추적 기록을 불러오지 못했습니다: {e}")
+
+    # ── span ──────────────────────────────────────────────────────
+    def start(self, name: str, parent: Optional[Span] = None, **attrs) -> Span:
+        """span을 시작한다 (parent 미지정 시 현재 span의 자식, 현재 span이 없으면 새 추적의 루트). 끝낼 때 finish()."""
+        parent = parent if parent is not None else _current.get()
+        span = Span(name, parent, attrs)
+        if parent is None:
+            with self._lock: self._open.add(span.trace_id)
+        if self._otel is not None:
+            from opentelemetry import trace as otel_trace
+            ctx = otel_trace.set_span_in_context(parent.otel) if parent is not None and parent.otel is not None else None
+            span.otel = self._otel.start_span(name, context=ctx)
+        return span
+
+    def finish(self, span: Span, exc: Optional[BaseException] = None):
+        span.end = time.perf_counter()
+        if exc is not None:
+            if type(exc).__name__ == "RequestCancelled": span.attrs["cancelled"] = True  # 취소는 오류가 아니다
+            else: self._fail(span, f"{type(exc).__name__}: {exc}", "".join(traceback.format_exception(type(exc), exc, exc.__traceback__)))
+        self.latency.record(span.name, span.end - span.start, span.attrs.get("rows"))
+        if span.otel is not None:
+            span.otel.set_attributes({k: _otel_value(v) for k, v in span.attrs.items() if v is not None})
+            if span.error:
+                from opentelemetry.trace import Status, StatusCode
+                span.otel.set_status(Status(StatusCode.ERROR, span.error))
+            span.otel.end()
+        if self.store is None: return
+        with self._lock:
+            if span.parent_id is None:
+                self._open.discard(span.trace_id)
+                batch = self._pending.pop(span.trace_id, []) + [span]
+            elif span.trace_id in self._open:
+                self._pending[span.trace_id].append(span); batch = None
+            else: batch = [span]  # 루트가 이미 끝난 뒤의 span (예: GUI 스레드의 chart.render)
+        if batch:
+            try: self.store.write(batch)
+            except sqlite3.Error as e: print(f"⚠️ 추적 기록 저장 실패: {e}")
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[Span] = None, **attrs):
+        span = self.start(name, parent, **attrs)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            _current.reset(token); token = None
+            self.finish(span, e)
+            raise
+        finally:
+            if token is not None:
+                _current.reset(token)
+                self.finish(span)
+
+    @contextmanager
+    def attach(self, span: Optional[Span]):
+        """다른 스레드에서 만든 span을 이 스레드의 현재 span으로 둔다 (배치 실행기의 단계별 풀)."""
+        token = _current.set(span)
+        try: yield span
+        finally: _current.reset(token)
+
+    def current(self) -> Optional[Span]:
+        return _current.get()
+
+    def annotate(self, **attrs):
+        span = _current.get()
+        if span is not None: span.set(**attrs)
+
+    def add(self, key: str, value: float):
+        span = _current.get()
+        if span is not None: span.add(key, value)
+
+    def record(self, name: str, seconds: float, rows: Optional[int] = None):
+        """span 없이 계산한 구간(예: 전체 조회 시간 - driver 시간 = DataFrame 변환)을 통계에만 넣는다."""
+        self.latency.record(name, seconds, rows)
+
+    def error(self, message: str, detail: str = ""):
+        """예외를 삼키는 곳(LLM 오류 → 대체 동작 등)의 오류를 현재 span과 최근 오류 목록에 남긴다."""
+        span = _current.get()
+        if span is not None: self._fail(span, message, detail)
+        else: self._errors.append({"time": time.time(), "span": None, "trace_id": None, "error": message, "detail": detail})
+
+    def _fail(self, span: Span, message: str, detail: str):
+        span.error = message
+        self._errors.append({"time": time.time(), "span": span.name, "trace_id": span.trace_id, "error": message, "detail": detail})
+
+    # ── 조회 ──────────────────────────────────────────────────────
+    def stats(self) -> Dict[str, dict]:
+        """{span 이름: {"count", "p50_ms", "p95_ms", "max_ms", "last_ms", "rows_last"}}"""
+        return self.latency.summary()
+
+    def recent_errors(self) -> List[dict]:
+        return list(self._errors)
+
+    def clear(self):
+        self.latency.clear()
+        self._errors.clear()
+
+
+def _from_env() -> Tracer:
+    store = None
+    path = os.getenv("TRACE_STORE", "traces.sqlite3")
+    if path:
+        try: store = TraceStore(path, keep=int(os.getenv("TRACE_KEEP", "50000")))
+        except sqlite3.Error as e: print(f"⚠️ 추적 저장소 비활성화: {e}")
+    return Tracer(store, window=int(os.getenv("TRACE_WINDOW", "500")), otel=os.getenv("TRACE_OTEL", "0") == "1")
+
+
+tracer = _from_env()
@@ -0,0 +1,226 @@
+# gui/charts.py
+"""
+그래프 자동 추론 (Chart Inference)
+
+결과 DataFrame의 컬럼 역할을 dtype/이름/값 형식으로 판별하고, 차트 종류를 고른 뒤 plotly 그림(JSON)을 만든다.
+    - 역할: time('MM_DD_HH24_MI_SS_MS' 문자열 또는 datetime), layer(layer / layer_number), project(project_id),
+      spatial(x / y / z), flag(값이 2개 이하인 수치: laser_on, contact), id(id / *_id), category(문자열), series(나머지 수치 = 센서 채널)
+    - 차트: line(시간/레이어 축, y 여러 개, 프로젝트가 여럿이면 프로젝트별 패싯), scatter(x-y 평면, 센서 값 색상),
+      toolpath(x-y-z 3D 경로), heatmap(x-y 격자 평균), bar(범주 축). 질문에 3D/경로, 히트맵, 산점도, 막대 키워드가 있으면 우선한다.
+    - 대용량: aggregate_sql로 원래 SQL을 감싼 집계 쿼리(구간 평균 / 등간격 표본 / 격자 평균)를 DB에서 돌려 작은 결과만 받아 그린다.
+      작은 결과는 클라이언트에서 LTTB(gui/plotting.py)로 줄인다.
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from db.time_column import parse_time
+from gui.plotting import dark_layout, downsample
+
+_TIME_RE = r"\d{2}_\d{2}_\d{2}_\d{2}_\d{2}_\d{1,6}"
+_PREFERRED_SERIES = ["mpt", "mpt_avg", "average_mpt", "avg_mpt", "mpt_median", "mpa", "mpw", "dwell_ratio_by_time",
+                     "dwell_time_ratio", "load", "r_lp", "e1", "e2"]
+_HINTS = [("toolpath", r"3d|3차원|툴\s*패스|toolpath|경로|궤적"), ("heatmap", r"히트\s*맵|heat\s*map|격자|밀도"),
+          ("scatter", r"산점도|scatter"), ("bar", r"막대|bar")]
+MAX_SERIES = 4
+MAX_FACETS = 6
+HEATMAP_GRID = 120
+_COLORS = ["#669df6", "#f6ae2d", "#86c06c", "#e86a92", "#b39ddb", "#4dd0e1"]
+
+
+# ── 역할 판별 ──────────────────────────────────────────────────
+def infer_roles(df: pd.DataFrame, sample: int = 2000) -> Dict[str, object]:
+    """컬럼 역할 사전. 값 검사(고유값 수, 시간 형식)는 앞쪽 sample행으로만 한다."""
+    roles = {"time": None, "layer": None, "project": None, "spatial": {}, "series": [], "flags": [], "category": [], "ids": []}
+    head = df.head(sample)
+    numeric = set(df.select_dtypes(include="number").columns)
+    for c in df.columns:
+        name = str(c).lower()
+        if c in numeric:
+            if name == "project_id": roles["project"] = c
+            elif name in ("layer", "layer_number"): roles["layer"] = roles["layer"] or c
+            elif name in ("x", "y", "z"): roles["spatial"][name] = c
+            elif name == "id" or name.endswith("_id"): roles["ids"].append(c)
+            elif head[c].nunique(dropna=True) <= 2: roles["flags"].append(c)
+            else: roles["series"].append(c)
+        elif pd.api.types.is_datetime64_any_dtype(df[c]): roles["time"] = roles["time"] or c
+        else:
+            values = head[c].dropna().astype(str)
+            if roles["time"] is None and len(values) and values.str.fullmatch(_TIME_RE).mean() >= 0.9: roles["time"] = c
+            else: roles["category"].append(c)
+    rank = {n: i for i, n in enumerate(_PREFERRED_SERIES)}
+    roles["series"].sort(key=lambda c: rank.get(str(c).lower(), len(rank)))
+    return roles
+
+
+def choose_chart(roles: Dict[str, object], hint: str = "") -> Optional[dict]:
+    """
+    {"kind": line | scatter | toolpath | heatmap | bar, "x", "y" | "ys", "z", "color", "order", "project", "time"}.
+    그릴 수 있는 조합이 없으면 None.
+    """
+    sp, series, category = roles["spatial"], roles["series"], roles["category"]
+    kind = next((k for k, pat in _HINTS if re.search(pat, hint or "", re.I)), None)
+    order = roles["time"] or roles["layer"]
+    value = series[0] if series else None
+    base = {"project": roles["project"], "time": roles["time"], "order": order}
+    if kind == "toolpath" and {"x", "y", "z"} <= sp.keys():
+        return {**base, "kind": "toolpath", "x": sp["x"], "y": sp["y"], "z": sp["z"], "color": value}
+    if kind == "heatmap" and {"x", "y"} <= sp.keys() and value:
+        return {**base, "kind": "heatmap", "x": sp["x"], "y": sp["y"], "color": value}
+    if kind in ("scatter", "heatmap", "toolpath") and {"x", "y"} <= sp.keys():
+        return {**base, "kind": "scatter", "x": sp["x"], "y": sp["y"], "color": value}
+    if series and (kind == "bar" or (not order and category)):
+        x = category[0] if category else roles["project"] or order
+        if x is not None: return {**base, "kind": "bar", "x": x, "ys": series[:MAX_SERIES]}
+    if order:
+        ys = series[:MAX_SERIES] or list(sp.values())[:MAX_SERIES] or roles["flags"][:1]
+        if ys: return {**base, "kind": "line", "x": order, "ys": ys}
+    if {"x", "y"} <= sp.keys():
+        return {**base, "kind": "scatter", "x": sp["x"], "y": sp["y"], "color": value}
+    if len(series) >= 2:
+        return {**base, "kind": "scatter", "x": series[0], "y": series[1], "color": series[2] if len(series) > 2 else None}
+    if series and roles["project"]:
+        return {**base, "kind": "bar", "x": roles["project"], "ys": series[:MAX_SERIES]}
+    return None
+
+
+# ── 서버 측 집계 ────────────────────────────────────────────────
+def _q(col) -> str:
+    return '"' + str(col).replace('"', '""') + '"'
+
+
+def aggregate_sql(sql: str, spec: dict, max_points: int = 4000) -> Optional[str]:
+    """
+    원래 SQL을 하위 쿼리로 감싸 그래프에 필요한 만큼만 돌려받는 집계 SQL. (bar는 이미 작으므로 None)
+        line:     (프로젝트별) 레이어 축이면 레이어별 평균, 시간 축이면 ntile 구간별 평균
+        scatter / toolpath: (프로젝트별) 순서 기준 등간격 표본
+        heatmap:  x-y 격자(width_bucket)별 평균
+    """
+    inner = sql.strip().rstrip(";").strip()
+    project = spec.get("project")
+    keys = [_q(project)] if project else []
+    part = f"PARTITION BY {_q(project)} " if project else ""
+    kind = spec["kind"]
+    if kind == "line":
+        x = _q(spec["x"])
+        avgs = ", ".join(f"AVG({_q(y)}) AS {_q(y)}" for y in spec["ys"])
+        if spec["x"] != spec.get("time"):  # 레이어 등 이산 축: 값별 평균
+            group = ", ".join(keys + [x])
+            return f"SELECT {group}, {avgs}, COUNT(*) AS _n FROM ({inner}) AS q GROUP BY {group} ORDER BY {group};"
+        group = ", ".join(keys + ["_bucket"])
+        return (f"SELECT {''.join(k + ', ' for k in keys)}MIN({x}) AS {x}, {avgs}, COUNT(*) AS _n "
+                f"FROM (SELECT q.*, ntile({int(max_points)}) OVER ({part}ORDER BY {x}) AS _bucket FROM ({inner}) AS q) AS s "
+                f"GROUP BY {group} ORDER BY {', '.join(keys + [x])};")
+    if kind in ("scatter", "toolpath"):
+        cols = [c for c in dict.fromkeys([project, spec.get("order"), spec["x"], spec["y"], spec.get("z"), spec.get("color")]) if c]
+        order = f"ORDER BY {_q(spec['order'])}" if spec.get("order") else ""
+        return (f"SELECT {', '.join(_q(c) for c in cols)} FROM (SELECT q.*, row_number() OVER ({part}{order}) AS _rn, "
+                f"count(*) OVER ({part.strip()}) AS _cnt FROM ({inner}) AS q) AS s "
+                f"WHERE _rn % GREATEST(_cnt / {int(max_points)}, 1) = 0 ORDER BY {', '.join(keys + ['_rn'])};")
+    if kind == "heatmap":
+        x, y, v, g = _q(spec["x"]), _q(spec["y"]), _q(spec["color"]), HEATMAP_GRID
+        return (f"WITH q AS (SELECT {x}::float8 AS x, {y}::float8 AS y, {v}::float8 AS v FROM ({inner}) AS q0), "
+                f"b AS (SELECT MIN(x) AS x0, MAX(x) + 1e-9 AS x1, MIN(y) AS y0, MAX(y) + 1e-9 AS y1 FROM q) "
+                f"SELECT width_bucket(q.x, b.x0, b.x1, {g}) AS _xb, width_bucket(q.y, b.y0, b.y1, {g}) AS _yb, "
+                f"MIN(b.x0) AS _x0, MIN(b.x1) AS _x1, MIN(b.y0) AS _y0, MIN(b.y1) AS _y1, AVG(q.v) AS {v}, COUNT(*) AS _n "
+                f"FROM q, b WHERE q.x IS NOT NULL AND q.y IS NOT NULL GROUP BY 1, 2;")
+    return None
+
+
+# ── 그림 만들기 ─────────────────────────────────────────────────
+def _grid(df: pd.DataFrame, spec: dict) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(x 중심, y 중심, 평균 행렬). 서버 집계 결과(_xb/_yb)면 그대로 채우고, 아니면 histogram2d로 계산."""
+    g = HEATMAP_GRID
+    if spec.get("aggregated"):
+        x0, x1, y0, y1 = (float(df[c].iloc[0]) for c in ("_x0", "_x1", "_y0", "_y1"))
+        z = np.full((g, g), np.nan)
+        xb = df["_xb"].to_numpy(dtype=np.int64).clip(1, g) - 1
+        yb = df["_yb"].to_numpy(dtype=np.int64).clip(1, g) - 1
+        z[yb, xb] = df[spec["color"]].to_numpy(dtype=np.float64)
+    else:
+        data = df[[spec["x"], spec["y"], spec["color"]]].dropna().astype(np.float64)
+        x, y, v = (data[c].to_numpy() for c in data.columns)
+        x0, x1, y0, y1 = x.min(), x.max() + 1e-9, y.min(), y.max() + 1e-9
+        sums, _, _ = np.histogram2d(y, x, bins=g, range=[[y0, y1], [x0, x1]], weights=v)
+        counts, _, _ = np.histogram2d(y, x, bins=g, range=[[y0, y1], [x0, x1]])
+        with np.errstate(invalid="ignore", divide="ignore"): z = np.where(counts > 0, sums / counts, np.nan)
+    xs = x0 + (np.arange(g) + 0.5) * (x1 - x0) / g
+    ys = y0 + (np.arange(g) + 0.5) * (y1 - y0) / g
+    return xs, ys, z
+
+
+def _stride(df: pd.DataFrame, max_points: int) -> pd.DataFrame:
+    step = -(-len(df) // max_points) if len(df) > max_points else 1
+    return df.iloc[::step]
+
+
+def _groups(df: pd.DataFrame, project) -> List[Tuple[str, pd.DataFrame]]:
+    if project is None or df[project].nunique() <= 1: return [("", df)]
+    return [(f"project {p}", g) for p, g in df.groupby(project, sort=True)]
+
+
+def build_figure(df: pd.DataFrame, spec: dict, max_points: int = 4000, gl_threshold: int = 5000,
+                 method: str = "lttb", total_rows: Optional[int] = None) -> Tuple[str, dict]:
+    """Plotly.react에 넘길 그림 JSON과 {"kind", "rows", "shown", "aggregated"} 정보."""
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    kind, rows = spec["kind"], total_rows or len(df)
+    df = df.copy(deep=False)
+    if spec.get("time") in df.columns: df[spec["time"]] = parse_time(df[spec["time"]])
+    shown = 0
+    if kind == "line":
+        x, ys, groups = spec["x"], spec["ys"], _groups(df, spec.get("project"))
+        facet = len(groups) > 1 and len(ys) > 1 and len(groups) <= MAX_FACETS
+        if facet: fig = make_subplots(rows=len(groups), cols=1, shared_xaxes=True, subplot_titles=[n for n, _ in groups], vertical_spacing=0.06)
+        else: fig = go.Figure()
+        traces = [(gi, name, sub, y) for gi, (name, sub) in enumerate(groups) for y in (ys if facet or len(groups) == 1 else ys[:1])]
+        per_trace = max(max_points // max(len(traces), 1), 200)
+        for gi, name, sub, y in traces:
+            data, n = downsample(sub, x, y, per_trace, method)
+            shown += len(data)
+            color = _COLORS[(ys.index(y) if facet or len(groups) == 1 else gi) % len(_COLORS)]
+            trace = (go.Scattergl if n > gl_threshold else go.Scatter)(
+                x=data[x].to_numpy(), y=data[y].to_numpy(), mode="lines+markers" if len(data) <= 300 else "lines",
+                line=dict(color=color, width=1.5), name=str(y) if facet or len(groups) == 1 else name,
+                legendgroup=str(y), showlegend=not facet or gi == 0)
+            if facet: fig.add_trace(trace, row=gi + 1, col=1)
+            else: fig.add_trace(trace)
+        title = f"{x} vs {', '.join(map(str, ys if facet or len(groups) == 1 else ys[:1]))}"
+        dark_layout(fig, title, str(x), str(ys[0]) if len(ys) == 1 or not facet else "")
+        if facet: fig.update_layout(height=max(300, 220 * len(groups)))
+        if x == spec.get("time"): fig.update_xaxes(tickformat="%m-%d %H:%M:%S")
+    elif kind in ("scatter", "toolpath"):
+        fig = go.Figure()
+        color = spec.get("color")
+        for gi, (name, sub) in enumerate(_groups(df, spec.get("project"))):
+            if kind == "toolpath" and spec.get("order") in sub.columns: sub = sub.sort_values(spec["order"], kind="stable")
+            sub = _stride(sub, max_points)
+            shown += len(sub)
+            marker = dict(color=sub[color].to_numpy(), colorscale="Viridis", showscale=gi == 0, colorbar=dict(title=str(color))) \
+                if color else dict(color=_COLORS[gi % len(_COLORS)])
+            if kind == "toolpath":
+                fig.add_trace(go.Scatter3d(x=sub[spec["x"]].to_numpy(), y=sub[spec["y"]].to_numpy(), z=sub[spec["z"]].to_numpy(),
+                                           mode="lines", line=dict(width=3, **marker), name=name or "toolpath"))
+            else:
+                fig.add_trace((go.Scattergl if len(sub) > gl_threshold // 5 else go.Scatter)(
+                    x=sub[spec["x"]].to_numpy(), y=sub[spec["y"]].to_numpy(), mode="markers", marker=dict(size=4, **marker), name=name or str(spec["y"])))
+        title = f"{spec['x']}-{spec['y']}-{spec['z']} 경로" if kind == "toolpath" else f"{spec['x']} vs {spec['y']}"
+        dark_layout(fig, title + (f" (색상: {color})" if color else ""), str(spec["x"]), str(spec["y"]))
+        if kind == "toolpath": fig.update_layout(scene=dict(xaxis_title=str(spec["x"]), yaxis_title=str(spec["y"]), zaxis_title=str(spec["z"])))
+    elif kind == "heatmap":
+        xs, ys_, z = _grid(df, spec)
+        shown = int(np.isfinite(z).sum())
+        fig = go.Figure(go.Heatmap(x=xs, y=ys_, z=z, colorscale="Viridis", colorbar=dict(title=str(spec["color"]))))
+        dark_layout(fig, f"{spec['x']}-{spec['y']} 격자별 평균 {spec['color']}", str(spec["x"]), str(spec["y"]))
+    else:  # bar
+        data = df.head(200)
+        shown = len(data)
+        fig = go.Figure([go.Bar(x=data[spec["x"]].astype(str), y=data[y], name=str(y), marker_color=_COLORS[i % len(_COLORS)])
+                         for i, y in enumerate(spec["ys"])])
+        dark_layout(fig, f"{spec['x']}별 {', '.join(map(str, spec['ys']))}", str(spec["x"]), "")
+    if spec.get("aggregated"): fig.update_layout(title_text=f"{fig.layout.title.text} (DB 집계: {rows:,}행 → {len(df):,}행)")
+    elif shown < rows and kind != "heatmap": fig.update_layout(title_text=f"{fig.layout.title.text} ({shown:,}/{rows:,}점 표시)")
+    return fig.to_json(), {"kind": kind, "rows": rows, "shown": shown, "aggregated": bool(spec.get("aggregated"))}
@@ -0,0 +1,173 @@
+# gui/engine.py
+"""
+요청 실행 엔진 (Request Execution Engine)
+
+_on_send 파이프라인(의도 분류 → SQL 생성 → 쿼리 실행 → 답변 생성)을 GUI 스레드가 아닌
+QThreadPool 워커에서 실행한다. LLM 왕복이나 raw_data 스캔이 길어져도 창이 멈추지 않는다.
+    - 단계별 진행 상황은 stage 시그널로 GUI 스레드에 전달된다.
+    - LLM 스트리밍 응답의 중간 결과는 partial 시그널로 전달된다 (GUI 갱신 과부하를 막기 위해 간격 제한).
+    - 실행 중인 요청은 cancel()로 취소할 수 있다. DB 쿼리는 CancelToken에 등록된 콜백(pg_cancel_backend)으로 중단된다.
+    - 여러 질문은 큐에 쌓여 순서대로 하나씩 실행된다. 이전 요청의 결과가 GUI에 반영된 뒤 다음 요청이 시작된다.
+"""
+import itertools, threading, time, traceback
+from collections import deque
+from typing import Callable, Optional
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
+
+
+class RequestCancelled(Exception):
+    """사용자가 요청을 취소했을 때 워커 안에서 발생한다."""
+
+
+class CancelToken:
+    """스레드 간 공유되는 취소 플래그. 취소 시 등록된 콜백(예: pg_cancel_backend)을 실행한다."""
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: list = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set(): return
+            self._event.set()
+            callbacks = list(self._callbacks)
+        # 콜백은 DB 연결 등 블로킹 작업일 수 있으므로 GUI 스레드를 막지 않도록 별도 스레드에서 실행한다.
+        for cb in callbacks:
+            threading.Thread(target=self._run_callback, args=(cb,), daemon=True).start()
+
+    def add_callback(self, cb: Callable[[], None]):
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(cb)
+                return
+        self._run_callback(cb)  # 이미 취소된 요청이면 즉시 실행
+
+    def remove_callback(self, cb: Callable[[], None]):
+        with self._lock:
+            if cb in self._callbacks: self._callbacks.remove(cb)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set(): raise RequestCancelled()
+
+    @staticmethod
+    def _run_callback(cb):
+        try: cb()
+        except Exception as e: print(f"⚠️ 취소 콜백 오류: {e}")
+
+
+class RequestContext:
+    """워커 함수에 전달되는 요청 정보. stage()로 진행 단계를 알리고 취소 여부를 확인한다."""
+    PARTIAL_INTERVAL = 0.05  # partial 시그널 최소 간격(초)
+
+    def __init__(self, request_id: int, token: CancelToken, engine: "RequestEngine"):
+        self.request_id = request_id
+        self.token = token
+        self._engine = engine
+        self._last_partial = 0.0
+
+    def stage(self, name: str):
+        self.token.raise_if_cancelled()
+        self._engine.stage.emit(self.request_id, name)
+
+    def partial(self, text: str):
+        """스트리밍 중인 누적 텍스트를 GUI에 전달한다. 취소된 요청이면 RequestCancelled로 스트림을 끊는다."""
+        self.token.raise_if_cancelled()
+        now = time.monotonic()
+        if now - self._last_partial < self.PARTIAL_INTERVAL: return
+        self._last_partial = now
+        self._engine.partial.emit(self.request_id, text)
+
+
+class _RequestRunnable(QRunnable):
+    def __init__(self, fn: Callable, args: tuple, ctx: RequestContext, done_signal):
+        super().__init__()
+        self.fn, self.args, self.ctx, self.done_signal = fn, args, ctx, done_signal
+
+    def run(self):
+        try:
+            result = self.fn(self.ctx, *self.args)
+            status = "cancelled" if self.ctx.token.cancelled else "ok"
+        except RequestCancelled:
+            status, result = "cancelled", None
+        except Exception:
+            # 취소로 인해 중단된 쿼리(QueryCanceled 등)는 오류가 아니라 취소로 처리한다.
+            status = "cancelled" if self.ctx.token.cancelled else "error"
+            result = traceback.format_exc()
+        self.done_signal.emit(self.ctx.request_id, status, result)
+
+
+class RequestEngine(QObject):
+    """
+    질문 요청 큐 + 워커 실행기.
+    시그널은 모두 GUI 스레드에서 수신된다 (워커 스레드에서 emit 시 Qt가 queued connection으로 전달).
+    """
+    started = pyqtSignal(int, object)         # (request_id, meta)
+    stage = pyqtSignal(int, str)              # (request_id, stage: classify/generate/execute/answer)
+    partial = pyqtSignal(int, str)            # (request_id, 스트리밍 누적 텍스트)
+    finished = pyqtSignal(int, object)        # (request_id, result)
+    failed = pyqtSignal(int, str)             # (request_id, traceback)
+    cancelled = pyqtSignal(int)               # (request_id)
+    queue_changed = pyqtSignal(int)           # 대기 중인 요청 수
+    _done = pyqtSignal(int, str, object)      # 내부용: 워커 → 엔진
+
+    def __init__(self, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self._ids = itertools.count(1)
+        self._queue: deque = deque()          # (request_id, fn, args, meta)
+        self._current: Optional[RequestContext] = None
+        self._done.connect(self._on_done)
+
+    def submit(self, fn: Callable, *args, meta: object = None) -> int:
+        """fn(ctx, *args)를 큐에 넣는다. fn은 워커 스레드에서 실행되므로 위젯에 접근하면 안 된다."""
+        request_id = next(self._ids)
+        self._queue.append((request_id, fn, args, meta))
+        self.queue_changed.emit(len(self._queue))
+        self._pump()
+        return request_id
+
+    def cancel(self, request_id: Optional[int] = None):
+        """실행 중인 요청(request_id 미지정 시) 또는 특정 요청을 취소한다."""
+        if request_id is None or (self._current and self._current.request_id == request_id):
+            if self._current: self._current.token.cancel()
+            return
+        for item in list(self._queue):
+            if item[0] == request_id:
+                self._queue.remove(item)
+                self.cancelled.emit(request_id)
+        self.queue_changed.emit(len(self._queue))
+
+    def cancel_all(self):
+        while self._queue:
+            self.cancelled.emit(self._queue.popleft()[0])
+        self.queue_changed.emit(0)
+        if self._current: self._current.token.cancel()
+
+    def is_busy(self) -> bool:
+        return self._current is not None
+
+    def pending_count(self) -> int:
+        return len(self._queue)
+
+    def _pump(self):
+        if self._current is not None or not self._queue: return
+        request_id, fn, args, meta = self._queue.popleft()
+        self.queue_changed.emit(len(self._queue))
+        self._current = RequestContext(request_id, CancelToken(), self)
+        self.started.emit(request_id, meta)
+        self.pool.start(_RequestRunnable(fn, args, self._current, self._done))
+
+    @pyqtSlot(int, str, object)
+    def _on_done(self, request_id: int, status: str, result: object):
+        # 결과 시그널을 먼저 내보내 GUI가 상태(last_df, history 등)를 반영한 뒤 다음 요청을 시작한다.
+        if status == "ok": self.finished.emit(request_id, result)
+        elif status == "cancelled": self.cancelled.emit(request_id)
+        else: self.failed.emit(request_id, str(result))
+        self._current = None
+        if not self._queue: self.queue_changed.emit(0)  # 유휴 상태 알림
+        self._pump()
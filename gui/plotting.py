@@ -0,0 +1,150 @@
+# gui/plotting.py
+"""
+그래프 렌더링 엔진 (대용량 결과용)
+
+기존 _maybe_plot은 DataFrame 전체로 px.line을 만들고 fig.to_html(include_plotlyjs="cdn")을 매번 setHtml로 다시 읽었다.
+(행 수만큼 JSON이 커지고, 오프라인이면 CDN의 plotly.js를 못 받아 그래프가 안 나온다)
+    - 다운샘플링: max_points를 넘는 시리즈는 LTTB(모양 보존) 또는 min-max(구간별 최소/최대) 데시메이션으로 줄인 뒤 직렬화한다.
+    - WebGL: 원본 점 수가 gl_threshold를 넘는 시리즈는 Scattergl로 그린다 (gui/charts.py).
+    - 영속 페이지: plotly 패키지에 들어 있는 plotly.min.js를 한 번만 읽어 둔 셸 페이지를 띄우고,
+      이후 그래프/안내 문구는 runJavaScript로 Plotly.react / 텍스트 교체만 한다 (페이지 재로딩 없음).
+numpy/pandas만 쓰는 함수(lttb, minmax_decimate, downsample)는 Qt 없이도 쓸 수 있다. 차트 종류 추론과 그림 생성은 gui/charts.py.
+"""
+import json, os
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+BG = "#24272E"
+
+
+# ── 다운샘플링 ──────────────────────────────────────────────────
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: 선택된 점의 인덱스(오름차순)를 돌려준다. x는 정렬되어 있어야 한다.
+    버킷 경계/다음 버킷 평균은 한 번에 계산하고, 앞 점에 의존하는 선택만 버킷 단위로 돈다 (버킷 안은 벡터 연산).
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3: return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)  # 첫/마지막 점을 뺀 n_out-2개 버킷의 경계
+    sums_x, sums_y = np.add.reduceat(x[:-1], edges[:-1]), np.add.reduceat(y[:-1], edges[:-1])
+    counts = np.diff(edges)
+    avg_x = np.append(sums_x / counts, x[-1])[1:]  # 버킷 i의 "다음 버킷 평균" (마지막 버킷은 끝점)
+    avg_y = np.append(sums_y / counts, y[-1])[1:]
+
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        bx, by = x[lo:hi], y[lo:hi]
+        area = np.abs((x[a] - avg_x[i]) * (by - y[a]) - (x[a] - bx) * (avg_y[i] - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def minmax_decimate(y: np.ndarray, n_out: int) -> np.ndarray:
+    """구간마다 최소/최대 점의 인덱스를 남긴다 (스파이크 보존). 완전 벡터화."""
+    n = len(y)
+    buckets = max(n_out // 2, 1)
+    if n_out >= n: return np.arange(n)
+    size = -(-n // buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    grid = padded.reshape(buckets, size)
+    valid = ~np.all(np.isnan(grid), axis=1)
+    base = np.arange(buckets)[valid] * size
+    grid = grid[valid]
+    idx = np.concatenate([base + np.nanargmin(grid, axis=1), base + np.nanargmax(grid, axis=1), [0, n - 1]])
+    return np.unique(idx)
+
+
+def downsample(df: pd.DataFrame, x_col: str, y_col: str, max_points: int, method: str = "lttb") -> Tuple[pd.DataFrame, int]:
+    """(x 정렬 + 결측 제거 + 다운샘플된 DataFrame, 원본 점 개수)."""
+    data = df[[x_col, y_col]].dropna()
+    if not data[x_col].is_monotonic_increasing: data = data.sort_values(x_col, kind="stable")
+    n = len(data)
+    if n <= max_points: return data, n
+    y = pd.to_numeric(data[y_col], errors="coerce").to_numpy(dtype=np.float64)
+    if method == "minmax":
+        idx = minmax_decimate(y, max_points)
+    else:
+        xs = data[x_col]
+        x = xs.to_numpy(dtype=np.float64) if pd.api.types.is_numeric_dtype(xs) else np.arange(n, dtype=np.float64)
+        idx = lttb(x, y, max_points)
+    return data.iloc[idx], n
+
+
+# ── 공통 스타일 ─────────────────────────────────────────────────
+def dark_layout(fig, title: str, x_title: str = "", y_title: str = ""):
+    """앱 테마(plotly_dark + 배경색)에 맞춘 레이아웃."""
+    fig.update_layout(template="plotly_dark", plot_bgcolor=BG, paper_bgcolor=BG, font_color="#EAEAEA", title_font_size=16,
+                      title_text=title, xaxis_title=x_title, yaxis_title=y_title, margin=dict(l=60, r=20, t=50, b=50))
+    return fig
+
+
+# ── 영속 그래프 페이지 ──────────────────────────────────────────
+def plotly_js_path() -> Optional[str]:
+    """로컬 plotly.js 번들 경로 (PLOTLY_JS 환경변수 > plotly 패키지 내장본). 없으면 None."""
+    path = os.getenv("PLOTLY_JS")
+    if path and os.path.exists(path): return path
+    try:
+        import plotly
+        path = os.path.join(os.path.dirname(plotly.__file__), "package_data", "plotly.min.js")
+        return path if os.path.exists(path) else None
+    except ImportError:
+        return None
+
+
+SHELL_HTML = """<html><head><meta charset="utf-8">
+<script src="%(src)s"></script>
+<style>html,body{margin:0;height:100%%;background:%(bg)s;color:#EAEAEA;font-family:Segoe UI,Malgun Gothic,Arial}
+#plot{width:100%%;height:100%%;display:none}#msg{white-space:pre-wrap;padding:4px}</style></head>
+<body><div id="msg">%(msg)s</div><div id="plot"></div>
+<script>
+var plotDiv = document.getElementById('plot'), msgDiv = document.getElementById('msg');
+function showMessage(t) { if (window.Plotly) Plotly.purge(plotDiv); plotDiv.style.display = 'none'; msgDiv.style.display = 'block'; msgDiv.textContent = t; }
+function renderFigure(fig) {
+  if (!window.Plotly) { showMessage('plotly.js를 불러오지 못했습니다.'); return; }
+  msgDiv.style.display = 'none'; plotDiv.style.display = 'block';
+  Plotly.react(plotDiv, fig.data, fig.layout, {responsive: true, displaylogo: false});
+}
+window.addEventListener('resize', function () { if (window.Plotly && plotDiv.data) Plotly.Plots.resize(plotDiv); });
+</script></body></html>"""
+
+
+class PlotView:
+    """
+    QWebEngineView 하나에 셸 페이지를 한 번만 띄우고, 이후에는 runJavaScript로만 갱신한다.
+    페이지 로딩이 끝나기 전에 온 요청은 마지막 것 하나만 보관했다가 loadFinished 후에 실행한다.
+    """
+    def __init__(self, webview, placeholder: str = ""):
+        from PyQt5.QtCore import QUrl
+        self.webview = webview
+        self._ready = False
+        self._pending: Optional[str] = None
+        js = plotly_js_path()
+        src = QUrl.fromLocalFile(js).toString() if js else "https://cdn.plot.ly/plotly-latest.min.js"  # 번들이 없을 때만 CDN
+        base = QUrl.fromLocalFile(os.path.dirname(js) + os.sep) if js else QUrl()
+        webview.loadFinished.connect(self._on_loaded)
+        webview.setHtml(SHELL_HTML % {"src": src, "bg": BG, "msg": placeholder}, base)
+
+    def _on_loaded(self, ok: bool):
+        self._ready = True
+        if self._pending is not None:
+            script, self._pending = self._pending, None
+            self.webview.page().runJavaScript(script)
+
+    def _run(self, script: str):
+        if self._ready: self.webview.page().runJavaScript(script)
+        else: self._pending = script
+
+    def show_figure(self, fig_json: str):
+        self._run(f"renderFigure({fig_json});")
+
+    def show_text(self, text: str):
+        self._run(f"showMessage({json.dumps(text, ensure_ascii=False)});")
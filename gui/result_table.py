@@ -0,0 +1,287 @@
+# gui/result_table.py
+"""
+결과 표 (가상화된 QTableView)
+
+이전에는 쿼리 결과를 sql_preview에 HTML/텍스트 덤프로 넣었다 (100행 초과면 상·하위 일부만, 큰 결과는 렌더링이 느림).
+여기서는 결과를 QAbstractTableModel로 감싸 화면에 보이는 행만 그때그때 읽는다.
+    - 원본: DataFrame(FrameSource) 또는 스트리밍 결과를 흘려 쓴 Arrow IPC 파일(ArrowFileSource, 메모리 매핑 — 전체 결과를 RAM에 올리지 않음).
+    - 페이지: canFetchMore / fetchMore로 PAGE_ROWS행씩 늘려 가고, 셀 값은 페이지 단위로 꺼내 최근 CACHE_PAGES개만 보관한다.
+      표시 문자열은 data()가 불릴 때 만든다 (보이는 셀만).
+    - 정렬: 헤더 클릭 → 원본에서 정렬 순서(행 번호 배열)만 계산한다 (pyarrow.compute.sort_indices / pandas 안정 정렬).
+    - 내보내기: 전체 결과(정렬 순서 반영)를 CSV / Parquet로. Arrow 원본은 배치 단위로 흘려 쓴다. 백그라운드 스레드에서 실행.
+"""
+import os, threading
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt, pyqtSignal
+from PyQt5.QtWidgets import QFileDialog, QHBoxLayout, QHeaderView, QLabel, QPushButton, QTableView, QVBoxLayout, QWidget
+
+
+def format_cell(v) -> str:
+    if v is None or v is pd.NA or v is pd.NaT: return ""
+    if isinstance(v, (float, np.floating)):
+        if v != v: return ""  # NaN
+        return f"{v:.6g}"
+    return str(v)
+
+
+class FrameSource:
+    """메모리에 있는 DataFrame (일반 조회 결과, LARGE_FETCH=copy 결과, 스트리밍 결과의 표본)."""
+    def __init__(self, df: pd.DataFrame):
+        self.df = df.reset_index(drop=True)
+        self.columns: List[str] = [str(c) for c in df.columns]
+        self.rows = len(df)
+        self.order: Optional[np.ndarray] = None
+
+    def numeric(self, col: int) -> bool:
+        return pd.api.types.is_numeric_dtype(self.df.dtypes.iloc[col]) and not pd.api.types.is_bool_dtype(self.df.dtypes.iloc[col])
+
+    def page(self, start: int, stop: int) -> List[list]:
+        part = self.df.iloc[start:stop] if self.order is None else self.df.iloc[self.order[start:stop]]
+        return [part.iloc[:, j].tolist() for j in range(len(self.columns))]
+
+    def sort(self, col: Optional[int], ascending: bool = True):
+        if col is None: self.order = None; return
+        s = self.df.iloc[:, col]
+        self.order = s.sort_values(ascending=ascending, kind="stable", na_position="last").index.to_numpy()
+
+    def export(self, path: str, fmt: str):
+        df = self.df if self.order is None else self.df.iloc[self.order]
+        if fmt == "parquet": df.to_parquet(path, index=False)
+        else: df.to_csv(path, index=False)
+
+    def close(self):
+        pass
+
+
+class ArrowFileSource:
+    """ResultDigest가 흘려 쓴 Arrow IPC 파일. owned=True면 close()에서 파일을 지운다."""
+    EXPORT_ROWS = 65_536  # 정렬된 결과를 내보낼 때 한 번에 take할 행 수
+
+    def __init__(self, path: str, owned: bool = True):
+        import pyarrow as pa  # pyarrow 필요 — Arrow 원본을 쓸 때만 import
+        self.path, self.owned = path, owned
+        self._mmap = pa.memory_map(path)
+        self.table = pa.ipc.open_file(self._mmap).read_all()  # 메모리 매핑 위의 zero-copy 테이블
+        self.columns = list(self.table.column_names)
+        self.rows = self.table.num_rows
+        self.order: Optional[np.ndarray] = None
+
+    def numeric(self, col: int) -> bool:
+        import pyarrow as pa
+        t = self.table.schema.field(col).type
+        return pa.types.is_integer(t) or pa.types.is_floating(t) or pa.types.is_decimal(t)
+
+    def page(self, start: int, stop: int) -> List[list]:
+        part = self.table.slice(start, stop - start) if self.order is None else self.table.take(self.order[start:stop])
+        return [c.to_pylist() for c in part.columns]
+
+    def sort(self, col: Optional[int], ascending: bool = True):
+        import pyarrow.compute as pc
+        if col is None: self.order = None; return
+        keys = [(self.columns[col], "ascending" if ascending else "descending")]
+        self.order = pc.sort_indices(self.table, sort_keys=keys).to_numpy()  # null은 기본값대로 맨 뒤
+
+    def _batches(self, table, order):
+        if order is None:
+            yield from table.to_batches()
+            return
+        for i in range(0, len(order), self.EXPORT_ROWS):
+            yield from table.take(order[i:i + self.EXPORT_ROWS]).to_batches()
+
+    def export(self, path: str, fmt: str):
+        table, order = self.table, self.order  # 내보내는 중에 정렬이 바뀌어도 시작 시점 순서로
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+            with pq.ParquetWriter(path, table.schema) as writer:
+                for batch in self._batches(table, order): writer.write_batch(batch)
+        else:
+            from pyarrow import csv as pa_csv
+            with pa_csv.CSVWriter(path, table.schema) as writer:
+                for batch in self._batches(table, order): writer.write_batch(batch)
+
+    def close(self):
+        self.table = None
+        self._mmap.close()
+        if self.owned:
+            try: os.remove(self.path)
+            except OSError: pass
+
+
+class ResultTableModel(QAbstractTableModel):
+    PAGE_ROWS = 1000
+    CACHE_PAGES = 16
+
+    def __init__(self, source=None, parent=None):
+        super().__init__(parent)
+        self.source = None
+        self.set_source(source)
+
+    def set_source(self, source, close_old: bool = True):
+        """원본을 바꾼다. close_old=False면 이전 원본을 닫지 않는다 (내보내는 중인 원본)."""
+        self.beginResetModel()
+        old, self.source = self.source, source
+        self._pages: "OrderedDict[int, List[list]]" = OrderedDict()
+        self._loaded = min(self.PAGE_ROWS, source.rows) if source else 0
+        self._numeric = [source.numeric(j) for j in range(len(source.columns))] if source else []
+        self.endResetModel()
+        if close_old and old is not None and old is not source: old.close()
+
+    @property
+    def loaded(self) -> int:
+        return self._loaded
+
+    # ── 크기 / 점진 로드 ───────────────────────────────────────
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._loaded
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() or self.source is None else len(self.source.columns)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.source is not None and self._loaded < self.source.rows
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.source is None: return
+        n = min(self.PAGE_ROWS, self.source.rows - self._loaded)
+        if n <= 0: return
+        self.beginInsertRows(QModelIndex(), self._loaded, self._loaded + n - 1)
+        self._loaded += n
+        self.endInsertRows()
+
+    # ── 셀 값 ──────────────────────────────────────────────────
+    def _page(self, p: int) -> List[list]:
+        page = self._pages.get(p)
+        if page is None:
+            start = p * self.PAGE_ROWS
+            page = self._pages[p] = self.source.page(start, min(start + self.PAGE_ROWS, self.source.rows))
+            while len(self._pages) > self.CACHE_PAGES: self._pages.popitem(last=False)
+        else:
+            self._pages.move_to_end(p)
+        return page
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or self.source is None: return None
+        if role == Qt.DisplayRole:
+            p, r = divmod(index.row(), self.PAGE_ROWS)
+            return format_cell(self._page(p)[index.column()][r])
+        if role == Qt.TextAlignmentRole and self._numeric[index.column()]:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or self.source is None: return None
+        if orientation == Qt.Horizontal: return self.source.columns[section] if section < len(self.source.columns) else None
+        return str(section + 1)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if self.source is None or self.source.rows == 0: return
+        self.layoutAboutToBeChanged.emit()
+        self.source.sort(column if column >= 0 else None, order == Qt.AscendingOrder)
+        self._pages.clear()
+        self.layoutChanged.emit()
+
+
+class ResultTableView(QWidget):
+    """결과 표 + 상태 줄(로드한 행 / 전체 행) + CSV / Parquet 내보내기 버튼."""
+    export_done = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.model = ResultTableModel(parent=self)
+        self.view = QTableView()
+        self.view.setModel(self.model)
+        self.view.setAlternatingRowColors(True)
+        self.view.setEditTriggers(QTableView.NoEditTriggers)
+        self.view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)  # 행 높이 계산 없이 스크롤
+        self.view.verticalHeader().setDefaultSectionSize(22)
+        self.view.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)  # 켜자마자 0번 컬럼으로 정렬하지 않도록
+        self.view.setSortingEnabled(True)
+        self.model.rowsInserted.connect(self._update_status)
+        self.model.modelReset.connect(self._update_status)
+
+        self.status = QLabel("")
+        self.status.setStyleSheet("color:#AAAAAA;")
+        self.csv_btn = QPushButton("CSV 내보내기")
+        self.parquet_btn = QPushButton("Parquet 내보내기")
+        self.csv_btn.clicked.connect(lambda: self._export("csv"))
+        self.parquet_btn.clicked.connect(lambda: self._export("parquet"))
+        self.export_done.connect(self._on_export_done)
+        self._note = ""
+        self._exporting = None  # 내보내는 중인 원본 (끝나기 전에 표가 바뀌면 끝난 뒤 닫음)
+        self._stale = None
+
+        row = QHBoxLayout()
+        row.addWidget(self.status, 1)
+        row.addWidget(self.csv_btn)
+        row.addWidget(self.parquet_btn)
+        box = QVBoxLayout(self)
+        box.setContentsMargins(0, 0, 0, 0)
+        box.addWidget(self.view, 1)
+        box.addLayout(row)
+        self._update_status()
+
+    def set_frame(self, df: Optional[pd.DataFrame], note: str = ""):
+        self._set(FrameSource(df) if df is not None else None, note)
+
+    def set_file(self, path: str, note: str = "", owned: bool = True):
+        self._set(ArrowFileSource(path, owned=owned), note)
+
+    def clear(self):
+        self._set(None, "")
+
+    def _set(self, source, note: str):
+        self._note = note
+        self.view.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        old = self.model.source
+        busy = self._exporting is not None and old is self._exporting
+        if busy: self._stale = old
+        self.model.set_source(source, close_old=not busy)
+        self.view.scrollToTop()
+
+    def _update_status(self, *_):
+        src = self.model.source
+        enabled = bool(src and src.rows) and self._exporting is None
+        self.csv_btn.setEnabled(enabled)
+        self.parquet_btn.setEnabled(enabled)
+        if src is None: self.status.setText(""); return
+        text = f"{src.rows:,}행 × {len(src.columns)}열" if self.model.loaded >= src.rows else \
+            f"{src.rows:,}행 중 {self.model.loaded:,}행 로드 (스크롤하면 더 읽음)"
+        self.status.setText(f"{text}  {self._note}".rstrip())
+
+    # ── 내보내기 (백그라운드 스레드) ────────────────────────────
+    def _export(self, fmt: str):
+        src = self.model.source
+        if src is None or self._exporting is not None: return
+        ext = ".parquet" if fmt == "parquet" else ".csv"
+        path, _ = QFileDialog.getSaveFileName(self, "결과 내보내기", "result" + ext, f"{fmt.upper()} (*{ext})")
+        if not path: return
+        if not path.lower().endswith(ext): path += ext
+        self.export(path, fmt)
+
+    def export(self, path: str, fmt: str) -> threading.Thread:
+        """전체 결과(현재 정렬 순서)를 path로 쓴다. 끝나면 export_done 시그널 (안내 문구)."""
+        src = self._exporting = self.model.source
+        self._update_status()
+        self.status.setText(f"{os.path.basename(path)} 내보내는 중…")
+
+        def run():
+            try:
+                src.export(path, fmt)
+                self.export_done.emit(f"내보냄: {path} ({src.rows:,}행)")
+            except Exception as e:
+                self.export_done.emit(f"내보내기 실패: {e}")
+        worker = threading.Thread(target=run, name="result-export", daemon=True)
+        worker.start()
+        return worker
+
+    def _on_export_done(self, message: str):
+        self._exporting = None
+        if self._stale is not None:
+            self._stale.close()
+            self._stale = None
+        self._update_status()
+        self.status.setText(message)
@@ -0,0 +1,83 @@
+# gui/startup.py
+"""
+빠른 시작 (Cold Start)
+
+이전에는 app.py import가 openai / QtWebEngine까지 모두 읽고, App.__init__이 프로젝트 목록 조회(DB 연결 + 인증)를
+마칠 때까지 창이 뜨지 않았다. 창을 먼저 띄우고 나머지는 뒤로 미루기 위한 도구들:
+    - ProjectListLoader: 마지막으로 받은 프로젝트 목록(JSON 캐시)을 바로 돌려주고, DB 조회는 백그라운드 스레드에서 한 뒤
+      loaded / failed 시그널로 GUI 스레드에 전달한다 (성공하면 캐시를 갱신).
+    - preload: 창이 뜬 뒤 백그라운드 스레드에서 첫 질문에 필요한 무거운 모듈(openai 등)을 미리 import한다.
+측정: python bench/bench_suite.py --only startup (import / App 생성 / 첫 화면 / 프로젝트 목록까지의 시간).
+"""
+import json, os, threading, time
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+Project = Tuple[int, str]
+
+
+def read_project_cache(path: str) -> List[Project]:
+    """캐시 파일의 [(project_id, project_name), ...] (없거나 깨졌으면 빈 목록)."""
+    if not path: return []
+    try:
+        with open(path, encoding="utf-8") as f: data = json.load(f)
+        return [(int(p["project_id"]), str(p["project_name"])) for p in data.get("projects", [])]
+    except (OSError, ValueError, KeyError, TypeError):
+        return []
+
+
+def write_project_cache(path: str, projects: Iterable[Project]):
+    if not path: return
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"saved_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                       "projects": [{"project_id": pid, "project_name": name} for pid, name in projects]}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"⚠️ 프로젝트 목록 캐시 저장 실패: {e}")
+
+
+class ProjectListLoader(QObject):
+    """fetch()(→ [(id, name)])를 백그라운드 스레드에서 실행하고 결과를 시그널로 GUI 스레드에 넘긴다."""
+    loaded = pyqtSignal(object)  # [(project_id, project_name), ...]
+    failed = pyqtSignal(str)
+
+    def __init__(self, fetch: Callable[[], List[Project]], cache_path: str = "", parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.fetch, self.cache_path = fetch, cache_path
+        self.done = threading.Event()  # 배치 / 벤치마크에서 기다릴 때
+        self.load_ms: Optional[float] = None
+
+    def cached(self) -> List[Project]:
+        return read_project_cache(self.cache_path)
+
+    def start(self):
+        self.done.clear()
+        threading.Thread(target=self._run, name="project-list", daemon=True).start()
+
+    def _run(self):
+        started = time.perf_counter()
+        try:
+            projects = self.fetch()
+        except Exception as e:
+            self.load_ms = (time.perf_counter() - started) * 1000
+            self.failed.emit(str(e))  # 다른 스레드에서 emit → GUI 스레드의 슬롯이 큐를 거쳐 실행
+        else:
+            self.load_ms = (time.perf_counter() - started) * 1000
+            write_project_cache(self.cache_path, projects)
+            self.loaded.emit(projects)
+        finally:
+            self.done.set()
+
+
+def preload(*fns: Callable[[], object]) -> threading.Thread:
+    """fns를 차례로 백그라운드 스레드에서 실행한다 (실패는 출력만 — 실제 사용 시점에 다시 시도된다)."""
+    def run():
+        for fn in fns:
+            try: fn()
+            except Exception as e: print(f"⚠️ 미리 불러오기 실패: {e}")
+    thread = threading.Thread(target=run, name="preload", daemon=True)
+    thread.start()
+    return thread
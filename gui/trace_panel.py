@@ -0,0 +1,85 @@
+# gui/trace_panel.py
+"""
+단계별 지연 패널 (QDockWidget)
+
+db/tracing.py의 tracer가 모은 span 이름별 통계(count / p50 / p95 / max / 마지막)를 파이프라인 순서로 보여주고,
+최근 오류(예외로 끝난 span, LLM 오류 후 대체 동작, 쿼리 실행 오류 등)를 아래 목록에 표시한다.
+통계는 TRACE_STORE에 쌓인 이전 실행 기록으로 시작하므로 앱을 다시 켜도 누적 p50/p95를 볼 수 있다.
+표는 REFRESH_MS마다 갱신한다 (요청이 없으면 같은 내용이면 다시 그리지 않음).
+"""
+import time
+
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtWidgets import (QDockWidget, QHeaderView, QHBoxLayout, QLabel, QListWidget, QPushButton, QTableWidget,
+                             QTableWidgetItem, QVBoxLayout, QWidget)
+
+# 파이프라인 순서 (여기 없는 이름은 뒤에 알파벳순)
+STAGE_ORDER = ["request", "classify", "llm.router", "llm.classify", "generate", "llm.sql", "execute", "guard",
+               "validate", "repair", "llm.repair", "db.local", "db.query", "db.stream", "db.convert", "db.prepared",
+               "answer", "llm.answer", "llm.chat", "llm.call", "chart", "chart.render", "prefetch"]
+COLUMNS = ["단계", "횟수", "p50 ms", "p95 ms", "max ms", "마지막 ms"]
+
+
+class TracePanel(QDockWidget):
+    REFRESH_MS = 2000
+
+    def __init__(self, tracer, parent=None):
+        super().__init__("단계별 지연 (p50 / p95)", parent)
+        self.setObjectName("trace_panel")
+        self.tracer = tracer
+        self._last = None
+
+        self.table = QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.errors = QListWidget()
+        self.errors.setMaximumHeight(90)
+        clear_btn = QPushButton("초기화")
+        clear_btn.clicked.connect(self._clear)
+
+        head = QHBoxLayout()
+        head.addWidget(QLabel("최근 오류"), 1)
+        head.addWidget(clear_btn)
+        box = QVBoxLayout()
+        box.addWidget(self.table, 1)
+        box.addLayout(head)
+        box.addWidget(self.errors)
+        body = QWidget()
+        body.setLayout(box)
+        self.setWidget(body)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(self.REFRESH_MS)
+        self.refresh()
+
+    def refresh(self):
+        stats, errors = self.tracer.stats(), self.tracer.recent_errors()
+        key = (tuple((k, v["count"], v["last_ms"]) for k, v in stats.items()), len(errors), errors[-1]["time"] if errors else None)
+        if key == self._last: return
+        self._last = key
+
+        rank = {name: i for i, name in enumerate(STAGE_ORDER)}
+        names = sorted(stats, key=lambda n: (rank.get(n, len(rank)), n))
+        self.table.setRowCount(len(names))
+        for row, name in enumerate(names):
+            s = stats[name]
+            values = [name, f"{s['count']:,}", f"{s['p50_ms']:,.1f}", f"{s['p95_ms']:,.1f}", f"{s['max_ms']:,.1f}", f"{s['last_ms']:,.1f}"]
+            for col, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if col: item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.table.setItem(row, col, item)
+
+        self.errors.clear()
+        for e in reversed(errors):
+            stamp = time.strftime("%H:%M:%S", time.localtime(e["time"]))
+            self.errors.addItem(f"{stamp}  [{e['span'] or '-'}]  {e['error']}")
+            self.errors.item(self.errors.count() - 1).setToolTip((e.get("detail") or e["error"])[-3000:])  # traceback / SQL
+
+    def _clear(self):
+        self.tracer.clear()
+        self._last = None
+        self.refresh()
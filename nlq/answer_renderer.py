@@ -0,0 +1,215 @@
+# nlq/answer_renderer.py
+"""
+로컬 답변 렌더러 (LLM 답변 단계 생략)
+
+작은 표, 단일 값, 요약 통계처럼 결과 자체가 답인 경우 llm_answer는 표를 감싸는 문장을 쓰려고 LLM을 한 번 더 호출했다.
+결과 모양을 보고 답변 종류를 정한 뒤 HTML 답변과 결정적인 "[데이터 해석]"을 pandas/NumPy로 직접 만든다.
+    - empty:  결과 없음 안내
+    - scalar: 1행 결과 (값 하나 또는 컬럼별 값 목록). time 문자열은 "3월 1일 09:28:55.960"처럼 읽기 쉽게
+    - trend:  레이어 컬럼 + 숫자 컬럼 (프로젝트별) — 최소제곱 기울기/R²로 추세, 최소·최대 레이어, MAD 기준 이상치
+    - table:  그 밖의 100행 이하 결과 — 숫자 컬럼별 범위/평균과 최소·최대 행
+    - stats:  큰 결과(스트리밍 표본 포함) — 전체 행 수와 숫자 컬럼 요약 통계
+질문에 이유/평가/비교 설명 같은 서술이 필요하면(NARRATIVE_RE) None을 돌려 LLM 답변으로 넘긴다.
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from nlq.prompt_builder import numeric_summary
+
+KINDS = ("empty", "scalar", "trend", "table", "stats")
+NARRATIVE_RE = re.compile(r"왜|이유|원인|해석해|설명해|의미|평가|판단|괜찮|좋았|나빴|좋은지|나쁜지|문제|개선|추천|조언|어때|어떤가|어떻게 생각|"
+                          r"분석해|비교해|인사이트|예측|품질|정상인지|why|explain|insight", re.I)
+_RANKING_RE = re.compile(r"상위|하위|순위|랭킹|top|bottom", re.I)  # 정렬 기준이 레이어가 아니므로 추세로 읽지 않는다
+LAYER_COLS = ("layer_number", "layer")
+_TIME_RE = re.compile(r"^(\d{2})_(\d{2})_(\d{2})_(\d{2})_(\d{2})_(\d{3})$")
+_ID_COLS = {"project_id", "summary_id", "id", "bead_number"}
+
+
+def table_html(frame: pd.DataFrame) -> str:
+    """결과 전체를 HTML 표로 붙이는 공통 머리말 + 표 (llm_answer의 표 첨부와 같은 형식)."""
+    return f"요청하신 <strong>모든</strong> 결과를 HTML 표로 제공합니다.<br>{frame.to_html(index=False, border=1)}<br>"
+
+
+def fmt_value(v) -> str:
+    """숫자는 크기에 맞춰 자릿수를 정하고, time 문자열('MM_DD_HH24_MI_SS_MS')은 읽기 쉬운 형식으로."""
+    if v is None or (isinstance(v, float) and np.isnan(v)) or v is pd.NaT: return "없음"
+    if isinstance(v, (bool, np.bool_)): return str(bool(v))
+    if isinstance(v, (int, np.integer)): return f"{int(v):,}"
+    if isinstance(v, (float, np.floating)):
+        v = float(v)
+        if v.is_integer() and abs(v) < 1e15: return f"{int(v):,}"
+        if abs(v) >= 1000: return f"{v:,.1f}"
+        if abs(v) >= 1: return f"{v:,.2f}"
+        return f"{v:.4g}"
+    m = _TIME_RE.match(str(v))
+    if m:
+        mo, dd, hh, mi, ss, ms = m.groups()
+        return f"{int(mo)}월 {int(dd)}일 {hh}:{mi}:{ss}.{ms}"
+    return str(v)
+
+
+def classify_result(df: pd.DataFrame, complete: bool = True, max_table_rows: int = 100, question: str = "") -> str:
+    if df is None or df.empty: return "empty"
+    if not complete or len(df) > max_table_rows: return "stats"
+    if len(df) == 1: return "scalar"
+    layer = next((c for c in LAYER_COLS if c in df.columns), None)
+    if layer and len(df) >= 3 and _metric_columns(df, layer) and not _RANKING_RE.search(question): return "trend"
+    return "table"
+
+
+def _metric_columns(df: pd.DataFrame, layer: Optional[str] = None) -> List[str]:
+    return [c for c in df.select_dtypes(include="number").columns if c != layer and c not in _ID_COLS]
+
+
+def linear_trend(x: np.ndarray, Y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """열마다 y = a + b·x 최소제곱 기울기 b와 R² (NaN은 열별로 제외). Y: (n, k)."""
+    valid = ~np.isnan(Y)
+    n = valid.sum(axis=0)
+    xv = np.where(valid, x[:, None], 0.0)
+    yv = np.where(valid, Y, 0.0)
+    with np.errstate(all="ignore"):
+        mx, my = xv.sum(axis=0) / n, yv.sum(axis=0) / n
+        dx, dy = np.where(valid, x[:, None] - mx, 0.0), np.where(valid, Y - my, 0.0)
+        sxx, syy, sxy = (dx * dx).sum(axis=0), (dy * dy).sum(axis=0), (dx * dy).sum(axis=0)
+        slope = np.where(sxx > 0, sxy / sxx, np.nan)
+        r2 = np.where((sxx > 0) & (syy > 0), sxy * sxy / (sxx * syy), 0.0)
+    return slope, r2
+
+
+def mad_outliers(values: np.ndarray, threshold: float = 3.5) -> np.ndarray:
+    """수정 z-점수(0.6745·|x−중앙값|/MAD)가 threshold를 넘는 위치 (불리언 배열)."""
+    med = np.nanmedian(values)
+    mad = np.nanmedian(np.abs(values - med))
+    if not mad or np.isnan(mad): return np.zeros(len(values), dtype=bool)
+    with np.errstate(invalid="ignore"):
+        return 0.6745 * np.abs(values - med) / mad > threshold
+
+
+class AnswerRenderer:
+    """
+    mode: auto(서술이 필요 없는 질문만 로컬) | local(가능하면 항상 로컬) | llm(항상 LLM).
+    kinds: 로컬로 렌더링할 결과 종류 (KINDS의 부분집합). labels: 컬럼명 → 한국어 설명.
+    """
+    def __init__(self, mode: str = "auto", kinds: Iterable[str] = KINDS, labels: Optional[Dict[str, str]] = None,
+                 max_table_rows: int = 100, max_outliers: int = 5):
+        self.mode = mode
+        self.kinds = {k for k in kinds if k in KINDS}
+        self.labels = labels or {}
+        self.max_table_rows, self.max_outliers = max_table_rows, max_outliers
+
+    def label(self, col: str) -> str:
+        desc = self.labels.get(col)
+        return f"`{col}`({desc})" if desc and desc != col else f"`{col}`"
+
+    def choose(self, question: str, res) -> Optional[str]:
+        """로컬로 렌더링할 결과 종류, LLM에 맡겨야 하면 None."""
+        if self.mode == "llm": return None
+        if self.mode == "auto" and NARRATIVE_RE.search(question or ""): return None
+        df, complete = self._frame(res)
+        kind = classify_result(df, complete, self.max_table_rows, question or "")
+        return kind if kind in self.kinds else None
+
+    def render(self, question: str, res) -> Optional[Tuple[str, str]]:
+        """(HTML 답변, 결과 종류) 또는 None (LLM 답변 필요)."""
+        kind = self.choose(question, res)
+        if kind is None: return None
+        df, _ = self._frame(res)
+        if kind == "empty": return "조회 결과가 없습니다. 선택한 프로젝트나 조건(레이어, 시간 범위 등)을 확인해 주세요.", kind
+        if kind == "scalar": return self._scalar(df), kind
+        if kind == "stats": return self._stats(res, df), kind
+        notes = self._trend_notes(df) if kind == "trend" else self._table_notes(df)
+        body = table_html(df)
+        if notes: body += "<br><strong>[데이터 해석]</strong><br>" + "<br>".join(notes)
+        return body, kind
+
+    @staticmethod
+    def _frame(res) -> Tuple[pd.DataFrame, bool]:
+        if isinstance(res, pd.DataFrame) or res is None: return res, True
+        return (res.frame(), True) if res.complete else (res.head(), False)  # ResultDigest
+
+    # ── 종류별 렌더링 ─────────────────────────────────────────
+    def _scalar(self, df: pd.DataFrame) -> str:
+        row = df.iloc[0]
+        if len(df.columns) == 1:
+            return f"조회 결과 {self.label(df.columns[0])} 값은 <strong>{fmt_value(row.iloc[0])}</strong>입니다."
+        items = "<br>".join(f"• {self.label(c)}: <strong>{fmt_value(row[c])}</strong>" for c in df.columns)
+        return f"조회 결과는 다음과 같습니다.<br>{items}"
+
+    def _stats(self, res, df: pd.DataFrame) -> str:
+        rows = res.rows if not isinstance(res, pd.DataFrame) else len(res)
+        summary = res.summary() if not isinstance(res, pd.DataFrame) else numeric_summary(res)
+        text = f"데이터가 너무 많아 모두 표시하기 어렵습니다. (총 {rows:,}행, SQL 미리보기 창에서 상·하위 행을 확인할 수 있습니다)"
+        if summary is None or summary.empty: return text
+        summary = summary[~summary["column"].isin(_ID_COLS)]
+        constant = summary["min"].to_numpy() == summary["max"].to_numpy()
+        text += f"<br><br><strong>[숫자 컬럼 요약 (전체 {rows:,}행)]</strong><br>{summary[~constant].to_html(index=False, border=1, float_format=fmt_value)}"
+        if constant.any():
+            fixed = ", ".join(f"{self.label(r['column'])} = {fmt_value(r['min'])}" for _, r in summary[constant].iterrows())
+            text += f"<br><strong>[데이터 해석]</strong><br>• 모든 행에서 값이 같은 컬럼: {fixed}"
+        return text
+
+    def _table_notes(self, df: pd.DataFrame) -> List[str]:
+        metrics = _metric_columns(df)
+        if not metrics: return []
+        key = next((c for c in df.columns if c not in metrics), None)  # 행을 가리킬 때 쓸 컬럼 (예: project_name)
+        a = df[metrics].to_numpy(dtype=np.float64, na_value=np.nan)
+        notes = []
+        with np.errstate(all="ignore"):
+            means = np.nanmean(a, axis=0)
+        for j, col in enumerate(metrics):
+            vals = a[:, j]
+            if np.isnan(vals).all(): continue
+            lo, hi = int(np.nanargmin(vals)), int(np.nanargmax(vals))
+            if vals[lo] == vals[hi]:
+                missing = int(np.isnan(vals).sum())
+                notes.append(f"• {self.label(col)}: 모든 행이 같은 값({fmt_value(vals[lo])})입니다." if not missing else
+                             f"• {self.label(col)}: 값이 있는 {len(vals) - missing:,}행은 {'모두 ' if len(vals) - missing > 1 else ''}"
+                             f"{fmt_value(vals[lo])}이고, {missing:,}행은 값이 없습니다.")
+                continue
+            where = (lambda i: f" ({key} {fmt_value(df[key].iloc[i])})") if key else (lambda i: "")
+            notes.append(f"• {self.label(col)}: 최댓값 {fmt_value(vals[hi])}{where(hi)}, 최솟값 {fmt_value(vals[lo])}{where(lo)}, 평균 {fmt_value(means[j])}")
+        return notes
+
+    def _trend_notes(self, df: pd.DataFrame) -> List[str]:
+        layer = next(c for c in LAYER_COLS if c in df.columns)
+        metrics = _metric_columns(df, layer)
+        groups = [(None, df)] if "project_id" not in df.columns or df["project_id"].nunique() <= 1 else list(df.groupby("project_id", sort=True))
+        notes = []
+        for pid, g in groups:
+            g = g.sort_values(layer, kind="stable")
+            x = pd.to_numeric(g[layer], errors="coerce").to_numpy(dtype=np.float64)
+            Y = g[metrics].to_numpy(dtype=np.float64, na_value=np.nan)
+            slope, r2 = linear_trend(x, Y)
+            prefix = f"[프로젝트 {pid}] " if pid is not None else ""
+            for j, col in enumerate(metrics):
+                vals = Y[:, j]
+                ok = ~np.isnan(vals)
+                if ok.sum() < 3: continue
+                lo, hi = int(np.nanargmin(vals)), int(np.nanargmax(vals))
+                if vals[lo] == vals[hi]:
+                    missing = len(vals) - int(ok.sum())
+                    notes.append(f"• {prefix}{self.label(col)}: 모든 레이어에서 같은 값({fmt_value(vals[lo])})입니다." if not missing else
+                                 f"• {prefix}{self.label(col)}: 값이 있는 {int(ok.sum()):,}개 레이어는 모두 {fmt_value(vals[lo])}이고, "
+                                 f"{missing:,}개 레이어는 값이 없습니다.")
+                    continue
+                span = np.nanmax(x[ok]) - np.nanmin(x[ok])
+                change, mean = slope[j] * span, np.nanmean(vals)
+                if np.isnan(slope[j]) or r2[j] < 0.3 or abs(change) < 0.01 * abs(mean or 1):
+                    trend = "뚜렷한 증가/감소 추세 없이 유지됩니다"
+                else:
+                    trend = (f"레이어가 진행될수록 {'증가' if slope[j] > 0 else '감소'}하는 추세입니다 "
+                             f"(레이어당 {slope[j]:+.3g}, 전체 {change:+,.3g} / {change / mean:+.1%}, R²={r2[j]:.2f})" if mean else
+                             f"레이어가 진행될수록 {'증가' if slope[j] > 0 else '감소'}하는 추세입니다 (레이어당 {slope[j]:+.3g}, R²={r2[j]:.2f})")
+                note = (f"• {prefix}{self.label(col)}: 레이어 {fmt_value(x[ok].min())}~{fmt_value(x[ok].max())}에서 {trend}. "
+                        f"최댓값 {fmt_value(vals[hi])} (레이어 {fmt_value(x[hi])}), 최솟값 {fmt_value(vals[lo])} (레이어 {fmt_value(x[lo])}).")
+                out = np.flatnonzero(mad_outliers(vals))
+                if len(out):
+                    shown = ", ".join(f"레이어 {fmt_value(x[i])} ({fmt_value(vals[i])})" for i in out[: self.max_outliers])
+                    more = f" 외 {len(out) - self.max_outliers}개" if len(out) > self.max_outliers else ""
+                    note += f" 중앙값에서 크게 벗어난 값: {shown}{more}."
+                notes.append(note)
+        return notes
+
@@ -0,0 +1,262 @@
+# nlq/batch.py
+"""
+헤드리스 배치 실행기 (GUI 없이 질문 파일 실행)
+
+야간 보고서 질문 세트나 회귀 점검을 위해 app.py의 요청 처리 단계(plan_request → execute_plan → answer_result)를
+질문 파일 전체에 대해 파이프라인으로 실행하고, 질문별 결과/SQL/단계별 시간을 JSONL(+ Parquet)로 남긴다.
+    - LLM 단계(분류·SQL 생성, 답변)와 DB 단계(쿼리 실행)는 서로 다른 스레드 풀에서 돌아간다.
+      한 질문이 DB를 기다리는 동안 다른 질문의 LLM 호출이 진행된다.
+    - 동시에 진행 중인 질문 수는 max_inflight로 제한한다. 결과 DataFrame이 쌓이지 않고, 답변 단계가 새 질문보다 먼저 실행된다.
+    - LLM 속도 제한(LLM_RPM)과 429/5xx 재시도(LLM_RETRIES)는 app.llm_complete가 nlq/rate_limit.py로 처리한다.
+    - 질문마다 request span을 열고 각 단계를 그 아래에서 실행한다 (db/tracing.py, 결과 행의 trace_id로 TRACE_STORE에서 조회).
+    - 비용 가드가 확인을 요구한 쿼리는 기본적으로 실행하지 않고 status="needs_confirm"으로 기록한다 (--confirm-expensive면 실행).
+
+질문 파일: .txt(한 줄에 하나, #으로 시작하면 주석) / .jsonl({"question", "ids"(선택), "id"(선택)}) / .csv(question, ids, id 컬럼)
+    python -m nlq.batch questions.txt --ids 1,2 --out results.jsonl --parquet results.parquet
+    python -m nlq.batch questions.jsonl --ids 1 --llm-workers 8 --db-workers 2 --rpm 300
+    python -m nlq.batch questions.txt --ids 1 --fake --latency 0.5      # tools/fake_openai.py 가짜 서버로 실행
+라이브러리로 쓸 때:
+    from nlq.batch import BatchRunner, load_questions
+    runner = BatchRunner.from_app(llm_workers=4, db_workers=2)
+    rows = runner.run_all(load_questions("questions.txt"), ids=[1, 2])
+"""
+import argparse, csv, json, os, queue, sys, threading, time, traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional
+
+import pandas as pd
+
+from db.tracing import tracer
+
+RESULT_COLUMNS = ["index", "id", "question", "ids", "status", "intent", "source", "sql", "rows", "repairs", "guard", "answer_kind",
+                  "answer", "error", "result_json", "trace_id", "plan_ms", "execute_ms", "answer_ms", "wait_ms", "total_ms"]
+
+
+def load_questions(path: str) -> List[dict]:
+    """질문 파일을 [{"question", "ids"(없으면 None), "id"}] 목록으로 읽는다."""
+    ext = os.path.splitext(path)[1].lower()
+    items = []
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if ext == ".jsonl":
+            for line in f:
+                if line.strip(): items.append(json.loads(line))
+        elif ext == ".csv":
+            items = list(csv.DictReader(f))
+        else:
+            items = [{"question": line.strip()} for line in f if line.strip() and not line.lstrip().startswith("#")]
+    out = []
+    for n, item in enumerate(items):
+        ids = item.get("ids")
+        if isinstance(ids, str): ids = [int(x) for x in ids.replace(";", ",").split(",") if x.strip()] or None
+        out.append({"question": str(item["question"]).strip(), "ids": ids, "id": item.get("id") or n + 1})
+    return out
+
+
+def _result_json(res, max_rows: int) -> Optional[str]:
+    """결과 앞부분 max_rows행을 JSON 레코드 문자열로 (Parquet에서도 한 컬럼에 담을 수 있게)."""
+    if res is None or max_rows <= 0: return None
+    frame = res.head(max_rows) if hasattr(res, "head") else None
+    if frame is None or frame.empty: return "[]"
+    return frame.to_json(orient="records", force_ascii=False, date_format="iso")
+
+
+class BatchRunner:
+    """
+    단계 함수를 주입받는 파이프라인 실행기 (app 의존은 from_app에만 있다).
+      plan(question, ids) -> dict                       [LLM 풀]  {"intent", "sql", ...}, 더 진행 불가면 done=True
+      execute(plan) -> dict                             [DB 풀]   res / rows, 실패·확인 대기면 done=True
+      answer(plan) -> dict                              [LLM 풀]  answer / answer_kind
+      respond(plan) -> str                              [LLM 풀]  SQL이 아닌 의도(SCHEMA_INFO / CHAT)의 답변
+    """
+    def __init__(self, plan: Callable, execute: Callable, answer: Callable, respond: Callable,
+                 llm_workers: int = 4, db_workers: int = 2, max_inflight: Optional[int] = None, result_rows: int = 20):
+        self.plan, self.execute, self.answer, self.respond = plan, execute, answer, respond
+        self.llm_workers, self.db_workers = max(1, llm_workers), max(1, db_workers)
+        self.max_inflight = max_inflight or self.llm_workers + self.db_workers
+        self.result_rows = result_rows
+
+    @classmethod
+    def from_app(cls, confirm_expensive: bool = False, **kwargs) -> "BatchRunner":
+        """app.py의 요청 처리 단계로 실행기를 만든다 (app을 import하므로 .env의 DATABASE_URL 필요)."""
+        import app
+
+        def execute(plan: dict) -> dict:
+            if app.PREFETCH: app.PREFETCH.prefetch(plan["ids"])  # 같은 프로젝트 집합이면 아무것도 안 함
+            plan = app.execute_plan(plan)
+            if confirm_expensive and plan.get("confirm"):
+                sql = plan["confirm"]["sql"]
+                plan = app.execute_plan({**plan, "sql": sql, "confirmed": True, "done": False, "confirm": None})
+            return plan
+
+        def respond(plan: dict) -> str:
+            if plan["intent"] == "SCHEMA_INFO": return app.llm_schema_response(plan["user_text"])
+            return app.llm_chat_response(plan["user_text"], "")  # 배치 질문은 서로 독립 (대화 기록 없음)
+
+        return cls(plan=app.plan_request, execute=execute, answer=app.answer_result, respond=respond, **kwargs)
+
+    # ── 실행 ──────────────────────────────────────────────────────
+    def run(self, questions: Iterable[dict], ids: Optional[List[int]] = None) -> Iterator[dict]:
+        """질문을 파이프라인으로 실행하고 끝난 순서대로 결과 행(dict)을 내보낸다. questions 항목의 ids가 없으면 ids 사용."""
+        done_q: "queue.Queue[dict]" = queue.Queue()
+        slots = threading.BoundedSemaphore(self.max_inflight)
+        llm_pool = ThreadPoolExecutor(self.llm_workers, thread_name_prefix="batch-llm")
+        db_pool = ThreadPoolExecutor(self.db_workers, thread_name_prefix="batch-db")
+        total = 0
+
+        def finish(row: dict, job: dict):
+            row["total_ms"] = (time.perf_counter() - job["started"]) * 1000
+            row["wait_ms"] = row["total_ms"] - row["plan_ms"] - row["execute_ms"] - row["answer_ms"]  # 풀 대기 시간
+            job["span"].set(status=row["status"], intent=row["intent"], rows=row["rows"], wait_ms=row["wait_ms"])
+            if row["status"] == "error": job["span"].error = row["error"]
+            tracer.finish(job["span"])
+            slots.release()
+            done_q.put(row)
+
+        def stage(pool, fn, row, job, timing, then):
+            """fn을 pool에서(질문의 request span 아래에서) 실행하고 소요 시간을 row[timing]에 더한 뒤 then(결과)을 호출한다. 예외는 행에 기록."""
+            def task():
+                t0 = time.perf_counter()
+                try:
+                    with tracer.attach(job["span"]): out = fn()
+                except Exception as e:
+                    row[timing] += (time.perf_counter() - t0) * 1000
+                    row.update(status="error", error=f"{type(e).__name__}: {e}")
+                    traceback.print_exc()
+                    finish(row, job)
+                    return
+                row[timing] += (time.perf_counter() - t0) * 1000
+                try: then(out)
+                except Exception as e:
+                    row.update(status="error", error=f"{type(e).__name__}: {e}")
+                    finish(row, job)
+            pool.submit(task)
+
+        def start(index: int, item: dict):
+            qids = item.get("ids") or ids or []
+            job = {"started": time.perf_counter(), "span": tracer.start("request", question=item["question"][:120], projects=len(qids), batch=True)}
+            row = dict.fromkeys(RESULT_COLUMNS)
+            row.update(index=index, id=item.get("id", index + 1), question=item["question"], ids=list(qids),
+                       trace_id=job["span"].trace_id, plan_ms=0.0, execute_ms=0.0, answer_ms=0.0)
+
+            def planned(plan: dict):
+                row.update(intent=plan["intent"], source=plan.get("source"), sql=plan.get("sql"))
+                if plan["intent"] != "SQL":
+                    stage(llm_pool, lambda: self.respond(plan), row, job, "answer_ms", responded)
+                elif plan.get("done"): ended(plan)
+                else: stage(db_pool, lambda: self.execute(plan), row, job, "execute_ms", executed)
+
+            def responded(text: str):
+                row.update(status="ok", answer=text, answer_kind="llm")
+                finish(row, job)
+
+            def executed(plan: dict):
+                row.update(sql=plan.get("sql"), guard=plan.get("guard"), rows=plan.get("rows"), repairs=plan.get("repairs"))
+                if plan.get("done"): ended(plan)
+                else: stage(llm_pool, lambda: self.answer(plan), row, job, "answer_ms", answered)
+
+            def answered(plan: dict):
+                row.update(status="ok", answer=plan["answer"], answer_kind=plan.get("answer_kind"),
+                           result_json=_result_json(plan.get("res"), self.result_rows))
+                finish(row, job)
+
+            def ended(plan: dict):  # 생성 실패 / 읽기 전용 거부 / 확인 대기 / 실행 오류
+                status = "needs_confirm" if plan.get("confirm") else "failed"
+                row.update(status=status, answer=plan.get("answer"), error=plan.get("error") or plan.get("sql_preview"))
+                finish(row, job)
+
+            stage(llm_pool, lambda: self.plan(item["question"], list(qids)), row, job, "plan_ms", planned)
+
+        try:
+            for index, item in enumerate(questions):
+                while not slots.acquire(timeout=0.05):  # 자리가 날 때까지 끝난 결과를 먼저 내보낸다
+                    while not done_q.empty(): total -= 1; yield done_q.get()
+                total += 1
+                start(index, item)
+                while not done_q.empty(): total -= 1; yield done_q.get()
+            while total > 0:
+                total -= 1
+                yield done_q.get()
+        finally:
+            llm_pool.shutdown(wait=False, cancel_futures=True)
+            db_pool.shutdown(wait=False, cancel_futures=True)
+
+    def run_all(self, questions: Iterable[dict], ids: Optional[List[int]] = None, out: Optional[str] = None,
+                parquet: Optional[str] = None, progress: bool = False) -> List[dict]:
+        """run()을 끝까지 실행해 index 순서의 결과 목록을 반환한다. out이면 JSONL로 한 줄씩 바로 쓰고, parquet이면 끝에 한 번 쓴다."""
+        rows, f = [], open(out, "w", encoding="utf-8") if out else None
+        try:
+            for row in self.run(questions, ids):
+                rows.append(row)
+                if f:
+                    f.write(json.dumps(row, ensure_ascii=False, default=str) + "\n"); f.flush()
+                if progress:
+                    print(f"[{len(rows)}] {row['status']:<13} {row['total_ms']:>8.0f}ms  {row['question'][:60]}", file=sys.stderr)
+        finally:
+            if f: f.close()
+        rows.sort(key=lambda r: r["index"])
+        if parquet: write_parquet(rows, parquet)
+        return rows
+
+
+def write_parquet(rows: List[dict], path: str):
+    """결과 행을 Parquet로 저장한다 (pyarrow 필요). ids는 리스트 컬럼, result_json은 문자열 컬럼."""
+    df = pd.DataFrame(rows, columns=RESULT_COLUMNS)
+    for col in ("rows", "repairs"): df[col] = df[col].astype("Int64")  # SQL이 아닌 질문은 결측
+    for col in ("id", "question", "status", "intent", "source", "sql", "guard", "answer_kind", "answer", "error", "result_json", "trace_id"):
+        df[col] = df[col].astype("string")
+    df.to_parquet(path, index=False)
+
+
+def summarize(rows: List[dict], wall_s: float) -> dict:
+    """상태별 개수, 처리량, SQL 자가 수정을 거친 질문 수, 단계별 p50/p95(ms)."""
+    from db.metrics import percentile
+    summary = {"questions": len(rows), "wall_s": wall_s, "qps": len(rows) / wall_s if wall_s else 0.0,
+               "status": {s: sum(r["status"] == s for r in rows) for s in sorted({r["status"] for r in rows})},
+               "repaired": sum(1 for r in rows if r.get("repairs"))}
+    for key in ("plan_ms", "execute_ms", "answer_ms", "wait_ms", "total_ms"):
+        values = sorted(r[key] for r in rows if r[key] is not None)
+        summary[key] = {"p50": percentile(values, 0.5), "p95": percentile(values, 0.95)}
+    return summary
+
+
+def main():
+    ap = argparse.ArgumentParser(description="질문 파일을 GUI 없이 실행해 결과/SQL을 JSONL·Parquet로 저장")
+    ap.add_argument("questions", help="질문 파일 (.txt / .jsonl / .csv)")
+    ap.add_argument("--ids", default="", help="기본 프로젝트 ID (쉼표 구분, 질문별 ids가 있으면 그것을 사용)")
+    ap.add_argument("--out", default="batch_results.jsonl", help="JSONL 결과 파일 (끝난 순서대로 한 줄씩 기록)")
+    ap.add_argument("--parquet", help="Parquet 결과 파일 (index 순서)")
+    ap.add_argument("--llm-workers", type=int, default=4, help="동시 LLM 호출 수")
+    ap.add_argument("--db-workers", type=int, default=2, help="동시 DB 쿼리 수 (DB_POOL_SIZE 이하 권장)")
+    ap.add_argument("--max-inflight", type=int, default=None, help="동시에 진행 중인 질문 수 (기본 llm + db workers)")
+    ap.add_argument("--rpm", type=float, default=None, help="LLM 분당 요청 수 제한 (LLM_RPM)")
+    ap.add_argument("--retries", type=int, default=None, help="LLM 429/5xx 재시도 횟수 (LLM_RETRIES)")
+    ap.add_argument("--result-rows", type=int, default=20, help="결과 앞부분을 result_json에 담을 행 수 (0이면 안 담음)")
+    ap.add_argument("--confirm-expensive", action="store_true", help="비용 가드 확인이 필요한 쿼리도 실행")
+    ap.add_argument("--fake", action="store_true", help="tools/fake_openai.py 가짜 LLM 서버를 띄워 사용")
+    ap.add_argument("--latency", type=float, default=0.3, help="--fake 응답 지연(초)")
+    ap.add_argument("--fake-rpm", type=int, default=0, help="--fake 서버가 이 분당 요청 수를 넘으면 429 응답")
+    args = ap.parse_args()
+
+    server = None
+    if args.fake:
+        from tools.fake_openai import start_server
+        server, base_url = start_server(port=0, latency=args.latency, rpm=args.fake_rpm)
+        os.environ["OPENAI_BASE_URL"], os.environ["OPENAI_API_KEY"] = base_url, os.environ.get("OPENAI_API_KEY") or "sk-fake"
+    if args.rpm is not None: os.environ["LLM_RPM"] = str(args.rpm)
+    if args.retries is not None: os.environ["LLM_RETRIES"] = str(args.retries)
+    os.environ.setdefault("PROMPT_LOG", "0")
+
+    questions = load_questions(args.questions)
+    ids = [int(x) for x in args.ids.split(",") if x.strip()]
+    runner = BatchRunner.from_app(confirm_expensive=args.confirm_expensive, llm_workers=args.llm_workers, db_workers=args.db_workers,
+                                  max_inflight=args.max_inflight, result_rows=args.result_rows)
+    t0 = time.perf_counter()
+    rows = runner.run_all(questions, ids, out=args.out, parquet=args.parquet, progress=True)
+    summary = summarize(rows, time.perf_counter() - t0)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    if server: server.shutdown()
+    sys.exit(0 if all(r["status"] == "ok" for r in rows) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# nlq/conversation.py
+"""
+대화 기록 저장소 (SQLite, 추가 전용 + 검색 색인)
+
+이전에는 메시지마다 memory.json 전체를 GUI 스레드에서 다시 쓰고 최근 12개만 남겼다 (긴 대화는 앞부분을 잊음).
+    - 세션: 선택한 프로젝트 집합(정렬된 ids). 같은 프로젝트들을 다시 선택하면 그 대화가 이어진다.
+    - 쓰기: append()는 큐에 넣고 바로 돌아온다. 백그라운드 스레드가 모아서(flush_ms / batch) 한 트랜잭션으로 기록한다.
+      읽기(recent / related)는 워커 스레드에서 호출되며, 아직 기록되지 않은 대화가 있으면 먼저 기다린다.
+    - 색인: FTS5 trigram(한국어도 형태소 분석 없이 부분 문자열로 검색) + bm25 순위.
+      FTS5가 없는 SQLite면 세션 안에서 문자 n-gram 코사인 유사도로 찾는다 (nlq/sql_cache.py와 같은 방식).
+    - context(): 최근 n턴 + 현재 질문과 관련된 이전 턴(질문 → SQL → 답변)을 시간순으로 돌려준다.
+"""
+import atexit, queue, re, sqlite3, threading, time
+from typing import Iterable, List, Optional
+
+from nlq.sql_cache import _cosine, _ngrams, normalize_question
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_FLUSH = ("flush",)  # 기록 스레드에게 모으기를 멈추고 바로 쓰라는 표시
+
+
+def _fts_query(norm: str, limit: int = 32) -> str:
+    """정규화된 질문의 3글자 조각 OR 검색식 (trigram 색인은 2글자 한국어 단어도 "공정 시"처럼 공백을 포함한 조각으로 찾는다)."""
+    grams = []
+    for i in range(len(norm) - 2):
+        g = norm[i:i + 3]
+        if g.strip() and g not in grams: grams.append(g)
+    return " OR ".join('"' + g.replace('"', '""') + '"' for g in grams[:limit])
+
+
+def session_key(ids: Iterable[int]) -> str:
+    return ",".join(str(int(i)) for i in sorted(set(ids or [])))
+
+
+def plain_text(html: str, limit: int = 400) -> str:
+    """답변 HTML(표, 강조 태그)을 프롬프트에 넣을 짧은 평문으로."""
+    text = re.sub(r"\s+", " ", _TAG_RE.sub(" ", (html or "").replace("<br>", "\n"))).strip()
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+class ConversationStore:
+    def __init__(self, path: str, flush_ms: int = 200, batch: int = 64):
+        self.path = path
+        self.flush_s = flush_ms / 1000.0
+        self.batch = batch
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:": self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS turns (
+            id INTEGER PRIMARY KEY, session TEXT, created REAL, user TEXT, answer TEXT, intent TEXT, sql TEXT, rows INTEGER)""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS turns_session ON turns(session, id)")
+        try:
+            self._conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS turns_fts USING fts5("
+                               "user, answer, sql, content='turns', content_rowid='id', tokenize='trigram')")
+            self.fts = True
+        except sqlite3.OperationalError:  # FTS5 / trigram 토크나이저가 없는 SQLite (3.34 미만)
+            self.fts = False
+        self._conn.commit()
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="conversation-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    # ── 쓰기 (비동기, 모아서 기록) ──────────────────────────────
+    def append(self, ids: Iterable[int], user: str, answer: str, intent: Optional[str] = None,
+               sql: Optional[str] = None, rows: Optional[int] = None):
+        """대화 한 턴을 기록 큐에 넣는다 (GUI 스레드에서 불러도 막히지 않음)."""
+        self._queue.put((session_key(ids), time.time(), user, plain_text(answer, 2000), intent, sql, rows))
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done(); return
+            if item is _FLUSH:  # 이미 다 쓴 뒤의 flush 요청
+                self._queue.task_done(); continue
+            items, deadline = [item], time.monotonic() + self.flush_s
+            while len(items) < self.batch:
+                try: nxt = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty: break
+                if nxt is None:
+                    self._queue.put(None); self._queue.task_done(); break  # 종료 표시는 이번 묶음을 쓴 뒤 처리
+                if nxt is _FLUSH:
+                    self._queue.task_done(); break
+                items.append(nxt)
+            try: self._write(items)
+            except sqlite3.Error as e: print(f"⚠️ 대화 기록 저장 실패: {e}")
+            for _ in items: self._queue.task_done()
+
+    def _write(self, items: List[tuple]):
+        with self._lock:
+            for item in items:
+                rowid = self._conn.execute("INSERT INTO turns(session, created, user, answer, intent, sql, rows) "
+                                           "VALUES (?, ?, ?, ?, ?, ?, ?)", item).lastrowid
+                if self.fts:
+                    self._conn.execute("INSERT INTO turns_fts(rowid, user, answer, sql) VALUES (?, ?, ?, ?)",
+                                       (rowid, item[2], item[3], item[5] or ""))
+            self._conn.commit()
+
+    def flush(self):
+        """큐에 남은 기록이 모두 저장될 때까지 기다린다 (모으는 중이면 바로 쓰게 한다)."""
+        if self._queue.unfinished_tasks and self._writer.is_alive():
+            self._queue.put(_FLUSH)
+            self._queue.join()
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(timeout=5)
+
+    # ── 읽기 ────────────────────────────────────────────────────
+    @staticmethod
+    def _row(r) -> dict:
+        return {"id": r[0], "created": r[1], "user": r[2], "answer": r[3], "intent": r[4], "sql": r[5], "rows": r[6]}
+
+    def recent(self, ids: Iterable[int], n: int = 5) -> List[dict]:
+        """세션의 최근 n턴 (오래된 것부터)."""
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute("SELECT id, created, user, answer, intent, sql, rows FROM turns WHERE session = ? "
+                                      "ORDER BY id DESC LIMIT ?", (session_key(ids), n)).fetchall()
+        return [self._row(r) for r in rows[::-1]]
+
+    def count(self, ids: Iterable[int]) -> int:
+        self.flush()
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM turns WHERE session = ?", (session_key(ids),)).fetchone()[0]
+
+    def related(self, ids: Iterable[int], question: str, k: int = 3, exclude: Iterable[int] = (),
+                min_score: float = 0.3, sql_only: bool = False) -> List[dict]:
+        """
+        세션의 이전 턴 중 question과 관련된 상위 k개 (점수 내림차순). exclude: 이미 넣은 턴 id (최근 턴 등).
+        FTS5 후보(bm25 상위)를 질문 n-gram 코사인 유사도로 다시 매겨 min_score 미만은 버린다.
+        """
+        if k <= 0: return []
+        self.flush()
+        norm, session, skip = normalize_question(question), session_key(ids), set(exclude)
+        cols = "t.id, t.created, t.user, t.answer, t.intent, t.sql, t.rows"
+        sql_filter = " AND t.sql IS NOT NULL" if sql_only else ""
+        with self._lock:
+            match = _fts_query(norm) if self.fts else ""
+            if match:
+                rows = self._conn.execute(f"SELECT {cols} FROM turns_fts f JOIN turns t ON t.id = f.rowid "
+                                          f"WHERE turns_fts MATCH ? AND t.session = ?{sql_filter} ORDER BY bm25(turns_fts) LIMIT ?",
+                                          (match, session, max(k * 8, 20))).fetchall()
+            else:
+                rows = self._conn.execute(f"SELECT {cols} FROM turns t WHERE t.session = ?{sql_filter} ORDER BY t.id DESC LIMIT 500",
+                                          (session,)).fetchall()
+        target = _ngrams(norm)
+        scored = [(_cosine(target, _ngrams(normalize_question(r[2]))), r) for r in rows if r[0] not in skip]
+        scored = sorted((s for s in scored if s[0] >= min_score), key=lambda s: -s[0])[:k]
+        return [{**self._row(r), "score": round(score, 3)} for score, r in scored]
+
+    def context(self, ids: Iterable[int], question: str, recent: int = 2, related: int = 3) -> List[dict]:
+        """최근 recent턴 + 그 밖의 관련 턴 related개, 시간순."""
+        last = self.recent(ids, recent) if recent > 0 else []
+        more = self.related(ids, question, related, exclude=[t["id"] for t in last])
+        return sorted(last + more, key=lambda t: t["id"])
+
+    def stats(self) -> dict:
+        self.flush()
+        with self._lock:
+            turns, sessions = self._conn.execute("SELECT COUNT(*), COUNT(DISTINCT session) FROM turns").fetchone()
+        return {"turns": turns, "sessions": sessions, "fts": self.fts}
+
+
+def format_turns(turns: List[dict], with_sql: bool = True, answer_chars: int = 300) -> str:
+    """프롬프트용 대화 조각: User / (SQL) / LLM 줄."""
+    lines = []
+    for t in turns:
+        lines.append(f"User: {t['user']}")
+        if with_sql and t.get("sql"): lines.append(f"SQL: {t['sql']}")
+        lines.append(f"LLM: {plain_text(t['answer'], answer_chars)}")
+    return "\n".join(lines)
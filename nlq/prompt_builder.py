@@ -0,0 +1,311 @@
+# nlq/prompt_builder.py
+"""
+LLM 프롬프트 조립기 (토큰 예산 + 프롬프트 캐시 친화 순서)
+
+기존 llm_generate_sql / llm_route / llm_answer는 호출마다 CONTEXT_DEFINITIONS 전체와 EXAMPLE_QUERIES 전체를 다시 붙이고,
+llm_answer는 결과를 100행짜리 HTML 표(df.to_html)로 넣어 토큰 대부분을 표 태그에 썼다.
+    - 캐시 친화 순서: 매번 같은 내용(역할, 규칙, 용어 정의, 테이블 관계)을 system 앞쪽에 고정하고,
+      질문마다 달라지는 내용(스키마 조각, 예시, 결과 미리보기, 질문)은 뒤쪽 user 메시지에 둔다.
+      OpenAI 등은 앞부분이 같은 요청의 접두사를 자동 캐시하므로 고정 부분은 두 번째 요청부터 캐시 적중이 된다.
+    - 관련 조각만: 질문의 키워드/컬럼명으로 필요한 테이블의 스키마 줄만 넣고, 예시 쿼리는 문자 n-gram 유사도 상위 k개만 넣는다.
+      (어느 테이블인지 판단이 안 되면 전부 넣는다)
+    - 토큰 예산: tiktoken으로 로컬에서 세고(없거나 인코딩 파일을 못 받으면 문자 수 기반 근사), 예산을 넘으면
+      덜 중요한 조각(뒤쪽 예시)부터 빼고 결과 미리보기 행 수를 줄인다.
+    - 결과 미리보기 압축: HTML 대신 CSV(숫자는 유효숫자 6자리) + 숫자 컬럼 요약 통계(NumPy로 한 번에 계산).
+    - 계측: 단계별로 보낸 토큰 / 기존 방식이었다면 보냈을 토큰 / 절약분 / 조립 시간 / LLM 호출 시간 / 캐시된 토큰(응답 usage)을 기록하고,
+      LLM 호출 시간과 입력 토큰의 회귀 기울기로 절약된 지연을 추정한다.
+"""
+import math, re, threading, time
+from collections import defaultdict, deque
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from nlq.sql_cache import _cosine, _ngrams
+
+_SECTION_RE = re.compile(r"^--- \[(.+?)\] ---\s*$", re.M)
+_TABLE_LINE_RE = re.compile(r"^\*\s*`([a-z_]+\.[a-z0-9_]+)`\s*:", re.M)
+_EXAMPLE_RE = re.compile(r"^\s*\d+\)\s*(.+?):\s*\n\s+(.+?)\s*$", re.M)
+_IDENT_RE = re.compile(r"`([a-z][a-z0-9_]*)`")
+_WORD_RE = re.compile(r"[a-z][a-z0-9_]*", re.I)
+
+SCHEMA_SECTION = "DB 스키마"
+
+# 컬럼명 외에 테이블을 가리키는 한국어/영어 표현 (아무 테이블도 안 걸리면 모든 테이블 포함)
+TABLE_HINTS = {
+    "public.project6": re.compile(r"이름|name|목록|project6", re.I),
+    "data.meta_data": re.compile(r"meta|메타|요약|통계|mpt|레이어별|층별|평균|최대|최소|최댓값|최솟값|중앙값|드웰|dwell|소요|duration|비율|횟수|날짜|active", re.I),
+    "data.raw_data": re.compile(r"raw|원본|시각|시간대|구간|좌표|경로|궤적|레이저|laser|샘플|센서|비드|bead|파워|속도|면적|폭|하중|접촉|time", re.I),
+}
+ALWAYS_TABLES = ("public.project6",)
+
+
+# ── 토큰 계산 ─────────────────────────────────────────────────
+_ENCODER_LOCK = threading.Lock()  # 여러 스레드(배치 실행기)가 처음 동시에 불러도 인코더는 한 번만 만든다
+
+
+def _encoder(model: str):
+    with _ENCODER_LOCK: return _load_encoder(model)
+
+
+@lru_cache(maxsize=4)
+def _load_encoder(model: str):
+    """tiktoken 인코더. 패키지가 없거나 BPE 파일을 받을 수 없으면(오프라인) None → 근사치 사용."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try: return tiktoken.encoding_for_model(model)
+        except KeyError: return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        print(f"⚠️ tiktoken 인코딩을 불러오지 못해 근사 토큰 수를 사용합니다: {type(e).__name__}")
+        return None
+
+
+def approx_tokens(text: str) -> int:
+    """ASCII 약 4글자당 1토큰, 한글 등 비ASCII는 글자당 약 0.7토큰 (o200k/cl100k 평균에 맞춘 근사)."""
+    ascii_len = len(text.encode("ascii", "ignore"))
+    return math.ceil(ascii_len / 4 + (len(text) - ascii_len) * 0.7)
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    enc = _encoder(model)
+    return len(enc.encode(text, disallowed_special=())) if enc is not None else approx_tokens(text)
+
+
+def count_message_tokens(messages: Sequence[dict], model: str = "gpt-4o") -> int:
+    """chat 메시지 목록의 입력 토큰 수 (메시지당 형식 오버헤드 3토큰 + 응답 시작 3토큰)."""
+    return sum(count_tokens(m.get("content") or "", model) + 3 for m in messages) + 3
+
+
+# ── 결과 미리보기 압축 ─────────────────────────────────────────
+def numeric_summary(df: pd.DataFrame) -> pd.DataFrame:
+    """숫자 컬럼별 count / min / max / mean / std / first / last를 2차원 배열 한 번의 NumPy 연산으로 계산한다."""
+    num = df.select_dtypes(include="number")
+    if num.empty or len(num) == 0: return pd.DataFrame(columns=["column", "count", "min", "max", "mean", "std", "first", "last"])
+    a = num.to_numpy(dtype=np.float64, na_value=np.nan)
+    valid = ~np.isnan(a)
+    count = valid.sum(axis=0)
+    has = count > 0
+    with np.errstate(all="ignore"):
+        lo = np.where(has, np.nanmin(np.where(valid, a, np.inf), axis=0), np.nan)
+        hi = np.where(has, np.nanmax(np.where(valid, a, -np.inf), axis=0), np.nan)
+        mean = np.where(has, np.nansum(a, axis=0) / np.maximum(count, 1), np.nan)
+        std = np.sqrt(np.where(count > 1, np.nansum((a - mean) ** 2, axis=0) / np.maximum(count - 1, 1), np.nan))
+    first_idx, last_idx = valid.argmax(axis=0), len(a) - 1 - valid[::-1].argmax(axis=0)
+    cols = np.arange(a.shape[1])
+    return pd.DataFrame({"column": num.columns, "count": count, "min": lo, "max": hi, "mean": mean, "std": std,
+                         "first": np.where(has, a[first_idx, cols], np.nan), "last": np.where(has, a[last_idx, cols], np.nan)})
+
+
+def _csv(df: pd.DataFrame) -> str:
+    return df.to_csv(index=False, float_format="%.6g", lineterminator="\n").rstrip("\n")
+
+
+def compact_preview(res, max_rows: int = 60, max_tokens: int = 1500, count: Callable[[str], int] = approx_tokens) -> str:
+    """
+    DataFrame 또는 ResultDigest → LLM용 압축 미리보기 (CSV + 요약 통계).
+    max_rows 이하면 전체 CSV, 넘으면 상·하위 일부 CSV + 전체 숫자 컬럼 요약. max_tokens를 넘으면 행 수를 절반씩 줄인다.
+    """
+    digest = not isinstance(res, pd.DataFrame)
+    if res is None or (res.empty if not digest else res.rows == 0): return "(결과 없음)"
+    total = res.rows if digest else len(res)
+    if digest:
+        full = res.frame() if res.complete else None
+        head, tail = res.head(), res.tail()
+        stats = res.summary() if full is None else numeric_summary(full)
+    else:
+        full, head, tail = res, res, res
+        stats = numeric_summary(res) if total > max_rows else None
+    stats_text = f"\n[숫자 컬럼 요약 (전체 {total}행)]\n{_csv(stats)}" if stats is not None and not stats.empty else ""
+
+    rows = max_rows
+    while True:
+        if full is not None and total <= rows:
+            text = f"[전체 {total}행 CSV]\n{_csv(full)}"
+        else:
+            k = max(rows // 2, 1)
+            text = (f"[총 {total}행 중 상위 {min(k, len(head))}행 CSV]\n{_csv(head.head(k))}\n"
+                    f"[하위 {min(k, len(tail))}행 CSV]\n{_csv(tail.tail(k))}")
+        text += stats_text
+        if rows <= 2 or count(text) <= max_tokens: return text
+        rows //= 2
+
+
+# ── 계측 ─────────────────────────────────────────────────────
+class PromptMeter:
+    """단계별 프롬프트 토큰/지연 기록 (스레드 안전). summary()는 누적 합계와 추정 절약 지연."""
+    def __init__(self, window: int = 200, log: bool = True):
+        self.log = log
+        self._calls: Dict[str, deque] = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def ms_per_token(self, stage: str) -> Optional[float]:
+        """같은 단계 호출들의 (입력 토큰, LLM 지연) 회귀 기울기. 표본이 적거나 기울기가 음수면 None."""
+        with self._lock: calls = list(self._calls[stage])
+        if len(calls) < 5: return None
+        x = np.array([c["tokens"] for c in calls], dtype=np.float64)
+        y = np.array([c["llm_ms"] for c in calls], dtype=np.float64)
+        if np.ptp(x) == 0: return None
+        slope = float(np.polyfit(x, y, 1)[0])
+        return slope if slope > 0 else None
+
+    def record(self, stats: dict, llm_seconds: float, usage=None):
+        cached = None
+        details = getattr(usage, "prompt_tokens_details", None) if usage is not None else None
+        if details is not None: cached = getattr(details, "cached_tokens", None)
+        row = {**stats, "llm_ms": llm_seconds * 1000, "cached_tokens": cached,
+               "prompt_tokens": getattr(usage, "prompt_tokens", None) if usage is not None else None}
+        with self._lock: self._calls[stats["stage"]].append(row)
+        if not self.log: return
+        saved = row["tokens_full"] - row["tokens"] if row["tokens_full"] is not None else None
+        slope = self.ms_per_token(stats["stage"])
+        line = f"🧮 프롬프트[{stats['stage']}] {row['tokens']:,} 토큰"
+        if saved is not None:
+            line += f" (기존 {row['tokens_full']:,}, -{saved:,} / {saved / max(row['tokens_full'], 1):.0%})"
+        if cached: line += f", 캐시 {cached:,}"
+        line += f", 조립 {row['build_ms']:.1f}ms, LLM {row['llm_ms']:.0f}ms"
+        if saved and slope: line += f", 절약 추정 ~{saved * slope:.0f}ms"
+        print(line)
+
+    def summary(self) -> Dict[str, dict]:
+        with self._lock: snapshot = {k: list(v) for k, v in self._calls.items()}
+        out = {}
+        for stage, calls in snapshot.items():
+            sent = sum(c["tokens"] for c in calls)
+            known = [c for c in calls if c["tokens_full"] is not None]  # 기존 방식과 비교한 호출만
+            full = sum(c["tokens_full"] for c in known) if known else None
+            sent_known = sum(c["tokens"] for c in known)
+            slope = self.ms_per_token(stage)
+            out[stage] = {"count": len(calls), "tokens": sent, "tokens_full": full, "tokens_saved": full - sent_known if known else None,
+                          "cached_tokens": sum(c["cached_tokens"] or 0 for c in calls),
+                          "llm_ms_avg": sum(c["llm_ms"] for c in calls) / len(calls),
+                          "saved_ms_est": (full - sent_known) * slope if known and slope else None}
+        return out
+
+
+def parse_examples(example_queries: str) -> List[Tuple[str, str]]:
+    """EXAMPLE_QUERIES 형식("1) 제목:\n    SQL")의 [(제목, SQL)]."""
+    return [(title.strip(), sql.strip()) for title, sql in _EXAMPLE_RE.findall(example_queries)]
+
+
+# ── 조립기 ───────────────────────────────────────────────────
+class PromptBuilder:
+    """
+    context_definitions / example_queries를 한 번 파싱해 두고, 단계별 메시지를 조립한다.
+    반환값은 (messages, stats) — stats를 PromptMeter.record에 넘기면 토큰/지연이 기록된다.
+    library(nlq/query_library.QueryLibrary)가 있으면 예시는 고정 example_queries 대신 검증된 질문 → SQL 라이브러리에서 고른다.
+    """
+    def __init__(self, context_definitions: str, example_queries: str, model: str = "gpt-4o",
+                 budget_tokens: int = 6000, example_k: int = 3, preview_rows: int = 60, preview_tokens: int = 1500,
+                 meter: Optional[PromptMeter] = None, library=None):
+        self.model = model
+        self.budget_tokens, self.example_k = budget_tokens, example_k
+        self.preview_rows, self.preview_tokens = preview_rows, preview_tokens
+        self.meter, self.library = meter, library
+
+        # 섹션 분리: 스키마 섹션만 테이블 단위로 쪼개고 나머지(용어 정의, 관계 규칙)는 고정 부분
+        heads = list(_SECTION_RE.finditer(context_definitions))
+        stable, self.tables, self._columns = [], {}, {}
+        for i, m in enumerate(heads):
+            body = context_definitions[m.end(): heads[i + 1].start() if i + 1 < len(heads) else len(context_definitions)].strip()
+            if m.group(1) == SCHEMA_SECTION:
+                for line in body.splitlines():
+                    t = _TABLE_LINE_RE.match(line)
+                    if t:
+                        self.tables[t.group(1)] = line.strip()
+                        self._columns[t.group(1)] = set(_IDENT_RE.findall(line[t.end():]))
+            else:
+                stable.append(f"{m.group(0).strip()}\n{body}")
+        self.stable_context = "\n\n".join(stable)
+
+        self.examples = parse_examples(example_queries)
+        self._example_grams = [_ngrams(f"{t} {s}".lower()) for t, s in self.examples]
+        self._example_tables = [{name for name in self.tables if name.split(".")[-1] in s} for _, s in self.examples]
+
+    def count(self, text: str) -> int:
+        return count_tokens(text, self.model)
+
+    # ── 관련 조각 선택 ─────────────────────────────────────────
+    def relevant_tables(self, question: str) -> List[str]:
+        """질문의 컬럼명/힌트가 가리키는 테이블 + 항상 넣는 테이블(project6). 아무것도 안 걸리면 전부."""
+        words = {w.lower() for w in _WORD_RE.findall(question)}
+        picked = {name for name in self.tables
+                  if (words & self._columns[name] - {"project_id", "id"}) or (name in TABLE_HINTS and TABLE_HINTS[name].search(question))}
+        if not picked: return list(self.tables)
+        return [name for name in self.tables if name in picked or name in ALWAYS_TABLES]
+
+    def schema_slice(self, tables: Sequence[str]) -> str:
+        return f"--- [{SCHEMA_SECTION}] ---\n" + "\n".join(self.tables[t] for t in self.tables if t in tables)
+
+    def pick_examples(self, question: str, tables: Sequence[str]) -> List[Tuple[str, str]]:
+        """문자 n-gram 유사도(+ 선택된 테이블을 쓰는 예시 가산점) 상위 example_k개. 원래 순서를 유지한다."""
+        if self.library is not None: return self.library.examples(question, tables, self.example_k)
+        if self.example_k <= 0 or not self.examples: return []
+        q = _ngrams(question.lower())
+        scores = [_cosine(q, g) + (0.2 if ex_tables & set(tables) else 0.0)
+                  for g, ex_tables in zip(self._example_grams, self._example_tables)]
+        top = sorted(np.argsort(scores)[::-1][: self.example_k])
+        return [self.examples[i] for i in top]
+
+    @staticmethod
+    def format_examples(examples: Sequence[Tuple[str, str]]) -> str:
+        return "[EXAMPLES]\n" + "\n".join(f"{i}) {t}:\n    {s}" for i, (t, s) in enumerate(examples, 1)) if examples else ""
+
+    # ── 조립 ─────────────────────────────────────────────────
+    def _assemble(self, stage: str, system: str, parts: List[Tuple[str, bool]], tail: str,
+                  legacy: Optional[Callable[[], List[dict]]], started: float) -> Tuple[List[dict], dict]:
+        """parts: (텍스트, 필수 여부). 예산을 넘으면 뒤쪽 선택 조각부터 뺀다."""
+        parts = [(t, req) for t, req in parts if t]
+        fixed = self.count(system) + self.count(tail) + 9
+        sizes = [self.count(t) for t, _ in parts]
+        while fixed + sum(sizes) > self.budget_tokens and any(not req for _, req in parts):
+            i = max(i for i, (_, req) in enumerate(parts) if not req)
+            parts.pop(i); sizes.pop(i)
+        user = "\n\n".join([t for t, _ in parts] + [tail])
+        messages = [{"role": "system", "content": system}, {"role": "user", "content": user}]
+        stats = {"stage": stage, "tokens": fixed + sum(sizes), "tokens_full": None,
+                 "build_ms": (time.perf_counter() - started) * 1000}
+        if legacy is not None and self.meter is not None and self.meter.log:
+            stats["tokens_full"] = count_message_tokens(legacy(), self.model)
+        return messages, stats
+
+    def sql_messages(self, stage: str, head: str, rules: str, question: str, ids_rule: str,
+                     table_context: Optional[Dict[str, str]] = None,
+                     legacy: Optional[Callable[[], List[dict]]] = None, history: str = "",
+                     feedback: str = "") -> Tuple[List[dict], dict]:
+        """
+        SQL 생성 / 라우터용. system = head + 용어 정의·관계(고정) + rules, user = 스키마 조각 + 테이블별 추가 설명 + 예시 + ids + 질문.
+        table_context: {"data.raw_data": 롤업/time_ts 설명} 처럼 해당 테이블이 선택됐을 때만 넣을 내용.
+        history: 이전 대화의 관련 질문 → SQL (예산을 넘으면 예시보다 먼저 뺀다)
+        feedback: 자가 수정용 실패한 SQL + 오류 (필수 조각, 스키마 조각도 여기에 나온 테이블/컬럼까지 넣는다)
+        """
+        started = time.perf_counter()
+        tables = self.relevant_tables(f"{question}\n{feedback}" if feedback else question)
+        system = f"{head}\n{self.stable_context}\n\n{rules}"
+        extra = "".join(ctx for name, ctx in (table_context or {}).items() if name in tables and ctx)
+        parts = [(self.schema_slice(tables) + (f"\n{extra.rstrip()}" if extra else ""), True)]
+        parts += [(self.format_examples([ex]) if i == 0 else f"{i + 1}) {ex[0]}:\n    {ex[1]}", False)  # 예시는 하나씩 뺄 수 있게
+                  for i, ex in enumerate(self.pick_examples(question, tables))]
+        parts.append((history, False))
+        parts.append((feedback, True))
+        tail = f"{ids_rule}\n\n[사용자 질문]\n{question}\n\n[생성할 SQL]\n"
+        return self._assemble(stage, system, parts, tail, legacy, started)
+
+    def answer_messages(self, system: str, question: str, res, note: str = "",
+                        legacy: Optional[Callable[[], List[dict]]] = None) -> Tuple[List[dict], dict]:
+        """답변 생성용. system = 호출 측 고정 규칙 + 용어 정의·관계, user = 질문 + note(표 표시 여부 등) + 압축 미리보기."""
+        started = time.perf_counter()
+        system = f"{system}\n{self.stable_context}"
+        room = max(self.budget_tokens - self.count(system) - self.count(question) - 100, 200)
+        preview = compact_preview(res, self.preview_rows, min(self.preview_tokens, room), self.count)
+        if note: preview = f"{note}\n{preview}"
+        tail = f"[사용자 질문]\n{question}\n\n[결과 미리보기]\n{preview}\n\n[답변]\n"
+        return self._assemble("answer", system, [], tail, legacy, started)
+
+    def measure(self, stage: str, messages: List[dict]) -> dict:
+        """조립기를 거치지 않는 짧은 고정 프롬프트(의도 분류, 채팅)도 같은 형식으로 계측한다."""
+        return {"stage": stage, "tokens": count_message_tokens(messages, self.model), "tokens_full": None, "build_ms": 0.0}
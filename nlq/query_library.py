@@ -0,0 +1,125 @@
+# nlq/query_library.py
+"""
+검증된 질문 → SQL 라이브러리 (SQLite 영구 저장)
+
+SQL 생성 프롬프트의 예시는 고정된 EXAMPLE_QUERIES 6개뿐이었다. 실행에 성공하고 결과가 있었던 (질문, SQL)을 모아
+질문과 비슷한 것을 few-shot 예시로 넣는다 (PromptBuilder.pick_examples가 이 라이브러리에서 고른다).
+    - SQL은 선택 프로젝트 목록을 {{ids}} 자리표시자로 바꾼 템플릿으로 저장한다 (다른 프로젝트 선택에도 그대로 예시가 됨).
+      같은 템플릿(normalize_sql 기준)은 한 항목이고 uses만 늘어난다. 자리표시자로 바꿀 수 없는 SQL
+      (선택과 다른 프로젝트를 직접 지정하는 등)은 저장하지 않는다.
+    - 처음에는 EXAMPLE_QUERIES로 채운다 (source="seed", 지워지지 않음 — 예시 문구가 바뀌면 새 예시로 교체).
+    - 저장된 템플릿과 같은 SQL이 나중에 실행에 실패하면(스키마 변경 등) 그 항목을 지운다 (seed는 fails만 센다).
+    - 고르기: 문자 n-gram 코사인(질문 + SQL) + 같은 테이블을 쓰면 가산점 + 검증 횟수 가산점(작게), 상위 k개.
+    - max_entries를 넘으면 적게 쓰이고 오래된 항목부터 제거한다.
+"""
+import re, sqlite3, threading, time
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from nlq.sql_cache import _cosine, _ngrams
+from nlq.sql_rewrite import normalize_sql, referenced_tables
+
+IDS = "{{ids}}"
+_IDS_LIST = re.compile(r"(\bproject_id\s+IN\s*)\(\s*(\d+(?:\s*,\s*\d+)*)\s*\)", re.I)
+
+
+def to_template(sql: str, ids: Iterable[int]) -> Optional[str]:
+    """project_id IN (<선택 ids>)를 IN ({{ids}})로 바꾼 템플릿. 바꿀 곳이 없거나 다른 id 목록이 있으면 None."""
+    want = {int(i) for i in ids or []}
+    if not want: return None
+    mismatch = False
+    def sub(m: "re.Match") -> str:
+        nonlocal mismatch
+        if {int(x) for x in re.findall(r"\d+", m.group(2))} != want: mismatch = True
+        return f"{m.group(1)}({IDS})"
+    out = _IDS_LIST.sub(sub, sql)
+    return None if mismatch or out == sql else out
+
+
+def _key(template: str) -> str:
+    return normalize_sql(template.replace(IDS, "0"))
+
+
+def _tables(template: str) -> frozenset:
+    return frozenset(referenced_tables(template.replace(IDS, "0")) or ())
+
+
+class QueryLibrary:
+    def __init__(self, path: str, seeds: Sequence[Tuple[str, str]] = (), max_entries: int = 500):
+        """seeds: [(제목/질문, {{ids}} 템플릿 SQL)] — 보통 EXAMPLE_QUERIES를 파싱한 것."""
+        self.path = path
+        self.max_entries = max_entries
+        self.session = {"recorded": 0, "forgotten": 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._entries: Optional[list] = None  # 고르기용 메모리 사본 (쓰기마다 비움)
+        with self._conn:
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS queries (
+                key TEXT PRIMARY KEY, question TEXT, sql TEXT, tables TEXT, source TEXT,
+                uses INTEGER DEFAULT 0, fails INTEGER DEFAULT 0, created REAL, last_used REAL)""")
+            now = time.time()
+            keys = []
+            for i, (title, sql) in enumerate(seeds):
+                keys.append(_key(sql))
+                self._conn.execute(
+                    "INSERT INTO queries(key, question, sql, tables, source, created, last_used) VALUES (?, ?, ?, ?, 'seed', ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET question = excluded.question, sql = excluded.sql, source = 'seed'",
+                    (keys[-1], title, sql, ",".join(sorted(_tables(sql))), now - len(seeds) + i, now - len(seeds) + i))
+            self._conn.execute(f"DELETE FROM queries WHERE source = 'seed' AND key NOT IN ({','.join('?' * len(keys))})", keys)
+
+    # ── 기록 ─────────────────────────────────────────────────────
+    def record(self, question: str, ids: Iterable[int], sql: str, source: str = "llm") -> bool:
+        """실행에 성공하고 결과가 있었던 SQL을 저장한다 (같은 템플릿이면 uses만 증가). 저장했으면 True."""
+        template = to_template(sql, ids)
+        if template is None: return False
+        key, now = _key(template), time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO queries(key, question, sql, tables, source, uses, created, last_used) VALUES (?, ?, ?, ?, ?, 1, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET uses = uses + 1, last_used = excluded.last_used",
+                (key, question.strip(), template, ",".join(sorted(_tables(template))), source, now, now))
+            self._conn.execute(
+                "DELETE FROM queries WHERE key IN (SELECT key FROM queries WHERE source != 'seed' "
+                "ORDER BY uses DESC, last_used DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+            self._conn.commit()
+            self._entries = None
+            self.session["recorded"] += 1
+        return True
+
+    def forget(self, sql: str, ids: Iterable[int]):
+        """실행에 실패한 SQL과 같은 템플릿의 항목을 지운다 (seed는 지우지 않고 fails만 센다)."""
+        template = to_template(sql, ids)
+        if template is None: return
+        key = _key(template)
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM queries WHERE key = ? AND source != 'seed'", (key,))
+            self._conn.execute("UPDATE queries SET fails = fails + 1 WHERE key = ?", (key,))
+            self._conn.commit()
+            if cur.rowcount:
+                self._entries = None
+                self.session["forgotten"] += 1
+
+    # ── 고르기 ───────────────────────────────────────────────────
+    def _load(self) -> list:
+        with self._lock:
+            if self._entries is None:
+                rows = self._conn.execute("SELECT question, sql, tables, uses FROM queries ORDER BY created").fetchall()
+                self._entries = [(q, s, frozenset(filter(None, t.split(","))), uses, _ngrams(f"{q} {s}".lower()))
+                                 for q, s, t, uses in rows]
+            return self._entries
+
+    def examples(self, question: str, tables: Sequence[str] = (), k: int = 3) -> List[Tuple[str, str]]:
+        """질문과 비슷한 검증된 (질문, 템플릿 SQL) 상위 k개. 오래된 것부터의 저장 순서를 유지한다."""
+        entries = self._load()
+        if k <= 0 or not entries: return []
+        q, want = _ngrams(question.lower()), {t.split(".")[-1] for t in tables}
+        scores = [_cosine(q, grams) + (0.2 if ex_tables & want else 0.0) + 0.02 * min(uses, 5)
+                  for _, _, ex_tables, uses, grams in entries]
+        top = sorted(sorted(range(len(entries)), key=lambda i: -scores[i])[:k])
+        return [(entries[i][0], entries[i][1]) for i in top]
+
+    # ── 통계 ───────────────────────────────────────────────────
+    def stats(self) -> dict:
+        with self._lock:
+            by_source = dict(self._conn.execute("SELECT source, COUNT(*) FROM queries GROUP BY source").fetchall())
+            uses = self._conn.execute("SELECT COALESCE(SUM(uses), 0) FROM queries").fetchone()[0]
+        return {"entries": sum(by_source.values()), "by_source": by_source, "uses": uses, "session": dict(self.session)}
@@ -0,0 +1,92 @@
+# nlq/rate_limit.py
+"""
+LLM API 호출 속도 제한 + 재시도
+
+llm_complete가 모든 LLM 호출(GUI, 배치 실행기)에서 공통으로 사용한다.
+    - RateLimiter: 분당 요청 수(rpm) 토큰 버킷. 여러 스레드가 동시에 호출해도 전체 속도를 지킨다.
+      429 응답의 Retry-After를 받으면 pause()로 모든 호출을 그 시간만큼 함께 멈춘다.
+    - retry_call: 429 / 5xx / 타임아웃 / 연결 오류만 지수 백오프(+지터)로 재시도한다.
+      Retry-After(또는 retry-after-ms) 헤더가 있으면 그 값을 우선한다. 400 / 401 같은 오류는 바로 올린다.
+openai 패키지의 자체 재시도(max_retries)와 겹치지 않도록 app.py는 이 모듈을 쓸 때 클라이언트 재시도를 끈다.
+"""
+import random, threading, time
+from typing import Callable, Optional
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """분당 rpm회 토큰 버킷 (burst: 한 번에 몰아 보낼 수 있는 최대 요청 수). rpm <= 0이면 제한 없음."""
+    def __init__(self, rpm: float = 0, burst: Optional[int] = None):
+        self.rpm = float(rpm or 0)
+        self.capacity = float(burst or max(1, int(self.rpm // 60) or 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.waited_s = 0.0  # 누적 대기 시간 (계측용)
+
+    def acquire(self):
+        if self.rpm <= 0 and not self._paused_until: return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._paused_until - now
+                if wait <= 0 and self.rpm <= 0: return
+                if wait <= 0:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rpm / 60.0)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) * 60.0 / self.rpm
+                self.waited_s += wait
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """서버가 알려 준 시간 동안 모든 호출을 멈춘다 (Retry-After)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def _status(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None: status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """응답 헤더의 retry-after-ms / Retry-After(초)."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"): return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"): return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """429 / 5xx / 408 / 409, 그리고 상태 코드 없는 연결·타임아웃 오류(openai.APIConnectionError 계열)."""
+    status = _status(exc)
+    if status is not None: return status in RETRYABLE_STATUS
+    name = type(exc).__name__
+    return name in ("APIConnectionError", "APITimeoutError") or isinstance(exc, (ConnectionError, TimeoutError))
+
+
+def retry_call(fn: Callable, retries: int = 3, base_delay: float = 0.5, max_delay: float = 30.0,
+               limiter: Optional[RateLimiter] = None, on_retry: Optional[Callable[[int, BaseException, float], None]] = None):
+    """fn()을 호출하고, 재시도할 수 있는 오류면 최대 retries번 다시 시도한다. 호출마다 limiter.acquire()를 거친다."""
+    attempt = 0
+    while True:
+        if limiter: limiter.acquire()
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= retries or not is_retryable(e): raise
+            hinted = retry_after(e)
+            delay = hinted if hinted is not None else min(max_delay, base_delay * (2 ** attempt)) * (0.5 + random.random() / 2)
+            attempt += 1
+            if on_retry: on_retry(attempt, e, delay)
+            if limiter and _status(e) == 429: limiter.pause(delay)  # 다음 acquire()에서 다른 스레드와 함께 기다린다
+            else: time.sleep(delay)
@@ -0,0 +1,163 @@
+# nlq/sql_cache.py
+"""
+NL→SQL 캐시 (SQLite 영구 저장)
+
+같은 질문을 같은 프로젝트 선택으로 반복할 때 llm_generate_sql / llm_route의 LLM 호출을 건너뛴다.
+    - 키: 정규화된 질문 + 정렬된 selected_ids
+    - 정확히 일치하지 않으면 같은 프로젝트 집합 안에서 문자 n-gram 코사인 유사도로 비슷한 표현을 찾는다.
+      단, 내용어(조사를 뗀 단어) 집합이 같아야 한다 — 조사/구두점만 다른 질문만 적중하고,
+      단어 하나라도 다르면("켜진" vs "꺼진", "큰" vs "작은", "상위 10개" vs "상위 20개") 유사해도 적중으로 보지 않는다.
+    - 값: sanitize_sql + enforce_project_filter를 거치고 실행에 성공한 SQL
+    - LRU(max_entries) / TTL(ttl_seconds) 제거, 프롬프트 지문(CONTEXT_DEFINITIONS, EXAMPLE_QUERIES 등)이 바뀌면 전체 무효화
+    - 적중/미스 카운터 제공 (세션 + 누적)
+"""
+import hashlib, math, re, sqlite3, threading, time, unicodedata
+from collections import Counter
+from typing import Iterable, Optional, Tuple
+
+_REQUEST_SUFFIX = re.compile(r"(좀|을|를)?\s*(조사해|알려|보여|구해|찾아|계산해|뽑아|정리해)\s*(줘|주세요|줄래|줄 수 있어)?$")
+# 단어 끝에서 떼는 조사 (긴 것부터). "도"/"만"처럼 뜻이 바뀌는 조사는 떼지 않는다.
+_PARTICLES = ("에서는", "에서", "으로", "에게", "까지", "부터", "보다", "에는", "은", "는", "이", "가", "을", "를", "의", "에", "로", "와", "과")
+
+
+def normalize_question(text: str) -> str:
+    """유니코드 정규화, 소문자화, 구두점/공백 정리, 끝의 요청 어미("알려줘", "보여줘" 등) 제거."""
+    t = unicodedata.normalize("NFKC", text or "").lower()
+    t = re.sub(r"[^\w\s~\-.%]", " ", t)
+    t = re.sub(r"\s+", " ", t).strip(" .")
+    t = _REQUEST_SUFFIX.sub("", t).strip()
+    return t
+
+
+def prompt_fingerprint(*parts: str) -> str:
+    """SQL 생성 프롬프트 구성 요소의 지문. 값이 바뀌면 캐시 전체를 무효화한다."""
+    h = hashlib.sha256()
+    for p in parts: h.update((p or "").encode("utf-8")); h.update(b"\0")
+    return h.hexdigest()[:16]
+
+
+def _stem(word: str) -> str:
+    for p in _PARTICLES:
+        if word.endswith(p) and len(word) > len(p): return word[:-len(p)]
+    return word
+
+
+def _signature(norm: str) -> frozenset:
+    """퍼지 적중 전에 반드시 같아야 하는 부분: 조사를 뗀 내용어 집합 (숫자, 집계/정렬 키워드, 켜/꺼·큰/작은 같은 반의어 포함)."""
+    return frozenset(_stem(w) for w in norm.split())
+
+
+def _ngrams(text: str, n: int = 2) -> Counter:
+    t = f" {text.replace(' ', '_')} "
+    return Counter(t[i:i + n] for i in range(max(len(t) - n + 1, 1)))
+
+
+def _cosine(a: Counter, b: Counter) -> float:
+    dot = sum(v * b.get(k, 0) for k, v in a.items())
+    if not dot: return 0.0
+    return dot / (math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values())))
+
+
+class SqlCache:
+    def __init__(self, path: str, fingerprint: str, max_entries: int = 2000,
+                 ttl_seconds: float = 7 * 24 * 3600, fuzzy_threshold: float = 0.9):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.fuzzy_threshold = fuzzy_threshold
+        self.session = {"exact": 0, "fuzzy": 0, "miss": 0, "store": 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS sql_cache (
+                key TEXT PRIMARY KEY, question TEXT, ids TEXT, sql TEXT,
+                created REAL, last_used REAL, hits INTEGER DEFAULT 0)""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS sql_cache_ids ON sql_cache(ids)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT)")
+        if self._meta("fingerprint") != fingerprint:
+            self.clear()
+            self._set_meta("fingerprint", fingerprint)
+
+    # ── 조회 / 저장 ─────────────────────────────────────────────
+    @staticmethod
+    def _ids_key(ids: Iterable[int]) -> str:
+        return ",".join(str(int(i)) for i in sorted(set(ids)))
+
+    def get(self, question: str, ids: Iterable[int]) -> Optional[dict]:
+        """{"sql", "kind": "exact" | "fuzzy", "key"} 또는 None."""
+        norm, ids_key = normalize_question(question), self._ids_key(ids)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("DELETE FROM sql_cache WHERE last_used < ?", (now - self.ttl_seconds,))
+            row = self._conn.execute("SELECT key, sql FROM sql_cache WHERE key = ?", (f"{ids_key}|{norm}",)).fetchone()
+            kind = "exact"
+            if row is None:
+                row, kind = self._fuzzy_lookup(norm, ids_key), "fuzzy"
+            if row is None:
+                self._count("miss")
+                return None
+            self._conn.execute("UPDATE sql_cache SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, row[0]))
+            self._conn.commit()
+            self._count(kind)
+            return {"sql": row[1], "kind": kind, "key": row[0]}
+
+    def _fuzzy_lookup(self, norm: str, ids_key: str) -> Optional[Tuple[str, str]]:
+        if self.fuzzy_threshold >= 1.0: return None
+        target, signature = _ngrams(norm), _signature(norm)
+        best, best_score = None, self.fuzzy_threshold
+        for key, question, sql in self._conn.execute("SELECT key, question, sql FROM sql_cache WHERE ids = ?", (ids_key,)):
+            if _signature(question) != signature: continue
+            score = _cosine(target, _ngrams(question))
+            if score >= best_score: best, best_score = (key, sql), score
+        return best
+
+    def put(self, question: str, ids: Iterable[int], sql: str):
+        norm, ids_key = normalize_question(question), self._ids_key(ids)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO sql_cache(key, question, ids, sql, created, last_used) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET sql = excluded.sql, last_used = excluded.last_used",
+                (f"{ids_key}|{norm}", norm, ids_key, sql, now, now))
+            # LRU: 최대 개수를 넘으면 가장 오래 사용되지 않은 항목부터 제거
+            self._conn.execute(
+                "DELETE FROM sql_cache WHERE key IN (SELECT key FROM sql_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,))
+            self._conn.commit()
+            self._count("store")
+
+    def invalidate(self, key: str):
+        """실행에 실패한 캐시 SQL 등 특정 항목(get()이 반환한 key)을 제거한다."""
+        with self._lock:
+            self._conn.execute("DELETE FROM sql_cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM sql_cache")
+            self._conn.commit()
+
+    # ── 통계 ───────────────────────────────────────────────────
+    def stats(self) -> dict:
+        """세션/누적 적중·미스 카운터와 현재 항목 수."""
+        with self._lock:
+            total = {k: int(self._meta(f"count_{k}") or 0) for k in self.session}
+            entries = self._conn.execute("SELECT COUNT(*) FROM sql_cache").fetchone()[0]
+        lookups = sum(self.session[k] for k in ("exact", "fuzzy", "miss"))
+        hit_rate = (self.session["exact"] + self.session["fuzzy"]) / lookups if lookups else 0.0
+        return {"session": dict(self.session), "total": total, "entries": entries, "session_hit_rate": hit_rate}
+
+    def _count(self, kind: str):
+        self.session[kind] += 1
+        self._conn.execute("INSERT INTO meta(k, v) VALUES (?, '1') ON CONFLICT(k) DO UPDATE SET v = CAST(v AS INTEGER) + 1",
+                           (f"count_{kind}",))
+        self._conn.commit()
+
+    def _meta(self, k: str) -> Optional[str]:
+        row = self._conn.execute("SELECT v FROM meta WHERE k = ?", (k,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, k: str, v: str):
+        with self._lock:
+            self._conn.execute("INSERT INTO meta(k, v) VALUES (?, ?) ON CONFLICT(k) DO UPDATE SET v = excluded.v", (k, v))
+            self._conn.commit()
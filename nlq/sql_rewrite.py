@@ -0,0 +1,335 @@
+# nlq/sql_rewrite.py
+"""
+SQL 구문 트리(sqlglot) 기반 정제 / 프로젝트 필터 주입 / 읽기 전용 검사 / 정규화
+
+app.py의 sanitize_sql, enforce_project_filter가 정규식으로 하던 일을 파싱 결과 위에서 한다.
+    - sanitize_sql: 코드 블록/설명 제거 후, project6를 읽는 SELECT 안의 `name` 컬럼 참조만 `project_name`으로 바꾼다
+      (별칭, 문자열, 다른 테이블의 컬럼은 그대로)
+    - enforce_project_filter: project_id를 가진 테이블(raw_data / meta_data / project6 / 레이어 롤업)을 읽는 모든 SELECT
+      (CTE, 하위 쿼리, JOIN 포함)에 `project_id IN (...)`을 넣는다 — 각 테이블 스캔이 인덱스로 범위를 좁힐 수 있도록.
+      LEFT JOIN의 오른쪽 테이블은 ON 절에 넣어 외부 조인 의미를 유지하고, FULL JOIN이 있는 SELECT에서는 양쪽 모두
+      `(project_id IN (...) OR project_id IS NULL)`로 넣는다. 이미 선택 범위 안의 필터가 있으면 건너뛴다.
+    - check_read_only: SELECT(WITH / UNION 포함) 한 문장인지, DML/DDL, SELECT INTO, FOR UPDATE,
+      부작용 있는 함수(pg_sleep, pg_terminate_backend 등)가 없는지 검사
+    - normalize_sql: 공백/대소문자/식별자 표기를 통일한 캐시 키용 SQL
+    - rewrite_time_column: raw_data.time 문자열 비교 / MIN·MAX(time) / ORDER BY time → time_ts(timestamp, 인덱스) 사용 (db/time_column.py)
+    - referenced_tables / to_duckdb: 읽는 테이블 집합, PostgreSQL → DuckDB 방언 변환 (로컬 실행용, db/prefetch.py)
+파싱에 실패하면 정제/필터 주입은 기존 정규식 방식으로 대체하고, 읽기 전용 검사는 보수적인 정규식 검사로 대체한다.
+"""
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import ParseError
+from sqlglot.optimizer.scope import traverse_scope
+
+from db.rollups import ROLLUP_TABLES
+
+DIALECT = "postgres"
+# project_id 컬럼이 있는 테이블 — 롤업 테이블(db/rollups.py)도 여기서 가져와 새 롤업이 필터를 건너뛰지 않게 한다
+PROJECT_TABLES = {"raw_data", "meta_data", "project6"} | {t.split(".")[-1] for t in ROLLUP_TABLES}
+_SCHEMAS = {"", "data", "public"}
+SQL_START = re.compile(r'(?is)\b(SELECT|WITH|INSERT|UPDATE|DELETE|CREATE|DROP|ALTER|EXPLAIN)\b')
+_UNSAFE_FUNCS = {"pg_sleep", "pg_terminate_backend", "pg_cancel_backend", "pg_reload_conf", "set_config", "setval", "nextval",
+                 "pg_read_file", "pg_read_binary_file", "pg_ls_dir", "lo_import", "lo_export", "dblink", "dblink_exec",
+                 "pg_advisory_lock", "pg_advisory_xact_lock", "txid_current"}
+_WRITE_NODES = tuple(getattr(exp, n) for n in ("Insert", "Update", "Delete", "Create", "Drop", "Alter", "AlterTable", "Merge",
+                                                "TruncateTable", "Command", "Into", "Lock", "Grant", "Copy", "Set")
+                     if hasattr(exp, n))
+_READ_ONLY_FALLBACK = re.compile(r"^\s*(SELECT|WITH)\b(?!.*\b(INSERT|UPDATE|DELETE|CREATE|DROP|ALTER|TRUNCATE|GRANT|COPY|INTO|"
+                                 r"FOR\s+UPDATE|PG_SLEEP|PG_TERMINATE_BACKEND)\b)", re.I | re.S)
+
+
+def parse(sql: str) -> exp.Expression:
+    return sqlglot.parse_one(sql, read=DIALECT)
+
+
+def render(tree: exp.Expression) -> str:
+    return tree.sql(dialect=DIALECT) + ";"
+
+
+def extract_sql(raw: str) -> str:
+    """LLM 출력에서 ```sql 블록 / 앞쪽 설명을 걷어내고 SQL 문장만 남긴다."""
+    if not raw: return ""
+    blocks = re.findall(r"```(?:sql)?\s*(.*?)```", raw, flags=re.S)
+    if blocks: raw = blocks[0]
+    m = SQL_START.search(raw)
+    if m: raw = raw[m.start():]
+    return raw.strip()
+
+
+# ── 정제 ───────────────────────────────────────────────────────
+def sanitize_sql(raw: str) -> str:
+    text = extract_sql(raw)
+    if not text: return ""
+    try:
+        tree = parse(text)
+    except ParseError:
+        text = re.sub(r'\bname\b', 'project_name', text, flags=re.I)  # 파싱 불가 → 기존 방식
+        return text if text.endswith(";") else text + ";"
+    if tree is None: return ""
+    _fix_name_columns(tree)
+    return render(tree)
+
+
+def _fix_name_columns(tree: exp.Expression):
+    """project6를 읽는 SELECT 안에서 project6(또는 한정자 없는) `name` 컬럼 → `project_name`."""
+    for col in list(tree.find_all(exp.Column)):
+        if col.name.lower() != "name" or col.this.args.get("quoted"): continue
+        select = col.find_ancestor(exp.Select)
+        if select is None: continue
+        tables = {t.alias_or_name.lower(): t.name.lower() for t in _select_tables(select)}
+        if "project6" not in tables.values(): continue
+        if col.table and tables.get(col.table.lower()) != "project6": continue
+        col.set("this", exp.to_identifier("project_name"))
+
+
+def _select_tables(select: exp.Select) -> List[exp.Table]:
+    """이 SELECT의 FROM / JOIN에 직접 나오는 테이블 (하위 쿼리 안쪽 제외)."""
+    out = []
+    from_ = select.args.get("from") or select.args.get("from_")
+    sources = ([from_.this] if from_ else []) + [j.this for j in select.args.get("joins") or []]
+    for s in sources:
+        if isinstance(s, exp.Table): out.append(s)
+    return out
+
+
+# ── 프로젝트 필터 ───────────────────────────────────────────────
+def enforce_project_filter(sql: str, ids: Iterable[int]) -> str:
+    ids = sorted({int(i) for i in ids})
+    if not ids: return sql
+    try:
+        tree = parse(sql)
+    except ParseError as e:
+        print(f"⚠️ SQL 파싱 실패 (정규식 방식으로 필터 주입): {e}")
+        return _splice_filter(sql, ids)
+    if tree is None: return sql
+    changed = False
+    for scope in traverse_scope(tree):
+        select = scope.expression
+        if not isinstance(select, exp.Select): continue
+        tables = [s for s in scope.sources.values() if isinstance(s, exp.Table)
+                  and s.name.lower() in PROJECT_TABLES and (s.db or "").lower() in _SCHEMAS]
+        for table in tables:
+            changed |= _add_filter(select, table, ids, single=len(scope.sources) == 1)
+    return render(tree) if changed else sql
+
+
+def _add_filter(select: exp.Select, table: exp.Table, ids: List[int], single: bool) -> bool:
+    qualifier = table.alias_or_name
+    join = table.parent if isinstance(table.parent, exp.Join) else None
+    side = (join.side or "").upper() if join else ""
+    joins = select.args.get("joins") or []
+    right_join = next((j for j in joins if (j.side or "").upper() == "RIGHT" and j.this is not table), None)
+    full = any((j.side or "").upper() == "FULL" for j in joins)  # FULL JOIN은 양쪽 다 NULL 쪽이 될 수 있다
+
+    if join is not None and side == "LEFT": target = join       # 외부 조인의 NULL 쪽 → ON
+    elif right_join is not None: target = right_join            # RIGHT JOIN의 왼쪽(NULL 쪽) → ON
+    else: target = select                                        # FROM / INNER JOIN / RIGHT JOIN의 보존 쪽 → WHERE
+    cond_key = "on" if isinstance(target, exp.Join) else "where"
+    existing = target.args.get(cond_key)
+    existing = existing.this if isinstance(existing, exp.Where) else existing
+    if _has_filter(existing, qualifier, ids, single): return False
+
+    col = exp.column("project_id", table=None if single else qualifier)
+    pred = exp.In(this=col, expressions=[exp.Literal.number(i) for i in ids])
+    if full: pred = exp.paren(exp.or_(pred, exp.Is(this=col.copy(), expression=exp.Null())))
+    if cond_key == "on": target.set("on", _conjoin(existing, pred))
+    else: select.set("where", exp.Where(this=_conjoin(existing, pred)))
+    return True
+
+
+def _conjoin(existing: Optional[exp.Expression], pred: exp.Expression) -> exp.Expression:
+    """기존 조건 앞에 필터를 AND로 붙인다. (기존 AND 체인은 괄호 없이 평평하게, OR만 괄호로 감싼다)"""
+    if existing is None: return pred
+    if isinstance(existing, exp.Or): existing = exp.paren(existing)
+    return exp.And(this=pred, expression=existing)
+
+
+def _has_filter(cond: Optional[exp.Expression], qualifier: str, ids: List[int], single: bool) -> bool:
+    """AND로 연결된 조건 중 이 테이블의 project_id를 선택 범위(ids)의 부분집합으로 제한하는 것이 있는지."""
+    if cond is None: return False
+    allowed = set(ids)
+    for c in cond.flatten() if isinstance(cond, exp.And) else [cond]:
+        c = c.unnest()
+        if isinstance(c, exp.In): col, values = c.this, c.expressions
+        elif isinstance(c, exp.EQ): col, values = c.this, [c.expression]
+        else: continue
+        if not isinstance(col, exp.Column) or col.name.lower() != "project_id": continue
+        if col.table and col.table.lower() != qualifier.lower(): continue
+        if not col.table and not single: continue
+        if values and all(isinstance(v, exp.Literal) and v.is_int and int(v.this) in allowed for v in values): return True
+    return False
+
+
+def _splice_filter(sql: str, ids: List[int]) -> str:
+    """파싱할 수 없는 SQL용: 첫 WHERE(없으면 ORDER BY / GROUP BY / LIMIT 앞)에 필터를 넣는 기존 방식."""
+    ids_csv = ",".join(str(i) for i in ids)
+    if re.search(r'\bproject_id\b\s+IN\s*\(\s*\d+(?:\s*,\s*\d+)*\s*\)', sql, flags=re.I): return sql
+    if re.search(r'\bWHERE\b', sql, flags=re.I):
+        return re.sub(r'\bWHERE\b', f"WHERE project_id IN ({ids_csv}) AND ", sql, count=1, flags=re.I)
+    m = re.search(r'\b(ORDER\s+BY|GROUP\s+BY|LIMIT)\b', sql, flags=re.I)
+    if m: return sql[:m.start()] + f" WHERE project_id IN ({ids_csv}) " + sql[m.start():]
+    return sql.rstrip(';') + f" WHERE project_id IN ({ids_csv});"
+
+
+# ── 읽기 전용 검사 ──────────────────────────────────────────────
+def check_read_only(sql: str) -> Tuple[bool, str]:
+    """(읽기 전용 여부, 거부 사유)."""
+    try:
+        trees = [t for t in sqlglot.parse(sql, read=DIALECT) if t is not None]
+    except ParseError:
+        ok = bool(_READ_ONLY_FALLBACK.match(sql)) and sql.strip().rstrip(";").count(";") == 0
+        return ok, "" if ok else "SQL을 해석할 수 없어 읽기 전용인지 확인하지 못했습니다."
+    if len(trees) != 1: return False, "SQL 문장은 하나만 실행할 수 있습니다."
+    tree = trees[0]
+    if not isinstance(tree, exp.Query): return False, f"조회(SELECT) 문이 아닙니다: {tree.key.upper()}"
+    for node in tree.walk():
+        if isinstance(node, _WRITE_NODES): return False, f"데이터를 변경하는 구문이 포함되어 있습니다: {node.key.upper()}"
+        if isinstance(node, exp.Func):
+            name = (node.name if isinstance(node, exp.Anonymous) else node.sql_name()).lower()
+            if name in _UNSAFE_FUNCS: return False, f"허용되지 않는 함수: {name}"
+    if any(s.args.get("locks") for s in tree.find_all(exp.Select)): return False, "FOR UPDATE/SHARE 잠금은 허용되지 않습니다."
+    return True, ""
+
+
+# ── 정규화 ─────────────────────────────────────────────────────
+@lru_cache(maxsize=2048)
+def normalize_sql(sql: str) -> str:
+    """캐시 키용: 키워드 대문자, 따옴표 없는 식별자 소문자, 공백/세미콜론 통일. 파싱 실패 시 공백만 정리."""
+    try:
+        tree = parse(sql)
+        if tree is not None: return tree.sql(dialect=DIALECT, normalize=True)
+    except ParseError:
+        pass
+    return re.sub(r"\s+", " ", sql.strip().rstrip(";")).lower()
+
+
+# ── 참조 테이블 / DuckDB 변환 ───────────────────────────────────
+_MS_FORMAT = re.compile(r"(%S[_.:]?)MS")
+_FUNC_NAME = re.compile(r"^([A-Za-z_]\w*)\s*\(")
+
+def referenced_tables(sql: str) -> Optional[set]:
+    """SQL이 읽는 실제 테이블 이름(소문자, data/public 스키마는 떼고 그 밖의 스키마는 "schema.table") 집합. CTE 이름 제외. 파싱 실패 시 None."""
+    try:
+        tree = parse(sql)
+    except ParseError:
+        return None
+    if tree is None: return None
+    ctes = {c.alias_or_name.lower() for c in tree.find_all(exp.CTE)}
+    out = set()
+    for t in tree.find_all(exp.Table):
+        name, db = t.name.lower(), (t.db or "").lower()
+        if not name: return None  # 테이블 함수 등
+        if db in _SCHEMAS:
+            if not (db == "" and name in ctes): out.add(name)
+        else:
+            out.add(f"{db}.{name}")
+    return out
+
+
+@lru_cache(maxsize=512)
+def to_duckdb(sql: str) -> str:
+    """PostgreSQL SQL → DuckDB SQL (::캐스트, to_char, percentile_cont, NULLS 순서 등). 변환할 수 없으면 ParseError 등 예외."""
+    tree = parse(sql.strip().rstrip(";"))
+    if tree is None: raise ParseError("빈 SQL")
+    _keep_output_names(tree)
+    return _MS_FORMAT.sub(r"\1%g", tree.sql(dialect="duckdb"))  # to_char / to_timestamp의 MS(밀리초)는 sqlglot이 옮기지 않는다 → strftime %g
+
+
+def _keep_output_names(tree: exp.Expression):
+    """별칭 없는 함수 컬럼에 PostgreSQL이 붙이는 이름(함수 이름: min, count, to_char ...)을 별칭으로 붙인다 (DuckDB는 min("time")처럼 식 전체)."""
+    select = tree
+    while isinstance(select, exp.Union): select = select.left
+    if not isinstance(select, exp.Select): return
+    for e in list(select.expressions):
+        inner = e
+        while isinstance(inner, exp.Cast): inner = inner.this
+        if isinstance(e, (exp.Alias, exp.Column, exp.Star)) or not isinstance(inner, (exp.Func, exp.WithinGroup)): continue
+        m = _FUNC_NAME.match(inner.sql(dialect=DIALECT))
+        if m: e.replace(exp.alias_(e.copy(), m.group(1).lower(), quoted=True))
+
+
+# ── time → time_ts ─────────────────────────────────────────────
+_TIME_LITERAL = re.compile(r"^\d{2}_\d{2}(?:_\d{2}(?:_\d{2}(?:_\d{2}(?:_\d{3})?)?)?)?$")  # 'MM_DD' ~ 'MM_DD_HH24_MI_SS_MS'
+_FLIP = {exp.GT: exp.LT, exp.GTE: exp.LTE, exp.LT: exp.GT, exp.LTE: exp.GTE, exp.EQ: exp.EQ, exp.NEQ: exp.NEQ}
+_PREFIX_OP = {exp.GT: exp.GTE, exp.GTE: exp.GTE, exp.LT: exp.LT, exp.LTE: exp.LT}  # 앞부분만 준 문자열: 'a_b' < 'a_b_...'
+_TIME_FMT = "MM_DD_HH24_MI_SS_MS"
+
+
+def _ts_literal(node: exp.Expression) -> Optional[Tuple[exp.Expression, bool]]:
+    """time 문자열 리터럴 → (TIMESTAMP 리터럴, 전체 형식인지). 형식이 아니거나 날짜가 잘못되면 None."""
+    if not (isinstance(node, exp.Literal) and node.is_string and _TIME_LITERAL.match(node.this)): return None
+    parts = node.this.split("_")
+    full = len(parts) == 6
+    parts += ["00"] * (5 - len(parts)) + (["000"] if len(parts) < 6 else [])
+    try:
+        ts = datetime.strptime("2000_" + "_".join(parts), "%Y_%m_%d_%H_%M_%S_%f")
+    except ValueError:
+        return None
+    return exp.cast(exp.Literal.string(ts.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]), "TIMESTAMP"), full
+
+
+def rewrite_time_column(sql: str) -> str:
+    """
+    raw_data를 읽는 SELECT에서 time 문자열 조건을 time_ts 조건으로 바꾼다 ((project_id, time_ts) 인덱스 범위 조회).
+        time >= '03_01_09_30'          → time_ts >= CAST('2000-03-01 09:30:00.000' AS TIMESTAMP)  (앞부분만 준 값도 같은 의미로)
+        MIN(time) / MAX(time)          → TO_CHAR(MIN(time_ts), 'MM_DD_HH24_MI_SS_MS') (출력 형식/컬럼 이름 유지)
+        ORDER BY time (집계 없는 SELECT) → ORDER BY time_ts
+    바꿀 것이 없거나 파싱할 수 없으면 원본을 그대로 돌려준다.
+    """
+    try:
+        tree = parse(sql)
+    except ParseError:
+        return sql
+    if tree is None: return sql
+    changed = False
+    for scope in traverse_scope(tree):
+        select = scope.expression
+        if not isinstance(select, exp.Select): continue
+        raw = {alias.lower() for alias, src in scope.sources.items() if isinstance(src, exp.Table) and src.name.lower() == "raw_data"}
+        if not raw: continue
+        plain = not select.args.get("group") and not select.args.get("distinct") and not any(select.find_all(exp.AggFunc))
+        for col in list(scope.columns):
+            if col.name.lower() != "time" or (col.table and col.table.lower() not in raw): continue
+            if col.table == "" and len(scope.sources) > 1 and len(raw) != 1: continue
+            changed |= _rewrite_time_use(col)
+        if plain and select.args.get("order"):  # ORDER BY time: 출력 컬럼 이름으로 해석되므로 scope.columns에 없을 수 있다
+            outputs = {e.alias_or_name.lower(): e for e in select.expressions}
+            for ordered in select.args["order"].expressions:
+                c = ordered.this
+                if not (isinstance(c, exp.Column) and c.name.lower() == "time" and (not c.table or c.table.lower() in raw)): continue
+                if "time" in outputs and not isinstance(outputs["time"], exp.Column): continue  # 다른 식의 별칭 time
+                c.replace(exp.column("time_ts", table=c.table or None))
+                changed = True
+    return render(tree) if changed else sql
+
+
+def _rewrite_time_use(col: exp.Column) -> bool:
+    parent = col.parent
+    ts_col = exp.column("time_ts", table=col.table or None)
+    if type(parent) in _FLIP:
+        op, other = (type(parent), parent.expression) if parent.this is col else (_FLIP[type(parent)], parent.this)
+        lit = _ts_literal(other)
+        if lit is None: return False
+        value, full = lit
+        if not full:
+            if op not in _PREFIX_OP: return False
+            op = _PREFIX_OP[op]
+        parent.replace(op(this=ts_col, expression=value))
+        return True
+    if isinstance(parent, exp.Between) and parent.this is col:
+        low, high = _ts_literal(parent.args["low"]), _ts_literal(parent.args["high"])
+        if not (low and high and low[1] and high[1]): return False
+        parent.replace(exp.Between(this=ts_col, low=low[0], high=high[0]))
+        return True
+    if isinstance(parent, (exp.Min, exp.Max)) and parent.this is col:
+        name = "min" if isinstance(parent, exp.Min) else "max"
+        formatted = exp.Anonymous(this="TO_CHAR", expressions=[type(parent)(this=ts_col), exp.Literal.string(_TIME_FMT)])
+        if isinstance(parent.parent, exp.Select): formatted = exp.alias_(formatted, name)  # 별칭 없던 컬럼 이름(min/max) 유지
+        parent.replace(formatted)
+        return True
+    return False
@@ -0,0 +1,45 @@
+# tests/test_cost_guard.py
+"""
+db/cost_guard.inject_limit: LIMIT ALL / FETCH FIRST / OFFSET가 있는 SQL에도 최상위 상한을 문법에 맞게 넣는지 확인한다 (DB 불필요).
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+import os, sys, unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from db.cost_guard import inject_limit
+
+CAP = 2_000_000
+
+# (입력 SQL, 기대 SQL)
+CASES = [
+    ("SELECT * FROM data.raw_data WHERE project_id IN (1)",
+     "SELECT * FROM data.raw_data WHERE project_id IN (1) LIMIT 2000000;"),
+    ("SELECT * FROM data.raw_data WHERE project_id IN (1) LIMIT 10;",
+     "SELECT * FROM data.raw_data WHERE project_id IN (1) LIMIT 10;"),
+    ("SELECT * FROM data.raw_data WHERE project_id IN (1) LIMIT 5000000 OFFSET 5;",
+     "SELECT * FROM data.raw_data WHERE project_id IN (1) LIMIT 2000000 OFFSET 5;"),
+    ("SELECT * FROM data.raw_data WHERE project_id IN (1) LIMIT ALL;",
+     "SELECT * FROM data.raw_data WHERE project_id IN (1) LIMIT 2000000;"),
+    ("SELECT * FROM data.raw_data WHERE project_id IN (1) FETCH FIRST 5000000 ROWS ONLY;",
+     "SELECT * FROM data.raw_data WHERE project_id IN (1) FETCH FIRST 2000000 ROWS ONLY;"),
+    ("SELECT * FROM data.raw_data WHERE project_id IN (1) ORDER BY id OFFSET 5 FETCH NEXT 10 ROWS ONLY;",
+     "SELECT * FROM data.raw_data WHERE project_id IN (1) ORDER BY id OFFSET 5 FETCH NEXT 10 ROWS ONLY;"),
+    ("WITH x AS (SELECT id FROM data.raw_data LIMIT 3) SELECT * FROM x",
+     "WITH x AS (SELECT id FROM data.raw_data LIMIT 3) SELECT * FROM x LIMIT 2000000;"),
+    ("SELECT layer FROM data.raw_data UNION ALL SELECT layer FROM data.meta_data LIMIT 9000000",
+     "SELECT layer FROM data.raw_data UNION ALL SELECT layer FROM data.meta_data LIMIT 2000000;"),
+]
+
+
+class InjectLimitTest(unittest.TestCase):
+    def test_cases(self):
+        for sql, want in CASES:
+            with self.subTest(sql=sql):
+                self.assertEqual(inject_limit(sql, CAP), want)
+
+
+if __name__ == "__main__":
+    unittest.main()
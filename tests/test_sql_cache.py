@@ -0,0 +1,57 @@
+# tests/test_sql_cache.py
+"""
+nlq/sql_cache.py 퍼지 조회: 반의어 하나만 다른 질문이 서로의 SQL을 받지 않는지 확인한다 (DB 불필요).
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+import os, sys, tempfile, unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from nlq.sql_cache import SqlCache
+
+IDS = [1, 2]
+
+# (저장된 질문, 반대 뜻의 질문) — 문자 n-gram 코사인은 0.9를 넘는다
+ANTONYM_PAIRS = [
+    ("레이저가 켜진 구간의 용융풀 온도를 레이어별로 정리해서 보여줘",
+     "레이저가 꺼진 구간의 용융풀 온도를 레이어별로 정리해서 보여줘"),
+    ("dwell ratio가 가장 큰 레이어와 그 값을 알려줘",
+     "dwell ratio가 가장 작은 레이어와 그 값을 알려줘"),
+    ("레이어가 진행될수록 용융풀 면적이 증가하는 프로젝트를 찾아줘",
+     "레이어가 진행될수록 용융풀 면적이 감소하는 프로젝트를 찾아줘"),
+    ("contact 신호가 있는 레이어의 평균 mpt를 알려줘",
+     "contact 신호가 없는 레이어의 평균 mpt를 알려줘"),
+    ("평균 mpt가 가장 높은 상위 10개 레이어를 보여줘",
+     "평균 mpt가 가장 높은 상위 20개 레이어를 보여줘"),
+    ("평균 mpt가 가장 높은 상위 10개 레이어를 보여줘",
+     "평균 mpt가 가장 높은 하위 10개 레이어를 보여줘"),
+]
+
+
+class SqlCacheFuzzyTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = SqlCache(os.path.join(self.tmp.name, "sql_cache.sqlite3"), "test")
+
+    def tearDown(self):
+        self.cache._conn.close()
+        self.tmp.cleanup()
+
+    def test_antonyms_do_not_hit(self):
+        for stored, asked in ANTONYM_PAIRS:
+            with self.subTest(asked=asked):
+                self.cache.clear()
+                self.cache.put(stored, IDS, "SELECT 1")
+                self.assertIsNone(self.cache.get(asked, IDS))
+
+    def test_particle_variants_hit(self):
+        self.cache.put("프로젝트 1의 레이어별 평균 온도를 보여줘", IDS, "SELECT 1")
+        hit = self.cache.get("프로젝트 1 레이어별 평균 온도 보여줘", IDS)
+        self.assertIsNotNone(hit)
+        self.assertEqual(hit["kind"], "fuzzy")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,24 @@
+# tests/test_sql_rewrite.py
+"""
+nlq/sql_rewrite.py 검증 코퍼스(bench/bench_sql_rewrite.CORPUS)를 테스트로 실행한다 (DB 불필요).
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+import os, sys, unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+sys.path.insert(0, ROOT)
+
+from bench_sql_rewrite import CORPUS, check_case
+
+
+class SqlRewriteCorpusTest(unittest.TestCase):
+    def test_corpus(self):
+        for case in CORPUS:
+            with self.subTest(case=case[0]):
+                self.assertEqual(check_case(case, verbose=False), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
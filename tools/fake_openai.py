@@ -0,0 +1,189 @@
+# tools/fake_openai.py
+"""
+로컬 가짜 OpenAI 서버 (Chat Completions API 호환, 스트리밍 지원)
+
+실제 API 키/네트워크 없이 app.py의 LLM 단계(의도 분류, SQL 생성, 답변 스트리밍)를 점검하기 위한 도구입니다.
+    python tools/fake_openai.py --port 8765 --latency 0.5 --token-delay 0.02
+    # .env 또는 셸에서
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1  OPENAI_API_KEY=sk-fake  python app.py
+
+응답 규칙 (system 프롬프트 내용으로 단계를 판별):
+    - 라우터       → {"intent": "SQL", "sql": 고정 SQL} (JSON)
+    - 의도 분류기  → "SQL"
+    - SQL 생성기   → 고정 SQL (meta_data 레이어별 MPT 평균)
+    - 그 외        → 고정 한국어 답변 (스트리밍 시 글자 단위 청크로 전송)
+--responses 옵션으로 {"부분 문자열": "응답"} 형태의 JSON 파일을 주면, 사용자 프롬프트에 해당 문자열이 포함될 때 그 응답을 우선 사용합니다.
+--replay 옵션으로 녹화 파일(JSON 목록 또는 JSONL, 항목마다 {"question", "intent", "sql", "answer"})을 주면
+프롬프트의 [사용자 질문]이 그 question과 같을 때 단계별로 기록된 의도 / SQL / 답변을 그대로 돌려줍니다.
+nlq/batch.py의 결과 파일(results.jsonl)을 그대로 쓸 수 있으므로, 실제 API로 한 번 배치 실행해 녹화하고 이후에는 재생만 할 수 있습니다.
+--rpm 옵션을 주면 최근 60초 요청 수가 그 값을 넘을 때 429(Retry-After 헤더 포함)로 응답합니다 (속도 제한/재시도 점검용).
+
+코드에서 직접 띄울 수도 있습니다:
+    server, base_url = start_server(port=0)   # 백그라운드 스레드
+    ...
+    server.shutdown()
+"""
+import argparse, json, re, threading, time, uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_SQL = "SELECT project_id, layer_number, mpt_avg FROM data.meta_data ORDER BY layer_number;"
+DEFAULT_ANSWER = ("요청하신 결과를 확인했습니다.<br><br><strong>[데이터 해석]</strong> "
+                  "레이어가 진행될수록 용융풀 온도(MPT) 평균이 완만하게 상승하는 경향을 보입니다.")
+
+
+_QUESTION_RE = re.compile(r"(?:\[사용자 질문\]|--- 사용자 질문 ---|사용자 질문:)\s*(.*?)(?:\n\n|\Z)", re.S)
+
+
+def load_replay(path: str) -> Dict[str, dict]:
+    """녹화 파일 → {질문: {"intent", "sql", "answer"}}. JSON 목록 / JSONL(nlq/batch.py 결과) 모두 읽는다."""
+    text = open(path, encoding="utf-8").read().strip()
+    items: List[dict] = json.loads(text) if text.startswith("[") else [json.loads(line) for line in text.splitlines() if line.strip()]
+    return {str(it["question"]).strip(): it for it in items if it.get("question")}
+
+
+def _replay_response(system: str, case: dict) -> str:
+    intent = (case.get("intent") or "SQL").upper()
+    sql = case.get("sql") if intent == "SQL" else None
+    if "라우터" in system: return json.dumps({"intent": intent, "sql": sql}, ensure_ascii=False)
+    if "의도 분류기" in system: return intent
+    if "SQL 생성기" in system: return sql or DEFAULT_SQL
+    return case.get("answer") or DEFAULT_ANSWER
+
+
+def pick_response(messages: list, overrides: Optional[Dict[str, str]] = None, replay: Optional[Dict[str, dict]] = None) -> str:
+    system = " ".join(m.get("content") or "" for m in messages if m.get("role") == "system")
+    user = " ".join(m.get("content") or "" for m in messages if m.get("role") == "user")
+    for needle, reply in (overrides or {}).items():
+        if needle in user: return reply
+    if replay:
+        m = _QUESTION_RE.search(user)
+        case = replay.get(m.group(1).strip()) if m else None
+        if case is not None: return _replay_response(system, case)
+    if "라우터" in system: return json.dumps({"intent": "SQL", "sql": DEFAULT_SQL}, ensure_ascii=False)
+    if "의도 분류기" in system: return "SQL"
+    if "SQL 생성기" in system: return DEFAULT_SQL
+    return DEFAULT_ANSWER
+
+
+def _chunks(text: str):
+    # 실제 토큰과 비슷하게 공백/태그 경계 단위로 자른다.
+    return re.findall(r"<[^>]*>|\s*[^\s<]{1,4}", text) or [text]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "FakeOpenAI/1.0"
+
+    def log_message(self, fmt, *args):  # 터미널 출력 억제
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404); return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        cfg = self.server.cfg
+        if cfg["rpm"]:
+            retry_after = self.server.admit(cfg["rpm"])
+            if retry_after is not None:
+                self.server.rejected_count += 1
+                data = json.dumps({"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}).encode("utf-8")
+                self.send_response(429)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Retry-After", f"{retry_after:.3f}")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                return
+        reply = pick_response(body.get("messages", []), cfg["overrides"], cfg["replay"])
+        model = body.get("model", "fake-model")
+        cid = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        self.server.request_count += 1
+        time.sleep(cfg["latency"])
+
+        if not body.get("stream"):
+            payload = {
+                "id": cid, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(_chunks(reply)), "total_tokens": len(_chunks(reply))},
+            }
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        def send(delta: dict, finish: Optional[str] = None):
+            chunk = {"id": cid, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        try:
+            send({"role": "assistant", "content": ""})
+            for piece in _chunks(reply):
+                send({"content": piece})
+                time.sleep(cfg["token_delay"])
+            send({}, finish="stop")
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 클라이언트가 스트림을 끊음 (요청 취소)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def admit(self, rpm: int) -> Optional[float]:
+        """최근 60초 요청 수가 rpm 미만이면 기록하고 None, 아니면 다음 자리가 날 때까지의 초."""
+        with self.window_lock:
+            now = time.monotonic()
+            while self.window and now - self.window[0] >= 60: self.window.popleft()
+            if len(self.window) < rpm:
+                self.window.append(now)
+                return None
+            return 60 - (now - self.window[0])
+
+
+def start_server(host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, token_delay: float = 0.0,
+                 overrides: Optional[Dict[str, str]] = None, rpm: int = 0,
+                 replay: Optional[Dict[str, dict]] = None) -> Tuple[ThreadingHTTPServer, str]:
+    """백그라운드 스레드로 서버를 띄우고 (server, base_url)을 반환한다. rpm > 0이면 분당 요청 수를 넘을 때 429. replay: load_replay() 결과."""
+    server = _Server((host, port), _Handler)
+    server.cfg = {"latency": latency, "token_delay": token_delay, "overrides": overrides or {}, "rpm": rpm, "replay": replay or {}}
+    server.request_count = server.rejected_count = 0
+    server.window, server.window_lock = deque(), threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="로컬 가짜 OpenAI Chat Completions 서버")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.0, help="첫 응답까지 지연(초)")
+    ap.add_argument("--token-delay", type=float, default=0.0, help="스트리밍 청크 간 지연(초)")
+    ap.add_argument("--responses", help='{"부분 문자열": "응답"} JSON 파일')
+    ap.add_argument("--rpm", type=int, default=0, help="분당 요청 수 한도 (넘으면 429, 0이면 없음)")
+    ap.add_argument("--replay", help="녹화 파일 (JSON 목록 또는 nlq/batch.py 결과 JSONL: question / intent / sql / answer)")
+    args = ap.parse_args()
+    overrides = json.load(open(args.responses, encoding="utf-8")) if args.responses else None
+    replay = load_replay(args.replay) if args.replay else None
+    server, base_url = start_server(args.host, args.port, args.latency, args.token_delay, overrides, args.rpm, replay)
+    print(f"가짜 OpenAI 서버 실행 중: OPENAI_BASE_URL={base_url}  (Ctrl+C 종료)")
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()